@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Micro-benchmark of the S6a Diameter codec over recorded AIR and ULR
+payloads: decoding and reading the AVPs the S6a application uses, encoding
+the answers, and reassembling the requests from the reads of the server.
+"""
+import argparse
+import time
+from unittest.mock import Mock
+
+from load_tests.common import write_benchmark_result
+from magma.subscriberdb.protocols.diameter import avp, message, server
+from magma.subscriberdb.protocols.diameter.application import s6a
+
+SESSION_ID = 'mme.magma.com;1475864727;1;apps6a'
+PLMN = b'\x02\xf8\x59'
+
+
+def _encode(msg):
+    buf = bytearray(msg.length)
+    msg.encode(buf, 0)
+    return bytes(buf)
+
+
+def _request(command_code, imsi):
+    msg = message.Message()
+    msg.header.application_id = s6a.S6AApplication.APP_ID
+    msg.header.command_code = command_code
+    msg.header.request = True
+    msg.header.proxiable = True
+    msg.append_avp(avp.AVP('Session-Id', SESSION_ID))
+    msg.append_avp(avp.AVP('Auth-Session-State', 1))
+    msg.append_avp(avp.AVP('Origin-Host', 'mme.magma.com'))
+    msg.append_avp(avp.AVP('Origin-Realm', 'magma.com'))
+    msg.append_avp(avp.AVP('Destination-Realm', 'magma.com'))
+    msg.append_avp(avp.AVP('User-Name', imsi))
+    msg.append_avp(avp.AVP('Visited-PLMN-Id', PLMN))
+    return msg
+
+
+def record_air(imsi):
+    """ An AIR as sent by the MME """
+    msg = _request(
+        s6a.S6AApplicationCommands.AUTHENTICATION_INFORMATION, imsi,
+    )
+    msg.append_avp(
+        avp.AVP(
+            'Requested-EUTRAN-Authentication-Info', [
+                avp.AVP('Number-Of-Requested-Vectors', 1),
+                avp.AVP('Immediate-Response-Preferred', 0),
+            ],
+        ),
+    )
+    return _encode(msg)
+
+
+def record_ulr(imsi):
+    """ An ULR as sent by the MME """
+    msg = _request(s6a.S6AApplicationCommands.UPDATE_LOCATION, imsi)
+    msg.append_avp(avp.AVP('RAT-Type', 1004))
+    msg.append_avp(avp.AVP('ULR-Flags', 34))
+    return _encode(msg)
+
+
+def _read_air(msg):
+    """ Read the AIR as the S6a application does """
+    msg.find_avp(*avp.resolve('User-Name')).value
+    msg.find_avp(*avp.resolve('Visited-PLMN-Id')).value
+    info = msg.find_avp(*avp.resolve('Requested-EUTRAN-Authentication-Info'))
+    info.find_avp(*avp.resolve('Re-Synchronization-Info'))
+    info.find_avp(*avp.resolve('Number-Of-Requested-Vectors')).value
+
+
+def _read_ulr(msg):
+    msg.find_avp(*avp.resolve('User-Name')).value
+
+
+def _answer(msg):
+    """ An answer with the AVPs of an AIA """
+    resp = message.Message.create_response_msg(msg)
+    resp.append_avp(msg.find_avp(*avp.resolve('Session-Id')))
+    resp.append_avp(avp.AVP('Auth-Session-State', 1))
+    resp.append_avp(avp.AVP('Origin-Host', 'hss.magma.com'))
+    resp.append_avp(avp.AVP('Origin-Realm', 'magma.com'))
+    resp.append_avp(avp.AVP('Origin-State-Id', 1))
+    resp.append_avp(
+        avp.AVP('Result-Code', avp.ResultCode.DIAMETER_SUCCESS),
+    )
+    resp.append_avp(
+        avp.AVP(
+            'Authentication-Info', [
+                avp.AVP(
+                    'E-UTRAN-Vector', [
+                        avp.AVP('RAND', 16 * b'\x01'),
+                        avp.AVP('XRES', 8 * b'\x02'),
+                        avp.AVP('AUTN', 16 * b'\x03'),
+                        avp.AVP('KASME', 32 * b'\x04'),
+                    ],
+                ),
+            ],
+        ),
+    )
+    return _encode(resp)
+
+
+READERS = {
+    s6a.S6AApplicationCommands.AUTHENTICATION_INFORMATION: _read_air,
+    s6a.S6AApplicationCommands.UPDATE_LOCATION: _read_ulr,
+}
+
+
+def _decode(payloads):
+    for payload in payloads:
+        msg = message.decode(payload)
+        code = msg.header.command_code
+        msg.has_fields(s6a.S6AApplication.REQUIRED_FIELDS[code])
+        READERS[code](msg)
+
+
+def _roundtrip(payloads):
+    for payload in payloads:
+        msg = message.decode(payload)
+        code = msg.header.command_code
+        msg.has_fields(s6a.S6AApplication.REQUIRED_FIELDS[code])
+        READERS[code](msg)
+        _answer(msg)
+
+
+def _make_stream(payloads, read_size):
+    """ Split the requests into reads as the transport would """
+    stream = b''.join(payloads)
+    return [
+        stream[offset:offset + read_size]
+        for offset in range(0, len(stream), read_size)
+    ]
+
+
+def codec(args):
+    payloads = []
+    for i in range(args.num_requests):
+        imsi = '00101%010d' % (i % args.num_subs)
+        if i % 2:
+            payloads.append(record_ulr(imsi))
+        else:
+            payloads.append(record_air(imsi))
+
+    s6a_server = server.S6aServer(Mock(), Mock(), 'magma.com', 'hss.magma.com')
+    s6a_server.connection_made(Mock())
+    s6a_server._handle_msg = lambda app_id, msg: None  # pylint:disable=protected-access
+    reads = _make_stream(payloads, args.read_size)
+
+    def _stream(_payloads):
+        for read in reads:
+            s6a_server.data_received(read)
+
+    result = {
+        'num_requests': args.num_requests,
+        'read_size': args.read_size,
+    }
+    for name, run in (
+        ('decode', _decode),
+        ('roundtrip', _roundtrip),
+        ('stream', _stream),
+    ):
+        start = time.monotonic()
+        run(payloads)
+        elapsed = time.monotonic() - start
+        msgs_per_sec = args.num_requests / elapsed
+        result['%s_msgs_per_sec' % name] = msgs_per_sec
+        print('%-10s %.0f msgs/s' % (name, msgs_per_sec))
+
+    output_file = write_benchmark_result('diameter_codec', result)
+    print('Results written to %s' % output_file)
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmark for the S6a Diameter codec.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_codec = subparsers.add_parser(
+        'codec',
+        help='Decode AIRs and ULRs and encode their answers',
+    )
+    parser_codec.add_argument(
+        '--num_requests', type=int, default=20000,
+        help='Number of requests, half AIRs and half ULRs',
+    )
+    parser_codec.add_argument(
+        '--num_subs', type=int, default=100,
+        help='Number of distinct subscribers',
+    )
+    parser_codec.add_argument(
+        '--read_size', type=int, default=4096,
+        help='Size of the transport reads of the streamed requests',
+    )
+    parser_codec.set_defaults(func=codec)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Benchmark of the eventd LogEvent path, validating events and sending them
+to a local fake fluent-bit Forward input. The fake input can also be served
+on its own, in place of fluent-bit, to load a running eventd.
+"""
+import argparse
+import json
+import time
+from unittest.mock import MagicMock
+
+from load_tests.common import write_benchmark_result
+from magma.configuration.service_configs import load_service_config
+from magma.eventd.event_validator import EventValidator
+from magma.eventd.fake_forward_server import FakeForwardServer
+from magma.eventd.forward_sink import ForwardSink
+from magma.eventd.rpc_servicer import EventDRpcServicer
+from orc8r.protos.eventd_pb2 import Event
+
+EVENT_TYPE = 'processed_updates'
+FLUENT_BIT_PORT = 5170
+
+
+def _event(index):
+    value = {'updates': [{'key': 'key%d' % index, 'value': 'dmFsdWU='}]}
+    return Event(
+        stream_name='magmad',
+        event_type=EVENT_TYPE,
+        tag='IMSI%015d' % index,
+        value=json.dumps(value),
+    )
+
+
+def log_events(args):
+    server = FakeForwardServer(keep_records=False)
+    server.start()
+
+    config = load_service_config('eventd')
+    config['fluent_bit_port'] = server.port
+    config['fluent_bit_sink'] = dict(
+        config.get('fluent_bit_sink', {}),
+        num_connections=args.num_connections,
+        flush_count=args.flush_count,
+        max_queue_size=args.num_events,
+        spill_dir=None,
+    )
+    sink = ForwardSink.from_config(config)
+    sink.start()
+    servicer = EventDRpcServicer(config, EventValidator(config), sink)
+    events = [_event(index) for index in range(args.num_events)]
+    context = MagicMock()
+
+    start = time.monotonic()
+    for event in events:
+        servicer.LogEvent(event, context)
+    log_secs = time.monotonic() - start
+    if not server.wait_for_records(args.num_events, timeout=60):
+        print('Only %d events were received' % server.num_records)
+    total_secs = time.monotonic() - start
+    sink.close()
+    server.stop()
+
+    result = {
+        'num_events': args.num_events,
+        'num_connections': args.num_connections,
+        'flush_count': args.flush_count,
+        'usec_per_log_event': log_secs * 1e6 / args.num_events,
+        'events_per_sec': server.num_records / total_secs,
+    }
+    print('LogEvent: %.2f usec' % result['usec_per_log_event'])
+    print('Received by fluent-bit: %.0f events/s' % result['events_per_sec'])
+    output_file = write_benchmark_result('eventd', result)
+    print('Results written to %s' % output_file)
+
+
+def serve(args):
+    server = FakeForwardServer(port=args.port, keep_records=False)
+    server.start()
+    print('Fake Forward input listening on port %d' % server.port)
+    num_records = 0
+    try:
+        while True:
+            time.sleep(args.interval)
+            received = server.num_records - num_records
+            num_records += received
+            print('%.0f events/s' % (received / args.interval))
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark for the eventd fluent-bit sink.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_log = subparsers.add_parser(
+        'log_events',
+        help='Log a burst of events to a fake fluent-bit Forward input',
+    )
+    parser_log.add_argument(
+        '--num_events', type=int, default=50000,
+        help='Number of events logged',
+    )
+    parser_log.add_argument(
+        '--num_connections', type=int, default=2,
+        help='Number of connections to fluent-bit',
+    )
+    parser_log.add_argument(
+        '--flush_count', type=int, default=500,
+        help='Maximum number of events sent in a chunk',
+    )
+    parser_log.set_defaults(func=log_events)
+
+    parser_serve = subparsers.add_parser(
+        'serve',
+        help='Serve a fake fluent-bit Forward input, printing its rate',
+    )
+    parser_serve.add_argument(
+        '--port', type=int, default=FLUENT_BIT_PORT,
+        help='Port to listen on, the fluent_bit_port of eventd',
+    )
+    parser_serve.add_argument(
+        '--interval', type=float, default=1,
+        help='Seconds between two rate reports',
+    )
+    parser_serve.set_defaults(func=serve)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Micro-benchmark of the pipelined restart reconciliation, diffing the flow
+messages of the UEs against the flows found in a synthetic OVS table, as
+RestartMixin does for each table of a controller.
+"""
+import argparse
+import ipaddress
+import logging
+import time
+from types import SimpleNamespace
+
+from load_tests.common import write_benchmark_result
+from magma.pipelined.openflow.messages import MessageHub
+from ryu.ofproto import ofproto_v1_4, ofproto_v1_4_parser
+
+TABLE = 12
+NEXT_TABLE = 13
+UE_BLOCK = ipaddress.ip_network('192.160.0.0/12')
+
+
+def _ue_flow(parser, index, as_msg):
+    """ The uplink flow of a UE, as a flow message or as found in OVS """
+    ip_addr = str(UE_BLOCK[index + 1])
+    match = parser.OFPMatch(
+        eth_type=0x0800, reg1=0x10, ipv4_src=ip_addr,
+        metadata=(index << 1) | 1,
+    )
+    actions = [
+        parser.NXActionRegLoad2(dst='reg2', value=index % 16 + 1),
+        parser.NXActionRegLoad2(dst='reg4', value=0),
+        parser.NXActionResubmitTable(table_id=NEXT_TABLE),
+    ]
+    instructions = [
+        parser.OFPInstructionActions(
+            ofproto_v1_4.OFPIT_APPLY_ACTIONS, actions,
+        ),
+    ]
+    if as_msg:
+        return parser.OFPFlowMod(
+            None, table_id=TABLE, priority=10, match=match,
+            instructions=instructions,
+        )
+    return parser.OFPFlowStats(
+        table_id=TABLE, priority=10, match=match,
+        instructions=instructions,
+    )
+
+
+def reconcile(args):
+    parser = ofproto_v1_4_parser
+    dp = SimpleNamespace(ofproto=ofproto_v1_4, ofproto_parser=parser)
+    msg_hub = MessageHub(logging.getLogger(__name__))
+
+    # The UEs from num_stale on are still active, while those from
+    # num_flows on attached during the restart
+    msgs = [
+        _ue_flow(parser, index, True)
+        for index in range(args.num_stale, args.num_flows + args.num_new)
+    ]
+    flows = [_ue_flow(parser, index, False) for index in range(args.num_flows)]
+
+    start = time.monotonic()
+    msgs_to_send, remaining_flows = \
+        msg_hub.filter_msgs_if_not_in_flow_list(dp, msgs, flows)
+    elapsed = time.monotonic() - start
+    assert len(msgs_to_send) == args.num_new
+    assert len(remaining_flows) == args.num_stale
+
+    result = {
+        'num_flows': args.num_flows,
+        'num_msgs': len(msgs),
+        'reconcile_secs': elapsed,
+    }
+    print(
+        'Reconciled %d messages with %d flows in %.3f s' % (
+            len(msgs), args.num_flows, elapsed,
+        ),
+    )
+    output_file = write_benchmark_result('flow_reconciliation', result)
+    print('Results written to %s' % output_file)
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmark for the pipelined restart '
+        'reconciliation.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_reconcile = subparsers.add_parser(
+        'reconcile',
+        help='Diff the UE flow messages against the flows of a table',
+    )
+    parser_reconcile.add_argument(
+        '--num_flows', type=int, default=50000,
+        help='Number of UE flows found in the table',
+    )
+    parser_reconcile.add_argument(
+        '--num_stale', type=int, default=500,
+        help='Number of found flows of UEs no longer active',
+    )
+    parser_reconcile.add_argument(
+        '--num_new', type=int, default=500,
+        help='Number of flows of UEs missing from the table',
+    )
+    parser_reconcile.set_defaults(func=reconcile)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
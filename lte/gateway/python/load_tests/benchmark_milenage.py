@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Micro-benchmark of the Milenage E-UTRAN vector generation, comparing the
+vectors/sec of the separate f1-f5 functions, which set up AES and compute
+TEMP for each of them, against the batched vector engine.
+"""
+import argparse
+import os
+import time
+
+from load_tests.common import write_benchmark_result
+from magma.subscriberdb.crypto.milenage import Milenage
+
+PLMN = b'\x02\xf8\x59'
+
+
+def _separate_vectors(milenage, key, opc, sqns):
+    """ One vector at a time, with the separate Milenage functions """
+    vectors = []
+    for sqn in sqns:
+        sqn_bytes = sqn.to_bytes(6, 'big')
+        rand = Milenage.generate_rand()
+        mac_a, _ = Milenage.f1(key, sqn_bytes, rand, opc, milenage.amf)
+        xres, ak = Milenage.f2_f5(key, rand, opc)
+        ck = Milenage.f3(key, rand, opc)
+        ik = Milenage.f4(key, rand, opc)
+        autn = Milenage.generate_autn(sqn_bytes, ak, mac_a, milenage.amf)
+        kasme = Milenage.generate_kasme(ck, ik, PLMN, sqn_bytes, ak)
+        vectors.append((rand, xres, autn, kasme))
+    return vectors
+
+
+def _batched_vectors(milenage, key, opc, sqns):
+    return milenage.generate_eutran_vectors(key, opc, sqns, PLMN)
+
+
+def _single_vectors(milenage, key, opc, sqns):
+    """ One generate_eutran_vector call per vector """
+    return [
+        milenage.generate_eutran_vector(key, opc, sqn, PLMN) for sqn in sqns
+    ]
+
+
+IMPLEMENTATIONS = {
+    'separate': _separate_vectors,
+    'single': _single_vectors,
+    'batched': _batched_vectors,
+}
+
+
+def eutran(args):
+    milenage = Milenage(b'\x80\x00')
+    keys = [
+        (os.urandom(16), os.urandom(16)) for _ in range(args.num_subs)
+    ]
+    result = {
+        'num_requests': args.num_requests,
+        'vectors_per_request': args.vectors_per_request,
+    }
+    for name, generate in IMPLEMENTATIONS.items():
+        sqn = 0
+        start = time.monotonic()
+        for request in range(args.num_requests):
+            key, opc = keys[request % args.num_subs]
+            sqns = range(sqn, sqn + args.vectors_per_request)
+            sqn += args.vectors_per_request
+            generate(milenage, key, opc, sqns)
+        elapsed = time.monotonic() - start
+        vectors_per_sec = \
+            args.num_requests * args.vectors_per_request / elapsed
+        result['%s_vectors_per_sec' % name] = vectors_per_sec
+        print('%-10s %.0f vectors/s' % (name, vectors_per_sec))
+
+    output_file = write_benchmark_result('milenage', result)
+    print('Results written to %s' % output_file)
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmark for the Milenage auth vectors.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_eutran = subparsers.add_parser(
+        'eutran',
+        help='Generate E-UTRAN vectors as for S6a AIRs',
+    )
+    parser_eutran.add_argument(
+        '--num_requests', type=int, default=5000,
+        help='Number of AIRs',
+    )
+    parser_eutran.add_argument(
+        '--vectors_per_request', type=int, default=1,
+        help='Number-Of-Requested-Vectors of each AIR',
+    )
+    parser_eutran.add_argument(
+        '--num_subs', type=int, default=100,
+        help='Number of distinct subscriber keys',
+    )
+    parser_eutran.set_defaults(func=eutran)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+In-process benchmark of the mobilityd DHCP IP allocation. The DHCP client
+sends its packets to a local DHCP server stand-in, which answers them after
+a configurable delay, so that the allocations/sec of an attach burst can be
+measured without a DHCP server on the uplink.
+"""
+import argparse
+import ipaddress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+from load_tests.common import write_benchmark_result
+from magma.mobilityd.dhcp_client import DHCPClient
+from magma.mobilityd.dhcp_desc import DHCPState
+from magma.mobilityd.ip_allocator_dhcp import IPAllocatorDHCP
+from magma.mobilityd.mobility_store import MobilityStore
+from scapy.layers.dhcp import BOOTP, DHCP
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+
+SERVER_MAC = '00:00:00:00:00:01'
+SERVER_IP = '10.200.0.1'
+LEASE_TIME = 3600
+
+
+class StandInDHCPServer(object):
+    """
+    DHCP server stand-in, offering the IPs of a block and acking the
+    requests after delay seconds
+    """
+
+    def __init__(self, ip_block: str, delay: float, num_workers: int):
+        self._network = ipaddress.ip_network(ip_block)
+        self._hosts = self._network.hosts()
+        self._offers = {}
+        self._lock = threading.Lock()
+        self._delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=num_workers)
+        self.client = None
+
+    def handle_pkt(self, pkt) -> None:
+        self._executor.submit(self._reply, Ether(bytes(pkt)))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _reply(self, request) -> None:
+        message_type = request[DHCP].options[0][1]
+        if message_type == int(DHCPState.DISCOVER):
+            with self._lock:
+                chaddr = request[BOOTP].chaddr
+                if chaddr not in self._offers:
+                    self._offers[chaddr] = str(next(self._hosts))
+                ip = self._offers[chaddr]
+            reply_type = 'offer'
+        elif message_type == int(DHCPState.REQUEST):
+            ip = request[BOOTP].ciaddr
+            reply_type = 'ack'
+        else:
+            return
+
+        reply = Ether(src=SERVER_MAC, dst=request[Ether].src)
+        reply /= IP(src=SERVER_IP, dst='255.255.255.255')
+        reply /= UDP(sport=67, dport=68)
+        reply /= BOOTP(
+            op=2, yiaddr=ip, xid=request[BOOTP].xid,
+            chaddr=request[BOOTP].chaddr,
+        )
+        reply /= DHCP(
+            options=[
+                ('message-type', reply_type),
+                ('subnet_mask', str(self._network.netmask)),
+                ('router', SERVER_IP),
+                ('lease_time', LEASE_TIME),
+                'end',
+            ],
+        )
+        time.sleep(self._delay)
+        # Parsed as the sniffer would
+        self.client._rx_dhcp_pkt(Ether(bytes(reply)))  # pylint: disable=protected-access
+
+
+class StandInDHCPClient(DHCPClient):
+    """ DHCP client exchanging its packets with a DHCP server stand-in """
+
+    def __init__(self, server: StandInDHCPServer, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._server = server
+        server.client = self
+
+    def run(self):
+        self._monitor_thread.start()
+
+    def stop(self):
+        self._monitor_thread_event.set()
+
+    def _send_pkt(self, pkt) -> None:
+        self._server.handle_pkt(pkt)
+
+
+def allocate(args):
+    client = redis.Redis(
+        host=args.redis_host, port=args.redis_port, db=args.redis_db,
+    )
+    client.flushdb()
+    store = MobilityStore(client)
+    server = StandInDHCPServer(
+        args.ip_block, args.server_delay_ms / 1000, args.threads,
+    )
+    dhcp_client = StandInDHCPClient(
+        server,
+        dhcp_store=store.dhcp_store,
+        gw_info=store.dhcp_gw_info,
+        dhcp_wait=threading.Condition(),
+    )
+    allocator = IPAllocatorDHCP(store, dhcp_client=dhcp_client)
+
+    latencies = []
+
+    def _allocate(index):
+        start = time.monotonic()
+        allocator.alloc_ip_address('IMSI%015d' % index, 0)
+        latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        for _ in executor.map(_allocate, range(args.num)):
+            pass
+    elapsed = time.monotonic() - start
+
+    allocator.stop_dhcp_sniffer()
+    server.close()
+    client.flushdb()
+
+    latencies.sort()
+    result = {
+        'num_allocations': args.num,
+        'threads': args.threads,
+        'server_delay_ms': args.server_delay_ms,
+        'allocations_per_sec': args.num / elapsed,
+        'p50_latency_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_latency_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+    print(
+        '%.0f allocations/s, latency p50 %.1f ms p99 %.1f ms' % (
+            result['allocations_per_sec'], result['p50_latency_ms'],
+            result['p99_latency_ms'],
+        ),
+    )
+    output_file = write_benchmark_result('mobilityd_dhcp', result)
+    print('Results written to %s' % output_file)
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='In-process benchmark for mobilityd DHCP IP allocation. '
+        'The given Redis database is flushed before and after the run.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--redis_host', default='localhost')
+    parser.add_argument('--redis_port', type=int, default=6380)
+    parser.add_argument(
+        '--redis_db', type=int, default=15,
+        help='Scratch Redis database, must not be used by any service',
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_allocate = subparsers.add_parser(
+        'allocate',
+        help='Allocate IPs for concurrently attaching subscribers',
+    )
+    parser_allocate.add_argument(
+        '--num', type=int, default=2000, help='Number of subscribers',
+    )
+    parser_allocate.add_argument(
+        '--threads', type=int, default=50,
+        help='Number of concurrent allocations',
+    )
+    parser_allocate.add_argument(
+        '--server_delay_ms', type=float, default=5,
+        help='Delay of the DHCP server answers',
+    )
+    parser_allocate.add_argument('--ip_block', default='10.200.0.0/16')
+    parser_allocate.set_defaults(func=allocate)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
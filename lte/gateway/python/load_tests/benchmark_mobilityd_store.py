@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+In-process benchmark of the mobilityd IP address manager. Unlike the gHZ
+load tests, this drives IPAddressManager directly against a scratch Redis
+database, to measure how allocation latency evolves with the number of
+active subscribers.
+"""
+import argparse
+import ipaddress
+import time
+
+import redis
+from load_tests.common import write_benchmark_result
+from magma.mobilityd.ip_address_man import IPAddressManager
+from magma.mobilityd.ip_allocator_pool import IpAllocatorPool
+from magma.mobilityd.ipv6_allocator_pool import IPv6AllocatorPool
+from magma.mobilityd.mobility_store import MobilityStore
+
+
+def _new_ip_address_man(client: redis.Redis, compact_ip_pool: bool):
+    store = MobilityStore(client, compact_ip_pool=compact_ip_pool)
+    ip_address_man = IPAddressManager(
+        IpAllocatorPool(store),
+        IPv6AllocatorPool(store, session_prefix_alloc_mode='RANDOM'),
+        store,
+        recycling_interval=None,
+    )
+    return ip_address_man
+
+
+def allocate(args):
+    client = redis.Redis(
+        host=args.redis_host, port=args.redis_port, db=args.redis_db,
+    )
+    client.flushdb()
+    ip_address_man = _new_ip_address_man(client, args.compact_ip_pool)
+
+    start = time.monotonic()
+    ip_address_man.add_ip_block(ipaddress.ip_network(args.ip_block))
+    add_block_secs = time.monotonic() - start
+
+    batches = []
+    for batch_start in range(0, args.num, args.batch):
+        start = time.monotonic()
+        for index in range(batch_start, min(batch_start + args.batch, args.num)):
+            ip_address_man.alloc_ip_address('IMSI%015d' % index)
+        elapsed = time.monotonic() - start
+        batches.append({
+            'active_subscribers': batch_start,
+            'usec_per_allocation': elapsed * 1e6 / args.batch,
+        })
+        print(
+            '%7d active subscribers: %8.1f usec/allocation' % (
+                batch_start, elapsed * 1e6 / args.batch,
+            ),
+        )
+
+    start = time.monotonic()
+    for index in range(args.num):
+        ip_address_man.get_sid_for_ip(
+            ip_address_man.get_ip_for_sid('IMSI%015d' % index),
+        )
+    lookup_usecs = (time.monotonic() - start) * 1e6 / args.num
+    print('get_sid_for_ip: %.1f usec/lookup' % lookup_usecs)
+
+    client.flushdb()
+    output_file = write_benchmark_result(
+        'mobilityd_allocate', {
+            'add_ip_block_secs': add_block_secs,
+            'allocation_batches': batches,
+            'usec_per_sid_lookup': lookup_usecs,
+        },
+    )
+    print('Results written to %s' % output_file)
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='In-process benchmark for mobilityd IP allocation. '
+        'The given Redis database is flushed before and after the run.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--redis_host', default='localhost')
+    parser.add_argument('--redis_port', type=int, default=6380)
+    parser.add_argument(
+        '--redis_db', type=int, default=15,
+        help='Scratch Redis database, must not be used by any service',
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_allocate = subparsers.add_parser(
+        'allocate',
+        help='Allocate IPs for an increasing number of subscribers',
+    )
+    parser_allocate.add_argument(
+        '--num', type=int, default=100000, help='Number of subscribers',
+    )
+    parser_allocate.add_argument(
+        '--batch', type=int, default=10000,
+        help='Number of allocations per measurement',
+    )
+    parser_allocate.add_argument('--ip_block', default='10.128.0.0/12')
+    parser_allocate.add_argument(
+        '--compact_ip_pool', action='store_true',
+        help='Store free IPs in block bitmaps',
+    )
+    parser_allocate.set_defaults(func=allocate)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
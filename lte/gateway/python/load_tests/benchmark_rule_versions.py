@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Micro-benchmark of the pipelined SessionRuleToVersionMapper under session
+churn: with a number of active sessions, sessions are torn down and
+activated again, reading the versions of their rules as the enforcement
+stats do.
+"""
+import argparse
+import time
+
+from load_tests.common import write_benchmark_result
+from lte.protos.mobilityd_pb2 import IPAddress
+from magma.pipelined.rule_mappers import SessionRuleToVersionMapper
+
+
+def _session(index):
+    ip_addr = IPAddress(
+        version=IPAddress.IPV4,
+        address=('10.%d.%d.%d' % (
+            index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff,
+        )).encode('utf-8'),
+    )
+    return 'IMSI%015d' % index, ip_addr
+
+
+def _activate(mapper, session, rule_ids, version):
+    imsi, ip_addr = session
+    for rule_id in rule_ids:
+        mapper.save_version(imsi, ip_addr, rule_id, version)
+
+
+def churn(args):
+    mapper = SessionRuleToVersionMapper()
+    rule_ids = ['rule%d' % i for i in range(args.rules_per_session)]
+    sessions = [_session(index) for index in range(args.num_sessions)]
+
+    start = time.monotonic()
+    for session in sessions:
+        _activate(mapper, session, rule_ids, 1)
+    activate_secs = time.monotonic() - start
+
+    start = time.monotonic()
+    for session in sessions:
+        imsi, ip_addr = session
+        for rule_id in rule_ids:
+            mapper.get_version(imsi, ip_addr, rule_id)
+    lookup_secs = time.monotonic() - start
+
+    start = time.monotonic()
+    for index in range(args.num_churn):
+        session = sessions[index % args.num_sessions]
+        mapper.remove_all_ue_versions(*session)
+        _activate(mapper, session, rule_ids, index + 2)
+    churn_secs = time.monotonic() - start
+
+    num_lookups = args.num_sessions * args.rules_per_session
+    result = {
+        'num_sessions': args.num_sessions,
+        'rules_per_session': args.rules_per_session,
+        'usec_per_save_version': activate_secs * 1e6 / num_lookups,
+        'usec_per_get_version': lookup_secs * 1e6 / num_lookups,
+        'teardowns_per_sec': args.num_churn / churn_secs,
+    }
+    print('save_version: %.2f usec' % result['usec_per_save_version'])
+    print('get_version: %.2f usec' % result['usec_per_get_version'])
+    print(
+        'teardown and activation: %.0f sessions/s'
+        % result['teardowns_per_sec'],
+    )
+    output_file = write_benchmark_result('rule_versions', result)
+    print('Results written to %s' % output_file)
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='Micro-benchmark for the pipelined rule versions.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_churn = subparsers.add_parser(
+        'churn',
+        help='Tear down and activate sessions among the active ones',
+    )
+    parser_churn.add_argument(
+        '--num_sessions', type=int, default=50000,
+        help='Number of active sessions',
+    )
+    parser_churn.add_argument(
+        '--rules_per_session', type=int, default=4,
+        help='Number of rules of each session',
+    )
+    parser_churn.add_argument(
+        '--num_churn', type=int, default=200,
+        help='Number of sessions torn down and activated again',
+    )
+    parser_churn.set_defaults(func=churn)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+In-process benchmark of the subscriberdb S6a auth path. It drives
+Processor.generate_lte_auth_vector, as done for every Authentication
+Information Request, against a scratch SqliteStore.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from lte.protos.mconfig.mconfigs_pb2 import SubscriberDB
+from lte.protos.subscriberdb_pb2 import (
+    LTESubscription,
+    SubscriberData,
+    SubscriberID,
+)
+from magma.subscriberdb.processor import Processor
+from magma.subscriberdb.sid import SIDUtils
+from magma.subscriberdb.store.sqlite import SqliteStore
+from load_tests.common import write_benchmark_result
+
+PLMN = b'\x02\xf8\x59'
+
+
+def _create_store(db_path: str, args) -> SqliteStore:
+    store = SqliteStore(
+        db_path, sid_digits=args.sid_last_n, cache_size=args.cache_size,
+    )
+    subscribers = []
+    for index in range(args.num_subs):
+        sub = SubscriberData(
+            sid=SubscriberID(id='%015d' % index, type=SubscriberID.IMSI),
+        )
+        sub.lte.state = LTESubscription.ACTIVE
+        sub.lte.auth_algo = LTESubscription.MILENAGE
+        sub.lte.auth_key = random.getrandbits(128).to_bytes(16, 'big')
+        sub.lte.auth_opc = random.getrandbits(128).to_bytes(16, 'big')
+        subscribers.append(sub)
+    store.resync(subscribers)
+    return store
+
+
+def air(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = _create_store(args.db_path or tmpdir + '/', args)
+        processor = Processor(
+            store, SubscriberDB.SubscriptionProfile(), {},
+            op=16 * b'\x11', amf=b'\x80\x00',
+            vector_pool_size=args.vector_pool_size,
+        )
+        if args.vector_pool_size:
+            # Warm the pools, as after a first attach of the subscribers
+            for index in range(args.num_subs):
+                processor.generate_lte_auth_vector('%015d' % index, PLMN)
+            time.sleep(args.warmup_secs)
+        # Attach storms hit a subset of hot subscribers
+        imsis = [
+            '%015d' % random.randrange(args.num_subs)
+            for _ in range(args.num_requests)
+        ]
+        latencies = [[] for _ in range(args.threads)]
+
+        def _run(thread_idx):
+            for imsi in imsis[thread_idx::args.threads]:
+                start = time.monotonic()
+                processor.generate_lte_auth_vector(imsi, PLMN)
+                latencies[thread_idx].append(time.monotonic() - start)
+
+        threads = [
+            threading.Thread(target=_run, args=(idx,))
+            for idx in range(args.threads)
+        ]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        sample = SIDUtils.to_str(
+            SubscriberID(id=imsis[0], type=SubscriberID.IMSI),
+        )
+        assert store.get_subscriber_data(sample).state.lte_auth_next_seq > 0
+        store.close()
+
+    all_latencies = sorted(
+        latency for thread in latencies for latency in thread
+    )
+    result = {
+        'num_subs': args.num_subs,
+        'num_requests': args.num_requests,
+        'threads': args.threads,
+        'cache_size': args.cache_size,
+        'vector_pool_size': args.vector_pool_size,
+        'air_per_sec': args.num_requests / elapsed,
+        'p50_latency_usec': _percentile(all_latencies, 50) * 1e6,
+        'p99_latency_usec': _percentile(all_latencies, 99) * 1e6,
+    }
+    print(
+        '%.0f AIR/s, p50 %.0f usec, p99 %.0f usec' % (
+            result['air_per_sec'], result['p50_latency_usec'],
+            result['p99_latency_usec'],
+        ),
+    )
+    output_file = write_benchmark_result('subscriberdb_air', result)
+    print('Results written to %s' % output_file)
+
+
+def _percentile(values, percent):
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def create_parser():
+    """
+    Creates the argparse subparser for all args
+    """
+    parser = argparse.ArgumentParser(
+        description='In-process benchmark for the subscriberdb store.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--db_path', default=None,
+        help='Directory of the scratch store, a temporary one by default',
+    )
+    parser.add_argument('--sid_last_n', type=int, default=2)
+    parser.add_argument(
+        '--cache_size', type=int, default=0,
+        help='Number of decoded subscribers cached by the store',
+    )
+
+    subparsers = parser.add_subparsers(title='subcommands', dest='cmd')
+    parser_air = subparsers.add_parser(
+        'air',
+        help='Generate LTE auth vectors as for S6a AIRs',
+    )
+    parser_air.add_argument(
+        '--num_subs', type=int, default=10000,
+        help='Number of subscribers in the store',
+    )
+    parser_air.add_argument(
+        '--num_requests', type=int, default=20000,
+        help='Number of auth vectors to generate',
+    )
+    parser_air.add_argument(
+        '--threads', type=int, default=10,
+        help='Number of concurrent requests, as the gRPC workers',
+    )
+    parser_air.add_argument(
+        '--vector_pool_size', type=int, default=0,
+        help='Number of auth vectors pooled per subscriber',
+    )
+    parser_air.add_argument(
+        '--warmup_secs', type=float, default=5,
+        help='Time left to fill the auth vector pools',
+    )
+    parser_air.set_defaults(func=air)
+    return parser
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    if not args.cmd:
+        parser.print_usage()
+        exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
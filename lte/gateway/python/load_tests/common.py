@@ -10,6 +10,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import json
 import os
 import subprocess  # noqa: S404
 from pathlib import Path
@@ -52,6 +53,22 @@ def make_output_file_path(
     return '%s/result_%s.json' % (RESULTS_PATH, request_type)
 
 
+def write_benchmark_result(name: str, result: dict) -> str:
+    """Write the result of an in-process benchmark as a JSON file
+
+    Args:
+        name (str): name of the benchmark
+        result (dict): JSON serializable benchmark result
+
+    Returns:
+        str: full output file path
+    """
+    output_file = '%s/benchmark_%s.json' % (RESULTS_PATH, name)
+    with open(output_file, 'w') as f:
+        json.dump(result, f, indent=2)
+    return output_file
+
+
 def make_full_request_type(
     service_name: str,
     request_type: str,
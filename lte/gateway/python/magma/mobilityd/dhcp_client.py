@@ -13,12 +13,15 @@ limitations under the License.
 Allocates IP address as per DHCP server in the uplink network.
 """
 import datetime
+import heapq
+import itertools
 import logging
 import threading
 import time
+from concurrent.futures import Future
 from ipaddress import IPv4Network, ip_address
 from threading import Condition
-from typing import MutableMapping, Optional
+from typing import Dict, List, MutableMapping, Optional, Tuple
 
 from magma.mobilityd.dhcp_desc import DHCPDescriptor, DHCPState
 from magma.mobilityd.mac import MacAddress, hex_to_mac
@@ -65,7 +68,17 @@ class DHCPClient:
         self._dhcp_notify = dhcp_wait
         self._dhcp_interface = iface
         self._msg_xid = 0
+        self._xid_lock = threading.Lock()
         self._lease_renew_wait_min = lease_renew_wait_min
+        # Allocations waiting for the DHCP server to offer an IP, by MAC key
+        self._allocations: Dict[str, Future] = {}
+        # Heap of the (due time, sequence, MAC key, renew deadline) of the
+        # leases to renew, the deadline identifying the lease
+        self._renewals: List[
+            Tuple[datetime.datetime, int, str, datetime.datetime]
+        ] = []
+        self._renewal_seq = itertools.count()
+        self._renewal_lock = threading.Lock()
         self._monitor_thread = threading.Thread(
             target=self._monitor_dhcp_state,
         )
@@ -88,6 +101,28 @@ class DHCPClient:
         self._sniffer.stop()
         self._monitor_thread_event.set()
 
+    def allocate_ip_address(self, mac: MacAddress, vlan: int) -> Future:
+        """
+        Send a DHCP discover for the MAC address, and return a future
+        resolved with its DHCP descriptor once the DHCP server offers an IP.
+        Allocations of different MAC addresses are in flight at the same
+        time, while those of a same MAC address share the same future.
+
+        Args:
+            mac: MAC address of the client
+            vlan: vlan id if the IP is allocated in a VLAN
+
+        Returns: Future of the DHCP descriptor of the offered IP.
+        """
+        key = mac.as_redis_key(vlan)
+        with self._dhcp_notify:
+            future = self._allocations.get(key)
+            if future is None:
+                future = Future()
+                self._allocations[key] = future
+        self.send_dhcp_packet(mac, vlan, DHCPState.DISCOVER)
+        return future
+
     def send_dhcp_packet(
         self, mac: MacAddress, vlan: int,
         state: DHCPState,
@@ -111,8 +146,7 @@ class DHCPClient:
                 mac=mac, ip="", vlan=vlan,
                 state_requested=DHCPState.DISCOVER,
             )
-            self._msg_xid = self._msg_xid + 1
-            pkt_xid = self._msg_xid
+            pkt_xid = self._next_xid()
         elif state == DHCPState.REQUEST and dhcp_desc:
             dhcp_opts = [
                 ("message-type", "request"),
@@ -128,8 +162,7 @@ class DHCPClient:
                 ("server_id", dhcp_desc.server_ip),
             ]
             dhcp_desc.state_requested = DHCPState.RELEASE
-            self._msg_xid = self._msg_xid + 1
-            pkt_xid = self._msg_xid
+            pkt_xid = self._next_xid()
             ciaddr = dhcp_desc.ip
         else:
             LOG.warning(
@@ -151,9 +184,10 @@ class DHCPClient:
         pkt /= UDP(sport=68, dport=67)
         pkt /= BOOTP(op=1, chaddr=mac.as_hex(), xid=pkt_xid, ciaddr=ciaddr)
         pkt /= DHCP(options=dhcp_opts)
-        LOG.debug("DHCP pkt xmit %s", pkt.show(dump=True))
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("DHCP pkt xmit %s", pkt.show(dump=True))
 
-        sendp(pkt, iface=self._dhcp_interface, verbose=0)
+        self._send_pkt(pkt)
 
     def get_dhcp_desc(
         self, mac: MacAddress,
@@ -196,43 +230,98 @@ class DHCPClient:
             DHCPState.RELEASE,
             dhcp_desc,
         )
-        del self.dhcp_client_state[key]
+        with self._dhcp_notify:
+            del self.dhcp_client_state[key]
+            self._allocations.pop(key, None)
+
+    def _send_pkt(self, pkt) -> None:
+        sendp(pkt, iface=self._dhcp_interface, verbose=0)
+
+    def _next_xid(self) -> int:
+        with self._xid_lock:
+            self._msg_xid = self._msg_xid + 1
+            return self._msg_xid
+
+    def _schedule_renewal(
+        self, key: str, deadline: datetime.datetime,
+        due: Optional[datetime.datetime] = None,
+    ) -> None:
+        """
+        Schedule the renewal of a lease at its renew deadline, or at due
+        for a retry.
+        """
+        with self._renewal_lock:
+            heapq.heappush(
+                self._renewals,
+                (due or deadline, next(self._renewal_seq), key, deadline),
+            )
+
+    def _pop_due_renewals(
+        self, now: datetime.datetime,
+    ) -> List[Tuple[str, datetime.datetime]]:
+        due = []
+        with self._renewal_lock:
+            while self._renewals and self._renewals[0][0] <= now:
+                _, _, key, deadline = heapq.heappop(self._renewals)
+                due.append((key, deadline))
+        return due
+
+    def _renew_lease(
+        self, key: str, deadline: datetime.datetime,
+        now: datetime.datetime,
+    ) -> None:
+        with self._dhcp_notify:
+            dhcp_record = self.dhcp_client_state.get(key)
+        # The lease was released, lost or renewed since it was scheduled
+        if dhcp_record is None \
+                or dhcp_record.state not in DHCP_ACTIVE_STATES \
+                or dhcp_record.lease_renew_deadline != deadline:
+            return
+
+        logging.debug("monitor: %s", dhcp_record)
+        request_state = DHCPState.REQUEST
+        # in case of lost DHCP lease rediscover it.
+        if now >= dhcp_record.lease_expiration_time:
+            request_state = DHCPState.DISCOVER
+
+        logging.debug("sending lease renewal")
+        self.send_dhcp_packet(
+            dhcp_record.mac, dhcp_record.vlan,
+            request_state, dhcp_record,
+        )
+        # Retry until the DHCP server answers, which records a new lease
+        self._schedule_renewal(
+            key, deadline,
+            now + datetime.timedelta(seconds=self._lease_renew_wait_min),
+        )
 
     def _monitor_dhcp_state(self):
         """
-        monitor DHCP client state.
+        monitor DHCP client state, renewing the leases from a heap of their
+        renew deadlines.
         """
+        # Leases recorded before the client started
+        with self._dhcp_notify:
+            for key, dhcp_record in self.dhcp_client_state.items():
+                if dhcp_record.state in DHCP_ACTIVE_STATES:
+                    self._schedule_renewal(
+                        key, dhcp_record.lease_renew_deadline,
+                    )
+
         while True:
+            now = datetime.datetime.now()
+            logging.debug("monitor time: %s", now)
+            for key, deadline in self._pop_due_renewals(now):
+                self._renew_lease(key, deadline, now)
+
+            # Wake up for the next renewal, or check for renewals recorded
+            # in the meantime after lease_renew_wait_min
             wait_time = self._lease_renew_wait_min
-            with self._dhcp_notify:
-                for dhcp_record in self.dhcp_client_state.values():
-                    logging.debug("monitor: %s", dhcp_record)
-                    # Only process active records.
-                    if dhcp_record.state not in DHCP_ACTIVE_STATES:
-                        continue
-
-                    now = datetime.datetime.now()
-                    logging.debug("monitor time: %s", now)
-                    request_state = DHCPState.REQUEST
-                    # in case of lost DHCP lease rediscover it.
-                    if now >= dhcp_record.lease_expiration_time:
-                        request_state = DHCPState.DISCOVER
-
-                    if now >= dhcp_record.lease_renew_deadline:
-                        logging.debug("sending lease renewal")
-                        self.send_dhcp_packet(
-                            dhcp_record.mac, dhcp_record.vlan,
-                            request_state, dhcp_record,
-                        )
-                    else:
-                        # Find next renewal wait time.
-                        time_to_renew = dhcp_record.lease_renew_deadline - now
-                        wait_time = min(
-                            wait_time, time_to_renew.total_seconds(),
-                        )
-
-            # default in wait is 30 sec
-            wait_time = max(wait_time, self._lease_renew_wait_min)
+            with self._renewal_lock:
+                if self._renewals:
+                    time_to_renew = self._renewals[0][0] - now
+                    wait_time = min(wait_time, time_to_renew.total_seconds())
+            wait_time = max(wait_time, self.THREAD_YIELD_TIME)
             logging.debug("lease renewal check after: %s sec", wait_time)
             self._monitor_thread_event.wait(wait_time)
             if self._monitor_thread_event.is_set():
@@ -246,7 +335,8 @@ class DHCPClient:
         return None
 
     def _process_dhcp_pkt(self, packet, state: DHCPState):
-        LOG.debug("DHCP pkt recv %s", packet.show(dump=True))
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("DHCP pkt recv %s", packet.show(dump=True))
 
         mac_addr = MacAddress(hex_to_mac(packet[BOOTP].chaddr.hex()[0:12]))
         vlan: int = 0
@@ -305,18 +395,20 @@ class DHCPClient:
 
                 self.dhcp_client_state[mac_addr_key] = dhcp_state
                 self._dhcp_notify.notifyAll()
-
-                if state == DHCPState.OFFER:
-                    # let other thread work on fulfilling IP allocation
-                    # request.
-                    threading.Event().wait(self.THREAD_YIELD_TIME)
-                    self.send_dhcp_packet(
-                        mac_addr, vlan, DHCPState.REQUEST, dhcp_state,
-                    )
+                allocation = self._allocations.pop(mac_addr_key, None)
             else:
                 LOG.debug("Unknown MAC: %s ", packet.summary())
                 return
 
+        self._schedule_renewal(mac_addr_key, dhcp_state.lease_renew_deadline)
+        # Wake up the allocation directly, without holding the lock
+        if allocation is not None and dhcp_state.ip_is_allocated():
+            allocation.set_result(dhcp_state)
+        if state == DHCPState.OFFER:
+            self.send_dhcp_packet(
+                mac_addr, vlan, DHCPState.REQUEST, dhcp_state,
+            )
+
     # ref: https://fossies.org/linux/scapy/scapy/layers/dhcp.py
     def _rx_dhcp_pkt(self, packet):
         if DHCP not in packet:
@@ -106,7 +106,7 @@ class IPAddressManager:
         and associated structure:
             - self._assigned_ip_blocks: {ip_block}
             - self.ip_state_map: {state=>{ip=>ip_desc}}
-            - self.sid_ips_map: {SID=>[IPDesc]}
+            - self.sid_ips_map: {SID=>[IPDesc]}, indexed by IP
 
         The utilized redis_containers store a cache of state in local memory,
         so reads are the same speed as without persistence. For writes, state
@@ -381,10 +381,7 @@ class IPAddressManager:
 
     def get_sid_for_ip(self, requested_ip: IPAddress) -> Optional[str]:
         """ If ip is associated with an sid, return the sid, else None """
-        for sid, ip_desc in self._store.sid_ips_map.items():
-            if requested_ip == ip_desc.ip:
-                return sid
-        return None
+        return self._store.sid_ips_map.get_sid(requested_ip)
 
     def is_ip_in_state(self, ip_addr: IPAddress, state: IPState):
         """
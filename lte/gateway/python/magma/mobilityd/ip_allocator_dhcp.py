@@ -21,15 +21,16 @@ from __future__ import (
 )
 
 import logging
+from concurrent import futures
 from copy import deepcopy
 from ipaddress import ip_address, ip_network
 from threading import Condition
-from typing import List, cast
+from typing import List, Optional
 
 from magma.mobilityd.ip_descriptor import IPDesc, IPState, IPType
 
 from .dhcp_client import DHCPClient
-from .dhcp_desc import DHCPDescriptor, DHCPState
+from .dhcp_desc import DHCPDescriptor
 from .ip_allocator_base import IPAllocator, NoAvailableIPError
 from .mac import MacAddress, create_mac_from_sid
 from .mobility_store import MobilityStore
@@ -44,7 +45,7 @@ LOG = logging.getLogger('mobilityd.dhcp.alloc')
 class IPAllocatorDHCP(IPAllocator):
     def __init__(
         self, store: MobilityStore, retry_limit: int = 300,
-        iface: str = "dhcp0",
+        iface: str = "dhcp0", dhcp_client: Optional[DHCPClient] = None,
     ):
         """
         Allocate IP address for SID using DHCP server.
@@ -58,15 +59,18 @@ class IPAllocatorDHCP(IPAllocator):
             store: Moblityd storage instance
             retry_limit: try DHCP request
             iface: DHCP interface.
+            dhcp_client: DHCP client to use instead of one on iface,
+                e.g. with a DHCP server stand-in.
         """
         self._store = store
-        self.dhcp_wait = Condition()
-        self._dhcp_client = DHCPClient(
-            dhcp_wait=self.dhcp_wait,
-            dhcp_store=store.dhcp_store,
-            gw_info=store.dhcp_gw_info,
-            iface=iface,
-        )
+        if dhcp_client is None:
+            dhcp_client = DHCPClient(
+                dhcp_wait=Condition(),
+                dhcp_store=store.dhcp_store,
+                gw_info=store.dhcp_gw_info,
+                iface=iface,
+            )
+        self._dhcp_client = dhcp_client
         self._retry_limit = retry_limit  # default wait for two minutes
         self._dhcp_client.run()
 
@@ -194,29 +198,28 @@ class IPAllocatorDHCP(IPAllocator):
     def _alloc_ip_address_from_dhcp(
         self, mac: MacAddress,
         vlan: int,
-    ) -> DHCPDescriptor:
-        retry_count = 0
-        with self.dhcp_wait:
-            dhcp_desc = None
-            while (
-                retry_count < self._retry_limit
-                and (
-                    (dhcp_desc is None) or not dhcp_allocated_ip(dhcp_desc)
+    ) -> Optional[DHCPDescriptor]:
+        """
+        Wait for the DHCP server to offer an IP, sending a DHCP discover
+        every DEFAULT_DHCP_REQUEST_RETRY_FREQUENCY retries. The wait doesn't
+        hold any lock, so that the allocations of other MAC addresses
+        proceed at the same time.
+        """
+        for retry_count in range(
+            0, self._retry_limit, DEFAULT_DHCP_REQUEST_RETRY_FREQUENCY,
+        ):
+            allocation = self._dhcp_client.allocate_ip_address(mac, vlan)
+            retries = min(
+                DEFAULT_DHCP_REQUEST_RETRY_FREQUENCY,
+                self._retry_limit - retry_count,
+            )
+            try:
+                return allocation.result(
+                    timeout=retries * DEFAULT_DHCP_REQUEST_RETRY_DELAY,
                 )
-            ):
-
-                if retry_count % DEFAULT_DHCP_REQUEST_RETRY_FREQUENCY == 0:
-                    self._dhcp_client.send_dhcp_packet(
-                        mac, vlan,
-                        DHCPState.DISCOVER,
-                    )
-                self.dhcp_wait.wait(timeout=DEFAULT_DHCP_REQUEST_RETRY_DELAY)
-
-                dhcp_desc = self._dhcp_client.get_dhcp_desc(mac, vlan)
-
-                retry_count = retry_count + 1
-
-            return cast(DHCPDescriptor, dhcp_desc)
+            except futures.TimeoutError:
+                LOG.debug("DHCP allocation timed out for mac %s", mac)
+        return self._dhcp_client.get_dhcp_desc(mac, vlan)
 
 
 def dhcp_allocated_ip(dhcp_desc: DHCPDescriptor) -> bool:
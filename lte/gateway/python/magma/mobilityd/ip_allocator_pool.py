@@ -24,7 +24,8 @@ from __future__ import (
 
 import logging
 from copy import deepcopy
-from typing import List
+from itertools import islice
+from typing import List, Set
 
 from magma.mobilityd.ip_descriptor import IPDesc, IPState, IPType
 
@@ -38,6 +39,9 @@ from .mobility_store import MobilityStore
 from .utils import IPAddress, IPNetwork
 
 DEFAULT_IP_RECYCLE_INTERVAL = 15
+# TODO(oramadan) t23793559 HACK reserve the GW address for
+#  gtp_br0 iface and test VM
+NUM_RESERVED_ADDRESSES = 11
 
 
 class IpAllocatorPool(IPAllocator):
@@ -65,9 +69,12 @@ class IpAllocatorPool(IPAllocator):
                 raise OverlappedIPBlocksError(ipblock)
 
         self._store.assigned_ip_blocks.add(ipblock)
-        # TODO(oramadan) t23793559 HACK reserve the GW address for
-        #  gtp_br0 iface and test VM
-        num_reserved_addresses = 11
+        if self._store.free_ip_bitmap is not None:
+            self._add_ip_block_bitmap(ipblock)
+            return
+
+        ip_descs_by_state = {IPState.RESERVED: [], IPState.FREE: []}
+        num_reserved_addresses = NUM_RESERVED_ADDRESSES
         for ip in ipblock.hosts():
             state = IPState.RESERVED if num_reserved_addresses > 0 \
                 else IPState.FREE
@@ -76,9 +83,28 @@ class IpAllocatorPool(IPAllocator):
                 ip_block=ipblock, sid=None,
                 ip_type=IPType.IP_POOL,
             )
-            self._store.ip_state_map.add_ip_to_state(ip, ip_desc, state)
+            ip_descs_by_state[state].append(ip_desc)
             if num_reserved_addresses > 0:
                 num_reserved_addresses -= 1
+        for state, ip_descs in ip_descs_by_state.items():
+            self._store.ip_state_map.add_ips_to_state(ip_descs, state)
+
+    def _add_ip_block_bitmap(self, ipblock: IPNetwork):
+        """ Add a block to the FREE bitmap, only the reserved addresses
+        are stored individually.
+        """
+        self._store.free_ip_bitmap.add_block(
+            ipblock, num_reserved=NUM_RESERVED_ADDRESSES,
+        )
+        for ip in islice(ipblock.hosts(), NUM_RESERVED_ADDRESSES):
+            ip_desc = IPDesc(
+                ip=ip, state=IPState.RESERVED,
+                ip_block=ipblock, sid=None,
+                ip_type=IPType.IP_POOL,
+            )
+            self._store.ip_state_map.add_ip_to_state(
+                ip, ip_desc, IPState.RESERVED,
+            )
 
     def remove_ip_blocks(
         self, ipblocks: List[IPNetwork],
@@ -132,27 +158,10 @@ class IpAllocatorPool(IPAllocator):
             del allocated_ip_block_set
 
         # Remove the associated IP addresses
-        remove_ips = \
-            (ip for block in remove_blocks for ip in block.hosts())
-        for ip in remove_ips:
-            for state in (IPState.FREE, IPState.RELEASED, IPState.REAPED):
-                self._store.ip_state_map.remove_ip_from_state(ip, state)
-            if force:
-                self._store.ip_state_map.remove_ip_from_state(
-                    ip,
-                    IPState.ALLOCATED,
-                )
-            else:
-                assert not self._store.ip_state_map.test_ip_state(
-                    ip,
-                    IPState.ALLOCATED,
-                ), \
-                    "Unexpected ALLOCATED IP %s from a soft IP block " \
-                    "removal "
-
-            # Clean up SID maps
-            for sid in list(self._store.sid_ips_map):
-                self._store.sid_ips_map.pop(sid)
+        if self._store.free_ip_bitmap is not None:
+            self._remove_ips_bitmap(remove_blocks, force)
+        else:
+            self._remove_ips(remove_blocks, force)
 
         # Remove the IP blocks
         self._store.assigned_ip_blocks -= remove_blocks
@@ -169,6 +178,48 @@ class IpAllocatorPool(IPAllocator):
             logging.info('Removed IP block %s from IPv4 address pool', block)
         return list(remove_blocks)
 
+    def _remove_ips(self, remove_blocks: Set[IPNetwork], force: bool):
+        """ Remove the IPs of the given blocks from all states """
+        remove_ips = [ip for block in remove_blocks for ip in block.hosts()]
+        if not remove_ips:
+            return
+        for state in (IPState.FREE, IPState.RELEASED, IPState.REAPED):
+            self._store.ip_state_map.remove_ips_from_state(remove_ips, state)
+        if force:
+            self._store.ip_state_map.remove_ips_from_state(
+                remove_ips,
+                IPState.ALLOCATED,
+            )
+        else:
+            assert not remove_blocks & \
+                self._store.ip_state_map.get_allocated_ip_block_set(), \
+                "Unexpected ALLOCATED IP from a soft IP block removal"
+
+        # Clean up SID maps
+        for sid in list(self._store.sid_ips_map):
+            self._store.sid_ips_map.pop(sid)
+
+    def _remove_ips_bitmap(self, remove_blocks: Set[IPNetwork], force: bool):
+        """ Remove the IPs of the given blocks when FREE IPs are kept in
+        the bitmap: only the sparse, non-FREE states need to be walked.
+        """
+        if not remove_blocks:
+            return
+        for block in remove_blocks:
+            self._store.free_ip_bitmap.remove_block(block)
+
+        states = [IPState.RELEASED, IPState.REAPED]
+        if force:
+            states.append(IPState.ALLOCATED)
+        for state in states:
+            for ip in self._store.ip_state_map.list_ips(state):
+                if any(ip in block for block in remove_blocks):
+                    self._store.ip_state_map.remove_ip_from_state(ip, state)
+
+        # Clean up SID maps
+        for sid in list(self._store.sid_ips_map):
+            self._store.sid_ips_map.pop(sid)
+
     def list_added_ip_blocks(self) -> List[IPNetwork]:
         """ List IP blocks added to the IP allocator
 
@@ -199,10 +250,10 @@ class IpAllocatorPool(IPAllocator):
             logging.error("Listing an unknown IP block: %s", ipblock)
             raise IPBlockNotFoundError(ipblock)
 
-        res = [
-            ip for ip in ipblock
-            if self._store.ip_state_map.test_ip_state(ip, IPState.ALLOCATED)
-        ]
+        res = sorted(
+            ip for ip in self._store.ip_state_map.list_ips(IPState.ALLOCATED)
+            if ip in ipblock
+        )
         return res
 
     def alloc_ip_address(self, sid: str, vlan_id: int) -> IPDesc:
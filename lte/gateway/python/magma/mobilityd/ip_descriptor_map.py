@@ -70,6 +70,24 @@ class IpDescriptorMap:
 
         self.ip_states[state][ip.exploded] = ip_desc
 
+    def add_ips_to_state(self, ip_descs: List[IPDesc], state: IPState):
+        """ Add ip=>ip_desc pairs to a internal dict in a single batch """
+        assert state in IPState, "unknown state %s" % state
+        for ip_desc in ip_descs:
+            assert ip_desc.state == state, \
+                "ip_desc.state %s does not match with state %s" \
+                % (ip_desc.state, state)
+
+        self.ip_states[state].bulk_set(
+            {ip_desc.ip.exploded: ip_desc for ip_desc in ip_descs},
+        )
+
+    def remove_ips_from_state(self, ips: List[IPAddress], state: IPState):
+        """ Remove IPs from a internal dict in a single batch """
+        assert state in IPState, "unknown state %s" % state
+
+        self.ip_states[state].bulk_delete(ip.exploded for ip in ips)
+
     def remove_ip_from_state(self, ip: IPAddress, state: IPState) -> IPDesc:
         """ Remove an IP from a internal dict """
         assert state in IPState, "unknown state %s" % state
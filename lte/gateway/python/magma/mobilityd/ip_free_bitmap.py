@@ -0,0 +1,281 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Compact representation of the FREE IP state for the IP_POOL allocator.
+
+Instead of one Redis hash entry per free address, every assigned IPv4 block
+is persisted as a single Redis string used as a bitmap: bit N is set when
+the N-th address of the block is free. The bitmap keeps the same layout as
+Redis SETBIT/GETBIT (most significant bit first), so the local copy can be
+written back with one SET and updated in place with SETBIT.
+
+IpFreeBitmap exposes the dict interface IpDescriptorMap expects from an IP
+state ({ip => IPDesc}), so it can be used as a drop-in for the FREE state
+while the other (sparse) states keep using RedisHashDict.
+"""
+
+import logging
+import re
+from ipaddress import ip_address, ip_network
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
+
+import redis
+from magma.mobilityd.ip_descriptor import IPDesc, IPState, IPType
+from magma.mobilityd.utils import IPAddress, IPNetwork
+
+# Matches any byte of the bitmap with at least one free address
+_NON_EMPTY_BYTE = re.compile(b'[^\x00]')
+
+
+class _BlockBitmap:
+    """ Local copy of the free-address bitmap of one IP block """
+
+    __slots__ = ('block', 'key', 'base', 'bits', 'free_count', 'cursor')
+
+    def __init__(self, block: IPNetwork, key: str, bits: bytearray):
+        self.block = block
+        self.key = key
+        self.base = int(block.network_address)
+        self.bits = bits
+        self.free_count = _count_set_bits(bits)
+        # Byte offset where the next search for a free address starts
+        self.cursor = 0
+
+    def test(self, offset: int) -> bool:
+        return bool(self.bits[offset >> 3] & (0x80 >> (offset & 7)))
+
+    def set(self, offset: int) -> bool:
+        """ Mark offset as free, return False if it already was """
+        if self.test(offset):
+            return False
+        self.bits[offset >> 3] |= 0x80 >> (offset & 7)
+        self.free_count += 1
+        return True
+
+    def clear(self, offset: int) -> bool:
+        """ Mark offset as not free, return False if it already was """
+        if not self.test(offset):
+            return False
+        self.bits[offset >> 3] &= ~(0x80 >> (offset & 7)) & 0xff
+        self.free_count -= 1
+        return True
+
+    def find_free(self) -> Optional[int]:
+        """ Return the offset of a free address, starting at the cursor """
+        if not self.free_count:
+            return None
+        match = _NON_EMPTY_BYTE.search(self.bits, self.cursor)
+        if match is None:
+            match = _NON_EMPTY_BYTE.search(self.bits, 0, self.cursor)
+        if match is None:
+            return None
+        self.cursor = match.start()
+        byte = self.bits[self.cursor]
+        return (self.cursor << 3) + 8 - byte.bit_length()
+
+    def iter_free(self) -> Iterator[int]:
+        for match in _NON_EMPTY_BYTE.finditer(self.bits):
+            idx = match.start()
+            byte = self.bits[idx]
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    yield (idx << 3) + bit
+
+
+class IpFreeBitmap(MutableMapping[str, IPDesc]):
+    """
+    Dict-like view {ip => IPDesc} of free IP addresses, backed by one
+    persisted bitmap per IP block.
+
+    Notes:
+        - The local bitmaps act as a write-through cache: reads never hit
+          Redis, every write is a single SETBIT.
+        - Memory in Redis is one bit per address of the assigned blocks,
+          independently of the number of allocated addresses.
+        - Not thread safe, callers are expected to hold the IP address
+          manager lock.
+    """
+
+    def __init__(self, client: redis.Redis, key_prefix: str):
+        """
+        Args:
+            client (redis.Redis): Redis client object
+            key_prefix (str): prefix of the Redis keys storing the bitmaps,
+                the IP block is appended to it
+        """
+        self.redis = client
+        self._key_prefix = key_prefix
+        self._bitmaps: Dict[IPNetwork, _BlockBitmap] = {}
+        self._load()
+
+    def _load(self):
+        """ Load all persisted bitmaps from Redis """
+        for key in self.redis.scan_iter(match=self._key_prefix + '*'):
+            if isinstance(key, bytes):
+                key = key.decode('utf-8')
+            serialized = self.redis.get(key)
+            if serialized is None:
+                continue
+            block = ip_network(key[len(self._key_prefix):])
+            self._bitmaps[block] = _BlockBitmap(
+                block, key, bytearray(serialized),
+            )
+
+    @property
+    def blocks(self) -> Iterable[IPNetwork]:
+        """ IP blocks that have a bitmap """
+        return self._bitmaps.keys()
+
+    def add_block(
+        self, ipblock: IPNetwork, num_reserved: int = 0,
+        free_ips: Optional[Iterable[IPAddress]] = None,
+    ):
+        """ Create and persist the bitmap of an IP block
+
+        Args:
+            ipblock (IPNetwork): block to add
+            num_reserved (int): number of leading host addresses that are
+                not marked as free
+            free_ips (Iterable[IPAddress]): if given, only these addresses
+                are marked as free instead of all host addresses of the block
+        """
+        num_bytes = (ipblock.num_addresses + 7) >> 3
+        key = self._key_prefix + str(ipblock)
+        if free_ips is None:
+            bits = bytearray(b'\xff' * num_bytes)
+            first_host, last_host = _host_offsets(ipblock)
+            non_free = list(range(first_host + num_reserved))
+            non_free.extend(range(last_host + 1, num_bytes << 3))
+            for offset in non_free:
+                bits[offset >> 3] &= ~(0x80 >> (offset & 7)) & 0xff
+            bitmap = _BlockBitmap(ipblock, key, bits)
+        else:
+            bitmap = _BlockBitmap(ipblock, key, bytearray(num_bytes))
+            base = int(ipblock.network_address)
+            for ip in free_ips:
+                bitmap.set(int(ip) - base)
+        self._bitmaps[ipblock] = bitmap
+        self.redis.set(key, bytes(bitmap.bits))
+
+    def remove_block(self, ipblock: IPNetwork):
+        """ Drop the bitmap of an IP block, if any """
+        bitmap = self._bitmaps.pop(ipblock, None)
+        if bitmap is not None:
+            self.redis.delete(bitmap.key)
+
+    def _locate(
+        self, ip: IPAddress,
+        ipblock: Optional[IPNetwork] = None,
+    ) -> Tuple[Optional[_BlockBitmap], int]:
+        bitmap = self._bitmaps.get(ipblock) if ipblock is not None else None
+        if bitmap is None or ip not in bitmap.block:
+            bitmap = next(
+                (b for b in self._bitmaps.values() if ip in b.block),
+                None,
+            )
+        if bitmap is None:
+            return None, -1
+        return bitmap, int(ip) - bitmap.base
+
+    @staticmethod
+    def _make_desc(ip: IPAddress, ipblock: IPNetwork) -> IPDesc:
+        return IPDesc(
+            ip=ip, state=IPState.FREE, sid=None,
+            ip_block=ipblock, ip_type=IPType.IP_POOL,
+        )
+
+    def __getitem__(self, key: str) -> IPDesc:
+        ip = ip_address(key)
+        bitmap, offset = self._locate(ip)
+        if bitmap is None or not bitmap.test(offset):
+            raise KeyError(key)
+        return self._make_desc(ip, bitmap.block)
+
+    def __setitem__(self, key: str, ip_desc: IPDesc):
+        ip = ip_address(key)
+        bitmap, offset = self._locate(ip, ip_desc.ip_block)
+        if bitmap is None:
+            # The block was removed while the IP was in use
+            logging.debug("Dropping free IP %s from unknown block", key)
+            return
+        if bitmap.set(offset):
+            self.redis.setbit(bitmap.key, offset, 1)
+
+    def __delitem__(self, key: str):
+        ip = ip_address(key)
+        bitmap, offset = self._locate(ip)
+        if bitmap is None or not bitmap.clear(offset):
+            raise KeyError(key)
+        self.redis.setbit(bitmap.key, offset, 0)
+
+    def __contains__(self, key) -> bool:
+        try:
+            ip = ip_address(key)
+        except ValueError:
+            return False
+        bitmap, offset = self._locate(ip)
+        return bitmap is not None and bitmap.test(offset)
+
+    def __iter__(self) -> Iterator[str]:
+        for bitmap in list(self._bitmaps.values()):
+            for offset in bitmap.iter_free():
+                yield ip_address(bitmap.base + offset).exploded
+
+    def __len__(self) -> int:
+        return sum(b.free_count for b in self._bitmaps.values())
+
+    def popitem(self) -> Tuple[str, IPDesc]:
+        """ Pop the next free IP, in O(1) amortized with the free cursor """
+        for bitmap in self._bitmaps.values():
+            offset = bitmap.find_free()
+            if offset is None:
+                continue
+            bitmap.clear(offset)
+            self.redis.setbit(bitmap.key, offset, 0)
+            ip = ip_address(bitmap.base + offset)
+            return ip.exploded, self._make_desc(ip, bitmap.block)
+        raise KeyError('popitem(): no free IP address')
+
+    def bulk_set(self, mapping: Mapping[str, IPDesc]):
+        for key, ip_desc in mapping.items():
+            self[key] = ip_desc
+
+    def bulk_delete(self, keys: Iterable[str]) -> int:
+        deleted = 0
+        for key in keys:
+            if key in self:
+                del self[key]
+                deleted += 1
+        return deleted
+
+    def clear(self):
+        for ipblock in list(self._bitmaps):
+            self.remove_block(ipblock)
+
+
+def _host_offsets(ipblock: IPNetwork) -> Tuple[int, int]:
+    """ Offsets of the first and last host address of an IP block """
+    if ipblock.num_addresses > 2:
+        return 1, ipblock.num_addresses - 2
+    return 0, ipblock.num_addresses - 1
+
+
+def _count_set_bits(bits: bytearray) -> int:
+    return bin(int.from_bytes(bits, 'big')).count('1')
@@ -165,12 +165,13 @@ def main():
     dhcp_iface = config.get('dhcp_iface', 'dhcp0')
     dhcp_retry_limit = config.get('retry_limit', RETRY_LIMIT)
     ipv6_prefixlen = config.get('ipv6_prefixlen', None)
+    compact_ip_pool = config.get('compact_ip_pool', False)
 
     # TODO: consider adding gateway mconfig to decide whether to
     # persist to Redis
     client = get_default_client()
     store = MobilityStore(
-        client,
+        client, compact_ip_pool=compact_ip_pool,
     )
 
     chan = ServiceRegistry.get_rpc_channel(
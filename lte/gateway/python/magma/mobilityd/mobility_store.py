@@ -10,8 +10,9 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import logging
 from collections import defaultdict
-from typing import Callable, Dict
+from typing import Callable, Dict, Iterable, Mapping, Optional
 
 import redis
 from magma.common.redis.containers import RedisFlatDict, RedisHashDict, RedisSet
@@ -23,11 +24,15 @@ from magma.common.redis.serializers import (
 from magma.mobilityd import serialize_utils
 from magma.mobilityd.ip_descriptor import IPDesc, IPState
 from magma.mobilityd.ip_descriptor_map import IpDescriptorMap
+from magma.mobilityd.ip_free_bitmap import IpFreeBitmap
 from magma.mobilityd.uplink_gw import UplinkGatewayInfo
+from magma.mobilityd.utils import IPAddress
 
 IPDESC_REDIS_TYPE = "mobilityd_ipdesc_record"
+IPDESC_SID_INDEX_REDIS_TYPE = "mobilityd:sid_by_ip"
 IPSTATES_REDIS_TYPE = "mobilityd:ip_states:{}"
 IPBLOCKS_REDIS_TYPE = "mobilityd:assigned_ip_blocks"
+IPBITMAP_REDIS_TYPE = "mobilityd:free_ip_bitmap:"
 MAC_TO_IP_REDIS_TYPE = "mobilityd_mac_to_ip"
 DHCP_GW_INFO_REDIS_TYPE = "mobilityd_gw_info"
 ALLOCATED_IID_REDIS_TYPE = "mobilityd_allocated_iid"
@@ -36,16 +41,31 @@ ALLOCATED_SESSION_PREFIX_TYPE = "mobilityd_allocated_session_prefix"
 
 class MobilityStore(object):
     def __init__(
-        self, client: redis.Redis,
+        self, client: redis.Redis, compact_ip_pool: bool = False,
     ):
-        self.init_store(client)
+        """
+        Args:
+            client (redis.Redis): Redis client object
+            compact_ip_pool (bool): if set, FREE IPv4 addresses are stored
+                as one bitmap per assigned IP block instead of one Redis
+                hash entry per address.
+        """
+        self.init_store(client, compact_ip_pool)
 
     def init_store(
-        self, client: redis.Redis,
+        self, client: redis.Redis, compact_ip_pool: bool = False,
     ):
         get_ip_states: Callable[[IPState], Dict[str, IPDesc]] = lambda key: ip_states(client, key)
+        self.free_ip_bitmap: Optional[IpFreeBitmap] = None
+        if compact_ip_pool:
+            self.free_ip_bitmap = IpFreeBitmap(client, IPBITMAP_REDIS_TYPE)
+
+        def get_ipv4_states(key):
+            if key == IPState.FREE and self.free_ip_bitmap is not None:
+                return self.free_ip_bitmap
+            return ip_states(client, key)
         self.ip_state_map = IpDescriptorMap(
-            defaultdict_key(get_ip_states),  # type: ignore[arg-type]
+            defaultdict_key(get_ipv4_states),  # type: ignore[arg-type]
         )
         self.ipv6_state_map = IpDescriptorMap(
             defaultdict_key(get_ip_states),  # type: ignore[arg-type]
@@ -56,6 +76,30 @@ class MobilityStore(object):
         self.dhcp_store = MacToIP(client)  # mac => DHCP_State
         self.allocated_iid = AllocatedIID(client)
         self.sid_session_prefix_allocated = AllocatedSessionPrefix(client)
+        if compact_ip_pool:
+            self._migrate_free_ips_to_bitmap(client)
+
+    def _migrate_free_ips_to_bitmap(self, client: redis.Redis):
+        """ Move FREE IPv4 addresses persisted as hash entries (i.e. by a
+        previous run without compact_ip_pool) into the block bitmaps.
+        """
+        legacy_free = ip_states(client, IPState.FREE)
+        for ipblock in self.assigned_ip_blocks:
+            if ipblock.version != 4 or ipblock in self.free_ip_bitmap.blocks:
+                continue
+            free_ips = [
+                ip_desc.ip for ip_desc in legacy_free.values()
+                if ip_desc.ip in ipblock
+            ]
+            self.free_ip_bitmap.add_block(ipblock, free_ips=free_ips)
+            if free_ips:
+                client.hdel(
+                    legacy_free.key, *(ip.exploded for ip in free_ips),
+                )
+            logging.info(
+                "Migrated %d free IPs of block %s to bitmap",
+                len(free_ips), ipblock,
+            )
 
 
 class AssignedIpBlocksSet(RedisSet):
@@ -69,13 +113,119 @@ class AssignedIpBlocksSet(RedisSet):
 
 
 class IPDescDict(RedisFlatDict):
+    """
+    SID => IPDesc map, with a reverse IP => SID index.
+
+    The index is persisted in a Redis hash that is updated in the same
+    MULTI/EXEC transaction as the IPDesc record, and it is mirrored in
+    memory so that looking up the SID of an IP doesn't scan the map.
+    """
+
     def __init__(self, client):
         serde = RedisSerde(
             IPDESC_REDIS_TYPE,
             serialize_utils.serialize_ip_desc,
             serialize_utils.deserialize_ip_desc,
         )
-        super().__init__(client, serde, writethrough=True)
+        self._sid_by_ip: Dict[str, str] = {}
+        super().__init__(
+            client, serde, writethrough=True, key_index=True,
+            change_feed=True,
+        )
+        self._rebuild_sid_index()
+
+    def __setitem__(self, key: str, value: IPDesc):
+        if ':' in key:
+            raise ValueError("Key %s cannot contain ':' char" % key)
+        composite_key = self._make_composite_key(key)
+        old_value = self.cache.get(composite_key)
+        version = self.get_version(key)
+        serialized_value = self.serde.serialize(value, version + 1)
+        self.cache[composite_key] = value
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(composite_key, serialized_value)
+        self._track_set(pipe, key)
+        if old_value is not None and old_value.ip != value.ip:
+            self._unindex_ip(pipe, old_value.ip, key)
+        if value.ip is not None:
+            self._sid_by_ip[value.ip.exploded] = key
+            pipe.hset(
+                IPDESC_SID_INDEX_REDIS_TYPE, value.ip.exploded, key,
+            )
+        return pipe.execute()[0]
+
+    def __delitem__(self, key: str) -> int:
+        if ':' in key:
+            raise ValueError("Key %s cannot contain ':' char" % key)
+        composite_key = self._make_composite_key(key)
+        old_value = self.cache.pop(composite_key)
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(composite_key)
+        self._track_delete(pipe, key)
+        self._unindex_ip(pipe, old_value.ip, key)
+        deleted_count = pipe.execute()[0]
+        if not deleted_count:
+            raise KeyError(composite_key)
+        return deleted_count
+
+    def bulk_set(self, mapping: Mapping[str, IPDesc]) -> None:
+        # Go through __setitem__ to keep the IP index consistent
+        for key, value in mapping.items():
+            self[key] = value
+
+    def bulk_delete(self, keys: Iterable[str]) -> int:
+        deleted_count = 0
+        for key in keys:
+            if self._make_composite_key(key) in self.cache:
+                deleted_count += self.__delitem__(key)
+        return deleted_count
+
+    def clear(self) -> None:
+        super().clear()
+        self._sid_by_ip.clear()
+        self.redis.delete(IPDESC_SID_INDEX_REDIS_TYPE)
+
+    def get_sid(self, ip: IPAddress) -> Optional[str]:
+        """ Return the SID the IP is assigned to, None if not assigned """
+        return self._sid_by_ip.get(ip.exploded)
+
+    def _unindex_ip(self, pipe, ip: Optional[IPAddress], key: str):
+        # Another SID may have been assigned the IP since, keep its entry
+        if ip is None or self._sid_by_ip.get(ip.exploded) != key:
+            return
+        del self._sid_by_ip[ip.exploded]
+        pipe.hdel(IPDESC_SID_INDEX_REDIS_TYPE, ip.exploded)
+
+    def _rebuild_sid_index(self):
+        """
+        Build the in-memory index from the IPDesc records and verify the
+        persisted index against it, e.g. after a crash or an upgrade from a
+        version without the index.
+        """
+        sid_by_ip = {}
+        for composite_key, ip_desc in self.cache.items():
+            if ip_desc.ip is not None:
+                sid, _ = composite_key.split(":", 1)
+                sid_by_ip[ip_desc.ip.exploded] = sid
+        self._sid_by_ip = sid_by_ip
+
+        persisted = {
+            ip.decode('utf-8'): sid.decode('utf-8') for ip, sid in
+            self.redis.hgetall(IPDESC_SID_INDEX_REDIS_TYPE).items()
+        }
+        if persisted == sid_by_ip:
+            return
+        logging.warning(
+            "Rebuilding IP to SID index: %d persisted entries, %d expected",
+            len(persisted), len(sid_by_ip),
+        )
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(IPDESC_SID_INDEX_REDIS_TYPE)
+        if sid_by_ip:
+            pipe.hset(IPDESC_SID_INDEX_REDIS_TYPE, mapping=sid_by_ip)
+        pipe.execute()
 
 
 def ip_states(client, key):
@@ -112,7 +262,7 @@ class MacToIP(RedisFlatDict):
             MAC_TO_IP_REDIS_TYPE,
             get_json_serializer(), get_json_deserializer(),
         )
-        super().__init__(client, serde)
+        super().__init__(client, serde, key_index=True)
 
     def __missing__(self, key):
         """Instead of throwing a key error, return None when key not found"""
@@ -129,7 +279,7 @@ class GatewayInfoMap(RedisFlatDict):
             DHCP_GW_INFO_REDIS_TYPE,
             get_json_serializer(), get_json_deserializer(),
         )
-        super().__init__(client, serde)
+        super().__init__(client, serde, key_index=True)
 
     def __missing__(self, key):
         """Instead of throwing a key error, return None when key not found"""
@@ -147,7 +297,7 @@ class AllocatedIID(RedisFlatDict):
             ALLOCATED_IID_REDIS_TYPE,
             get_json_serializer(), get_json_deserializer(),
         )
-        super().__init__(client, serde)
+        super().__init__(client, serde, key_index=True)
 
     def __missing__(self, key):
         """Instead of throwing a key error, return None when key not found"""
@@ -164,7 +314,7 @@ class AllocatedSessionPrefix(RedisFlatDict):
             ALLOCATED_SESSION_PREFIX_TYPE,
             get_json_serializer(), get_json_deserializer(),
         )
-        super().__init__(client, serde)
+        super().__init__(client, serde, key_index=True)
 
     def __missing__(self, key):
         """Instead of throwing a key error, return None when key not found"""
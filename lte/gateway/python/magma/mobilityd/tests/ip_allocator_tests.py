@@ -34,6 +34,7 @@ from magma.mobilityd.ip_allocator_pool import (
     IPBlockNotFoundError,
     NoAvailableIPError,
 )
+from magma.mobilityd.ip_descriptor import IPState
 from magma.mobilityd.ipv6_allocator_pool import IPv6AllocatorPool
 from magma.mobilityd.mobility_store import MobilityStore
 
@@ -52,7 +53,7 @@ class IPAllocatorTests(unittest.TestCase):
         """
         Creates and sets up an IPAllocator with the given recycling interval.
         """
-        store = MobilityStore(fakeredis.FakeStrictRedis())
+        store = self._new_store()
         store.dhcp_gw_info.read_default_gw()
         ip_allocator = IpAllocatorPool(store)
         ipv6_allocator = IPv6AllocatorPool(
@@ -67,6 +68,9 @@ class IPAllocatorTests(unittest.TestCase):
         )
         self._allocator.add_ip_block(self._block)
 
+    def _new_store(self):
+        return MobilityStore(fakeredis.FakeStrictRedis())
+
     def setUp(self):
         #  need to allocate at least 4 bits, as 13 addresses
         #  are either preallocated or not valid for hosts
@@ -372,3 +376,36 @@ class IPAllocatorTests(unittest.TestCase):
         self.assertTrue(
             ip1 in self._allocator.list_allocated_ips(self._block),
         )
+
+
+class IPAllocatorCompactPoolTests(IPAllocatorTests):
+    """
+    Runs the IP Allocator tests with FREE IPs stored in block bitmaps
+    """
+
+    def _new_store(self):
+        self._client = fakeredis.FakeStrictRedis()
+        return MobilityStore(self._client, compact_ip_pool=True)
+
+    def test_free_ips_not_stored_per_address(self):
+        """ test only the bitmap is persisted for free IPs """
+        self.assertEqual(
+            self._client.hlen('mobilityd:ip_states:{}'.format(IPState.FREE)), 0,
+        )
+        self.assertEqual(
+            len(self._allocator._store.ip_state_map.list_ips(IPState.FREE)),
+            3,
+        )
+
+    def test_large_ip_block(self):
+        """ test adding a /12 block doesn't walk its addresses """
+        block = ipaddress.ip_network('10.0.0.0/12')
+        self._allocator.add_ip_block(block)
+        self.assertEqual(
+            len(self._allocator._store.ip_state_map.ip_states[IPState.FREE]),
+            3 + block.num_addresses - 2 - 11,
+        )
+        self.assertEqual(
+            [block],
+            self._allocator.remove_ip_blocks(block, force=True),
+        )
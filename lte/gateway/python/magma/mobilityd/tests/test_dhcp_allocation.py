@@ -0,0 +1,179 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import datetime
+import threading
+import unittest
+
+import fakeredis
+from magma.mobilityd.dhcp_client import DHCPClient
+from magma.mobilityd.dhcp_desc import DHCPState
+from magma.mobilityd.ip_allocator_dhcp import IPAllocatorDHCP
+from magma.mobilityd.mac import MacAddress, create_mac_from_sid
+from magma.mobilityd.mobility_store import MobilityStore
+from magma.mobilityd.uplink_gw import UplinkGatewayInfo
+from scapy.layers.dhcp import BOOTP, DHCP
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+
+# pylint: disable=protected-access
+
+LEASE_TIME = 100
+
+
+class _CapturingDHCPClient(DHCPClient):
+    """ DHCP client capturing the packets it sends, without sniffing """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    def run(self):
+        pass
+
+    def _send_pkt(self, pkt):
+        self.sent.append(pkt)
+
+
+def _message_type(pkt):
+    return Ether(bytes(pkt))[DHCP].options[0][1]
+
+
+def _reply(request, message_type, ip):
+    """ DHCP server reply to a request, parsed as if it was sniffed """
+    reply = Ether(src="00:00:00:00:00:01", dst=request[Ether].src)
+    reply /= IP(src="192.168.128.1", dst="255.255.255.255")
+    reply /= UDP(sport=67, dport=68)
+    reply /= BOOTP(
+        op=2, yiaddr=ip, xid=request[BOOTP].xid,
+        chaddr=request[BOOTP].chaddr,
+    )
+    reply /= DHCP(
+        options=[
+            ("message-type", message_type),
+            ("subnet_mask", "255.255.255.0"),
+            ("router", "192.168.128.211"),
+            ("lease_time", LEASE_TIME),
+            "end",
+        ],
+    )
+    return Ether(bytes(reply))
+
+
+class DHCPAllocationTests(unittest.TestCase):
+    """
+    Tests for the DHCP client allocations and lease renewals, with the DHCP
+    server replies injected as sniffed packets
+    """
+
+    def setUp(self):
+        self.dhcp_store = {}
+        self.dhcp_client = _CapturingDHCPClient(
+            dhcp_store=self.dhcp_store,
+            gw_info=UplinkGatewayInfo({}),
+            dhcp_wait=threading.Condition(),
+        )
+
+    def test_concurrent_allocations(self):
+        mac1 = MacAddress("11:22:33:44:55:66")
+        mac2 = MacAddress("22:22:33:44:55:66")
+        allocation1 = self.dhcp_client.allocate_ip_address(mac1, 0)
+        allocation2 = self.dhcp_client.allocate_ip_address(mac2, 0)
+        # Both discovers are in flight
+        discover1, discover2 = self.dhcp_client.sent
+        self.assertEqual(_message_type(discover1), int(DHCPState.DISCOVER))
+        self.assertEqual(_message_type(discover2), int(DHCPState.DISCOVER))
+        self.assertNotEqual(discover1[BOOTP].xid, discover2[BOOTP].xid)
+        # A discover of an allocation in flight shares its future
+        self.assertIs(
+            self.dhcp_client.allocate_ip_address(mac2, 0), allocation2,
+        )
+
+        # Offers resolve the allocations of their MAC, in any order
+        self.dhcp_client.sent.clear()
+        self.dhcp_client._rx_dhcp_pkt(_reply(discover2, "offer", "192.168.128.12"))
+        self.assertFalse(allocation1.done())
+        self.assertEqual(allocation2.result(timeout=0).ip, "192.168.128.12")
+        self.dhcp_client._rx_dhcp_pkt(_reply(discover1, "offer", "192.168.128.11"))
+        self.assertEqual(allocation1.result(timeout=0).ip, "192.168.128.11")
+
+        # The offers are requested right away
+        request2, request1 = self.dhcp_client.sent
+        self.assertEqual(_message_type(request1), int(DHCPState.REQUEST))
+        self.assertEqual(request1[BOOTP].xid, discover1[BOOTP].xid)
+        self.assertEqual(request2[BOOTP].ciaddr, "192.168.128.12")
+
+        self.dhcp_client._rx_dhcp_pkt(_reply(request1, "ack", "192.168.128.11"))
+        dhcp_desc = self.dhcp_client.get_dhcp_desc(mac1, 0)
+        self.assertEqual(dhcp_desc.state, DHCPState.ACK)
+        self.assertEqual(dhcp_desc.subnet, "192.168.128.0/24")
+
+    def test_lease_renewal(self):
+        mac = MacAddress("11:22:33:44:55:66")
+        self.dhcp_client.allocate_ip_address(mac, 0)
+        discover = self.dhcp_client.sent.pop()
+        self.dhcp_client._rx_dhcp_pkt(_reply(discover, "offer", "192.168.128.11"))
+        request = self.dhcp_client.sent.pop()
+        self.dhcp_client._rx_dhcp_pkt(_reply(request, "ack", "192.168.128.11"))
+        dhcp_desc = self.dhcp_client.get_dhcp_desc(mac, 0)
+
+        # The renewal of the offer is stale once the offer was acked
+        now = datetime.datetime.now()
+        due = self.dhcp_client._pop_due_renewals(now)
+        self.assertEqual(len(due), 1)
+        self.dhcp_client._renew_lease(*due[0], now)
+        self.assertEqual(self.dhcp_client.sent, [])
+
+        # The lease is renewed at its renew deadline
+        self.assertEqual(self.dhcp_client._pop_due_renewals(now), [])
+        now = dhcp_desc.lease_renew_deadline
+        due = self.dhcp_client._pop_due_renewals(now)
+        self.assertEqual(due, [(mac.as_redis_key(0), now)])
+        self.dhcp_client._renew_lease(*due[0], now)
+        renewal = self.dhcp_client.sent.pop()
+        self.assertEqual(_message_type(renewal), int(DHCPState.REQUEST))
+
+        # and retried until the DHCP server answers
+        now += datetime.timedelta(minutes=5)
+        due = self.dhcp_client._pop_due_renewals(now)
+        self.assertEqual(len(due), 1)
+        self.dhcp_client.release_ip_address(mac, 0)
+        self.dhcp_client.sent.clear()
+        self.dhcp_client._renew_lease(*due[0], now)
+        self.assertEqual(self.dhcp_client.sent, [])
+
+    def test_ip_allocator(self):
+        store = MobilityStore(fakeredis.FakeStrictRedis())
+        allocator = IPAllocatorDHCP(
+            store, retry_limit=1, dhcp_client=self.dhcp_client,
+        )
+        sid = "IMSI001010000000001"
+
+        def _dhcp_server(pkt):
+            if _message_type(pkt) == int(DHCPState.DISCOVER):
+                self.dhcp_client._rx_dhcp_pkt(
+                    _reply(pkt, "offer", "192.168.128.11"),
+                )
+        self.dhcp_client._send_pkt = _dhcp_server
+
+        ip_desc = allocator.alloc_ip_address(sid, 0)
+        self.assertEqual(str(ip_desc.ip), "192.168.128.11")
+        self.assertEqual(str(ip_desc.ip_block), "192.168.128.0/24")
+        self.assertEqual(
+            self.dhcp_client.get_dhcp_desc(create_mac_from_sid(sid), 0).ip,
+            "192.168.128.11",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
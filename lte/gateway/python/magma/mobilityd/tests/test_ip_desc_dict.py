@@ -0,0 +1,99 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import ipaddress
+import unittest
+
+import fakeredis
+from magma.mobilityd.ip_descriptor import IPDesc, IPState, IPType
+from magma.mobilityd.mobility_store import (
+    IPDESC_SID_INDEX_REDIS_TYPE,
+    IPDescDict,
+)
+
+
+def _ip_desc(sid, ip):
+    return IPDesc(
+        ip=ipaddress.ip_address(ip), state=IPState.ALLOCATED, sid=sid,
+        ip_block=ipaddress.ip_network('10.0.0.0/24'),
+        ip_type=IPType.IP_POOL,
+    )
+
+
+class IPDescDictTests(unittest.TestCase):
+    def setUp(self):
+        self._client = fakeredis.FakeStrictRedis()
+        self._sid_ips_map = IPDescDict(self._client)
+
+    def _persisted_index(self):
+        return {
+            ip.decode('utf-8'): sid.decode('utf-8') for ip, sid in
+            self._client.hgetall(IPDESC_SID_INDEX_REDIS_TYPE).items()
+        }
+
+    def test_get_sid(self):
+        """ test the reverse index follows sets and deletes """
+        self._sid_ips_map['IMSI1'] = _ip_desc('IMSI1', '10.0.0.1')
+        self._sid_ips_map['IMSI2'] = _ip_desc('IMSI2', '10.0.0.2')
+        self.assertEqual(
+            self._sid_ips_map.get_sid(ipaddress.ip_address('10.0.0.1')),
+            'IMSI1',
+        )
+        self.assertEqual(
+            self._persisted_index(),
+            {'10.0.0.1': 'IMSI1', '10.0.0.2': 'IMSI2'},
+        )
+
+        del self._sid_ips_map['IMSI1']
+        self.assertIsNone(
+            self._sid_ips_map.get_sid(ipaddress.ip_address('10.0.0.1')),
+        )
+        self.assertEqual(self._persisted_index(), {'10.0.0.2': 'IMSI2'})
+
+        self._sid_ips_map.pop('IMSI2')
+        self.assertEqual(self._persisted_index(), {})
+
+    def test_ip_change(self):
+        """ test updating the IP of a SID drops the old index entry """
+        self._sid_ips_map['IMSI1'] = _ip_desc('IMSI1', '10.0.0.1')
+        self._sid_ips_map['IMSI1'] = _ip_desc('IMSI1', '10.0.0.3')
+        self.assertIsNone(
+            self._sid_ips_map.get_sid(ipaddress.ip_address('10.0.0.1')),
+        )
+        self.assertEqual(self._persisted_index(), {'10.0.0.3': 'IMSI1'})
+
+    def test_rebuild_on_load(self):
+        """ test a missing or stale persisted index is rebuilt """
+        self._sid_ips_map['IMSI1'] = _ip_desc('IMSI1', '10.0.0.1')
+        self._client.delete(IPDESC_SID_INDEX_REDIS_TYPE)
+        self._client.hset(IPDESC_SID_INDEX_REDIS_TYPE, '10.0.0.9', 'IMSI9')
+
+        reloaded = IPDescDict(self._client)
+        self.assertEqual(
+            reloaded.get_sid(ipaddress.ip_address('10.0.0.1')), 'IMSI1',
+        )
+        self.assertIsNone(reloaded.get_sid(ipaddress.ip_address('10.0.0.9')))
+        self.assertEqual(self._persisted_index(), {'10.0.0.1': 'IMSI1'})
+
+    def test_clear(self):
+        """ test clearing the map clears the index """
+        self._sid_ips_map['IMSI1'] = _ip_desc('IMSI1', '10.0.0.1')
+        self._sid_ips_map.clear()
+        self.assertIsNone(
+            self._sid_ips_map.get_sid(ipaddress.ip_address('10.0.0.1')),
+        )
+        self.assertEqual(self._persisted_index(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import ipaddress
+import unittest
+
+import fakeredis
+from magma.mobilityd.ip_descriptor import IPDesc, IPState, IPType
+from magma.mobilityd.ip_free_bitmap import IpFreeBitmap
+from magma.mobilityd.mobility_store import (
+    IPBITMAP_REDIS_TYPE,
+    MobilityStore,
+    ip_states,
+)
+
+
+class IpFreeBitmapTests(unittest.TestCase):
+    def setUp(self):
+        self._client = fakeredis.FakeStrictRedis()
+        self._bitmap = IpFreeBitmap(self._client, IPBITMAP_REDIS_TYPE)
+        self._block = ipaddress.ip_network('192.168.0.0/28')
+        self._bitmap.add_block(self._block, num_reserved=11)
+
+    def test_add_block(self):
+        """ test only non reserved host addresses are free """
+        self.assertEqual(
+            list(self._bitmap),
+            ['192.168.0.12', '192.168.0.13', '192.168.0.14'],
+        )
+        self.assertEqual(len(self._bitmap), 3)
+        self.assertNotIn('192.168.0.15', self._bitmap)
+        self.assertNotIn('192.168.0.11', self._bitmap)
+
+    def test_popitem(self):
+        """ test popping free IPs in order until the pool is empty """
+        popped = []
+        for _ in range(3):
+            ip, ip_desc = self._bitmap.popitem()
+            self.assertEqual(ip_desc.state, IPState.FREE)
+            self.assertEqual(ip_desc.ip_block, self._block)
+            self.assertEqual(ip_desc.ip.exploded, ip)
+            popped.append(ip)
+        self.assertEqual(
+            popped, ['192.168.0.12', '192.168.0.13', '192.168.0.14'],
+        )
+        with self.assertRaises(KeyError):
+            self._bitmap.popitem()
+
+    def test_free_again(self):
+        """ test a freed IP can be popped again """
+        ip, ip_desc = self._bitmap.popitem()
+        self._bitmap.popitem()
+        self._bitmap[ip] = ip_desc
+        self.assertIn(ip, self._bitmap)
+        self.assertEqual(
+            {self._bitmap.popitem()[0], self._bitmap.popitem()[0]},
+            {ip, '192.168.0.14'},
+        )
+        self.assertEqual(len(self._bitmap), 0)
+
+    def test_persistence(self):
+        """ test the bitmap is reloaded from Redis """
+        ip, _ = self._bitmap.popitem()
+        reloaded = IpFreeBitmap(self._client, IPBITMAP_REDIS_TYPE)
+        self.assertEqual(list(reloaded.blocks), [self._block])
+        self.assertNotIn(ip, reloaded)
+        self.assertEqual(list(reloaded), list(self._bitmap))
+
+    def test_remove_block(self):
+        """ test removing a block drops its free IPs """
+        self._bitmap.remove_block(self._block)
+        self.assertEqual(len(self._bitmap), 0)
+        self.assertEqual(self._client.keys(IPBITMAP_REDIS_TYPE + '*'), [])
+        # Freeing an IP of a removed block is ignored
+        ip_desc = IPDesc(
+            ip=ipaddress.ip_address('192.168.0.12'), state=IPState.FREE,
+            ip_block=self._block, ip_type=IPType.IP_POOL,
+        )
+        self._bitmap['192.168.0.12'] = ip_desc
+        self.assertEqual(len(self._bitmap), 0)
+
+    def test_small_blocks(self):
+        """ test /31 and /32 blocks use all their addresses """
+        self._bitmap.add_block(ipaddress.ip_network('10.0.0.0/31'))
+        self._bitmap.add_block(ipaddress.ip_network('10.0.1.1/32'))
+        self.assertIn('10.0.0.0', self._bitmap)
+        self.assertIn('10.0.0.1', self._bitmap)
+        self.assertIn('10.0.1.1', self._bitmap)
+        self.assertEqual(len(self._bitmap), 6)
+
+    def test_migration(self):
+        """ test free IPs stored as hash entries are moved to the bitmap """
+        client = fakeredis.FakeStrictRedis()
+        store = MobilityStore(client)
+        block = ipaddress.ip_network('10.0.0.0/28')
+        store.assigned_ip_blocks.add(block)
+        free_states = ip_states(client, IPState.FREE)
+        for ip in list(block.hosts())[11:]:
+            free_states[ip.exploded] = IPDesc(
+                ip=ip, state=IPState.FREE, ip_block=block,
+                ip_type=IPType.IP_POOL,
+            )
+
+        store = MobilityStore(client, compact_ip_pool=True)
+        self.assertEqual(len(free_states), 0)
+        self.assertEqual(
+            store.ip_state_map.list_ips(IPState.FREE),
+            [ipaddress.ip_address('10.0.0.{}'.format(i)) for i in (12, 13, 14)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
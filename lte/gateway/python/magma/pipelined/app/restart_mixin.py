@@ -10,17 +10,25 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import time
 from abc import ABCMeta, abstractmethod
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 
 from lte.protos.pipelined_pb2 import SetupFlowsResult
 from magma.pipelined.app.base import ControllerNotReadyException
+from magma.pipelined.metrics import (
+    RESTART_RECONCILE_FLOWS,
+    RESTART_RECONCILE_LATENCY,
+)
 from magma.pipelined.openflow import flows
 from magma.pipelined.policy_converters import ovs_flow_match_to_magma_match
+from ryu.lib import hub
 from ryu.ofproto.ofproto_v1_4_parser import OFPFlowStats
 
 DefaultMsgsMap = Dict[int, List[OFPFlowStats]]
 
+DEFAULT_MAX_CONCURRENT_RESTARTS = 4
+
 
 class RestartMixin(metaclass=ABCMeta):
     """
@@ -36,6 +44,15 @@ class RestartMixin(metaclass=ABCMeta):
          - Remove stale flows (not default and not in passed requsts)
          requests argument is controller specific
         """
+        start = time.monotonic()
+        try:
+            return self._reconcile_flows(requests)
+        finally:
+            RESTART_RECONCILE_LATENCY.labels(controller=self.APP_NAME).observe(
+                (time.monotonic() - start) * 1000,
+            )
+
+    def _reconcile_flows(self, requests) -> SetupFlowsResult:
         if not self._datapath:
             self.logger.error('Controller restart not ready, datapath is None')
             return SetupFlowsResult(result=SetupFlowsResult.FAILURE)
@@ -78,29 +95,26 @@ class RestartMixin(metaclass=ABCMeta):
                 [flow.match for flow in startup_flows_map[tbl]],
             )
 
+        # The missing flows of all the tables are sent at once, the default
+        # ones first, and waited for with a single barrier
+        msgs = []
         default_msgs = self._get_default_flow_msgs(dp)
-        for table, msgs_to_install in default_msgs.items():
-            msgs, remaining_flows = self._msg_hub \
-                .filter_msgs_if_not_in_flow_list(
-                    dp, msgs_to_install,
-                    startup_flows_map[table],
-                )
-            if msgs:
-                chan = self._msg_hub.send(msgs, dp)
-                self._wait_for_responses(chan, len(msgs))
-            startup_flows_map[table] = remaining_flows
-
         ue_msgs = self._get_ue_specific_flow_msgs(requests)
-        for table, msgs_to_install in ue_msgs.items():
-            msgs, remaining_flows = self._msg_hub \
-                .filter_msgs_if_not_in_flow_list(
-                    dp, msgs_to_install,
-                    startup_flows_map[table],
-                )
-            if msgs:
-                chan = self._msg_hub.send(msgs, dp)
-                self._wait_for_responses(chan, len(msgs))
-            startup_flows_map[table] = remaining_flows
+        for table_msgs in (default_msgs, ue_msgs):
+            for table, msgs_to_install in table_msgs.items():
+                missing_msgs, remaining_flows = self._msg_hub \
+                    .filter_msgs_if_not_in_flow_list(
+                        dp, msgs_to_install,
+                        startup_flows_map[table],
+                    )
+                msgs.extend(missing_msgs)
+                startup_flows_map[table] = remaining_flows
+        if msgs:
+            chan = self._msg_hub.send(msgs, dp)
+            self._wait_for_responses(chan, len(msgs))
+        RESTART_RECONCILE_FLOWS.labels(
+            controller=self.APP_NAME, action='install',
+        ).inc(len(msgs))
 
         for tbl in startup_flows_map:
             self.logger.debug(
@@ -133,6 +147,9 @@ class RestartMixin(metaclass=ABCMeta):
         if msg_list:
             chan = self._msg_hub.send(msg_list, self._datapath)
             self._wait_for_responses(chan, len(msg_list))
+        RESTART_RECONCILE_FLOWS.labels(
+            controller=self.APP_NAME, action='remove',
+        ).inc(len(msg_list))
 
     @abstractmethod
     def _get_ue_specific_flow_msgs(self, requests):
@@ -153,3 +170,39 @@ class RestartMixin(metaclass=ABCMeta):
             datapath (Datapath): RYU datapath
         """
         raise NotImplementedError
+
+
+def handle_restarts(
+    restarts: List[Tuple[RestartMixin, Any]],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENT_RESTARTS,
+) -> List[SetupFlowsResult]:
+    """
+    Sets up independent controllers after the restart at the same time,
+    so that the restart takes as long as the slowest controller instead of
+    all of them. At most max_concurrency controllers are set up at once.
+
+    Args:
+        restarts: the controllers with their handle_restart requests
+        max_concurrency: max number of controllers set up at once
+
+    Returns: the results of the controllers, in the order of restarts
+    """
+    semaphore = hub.BoundedSemaphore(max_concurrency)
+
+    def _handle_restart(controller, requests):
+        with semaphore:
+            return controller.handle_restart(requests)
+
+    threads = [
+        hub.spawn(_handle_restart, controller, requests)
+        for controller, requests in restarts
+    ]
+    hub.joinall(threads)
+    results = []
+    for thread in threads:
+        result = thread.wait()
+        # Uncaught exceptions are logged by the hub, with a None result
+        if result is None:
+            result = SetupFlowsResult(result=SetupFlowsResult.FAILURE)
+        results.append(result)
+    return results
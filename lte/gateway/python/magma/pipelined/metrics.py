@@ -11,7 +11,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
 DP_SEND_MSG_ERROR = Counter(
     'dp_send_msg_error',
@@ -63,3 +63,16 @@ GTP_PORT_USER_PLANE_DL_BYTES = Gauge(
     'GTP port user plane downlink bytes',
     ['ip_addr'],
 )
+
+RESTART_RECONCILE_LATENCY = Histogram(
+    'restart_reconcile_latency_ms',
+    'Latency of the reconciliation of the flows of a controller on '
+    'restart in milliseconds', ['controller'],
+    buckets=[10, 50, 100, 500, 1000, 5000, 10000, 30000, 60000],
+)
+
+RESTART_RECONCILE_FLOWS = Counter(
+    'restart_reconcile_flows',
+    'Flows installed or removed by the reconciliation of a controller on '
+    'restart', ['controller', 'action'],
+)
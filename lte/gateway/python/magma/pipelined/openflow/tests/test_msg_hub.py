@@ -17,6 +17,7 @@ from unittest.mock import MagicMock, Mock
 
 from magma.pipelined.openflow.messages import MessageHub
 from ryu.lib import hub
+from ryu.ofproto import ofproto_v1_4, ofproto_v1_4_parser
 
 
 class MockBarrierRequest(object):
@@ -154,6 +155,56 @@ class MessageHubTest(unittest.TestCase):
         self.assertEqual(len(switch.results_by_msg), 0)
         self.assertEqual(len(switch.requests_by_barrier), 0)
 
+    def test_filter_msgs_if_not_in_flow_list(self):
+        """
+        Test diffing flow messages against the flows found in a table
+        """
+        parser = ofproto_v1_4_parser
+        datapath = Mock(ofproto=ofproto_v1_4, ofproto_parser=parser)
+
+        def _flow(ip_addr, reg_value, as_msg, any_ip_src=False):
+            kwargs = {}
+            if any_ip_src:
+                kwargs['ipv4_src'] = ('0.0.0.0', '0.0.0.0')
+            match = parser.OFPMatch(eth_type=0x0800, ipv4_dst=ip_addr, **kwargs)
+            instructions = [
+                parser.OFPInstructionActions(
+                    ofproto_v1_4.OFPIT_APPLY_ACTIONS, [
+                        parser.NXActionResubmitTable(table_id=2),
+                        parser.NXActionRegLoad2(
+                            dst='reg2' if as_msg else 'reg2_nxm',
+                            value=reg_value,
+                        ),
+                    ],
+                ),
+            ]
+            if as_msg:
+                return parser.OFPFlowMod(
+                    datapath, match=match, instructions=instructions,
+                )
+            return parser.OFPFlowStats(match=match, instructions=instructions)
+
+        flows = [
+            _flow('1.1.1.1', 1, False),
+            _flow('1.1.1.2', 1, False),
+            _flow('1.1.1.2', 1, False, any_ip_src=True),
+            _flow('1.1.1.3', 1, False),
+        ]
+        msgs = [
+            _flow('1.1.1.2', 1, True),
+            _flow('1.1.1.3', 2, True),
+            _flow('1.1.1.1', 1, True),
+            _flow('1.1.1.2', 1, True),
+            _flow('1.1.1.2', 1, True),
+        ]
+        msgs_to_send, remaining_flows = \
+            self._msg_sender.filter_msgs_if_not_in_flow_list(
+                datapath, msgs, flows,
+            )
+        # Each flow matches a single message
+        self.assertEqual(msgs_to_send, [msgs[1], msgs[4]])
+        self.assertEqual(remaining_flows, [flows[3]])
+
     def _get_barrier_event(self):
         barrier_msg = Mock()
         barrier_msg.xid = self._mock_datapath.prev_barrier_xid
@@ -55,6 +55,10 @@ from magma.pipelined.app.enforcement import EnforcementController
 from magma.pipelined.app.enforcement_stats import EnforcementStatsController
 from magma.pipelined.app.ipfix import IPFIXController
 from magma.pipelined.app.ng_services import NGServiceController
+from magma.pipelined.app.restart_mixin import (
+    DEFAULT_MAX_CONCURRENT_RESTARTS,
+    handle_restarts,
+)
 from magma.pipelined.app.tunnel_learn import TunnelLearnController
 from magma.pipelined.app.ue_mac import UEMacAddressController
 from magma.pipelined.app.vlan_learn import VlanLearnController
@@ -109,6 +113,10 @@ class PipelinedRpcServicer(pipelined_pb2_grpc.PipelinedServicer):
             'call_timeout',
             DEFAULT_CALL_TIMEOUT,
         )
+        self._max_concurrent_restarts = service_config.get(
+            'max_concurrent_restarts',
+            DEFAULT_MAX_CONCURRENT_RESTARTS,
+        )
         self._print_grpc_payload = os.environ.get('MAGMA_PRINT_GRPC_PAYLOAD')
         if self._print_grpc_payload is None:
             self._print_grpc_payload = \
@@ -193,10 +201,16 @@ class PipelinedRpcServicer(pipelined_pb2_grpc.PipelinedServicer):
             req for req in request.requests
             if req.request_origin.type == RequestOriginType.GY
         ]
-        enforcement_res = self._enforcer_app.handle_restart(gx_reqs)
+        # The controllers own separate tables, so are set up at the same time
+        enforcement_res, _, _ = handle_restarts(
+            [
+                (self._enforcer_app, gx_reqs),
+                (self._gy_app, gy_reqs),
+                (self._enforcement_stats, gx_reqs),
+            ],
+            self._max_concurrent_restarts,
+        )
         # TODO check these results and aggregate
-        self._gy_app.handle_restart(gy_reqs)
-        self._enforcement_stats.handle_restart(gx_reqs)
         fut.set_result(enforcement_res)
 
     def ActivateFlows(self, request, context):
@@ -10,9 +10,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import json
 import threading
-from collections import namedtuple
 
 from lte.protos.mobilityd_pb2 import IPAddress
 from magma.common.redis.client import get_default_client
@@ -24,7 +22,8 @@ from magma.common.redis.serializers import (
 )
 from magma.pipelined.imsi import encode_imsi
 
-SubscriberRuleKey = namedtuple('SubscriberRuleKey', 'key_type imsi ip_addr rule_id')
+# Versions of a missing subscriber or IP address
+_NO_VERSIONS = {}  # type: dict
 
 
 class RuleIDToNumMapper:
@@ -82,9 +81,14 @@ class SessionRuleToVersionMapper:
     This class assigns version numbers to rule id & subscriber id combinations
     that can be used in an openflow register. The methods can be called from
     multiple threads.
+
+    The versions are indexed by encoded IMSI, then IP address, then rule id,
+    so that the versions of a subscriber are removed without going through
+    those of the other subscribers.
     """
 
     def __init__(self):
+        # encoded imsi => ip addr => rule id => version
         self._version_by_imsi_and_rule = {}
         self._lock = threading.Lock()  # write lock
 
@@ -92,31 +96,29 @@ class SessionRuleToVersionMapper:
         self, imsi: str, ip_addr: str, rule_id: str,
         version,
     ):
-        key = self._get_json_key(encode_imsi(imsi), ip_addr, rule_id)
-        self._version_by_imsi_and_rule[key] = version
+        versions_by_ip = self._version_by_imsi_and_rule.setdefault(
+            encode_imsi(imsi), {},
+        )
+        versions_by_ip.setdefault(ip_addr, {})[rule_id] = version
 
     def remove_all_ue_versions(self, imsi: str, ip_addr: IPAddress):
         """
-        Increment the version number for a given subscriber and rule. If the
-        rule id is not specified, then all rules for the subscriber will be
-        incremented.
+        Remove the versions of all the rules of a subscriber. If the IP
+        address is not specified, then the versions of all its IP addresses
+        are removed.
         """
         encoded_imsi = encode_imsi(imsi)
-        if ip_addr is None or ip_addr.address is None:
-            ip_addr_str = ""
-        else:
-            ip_addr_str = ip_addr.address.decode('utf-8').strip()
-        del_list = []
+        ip_addr_str = _get_ip_addr_str(ip_addr)
         with self._lock:
-            for k in self._version_by_imsi_and_rule.keys():
-                _, cur_imsi, cur_ip_addr_str, _ = SubscriberRuleKey(*json.loads(k))
-                if cur_imsi == encoded_imsi and (
-                    ip_addr_str == "" or
-                    ip_addr_str == cur_ip_addr_str
-                ):
-                    del_list.append(k)
-            for k in del_list:
-                del self._version_by_imsi_and_rule[k]
+            if ip_addr_str == "":
+                self._version_by_imsi_and_rule.pop(encoded_imsi, None)
+                return
+            versions_by_ip = self._version_by_imsi_and_rule.get(encoded_imsi)
+            if versions_by_ip is None:
+                return
+            versions_by_ip.pop(ip_addr_str, None)
+            if not versions_by_ip:
+                del self._version_by_imsi_and_rule[encoded_imsi]
 
     def save_version(
         self, imsi: str, ip_addr: IPAddress,
@@ -127,10 +129,7 @@ class SessionRuleToVersionMapper:
         rule id is not specified, then all rules for the subscriber will be
         incremented.
         """
-        if ip_addr is None or ip_addr.address is None:
-            ip_addr_str = ""
-        else:
-            ip_addr_str = ip_addr.address.decode('utf-8').strip()
+        ip_addr_str = _get_ip_addr_str(ip_addr)
         with self._lock:
             self._save_version_unsafe(imsi, ip_addr_str, rule_id, version)
 
@@ -138,42 +137,44 @@ class SessionRuleToVersionMapper:
         """
         Returns the version number given a subscriber and a rule.
         """
-        if ip_addr is None or ip_addr.address is None:
-            ip_addr_str = ""
-        else:
-            ip_addr_str = ip_addr.address.decode('utf-8').strip()
-        key = self._get_json_key(encode_imsi(imsi), ip_addr_str, rule_id)
+        encoded_imsi = encode_imsi(imsi)
+        ip_addr_str = _get_ip_addr_str(ip_addr)
         with self._lock:
-            version = self._version_by_imsi_and_rule.get(key)
-            if version is None:
-                # Set to zero to allow proper cleanup of old flows
-                version = 0
-        return version
+            versions = self._version_by_imsi_and_rule.get(
+                encoded_imsi, _NO_VERSIONS,
+            ).get(ip_addr_str, _NO_VERSIONS)
+            # Set to zero to allow proper cleanup of old flows
+            return versions.get(rule_id, 0)
 
     def remove(self, imsi: str, ip_addr: IPAddress, rule_id: str, version: int):
         """
         Removed the element from redis if the passed version matches the
         current one
         """
-        if ip_addr is None or ip_addr.address is None:
-            ip_addr_str = ""
-        else:
-            ip_addr_str = ip_addr.address.decode('utf-8').strip()
-        key = self._get_json_key(encode_imsi(imsi), ip_addr_str, rule_id)
+        if version is None:
+            return
+        encoded_imsi = encode_imsi(imsi)
+        ip_addr_str = _get_ip_addr_str(ip_addr)
         with self._lock:
-            cur_version = self._version_by_imsi_and_rule.get(key)
-            if version is None:
+            versions_by_ip = self._version_by_imsi_and_rule.get(encoded_imsi)
+            if versions_by_ip is None:
                 return
-            if cur_version == version:
-                del self._version_by_imsi_and_rule[key]
-
-    def _get_json_key(self, imsi: str, ip_addr: str, rule_id: str):
-        return json.dumps(
-            SubscriberRuleKey(
-                'imsi_rule', imsi, ip_addr,
-                rule_id,
-            ),
-        )
+            versions = versions_by_ip.get(ip_addr_str)
+            if versions is None or versions.get(rule_id) != version:
+                return
+            del versions[rule_id]
+            # Drop the emptied levels, so that they don't accumulate with
+            # the churn of the sessions
+            if not versions:
+                del versions_by_ip[ip_addr_str]
+                if not versions_by_ip:
+                    del self._version_by_imsi_and_rule[encoded_imsi]
+
+
+def _get_ip_addr_str(ip_addr: IPAddress) -> str:
+    if ip_addr is None or ip_addr.address is None:
+        return ""
+    return ip_addr.address.decode('utf-8').strip()
 
 
 class RuleIDDict(RedisFlatDict):
@@ -190,7 +191,9 @@ class RuleIDDict(RedisFlatDict):
             self._DICT_HASH, get_json_serializer(),
             get_json_deserializer(),
         )
-        super().__init__(client, serde, writethrough=True)
+        super().__init__(
+            client, serde, writethrough=True, key_index=True,
+        )
 
     def __missing__(self, key):
         """Instead of throwing a key error, return None when key not found"""
@@ -232,7 +235,9 @@ class RuleVersionDict(RedisFlatDict):
             self._DICT_HASH, get_json_serializer(),
             get_json_deserializer(),
         )
-        super().__init__(client, serde, writethrough=True)
+        super().__init__(
+            client, serde, writethrough=True, key_index=True,
+        )
 
     def __missing__(self, key):
         """Instead of throwing a key error, return None when key not found"""
@@ -21,15 +21,18 @@ from lte.protos.pipelined_pb2 import (
     ActivateFlowsRequest,
     DeactivateFlowsRequest,
     RequestOriginType,
+    SetupFlowsResult,
     SetupPolicyRequest,
     VersionedPolicy,
     VersionedPolicyID,
 )
 from lte.protos.policydb_pb2 import PolicyRule
 from lte.protos.subscriberdb_pb2 import SubscriberID
+from magma.pipelined.app.restart_mixin import handle_restarts
 from magma.pipelined.policy_converters import convert_ipv4_str_to_ip_proto
 from magma.pipelined.rpc_servicer import PipelinedRpcServicer
 from magma.pipelined.rule_mappers import SessionRuleToVersionMapper
+from ryu.lib import hub
 
 
 class RPCServicerTest(unittest.TestCase):
@@ -55,6 +58,8 @@ class RPCServicerTest(unittest.TestCase):
         self._inout_app = MagicMock()
         self._ng_servicer_app = MagicMock()
         self._service_config = MagicMock()
+        self._service_config.get.side_effect = \
+            lambda key, default=None: default
         self._service_manager = MagicMock()
         self._service_manager.is_app_enabled.side_effect = lambda x: True
 
@@ -96,6 +101,47 @@ class RPCServicerTest(unittest.TestCase):
         self._enforcement_stats.handle_restart.assert_called_with([gx_req1, gx_req2])
         self._gy_app.handle_restart.assert_called_with([gy_req])
 
+    def test_setup_flows_concurrently(self):
+        running = []
+        max_running = []
+
+        def handle_restart(name):
+            def _handle_restart(requests):
+                running.append(name)
+                max_running.append(len(running))
+                hub.sleep(0.01)
+                running.remove(name)
+                if name == 'gy':
+                    raise ValueError()
+                return SetupFlowsResult(result=SetupFlowsResult.SUCCESS)
+            return _handle_restart
+        self._enforcer_app.handle_restart.side_effect = handle_restart('gx')
+        self._gy_app.handle_restart.side_effect = handle_restart('gy')
+        self._enforcement_stats.handle_restart.side_effect = \
+            handle_restart('stats')
+
+        setup_req = SetupPolicyRequest(requests=[ActivateFlowsRequest()])
+        res = self.pipelined_srv.SetupPolicyFlows(setup_req, MagicMock())
+        self.assertEqual(res.result, SetupFlowsResult.SUCCESS)
+        self.assertEqual(max(max_running), 3)
+
+        # The failed controller doesn't fail the others
+        results = handle_restarts(
+            [
+                (self._enforcer_app, []),
+                (self._gy_app, []),
+                (self._enforcement_stats, []),
+            ], max_concurrency=2,
+        )
+        self.assertEqual(
+            [result.result for result in results], [
+                SetupFlowsResult.SUCCESS, SetupFlowsResult.FAILURE,
+                SetupFlowsResult.SUCCESS,
+            ],
+        )
+        self.assertEqual(max(max_running), 3)
+        self.assertEqual(max(max_running[3:]), 2)
+
     def test_activate_flows_req(self):
         rule = PolicyRule(id="rule1", priority=100, flow_list=[])
         policies = [VersionedPolicy(rule=rule, version=1)]
@@ -133,6 +133,32 @@ class RuleMappersTest(unittest.TestCase):
             0,
         )
 
+    def test_remove_ue_versions(self):
+        mapper = self._session_rule_version_mapper
+        imsi1, imsi2 = 'IMSI001010000000001', 'IMSI001010000000002'
+        ip1 = convert_ipv4_str_to_ip_proto('1.2.3.4')
+        ip2 = convert_ipv4_str_to_ip_proto('1.2.3.5')
+        mapper.save_version(imsi1, ip1, 'rule1', 1)
+        mapper.save_version(imsi1, ip2, 'rule1', 2)
+        mapper.save_version(imsi2, ip1, 'rule1', 3)
+
+        # Only the versions of the given IP address are removed
+        mapper.remove_all_ue_versions(imsi1, ip1)
+        self.assertEqual(mapper.get_version(imsi1, ip1, 'rule1'), 0)
+        self.assertEqual(mapper.get_version(imsi1, ip2, 'rule1'), 2)
+        self.assertEqual(mapper.get_version(imsi2, ip1, 'rule1'), 3)
+
+        # Versions are removed only if they are the current ones
+        mapper.remove(imsi2, ip1, 'rule1', 2)
+        self.assertEqual(mapper.get_version(imsi2, ip1, 'rule1'), 3)
+        mapper.remove(imsi2, ip1, 'rule1', 3)
+        self.assertEqual(mapper.get_version(imsi2, ip1, 'rule1'), 0)
+
+        # All the IP addresses of the subscriber
+        mapper.remove_all_ue_versions(imsi1, None)
+        self.assertEqual(mapper.get_version(imsi1, ip2, 'rule1'), 0)
+        self.assertEqual(mapper._version_by_imsi_and_rule, {})
+
 
 if __name__ == "__main__":
     unittest.main()
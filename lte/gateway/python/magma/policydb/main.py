@@ -25,6 +25,7 @@ from magma.common.service_registry import ServiceRegistry
 from magma.common.streamer import StreamerClient
 from magma.policydb.apn_rule_map_store import ApnRuleAssignmentsDict
 from magma.policydb.basename_store import BaseNameDict
+from magma.policydb.policy_view import SessionPolicyView
 from magma.policydb.rating_group_store import RatingGroupsDict
 from magma.policydb.reauth_handler import ReAuthHandler
 from magma.policydb.rule_map_store import RuleAssignmentsDict
@@ -47,7 +48,9 @@ def main():
         sentry_mconfig=service.shared_mconfig.sentry_config,
     )
 
-    apn_rules_dict = ApnRuleAssignmentsDict()
+    # Kept across restarts, so that the first APN rule mappings resync only
+    # sends sessiond the subscribers whose mappings changed meanwhile
+    apn_rules_dict = ApnRuleAssignmentsDict(clear_data=False)
     assignments_dict = RuleAssignmentsDict()
     basenames_dict = BaseNameDict()
     rating_groups_dict = RatingGroupsDict()
@@ -59,13 +62,16 @@ def main():
     sessiond_stub = SessionProxyResponderStub(sessiond_chan)
     reauth_handler = ReAuthHandler(assignments_dict, sessiond_stub)
 
-    # Add all servicers to the server
-    session_servicer = SessionRpcServicer(
-        service.mconfig,
+    # Keep the policies read on session creation in memory
+    policy_view = SessionPolicyView(
         rating_groups_dict,
         basenames_dict,
         apn_rules_dict,
     )
+    policy_view.start_update_listener()
+
+    # Add all servicers to the server
+    session_servicer = SessionRpcServicer(service.mconfig, policy_view)
     session_servicer.add_to_server(service.rpc_server)
 
     orc8r_chan = ServiceRegistry.get_rpc_channel(
@@ -84,14 +90,19 @@ def main():
         stream = StreamerClient(
             {
                 'policydb': PolicyDBStreamerCallback(),
-                'base_names': BaseNamesStreamerCallback(basenames_dict),
+                'base_names': BaseNamesStreamerCallback(
+                    basenames_dict,
+                    policy_view,
+                ),
                 'apn_rule_mappings': ApnRuleMappingsStreamerCallback(
                     session_mgr_stub,
                     basenames_dict,
                     apn_rules_dict,
+                    policy_view,
                 ),
                 'rating_groups': RatingGroupsStreamerCallback(
                     rating_groups_dict,
+                    policy_view,
                 ),
             },
             service.loop,
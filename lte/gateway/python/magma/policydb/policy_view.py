@@ -0,0 +1,223 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+import redis
+from lte.protos.policydb_pb2 import (
+    ChargingRuleNameSet,
+    RatingGroup,
+    SubscriberPolicySet,
+)
+from magma.common.redis.client import get_default_client
+from magma.common.redis.containers import RedisHashDict
+from magma.policydb.apn_rule_map_store import ApnRuleAssignmentsDict
+from magma.policydb.basename_store import BaseNameDict
+from magma.policydb.rating_group_store import RatingGroupsDict
+from magma.policydb.rule_store import PolicyRuleDict
+
+# pylint: disable=protected-access
+
+# Seconds to wait before subscribing again after losing the Redis connection
+LISTENER_RETRY_INTERVAL = 5
+# Seconds to wait for a notification before checking if the listener stopped
+LISTENER_POLL_TIMEOUT = 1
+
+
+class SessionPolicyView(object):
+    """
+    In-memory view of the rating groups, basenames and APN rule mappings
+    stored in Redis, with the infinite credit and postpay charging keys
+    precomputed, so that a session can be created without reading Redis.
+
+    The streamer callbacks update the view along with the Redis dicts, and
+    the update notifications of the dicts refresh it from Redis. Each part
+    of the view is replaced as a whole, so that readers don't take any lock.
+    A policy update notification refreshes the whole view, which catches up
+    with an update that was missed.
+    """
+
+    def __init__(
+        self,
+        rating_groups_by_id: RatingGroupsDict,
+        rules_by_basename: BaseNameDict,
+        apn_rules_by_sid: ApnRuleAssignmentsDict,
+    ):
+        self._rating_groups_by_id = rating_groups_by_id
+        self._rules_by_basename = rules_by_basename
+        self._apn_rules_by_sid = apn_rules_by_sid
+        # Serializes the refreshes, reads go to the current snapshots
+        self._refresh_lock = threading.Lock()
+        self._charging_keys = ((), ())  # type: Tuple[Tuple[int, ...], ...]
+        self._rule_ids_by_basename = {}  # type: Dict[str, Tuple[str, ...]]
+        self._apn_policies_by_sid = {}  # type: Dict[str, SubscriberPolicySet]
+        self._listener_stopped = threading.Event()
+        # Set once the listener is subscribed and caught up with Redis
+        self._listener_ready = threading.Event()
+        self.refresh()
+
+    def get_charging_keys(self) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        """
+        Get the infinite credit and the postpay charging keys, from the same
+        snapshot of the rating groups
+        """
+        return self._charging_keys
+
+    def get_apn_policies(self, imsi: str) -> Optional[SubscriberPolicySet]:
+        """
+        Get the APN rule mappings of a subscriber, None if the subscriber
+        has none. NOTE: leave the 'IMSI' prefix
+        """
+        return self._apn_policies_by_sid.get(imsi)
+
+    def get_basename_rule_ids(self, basename: str) -> Tuple[str, ...]:
+        """ Get the ids of the rules of a basename, empty if not streamed """
+        return self._rule_ids_by_basename.get(basename, ())
+
+    def refresh(self) -> None:
+        """ Refresh the whole view from Redis """
+        self.refresh_rating_groups()
+        self.refresh_basenames()
+        self.refresh_apn_rules()
+
+    def refresh_rating_groups(self) -> None:
+        with self._refresh_lock:
+            rating_groups = _snapshot(
+                self._rating_groups_by_id,
+            )  # type: Dict[Any, RatingGroup]
+            infinite_credit_keys = []
+            postpay_keys = []
+            for rating_group in rating_groups.values():
+                if rating_group.limit_type == RatingGroup.INFINITE_UNMETERED:
+                    infinite_credit_keys.append(rating_group.id)
+                elif rating_group.limit_type == RatingGroup.INFINITE_METERED:
+                    postpay_keys.append(rating_group.id)
+            self._charging_keys = (
+                tuple(sorted(infinite_credit_keys)),
+                tuple(sorted(postpay_keys)),
+            )
+        logging.debug(
+            "Refreshed %d rating groups in the policy view",
+            len(rating_groups),
+        )
+
+    def refresh_basenames(self) -> None:
+        with self._refresh_lock:
+            basenames = _snapshot(
+                self._rules_by_basename,
+            )  # type: Dict[str, ChargingRuleNameSet]
+            self._rule_ids_by_basename = {
+                basename: tuple(rule_names.RuleNames)
+                for basename, rule_names in basenames.items()
+            }
+        logging.debug(
+            "Refreshed %d basenames in the policy view", len(basenames),
+        )
+
+    def refresh_apn_rules(self) -> None:
+        with self._refresh_lock:
+            self._apn_policies_by_sid = _snapshot(self._apn_rules_by_sid)
+        logging.debug(
+            "Refreshed the APN rule mappings of %d subscribers in the "
+            "policy view", len(self._apn_policies_by_sid),
+        )
+
+    def update_apn_rules(
+        self,
+        apn_policies_by_sid: Mapping[str, SubscriberPolicySet],
+        deleted_sids: Iterable[str] = (),
+    ) -> None:
+        """
+        Set the APN rule mappings of the given subscribers, and remove those
+        of the deleted ones
+        """
+        with self._refresh_lock:
+            updated = dict(self._apn_policies_by_sid)
+            updated.update(apn_policies_by_sid)
+            for sid in deleted_sids:
+                updated.pop(sid, None)
+            self._apn_policies_by_sid = updated
+
+    def start_update_listener(
+        self, client: Optional[redis.Redis] = None,
+    ) -> threading.Thread:
+        """
+        Start a thread refreshing the view on the update notifications of
+        the Redis dicts, e.g. on the policy updates of the policydb CLI.
+        """
+        if client is None:
+            client = get_default_client()
+        self._listener_stopped.clear()
+        self._listener_ready.clear()
+        thread = threading.Thread(
+            target=self._listen,
+            args=(client,),
+            name='policy_view_listener',
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def stop_update_listener(self) -> None:
+        self._listener_stopped.set()
+
+    def _listen(self, client: redis.Redis) -> None:
+        refresh_by_channel = {
+            RatingGroupsDict._NOTIFY_CHANNEL: self.refresh_rating_groups,
+            BaseNameDict._NOTIFY_CHANNEL: self.refresh_basenames,
+            PolicyRuleDict._NOTIFY_CHANNEL: self.refresh,
+        }
+        while not self._listener_stopped.is_set():
+            try:
+                self._listen_once(client, refresh_by_channel)
+            except redis.exceptions.RedisError as e:
+                logging.warning(
+                    "Policy view lost its Redis subscription: %s", e,
+                )
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Policy view failed to refresh")
+            else:
+                continue
+            self._listener_ready.clear()
+            self._listener_stopped.wait(LISTENER_RETRY_INTERVAL)
+
+    def _listen_once(
+        self,
+        client: redis.Redis,
+        refresh_by_channel: Mapping[str, Callable[[], None]],
+    ) -> None:
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(*refresh_by_channel)
+            # Catch up with the updates published while not subscribed
+            self.refresh()
+            self._listener_ready.set()
+            while not self._listener_stopped.is_set():
+                message = pubsub.get_message(timeout=LISTENER_POLL_TIMEOUT)
+                if message is None:
+                    continue
+                channel = message['channel']
+                if isinstance(channel, bytes):
+                    channel = channel.decode('utf-8')
+                refresh_by_channel[channel]()
+        finally:
+            pubsub.close()
+
+
+def _snapshot(dict_: Mapping[Any, Any]) -> Dict[Any, Any]:
+    """ Copy a Redis dict with a single HGETALL, or any other mapping """
+    if isinstance(dict_, RedisHashDict):
+        return dict_.items_snapshot()
+    return dict(dict_.items())
@@ -15,11 +15,7 @@ import logging
 from typing import List, Set
 
 from lte.protos.mconfig import mconfigs_pb2
-from lte.protos.policydb_pb2 import (
-    ApnPolicySet,
-    RatingGroup,
-    SubscriberPolicySet,
-)
+from lte.protos.policydb_pb2 import ApnPolicySet, SubscriberPolicySet
 from lte.protos.session_manager_pb2 import (
     CreateSessionRequest,
     CreateSessionResponse,
@@ -35,10 +31,8 @@ from lte.protos.session_manager_pb2_grpc import (
     CentralSessionControllerServicer,
     add_CentralSessionControllerServicer_to_server,
 )
-from magma.policydb.apn_rule_map_store import ApnRuleAssignmentsDict
-from magma.policydb.basename_store import BaseNameDict
 from magma.policydb.default_rules import get_allow_all_policy_rule
-from magma.policydb.rating_group_store import RatingGroupsDict
+from magma.policydb.policy_view import SessionPolicyView
 from orc8r.protos.common_pb2 import NetworkID
 
 
@@ -55,34 +49,23 @@ class SessionRpcServicer(CentralSessionControllerServicer):
 
     This limited PCRF/OCS is also used for enabling the Captive Portal
     feature.
+
+    The rating groups, basenames and APN rule mappings are read from an
+    in-memory view, so that sessions are created without reading Redis.
     """
 
     def __init__(
         self,
         mconfig: mconfigs_pb2.PolicyDB,
-        rating_groups_by_id: RatingGroupsDict,
-        rules_by_basename: BaseNameDict,
-        apn_rules_by_sid: ApnRuleAssignmentsDict,
+        policy_view: SessionPolicyView,
     ):
         self._mconfig = mconfig
         self._network_id = NetworkID(id="_")
-        self._rating_groups_by_id = rating_groups_by_id
-        self._rules_by_basename = rules_by_basename
-        self._apn_rules_by_sid = apn_rules_by_sid
+        self._policy_view = policy_view
 
     def get_infinite_credit_charging_keys(self) -> List[int]:
-        keys = []
-        for rating_group in self._rating_groups_by_id.values():
-            if rating_group.limit_type == RatingGroup.INFINITE_UNMETERED:
-                keys.append(rating_group.id)
-        return keys
-
-    def _get_postpay_charging_keys(self) -> List[int]:
-        keys = []
-        for rating_group in self._rating_groups_by_id.values():
-            if rating_group.limit_type == RatingGroup.INFINITE_METERED:
-                keys.append(rating_group.id)
-        return keys
+        infinite_credit_keys, _ = self._policy_view.get_charging_keys()
+        return list(infinite_credit_keys)
 
     def add_to_server(self, server):
         """ Add the servicer to a gRPC server """
@@ -166,10 +149,10 @@ class SessionRpcServicer(CentralSessionControllerServicer):
         Get the list of static rules to be installed for a subscriber
         NOTE: Remove "IMSI" prefix from imsi argument.
         """
-        if imsi not in self._apn_rules_by_sid:
+        sub_apn_policies = self._policy_view.get_apn_policies(imsi)
+        if sub_apn_policies is None:
             return []
 
-        sub_apn_policies = self._apn_rules_by_sid[imsi]
         assigned_static_rules = []  # type: List[StaticRuleInstall]
         # Add global rules
         global_rules = self._get_global_static_rules(sub_apn_policies)
@@ -202,11 +185,9 @@ class SessionRpcServicer(CentralSessionControllerServicer):
     ) -> Set[str]:
         global_rules = set(sub_apn_policies.global_policies)
         for basename in sub_apn_policies.global_base_names:
-            if basename not in self._rules_by_basename:
-                # Eventually, basename definition will be streamed from orc8r
-                continue
+            # Basenames not streamed from orc8r yet have no rules
             global_rules.update(
-                self._rules_by_basename[basename].RuleNames,
+                self._policy_view.get_basename_rule_ids(basename),
             )
         return global_rules
 
@@ -216,17 +197,15 @@ class SessionRpcServicer(CentralSessionControllerServicer):
     ) -> Set[str]:
         desired_rules = set(policies.assigned_policies)
         for basename in policies.assigned_base_names:
-            if basename not in self._rules_by_basename:
-                # Eventually, basename definition will be streamed from orc8r
-                continue
+            # Basenames not streamed from orc8r yet have no rules
             desired_rules.update(
-                self._rules_by_basename[basename].RuleNames,
+                self._policy_view.get_basename_rule_ids(basename),
             )
         return desired_rules
 
     def _get_credits(self, sid: str) -> List[CreditUpdateResponse]:
-        infinite_credit_keys = self.get_infinite_credit_charging_keys()
-        postpay_keys = self._get_postpay_charging_keys()
+        infinite_credit_keys, postpay_keys = \
+            self._policy_view.get_charging_keys()
         credit_updates = []
         for charging_key in infinite_credit_keys:
             credit_updates.append(
@@ -0,0 +1,91 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import hashlib
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, NamedTuple
+
+from orc8r.protos.streamer_pb2 import DataUpdate
+
+DIGEST_SIZE = 16
+
+StreamDiff = NamedTuple(
+    'StreamDiff', [
+        ('changed', List[DataUpdate]),
+        ('deleted', List[str]),
+        ('digests', Dict[str, bytes]),
+    ],
+)
+
+
+class StreamDigests(object):
+    """
+    Content digests of the entries applied from a stream, keyed by the keys
+    of their updates, so that a resync only applies the entries which were
+    added, changed or deleted since the previous one.
+    """
+
+    def __init__(self):
+        self._digests = {}  # type: Dict[str, bytes]
+        # Keys to apply again on the next update, e.g. after a failed RPC.
+        # Appended from gRPC callback threads, a deque is thread safe.
+        self._invalidated = deque()  # type: deque
+
+    def is_empty(self) -> bool:
+        """ Whether no update was applied yet """
+        return not self._digests
+
+    def seed(self, values_by_key: Mapping[str, bytes]) -> None:
+        """
+        Record the digests of serialized entries that were applied before,
+        e.g. by a previous run of the service
+        """
+        for key, value in values_by_key.items():
+            self._digests[key] = _digest(value)
+
+    def diff(self, updates: List[DataUpdate], resync: bool) -> StreamDiff:
+        """
+        Get the updates with new content, and the keys missing from a
+        resync, which contains all the entries of the stream
+        """
+        while self._invalidated:
+            self._digests.pop(self._invalidated.popleft(), None)
+
+        digests = {update.key: _digest(update.value) for update in updates}
+        if digests == self._digests:
+            return StreamDiff([], [], digests)
+        changed = [
+            update for update in updates
+            if self._digests.get(update.key) != digests[update.key]
+        ]
+        deleted = []  # type: List[str]
+        if resync:
+            deleted = [key for key in self._digests if key not in digests]
+        return StreamDiff(changed, deleted, digests)
+
+    def apply(self, diff: StreamDiff) -> None:
+        """ Record the digests of a diff once it was applied """
+        for update in diff.changed:
+            self._digests[update.key] = diff.digests[update.key]
+        for key in diff.deleted:
+            del self._digests[key]
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """
+        Apply the entries of keys again on the next update, thread safe
+        """
+        self._invalidated.extend(keys)
+
+
+def _digest(value: bytes) -> bytes:
+    return hashlib.blake2b(value, digest_size=DIGEST_SIZE).digest()
@@ -11,10 +11,10 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import functools
 import logging
-from typing import Any, List, Set
+from typing import Any, List, Optional, Set
 
-import grpc
 from lte.protos.policydb_pb2 import (
     ApnPolicySet,
     ChargingRuleNameSet,
@@ -36,10 +36,15 @@ from magma.common.streamer import StreamerClient
 from magma.policydb.apn_rule_map_store import ApnRuleAssignmentsDict
 from magma.policydb.basename_store import BaseNameDict
 from magma.policydb.default_rules import get_allow_all_policy_rule
+from magma.policydb.policy_view import SessionPolicyView
 from magma.policydb.rating_group_store import RatingGroupsDict
 from magma.policydb.rule_store import PolicyRuleDict
+from magma.policydb.stream_digests import StreamDigests
 from orc8r.protos.streamer_pb2 import DataUpdate
 
+# Number of subscribers whose rules are sent in a single SetSessionRules call
+SESSION_RULES_BATCH_SIZE = 1000
+
 
 class PolicyDBStreamerCallback(StreamerClient.Callback):
     """
@@ -48,6 +53,7 @@ class PolicyDBStreamerCallback(StreamerClient.Callback):
 
     def __init__(self):
         self._policy_dict = PolicyRuleDict()
+        self._digests = StreamDigests()
 
     def get_request_args(self, stream_name: str) -> Any:
         return None
@@ -57,30 +63,29 @@ class PolicyDBStreamerCallback(StreamerClient.Callback):
             "Processing %d policy updates (resync=%s)",
             len(updates), resync,
         )
-        if resync:
-            policy_ids = set()
-            for update in updates:
-                policy = PolicyRule()
-                policy.ParseFromString(update.value)
-                self._store_policy_rule(policy)
-                policy_ids.add(policy.id)
-            logging.debug("Resync with policies: %s", ','.join(policy_ids))
-            self._remove_old_policies(policy_ids)
-            self._policy_dict.send_update_notification()
-        else:
-            pass
-
-    def _store_policy_rule(self, policy):
-        self._policy_dict[policy.id] = policy
-
-    def _remove_old_policies(self, id_set):
-        """
-        Scan the set of ids passes in the streaming update to see which have
-        been deleted and delete them in the policy dictionary
-        """
-        missing_rules = set(self._policy_dict.keys()) - id_set
-        for rule in missing_rules:
-            del self._policy_dict[rule]
+        if not resync:
+            return
+        is_first_resync = self._digests.is_empty()
+        diff = self._digests.diff(updates, resync)
+        deleted = diff.deleted
+        if is_first_resync:
+            # Remove the policies deleted while policydb was down
+            deleted = list(set(self._policy_dict.keys()) - set(diff.digests))
+        if not diff.changed and not deleted:
+            logging.debug("Resync without any policy update")
+            return
+        policies = {}
+        for update in diff.changed:
+            policy = PolicyRule()
+            policy.ParseFromString(update.value)
+            policies[policy.id] = policy
+        self._policy_dict.bulk_set(policies, delete_keys=deleted)
+        self._digests.apply(diff)
+        logging.debug(
+            "Resync with updated policies: %s, deleted policies: %s",
+            ','.join(policies), ','.join(deleted),
+        )
+        self._policy_dict.send_update_notification()
 
 
 class BaseNamesStreamerCallback(StreamerClient.Callback):
@@ -92,8 +97,10 @@ class BaseNamesStreamerCallback(StreamerClient.Callback):
     def __init__(
         self,
         basenames_dict: BaseNameDict,
+        policy_view: Optional[SessionPolicyView] = None,
     ):
         self._basenames = basenames_dict
+        self._policy_view = policy_view
 
     def get_request_args(self, stream_name: str) -> Any:
         return None
@@ -103,10 +110,14 @@ class BaseNamesStreamerCallback(StreamerClient.Callback):
         resync: bool,
     ):
         logging.info('Processing %d basename -> policy updates', len(updates))
+        basenames = {}
         for update in updates:
             basename = ChargingRuleNameSet()
             basename.ParseFromString(update.value)
-            self._basenames[update.key] = basename
+            basenames[update.key] = basename
+        self._basenames.bulk_set(basenames)
+        if self._policy_view is not None:
+            self._policy_view.refresh_basenames()
 
 
 class ApnRuleMappingsStreamerCallback(StreamerClient.Callback):
@@ -120,10 +131,14 @@ class ApnRuleMappingsStreamerCallback(StreamerClient.Callback):
         session_mgr_stub: LocalSessionManagerStub,
         rules_by_basename: BaseNameDict,
         apn_rules_by_sid: ApnRuleAssignmentsDict,
+        policy_view: Optional[SessionPolicyView] = None,
     ):
         self._session_mgr_stub = session_mgr_stub
         self._rules_by_basename = rules_by_basename
         self._apn_rules_by_sid = apn_rules_by_sid
+        self._policy_view = policy_view
+        self._digests = StreamDigests()
+        self._digests_seeded = False
 
     def get_request_args(self, stream_name: str) -> Any:
         return None
@@ -138,20 +153,41 @@ class ApnRuleMappingsStreamerCallback(StreamerClient.Callback):
             'Processing %d SID -> apn -> policy updates',
             len(updates),
         )
+        if resync and not self._digests_seeded:
+            # Only apply what changed since the mappings already in Redis
+            self._digests.seed({
+                sid: policies.SerializeToString() for sid, policies
+                in self._apn_rules_by_sid.items_snapshot().items()
+            })
+            self._digests_seeded = True
+        # TODO: (8/21/2020) repeated fields may not be ordered the same, use a
+        #       different method to compare later
+        diff = self._digests.diff(updates, resync)
         all_subscriber_rules = []  # type: List[RulesPerSubscriber]
-        found_update = False
-        for update in updates:
+        updated_policies = {}
+        for update in diff.changed:
             imsi = update.key
             subApnPolicies = SubscriberPolicySet()
             subApnPolicies.ParseFromString(update.value)
-            is_updated = self._are_sub_policies_updated(imsi, subApnPolicies)
-            if is_updated:
-                found_update = True
-                all_subscriber_rules.append(
-                    self._build_sub_rule_set(imsi, subApnPolicies),
+            all_subscriber_rules.append(
+                self._build_sub_rule_set(imsi, subApnPolicies),
+            )
+            updated_policies[imsi] = subApnPolicies
+        if diff.deleted:
+            logging.info(
+                'Removing the APN->policy assignments of %d IMSIs',
+                len(diff.deleted),
+            )
+        if updated_policies or diff.deleted:
+            self._apn_rules_by_sid.bulk_set(
+                updated_policies, delete_keys=diff.deleted,
+            )
+            self._digests.apply(diff)
+            if self._policy_view is not None:
+                self._policy_view.update_apn_rules(
+                    updated_policies, diff.deleted,
                 )
-                self._apn_rules_by_sid[imsi] = subApnPolicies
-        if not found_update:
+        if not all_subscriber_rules:
             logging.debug(
                 "No IMSIs with APN->Policy assignments found. "
                 "Not sending an update to SessionD",
@@ -161,31 +197,47 @@ class ApnRuleMappingsStreamerCallback(StreamerClient.Callback):
             'Updating %d IMSIs with new APN->policy assignments',
             len(all_subscriber_rules),
         )
-        update = SessionRules(rules_per_subscriber=all_subscriber_rules)
-        try:
-            self._session_mgr_stub.SetSessionRules(update, timeout=5)
-        except grpc.RpcError as e:
-            error_extra = (
-                EXCLUDE_FROM_ERROR_MONITORING if indicates_connection_error(e)
-                else None
-            )
-            logging.error(
-                "Unable to apply apn->policy updates %s",
-                str(e),
-                extra=error_extra,
+        for start in range(
+            0, len(all_subscriber_rules), SESSION_RULES_BATCH_SIZE,
+        ):
+            self._send_session_rules(
+                all_subscriber_rules[start:start + SESSION_RULES_BATCH_SIZE],
             )
 
-    def _are_sub_policies_updated(
+    def _send_session_rules(
         self,
-        subscriber_id: str,
-        subApnPolicies: SubscriberPolicySet,
-    ) -> bool:
-        if subscriber_id not in self._apn_rules_by_sid:
-            return True
-        prev = self._apn_rules_by_sid[subscriber_id]
-        # TODO: (8/21/2020) repeated fields may not be ordered the same, use a
-        #       different method to compare later
-        return subApnPolicies.SerializeToString() != prev.SerializeToString()
+        subscriber_rules: List[RulesPerSubscriber],
+    ) -> None:
+        """
+        Send the rules of a batch of subscribers to sessiond, without
+        blocking the service loop
+        """
+        update = SessionRules(rules_per_subscriber=subscriber_rules)
+        future = self._session_mgr_stub.SetSessionRules.future(
+            update, timeout=5,
+        )
+        future.add_done_callback(
+            functools.partial(
+                self._on_session_rules_done,
+                [rules.imsi for rules in subscriber_rules],
+            ),
+        )
+
+    def _on_session_rules_done(self, imsis: List[str], future) -> None:
+        err = future.exception()
+        if err is None:
+            return
+        # Send the rules of these subscribers again on the next update
+        self._digests.invalidate(imsis)
+        error_extra = (
+            EXCLUDE_FROM_ERROR_MONITORING if indicates_connection_error(err)
+            else None
+        )
+        logging.error(
+            "Unable to apply apn->policy updates %s",
+            str(err),
+            extra=error_extra,
+        )
 
     def _build_sub_rule_set(
         self,
@@ -266,8 +318,10 @@ class RatingGroupsStreamerCallback(StreamerClient.Callback):
     def __init__(
             self,
             rating_groups_dict: RatingGroupsDict,
+            policy_view: Optional[SessionPolicyView] = None,
     ):
         self._rating_groups = rating_groups_dict
+        self._policy_view = policy_view
 
     def get_request_args(self, stream_name: str) -> Any:
         return None
@@ -277,7 +331,11 @@ class RatingGroupsStreamerCallback(StreamerClient.Callback):
         resync: bool,
     ):
         logging.info('Processing %d rating group updates', len(updates))
+        rating_groups = {}
         for update in updates:
             rg = RatingGroup()
             rg.ParseFromString(update.value)
-            self._rating_groups[update.key] = rg
+            rating_groups[update.key] = rg
+        self._rating_groups.bulk_set(rating_groups)
+        if self._policy_view is not None:
+            self._policy_view.refresh_rating_groups()
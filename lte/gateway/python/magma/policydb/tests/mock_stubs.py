@@ -20,6 +20,20 @@ from lte.protos.session_manager_pb2 import (
 from orc8r.protos.common_pb2 import Void
 
 
+class MockRedisHashDict(dict):
+    """
+    This Mock RedisHashDict keeps its items in memory
+    """
+
+    def bulk_set(self, mapping, delete_keys=()):
+        self.update(mapping)
+        for key in delete_keys:
+            del self[key]
+
+    def items_snapshot(self):
+        return dict(self)
+
+
 class MockLocalSessionManagerStub:
     """
     This Mock LocalSessionManagerStub will always respond with a Void
@@ -0,0 +1,146 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+import unittest
+
+import fakeredis
+from lte.protos.policydb_pb2 import (
+    ApnPolicySet,
+    ChargingRuleNameSet,
+    RatingGroup,
+    SubscriberPolicySet,
+)
+from magma.policydb.policy_view import SessionPolicyView
+from magma.policydb.rating_group_store import RatingGroupsDict
+from magma.policydb.rule_store import PolicyRuleDict
+from magma.policydb.streamer_callback import (
+    BaseNamesStreamerCallback,
+    RatingGroupsStreamerCallback,
+)
+from orc8r.protos.streamer_pb2 import DataUpdate
+
+# pylint: disable=protected-access
+
+
+class SessionPolicyViewTest(unittest.TestCase):
+    def setUp(self):
+        self.rating_groups_by_id = {
+            1: RatingGroup(id=1, limit_type=RatingGroup.INFINITE_UNMETERED),
+            3: RatingGroup(id=3, limit_type=RatingGroup.FINITE),
+        }
+        self.basenames_dict = {
+            'bn1': ChargingRuleNameSet(RuleNames=['p5']),
+        }
+        self.apn_rules_by_sid = {
+            "IMSI1234": SubscriberPolicySet(
+                global_base_names=["bn1"],
+                rules_per_apn=[
+                    ApnPolicySet(apn="apn1", assigned_policies=["redirect"]),
+                ],
+            ),
+        }
+        self.view = SessionPolicyView(
+            self.rating_groups_by_id,
+            self.basenames_dict,
+            self.apn_rules_by_sid,
+        )
+
+    def tearDown(self):
+        self.view.stop_update_listener()
+
+    def test_snapshot(self):
+        """ The view doesn't read the dicts until it is refreshed """
+        self.rating_groups_by_id[2] = RatingGroup(
+            id=2, limit_type=RatingGroup.INFINITE_METERED,
+        )
+        self.assertEqual(self.view.get_charging_keys(), ((1,), ()))
+        self.view.refresh_rating_groups()
+        self.assertEqual(self.view.get_charging_keys(), ((1,), (2,)))
+
+        self.assertEqual(self.view.get_basename_rule_ids('bn1'), ('p5',))
+        self.assertEqual(self.view.get_basename_rule_ids('bn2'), ())
+        self.assertEqual(
+            self.view.get_apn_policies("IMSI1234"),
+            self.apn_rules_by_sid["IMSI1234"],
+        )
+        self.assertIsNone(self.view.get_apn_policies("IMSI2345"))
+
+    def test_update_apn_rules(self):
+        policies = SubscriberPolicySet(global_policies=["p6"])
+        self.view.update_apn_rules({"IMSI2345": policies})
+        self.assertEqual(self.view.get_apn_policies("IMSI2345"), policies)
+        self.assertEqual(
+            self.view.get_apn_policies("IMSI1234"),
+            self.apn_rules_by_sid["IMSI1234"],
+        )
+
+    def test_streamer_callbacks(self):
+        """ The streamer callbacks refresh the view after their updates """
+        rating_group = RatingGroup(
+            id=2, limit_type=RatingGroup.INFINITE_METERED,
+        )
+        basename = ChargingRuleNameSet(RuleNames=['p6', 'p7'])
+
+        class _Dict(dict):
+            def bulk_set(self, mapping):
+                self.update(mapping)
+
+        rating_groups_by_id = _Dict(self.rating_groups_by_id)
+        basenames_dict = _Dict(self.basenames_dict)
+        view = SessionPolicyView(
+            rating_groups_by_id, basenames_dict, self.apn_rules_by_sid,
+        )
+        RatingGroupsStreamerCallback(rating_groups_by_id, view).process_update(
+            'rating_groups',
+            [DataUpdate(key='2', value=rating_group.SerializeToString())],
+            False,
+        )
+        self.assertEqual(view.get_charging_keys(), ((1,), (2,)))
+        BaseNamesStreamerCallback(basenames_dict, view).process_update(
+            'base_names',
+            [DataUpdate(key='bn2', value=basename.SerializeToString())],
+            False,
+        )
+        self.assertEqual(view.get_basename_rule_ids('bn2'), ('p6', 'p7'))
+
+    def test_update_listener(self):
+        """ The update notifications refresh the view """
+        client = fakeredis.FakeStrictRedis()
+        self.view.start_update_listener(client)
+        self.assertTrue(self.view._listener_ready.wait(5))
+
+        self.rating_groups_by_id[2] = RatingGroup(
+            id=2, limit_type=RatingGroup.INFINITE_METERED,
+        )
+        client.publish(RatingGroupsDict._NOTIFY_CHANNEL, "Stream Update")
+        self._wait_for(
+            lambda: self.view.get_charging_keys() == ((1,), (2,)),
+        )
+
+        # A policy resync refreshes the whole view
+        del self.apn_rules_by_sid["IMSI1234"]
+        client.publish(PolicyRuleDict._NOTIFY_CHANNEL, "Stream Update")
+        self._wait_for(
+            lambda: self.view.get_apn_policies("IMSI1234") is None,
+        )
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -31,6 +31,7 @@ from lte.protos.session_manager_pb2 import (
     UpdateSessionRequest,
 )
 from lte.protos.subscriberdb_pb2 import SubscriberID
+from magma.policydb.policy_view import SessionPolicyView
 from magma.policydb.servicers.session_servicer import SessionRpcServicer
 
 CSR_STATIC_RULES = '[rule_id: "redirect"]'
@@ -107,9 +108,11 @@ class SessionRpcServicerTest(unittest.TestCase):
         }
         self.servicer = SessionRpcServicer(
             self._get_mconfig(),
-            rating_groups_by_id,
-            basenames_dict,
-            apn_rules_by_sid,
+            SessionPolicyView(
+                rating_groups_by_id,
+                basenames_dict,
+                apn_rules_by_sid,
+            ),
         )
 
     def _get_mconfig(self) -> mconfigs_pb2.PolicyDB:
@@ -12,9 +12,11 @@ limitations under the License.
 """
 
 import unittest
+from concurrent.futures import Future
 from typing import Callable, List
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+import fakeredis
 from lte.protos.policydb_pb2 import (
     ApnPolicySet,
     ChargingRuleNameSet,
@@ -30,18 +32,28 @@ from lte.protos.session_manager_pb2 import (
     SessionRules,
     StaticRuleInstall,
 )
-from magma.policydb.streamer_callback import ApnRuleMappingsStreamerCallback
-from magma.policydb.tests.mock_stubs import MockLocalSessionManagerStub
+from magma.policydb.apn_rule_map_store import ApnRuleAssignmentsDict
+from magma.policydb.rule_store import PolicyRuleDict
+from magma.policydb.streamer_callback import (
+    ApnRuleMappingsStreamerCallback,
+    PolicyDBStreamerCallback,
+)
+from magma.policydb.tests.mock_stubs import (
+    MockLocalSessionManagerStub,
+    MockRedisHashDict,
+)
 from orc8r.protos.common_pb2 import Void
 from orc8r.protos.streamer_pb2 import DataUpdate
 
 
 def get_SetSessionRules_side_effect(
     called_with: List[SessionRules],
-) -> Callable[[SessionRules, float], Void]:
-    def side_effect(session_rules: SessionRules, timeout: float) -> Void:
+) -> Callable[[SessionRules, float], Future]:
+    def side_effect(session_rules: SessionRules, timeout: float) -> Future:
         called_with.append(session_rules)
-        return Void()
+        future = Future()
+        future.set_result(Void())
+        return future
     return side_effect
 
 
@@ -126,7 +138,7 @@ class ApnRuleMappingsStreamerCallbackTest(unittest.TestCase):
         )
 
         # Setup the test
-        apn_rules_dict = {}
+        apn_rules_dict = MockRedisHashDict()
         basenames_dict = {
             'bn1': ChargingRuleNameSet(RuleNames=['p5']),
             'bn2': ChargingRuleNameSet(RuleNames=['p6']),
@@ -135,7 +147,8 @@ class ApnRuleMappingsStreamerCallbackTest(unittest.TestCase):
 
         stub_call_args = []  # type: List[SessionRules]
         side_effect = get_SetSessionRules_side_effect(stub_call_args)
-        stub.SetSessionRules = Mock(side_effect=side_effect)
+        stub.SetSessionRules = Mock()
+        stub.SetSessionRules.future.side_effect = side_effect
 
         callback = ApnRuleMappingsStreamerCallback(
             stub,
@@ -284,3 +297,156 @@ class ApnRuleMappingsStreamerCallbackTest(unittest.TestCase):
             called_with, expected_2.SerializeToString(),
             'SetSessionRules call has incorrect arguments',
         )
+
+    def test_Resync(self):
+        """
+        Test that a resync only applies the subscribers which changed, and
+        that the rules of a failed SetSessionRules call are sent again.
+        """
+        apn_rules_dict = MockRedisHashDict()
+        stub = MockLocalSessionManagerStub()
+        stub_call_args = []  # type: List[SessionRules]
+        side_effect = get_SetSessionRules_side_effect(stub_call_args)
+        stub.SetSessionRules = Mock()
+        stub.SetSessionRules.future.side_effect = side_effect
+        callback = ApnRuleMappingsStreamerCallback(stub, {}, apn_rules_dict)
+
+        def _update(imsi, policy_id):
+            return DataUpdate(
+                key=imsi,
+                value=SubscriberPolicySet(
+                    global_policies=[policy_id],
+                ).SerializeToString(),
+            )
+
+        updates = [_update("imsi_1", "p1"), _update("imsi_2", "p2")]
+        callback.process_update("stream", updates, True)
+        self.assertEqual(len(stub_call_args), 1)
+        self.assertEqual(set(apn_rules_dict), {"imsi_1", "imsi_2"})
+
+        # Nothing changed
+        apn_rules_dict.bulk_set = Mock()
+        callback.process_update("stream", updates, True)
+        self.assertEqual(len(stub_call_args), 1)
+        apn_rules_dict.bulk_set.assert_not_called()
+        del apn_rules_dict.bulk_set
+
+        # imsi_2 is deleted, and the rules of imsi_1 fail to be applied
+        failed = Future()
+        failed.set_exception(RuntimeError("sessiond is down"))
+        stub.SetSessionRules.future.side_effect = None
+        stub.SetSessionRules.future.return_value = failed
+        updates = [_update("imsi_1", "p3")]
+        callback.process_update("stream", updates, True)
+        self.assertEqual(set(apn_rules_dict), {"imsi_1"})
+        self.assertEqual(
+            apn_rules_dict["imsi_1"].global_policies, ["p3"],
+        )
+
+        # so they are sent again on the next resync
+        stub.SetSessionRules.future.side_effect = side_effect
+        callback.process_update("stream", updates, True)
+        self.assertEqual(len(stub_call_args), 2)
+        self.assertEqual(
+            [rules.imsi for rules in stub_call_args[1].rules_per_subscriber],
+            ["imsi_1"],
+        )
+
+    @patch('magma.policydb.apn_rule_map_store.get_default_client')
+    def test_ResyncAfterRestart(self, get_client_mock):
+        """
+        Test that the first resync after a restart doesn't apply the
+        subscribers whose mappings are already in Redis
+        """
+        get_client_mock.return_value = fakeredis.FakeStrictRedis()
+        stub = MockLocalSessionManagerStub()
+        stub_call_args = []  # type: List[SessionRules]
+        stub.SetSessionRules = Mock()
+        stub.SetSessionRules.future.side_effect = \
+            get_SetSessionRules_side_effect(stub_call_args)
+        updates = [
+            DataUpdate(
+                key=imsi,
+                value=SubscriberPolicySet(
+                    global_policies=[policy_id],
+                ).SerializeToString(),
+            ) for imsi, policy_id in (("imsi_1", "p1"), ("imsi_2", "p2"))
+        ]
+        ApnRuleMappingsStreamerCallback(
+            stub, {}, ApnRuleAssignmentsDict(),
+        ).process_update("stream", updates, True)
+        self.assertEqual(len(stub_call_args), 1)
+
+        # policydb restarts
+        apn_rules_dict = ApnRuleAssignmentsDict(clear_data=False)
+        callback = ApnRuleMappingsStreamerCallback(stub, {}, apn_rules_dict)
+        callback.process_update("stream", updates, True)
+        self.assertEqual(len(stub_call_args), 1)
+        self.assertEqual(apn_rules_dict.get_version("imsi_1"), 1)
+
+        # imsi_2 changed while policydb was down
+        updates[1] = DataUpdate(
+            key="imsi_2",
+            value=SubscriberPolicySet(
+                global_policies=["p3"],
+            ).SerializeToString(),
+        )
+        callback = ApnRuleMappingsStreamerCallback(stub, {}, apn_rules_dict)
+        callback.process_update("stream", updates, True)
+        self.assertEqual(len(stub_call_args), 2)
+        self.assertEqual(
+            [rules.imsi for rules in stub_call_args[1].rules_per_subscriber],
+            ["imsi_2"],
+        )
+
+
+class PolicyDBStreamerCallbackTest(unittest.TestCase):
+    def setUp(self):
+        self._client = fakeredis.FakeStrictRedis()
+        patcher = patch(
+            'magma.policydb.rule_store.get_default_client',
+            return_value=self._client,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_Resync(self):
+        """
+        Test that a resync only writes the policies which changed
+        """
+        policy_dict = PolicyRuleDict()
+        policy_dict['stale'] = PolicyRule(id='stale')
+        callback = PolicyDBStreamerCallback()
+        pubsub = self._client.pubsub()
+        pubsub.subscribe(
+            PolicyRuleDict._NOTIFY_CHANNEL,  # pylint: disable=protected-access
+        )
+        self.assertEqual(pubsub.get_message(timeout=1)['type'], 'subscribe')
+
+        def _update(policy_id, priority):
+            return DataUpdate(
+                key=policy_id,
+                value=PolicyRule(
+                    id=policy_id, priority=priority,
+                ).SerializeToString(),
+            )
+
+        # The policies left from before a restart are removed
+        callback.process_update(
+            "policydb", [_update('p1', 1), _update('p2', 1)], True,
+        )
+        self.assertEqual(set(policy_dict.keys()), {'p1', 'p2'})
+        self.assertIsNotNone(pubsub.get_message(timeout=1))
+
+        # Nothing changed
+        callback.process_update(
+            "policydb", [_update('p1', 1), _update('p2', 1)], True,
+        )
+        self.assertIsNone(pubsub.get_message(timeout=0.1))
+        self.assertEqual(policy_dict.get_version('p1'), 1)
+
+        callback.process_update("policydb", [_update('p1', 2)], True)
+        self.assertEqual(set(policy_dict.keys()), {'p1'})
+        self.assertEqual(policy_dict['p1'].priority, 2)
+        self.assertEqual(policy_dict.get_version('p1'), 2)
+        self.assertIsNotNone(pubsub.get_message(timeout=1))
@@ -0,0 +1,177 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from magma.subscriberdb.crypto.milenage import MilenageOutput
+from magma.subscriberdb.metrics import (
+    AUTH_VECTOR_POOL_HIT_TOTAL,
+    AUTH_VECTOR_POOL_MISS_TOTAL,
+)
+
+DEFAULT_MAX_SUBSCRIBERS = 10000
+DEFAULT_NUM_WORKERS = 2
+
+# (imsi, key, opc, count) => count outputs with newly reserved SQNs
+GenerateOutputs = Callable[[str, bytes, bytes, int], List[MilenageOutput]]
+
+
+class _PoolEntry(object):
+    """ Pooled outputs of a subscriber, in increasing SQN order """
+
+    __slots__ = ('key', 'opc', 'outputs', 'served_sqn', 'refilling')
+
+    def __init__(self, key: bytes, opc: bytes):
+        self.key = key
+        self.opc = opc
+        self.outputs = deque()
+        self.served_sqn = -1
+        self.refilling = False
+
+
+class AuthVectorPool(object):
+    """
+    Pool of Milenage outputs generated ahead of the auth requests of the
+    recently authenticated subscribers, so that an attach storm is served
+    without running Milenage or writing the store on the request path.
+
+    The SQNs of the pooled outputs are reserved in the store when they are
+    generated, and the outputs of a subscriber are served in increasing SQN
+    order: an output whose SQN is lower than one already served is dropped.
+    The outputs of a subscriber are dropped when its key or OPc changes, and
+    must be invalidated when its SQN is resynchronized.
+
+    The pool is bounded to size outputs for max_subscribers subscribers, the
+    least recently authenticated ones being evicted. Consumed outputs are
+    generated again by num_workers background threads.
+    """
+
+    def __init__(
+        self, generate: GenerateOutputs, size: int,
+        max_subscribers: int = DEFAULT_MAX_SUBSCRIBERS,
+        num_workers: int = DEFAULT_NUM_WORKERS,
+    ):
+        self._generate = generate
+        self._size = size
+        self._max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_workers,
+            thread_name_prefix='auth_vector_pool',
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_outputs(
+        self, imsi: str, key: bytes, opc: bytes, count: int,
+    ) -> List[MilenageOutput]:
+        """
+        Return count outputs for the subscriber, taken from the pool or
+        generated if there aren't enough pooled ones, and schedule the
+        refill of its pool.
+        """
+        with self._lock:
+            entry = self._get_entry(imsi, key, opc)
+            outputs = []
+            while entry.outputs and len(outputs) < count:
+                outputs.append(entry.outputs.popleft())
+
+        if outputs:
+            AUTH_VECTOR_POOL_HIT_TOTAL.inc(len(outputs))
+        missing = count - len(outputs)
+        if missing:
+            AUTH_VECTOR_POOL_MISS_TOTAL.inc(missing)
+            # Reserved after the pooled ones, so with higher SQNs
+            outputs.extend(self._generate(imsi, key, opc, missing))
+
+        with self._lock:
+            entry.served_sqn = max(entry.served_sqn, outputs[-1].sqn)
+            self._drop_served(entry)
+            if self._entries.get(imsi) is entry:
+                self._schedule_refill(imsi, entry)
+        return outputs
+
+    def invalidate(self, imsi: str) -> None:
+        """
+        Drop the pooled outputs of a subscriber, e.g. after its SQN was
+        resynchronized. Outputs being generated are dropped as well.
+        """
+        with self._lock:
+            self._entries.pop(imsi, None)
+
+    def close(self) -> None:
+        """
+        Stop the refill workers
+        """
+        self._executor.shutdown(wait=False)
+
+    def _get_entry(self, imsi: str, key: bytes, opc: bytes) -> _PoolEntry:
+        """ The lock must be held """
+        entry = self._entries.get(imsi)
+        if entry is not None and (entry.key, entry.opc) == (key, opc):
+            self._entries.move_to_end(imsi)
+            return entry
+        entry = _PoolEntry(key, opc)
+        self._entries[imsi] = entry
+        if len(self._entries) > self._max_subscribers:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _schedule_refill(self, imsi: str, entry: _PoolEntry) -> None:
+        """ The lock must be held """
+        if entry.refilling or len(entry.outputs) >= self._size:
+            return
+        entry.refilling = True
+        self._executor.submit(self._refill, imsi, entry)
+
+    def _refill(self, imsi: str, entry: _PoolEntry) -> None:
+        with self._lock:
+            if self._entries.get(imsi) is not entry:
+                entry.refilling = False
+                return
+            count = self._size - len(entry.outputs)
+        try:
+            outputs = self._generate(imsi, entry.key, entry.opc, count)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.debug("Couldn't refill auth vectors of %s: %s", imsi, e)
+            with self._lock:
+                entry.refilling = False
+                if self._entries.get(imsi) is entry:
+                    del self._entries[imsi]
+            return
+
+        with self._lock:
+            entry.refilling = False
+            # The entry was invalidated or replaced in the meantime
+            if self._entries.get(imsi) is not entry:
+                return
+            entry.outputs.extend(outputs)
+            self._drop_served(entry)
+
+    @staticmethod
+    def _drop_served(entry: _PoolEntry) -> None:
+        """
+        Drop the outputs whose SQN isn't higher than a served one, as the
+        UE would reject them. The lock must be held.
+        """
+        if any(output.sqn <= entry.served_sqn for output in entry.outputs):
+            entry.outputs = deque(
+                output for output in entry.outputs
+                if output.sqn > entry.served_sqn
+            )
@@ -39,7 +39,12 @@ from magma.subscriberdb.metrics import (
     SUBSCRIBER_SYNC_SUCCESS_TOTAL,
 )
 from magma.subscriberdb.store.sqlite import SqliteStore
-from orc8r.protos.digest_pb2 import Changeset, Digest, LeafDigest
+from orc8r.protos.digest_pb2 import (
+    Changeset,
+    Digest,
+    DigestTree,
+    LeafDigest,
+)
 
 CloudSubscribersInfo = NamedTuple(
     'CloudSubscribersInfo', [
@@ -133,6 +138,12 @@ class SubscriberDBCloudClient(SDWatchdogTask):
             return
 
         # failure between the calls
+        # Writing the whole store is too slow to be done on the event loop
+        await self._loop.run_in_executor(
+            None, self._resync_store, subscribers_info,
+        )
+
+    def _resync_store(self, subscribers_info: CloudSubscribersInfo) -> None:
         self._process_subscribers(subscribers_info.subscribers)
         self._update_root_digest(subscribers_info.root_digest)
         self._update_leaf_digests(subscribers_info.leaf_digests)
@@ -189,19 +200,22 @@ class SubscriberDBCloudClient(SDWatchdogTask):
             return True
 
         if not res.resync:
-            # TODO(hcgatewood): switch to bulk editing subscriber data rows
             changeset = self._process_changeset(res.changeset)
-            for subscriber_data in changeset.to_renew:
-                self._store.upsert_subscriber(subscriber_data)
-            for sid in changeset.deleted:
-                self._store.delete_subscriber(sid)
+            await self._loop.run_in_executor(
+                None, self._apply_changeset, changeset, res.digests,
+            )
             self._detach_subscribers_by_ids(changeset.deleted)
 
-            self._update_root_digest(res.digests.root_digest)
-            self._update_leaf_digests(res.digests.leaf_digests)
-
         return res.resync
 
+    def _apply_changeset(
+        self, changeset: ProcessedChangeset, digests: DigestTree,
+    ) -> None:
+        self._store.upsert_subscribers(changeset.to_renew)
+        self._store.delete_subscribers(changeset.deleted)
+        self._update_root_digest(digests.root_digest)
+        self._update_leaf_digests(digests.leaf_digests)
+
     async def _get_all_subscribers(self) -> Optional[CloudSubscribersInfo]:
         subscriberdb_cloud_client = self._grpc_client_manager.get_client()
         subscribers = []
@@ -61,6 +61,23 @@ class BaseLTEAuthAlgo(metaclass=abc.ABCMeta):
         """
         pass
 
+    def generate_eutran_vectors(self, key, opc, sqns, plmn):
+        """
+        Generate an E-EUTRAN key vector for each of the sequence numbers.
+        Algos can override this to share work between the vectors.
+        Args:
+            key (bytes): 128 bit subscriber key
+            opc (bytes): 128 bit operator variant algorithm configuration field
+            sqns (list of int): 48 bit sequence numbers
+            plmn (bytes): 24 bit network identifer
+        Returns:
+            list of (rand, xres, autn, kasme) vectors, as returned by
+            generate_eutran_vector
+        """
+        return [
+            self.generate_eutran_vector(key, opc, sqn, plmn) for sqn in sqns
+        ]
+
     @abc.abstractmethod
     def generate_m5gran_vector(
         self, key: bytes, opc: bytes, sqn: int,
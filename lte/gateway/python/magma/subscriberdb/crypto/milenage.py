@@ -12,11 +12,26 @@ limitations under the License.
 """
 
 import hmac
+from typing import NamedTuple
 
 from Crypto.Cipher import AES
 from Crypto.Random import random
 from magma.subscriberdb.crypto.lte import BaseLTEAuthAlgo, FiveGRanAuthVector
 
+# Outputs of the Milenage functions for a RAND and SQN, from which the
+# E-UTRAN and NGRAN vectors of any serving network are derived
+MilenageOutput = NamedTuple(
+    'MilenageOutput', [
+        ('sqn', int),
+        ('rand', bytes),
+        ('xres', bytes),
+        ('autn', bytes),
+        ('ak', bytes),
+        ('ck', bytes),
+        ('ik', bytes),
+    ],
+)
+
 
 class Milenage(BaseLTEAuthAlgo):
     """
@@ -41,17 +56,94 @@ class Milenage(BaseLTEAuthAlgo):
             autn (bytes): 128 bit authentication token
             kasme (bytes): 256 bit base network authentication code
         """
-        sqn_bytes = bytearray.fromhex('{:012x}'.format(sqn))
-        rand = Milenage.generate_rand()
+        return self.generate_eutran_vectors(key, opc, [sqn], plmn)[0]
+
+    def generate_eutran_vectors(self, key, opc, sqns, plmn):
+        """
+        Generate an E-EUTRAN key vector for each of the sequence numbers.
+
+        The AES key schedule of the subscriber key is computed once for all
+        the vectors, and TEMP = E_K(RAND XOR OP_C) once per vector for all
+        the f1-f5 functions.
+
+        Args:
+            key (bytes): 128 bit subscriber key
+            opc (bytes): 128 bit operator variant algorithm configuration field
+            sqns (list of int): 48 bit sequence numbers
+            plmn (bytes): 24 bit network identifer
+        Returns:
+            list of (rand, xres, autn, kasme) vectors, as returned by
+            generate_eutran_vector
+        """
+        return [
+            self.eutran_vector(output, plmn)
+            for output in self.generate_outputs(key, opc, sqns)
+        ]
+
+    def generate_outputs(self, key, opc, sqns):
+        """
+        Run the Milenage functions for a new RAND and each of the sequence
+        numbers. These outputs don't depend on the serving network, so they
+        can be computed ahead of the auth requests.
+
+        The AES key schedule of the subscriber key is computed once for all
+        the outputs, and TEMP = E_K(RAND XOR OP_C) once per output for all
+        the f1-f5 functions.
+
+        Args:
+            key (bytes): 128 bit subscriber key
+            opc (bytes): 128 bit operator variant algorithm configuration field
+            sqns (list of int): 48 bit sequence numbers
+        Returns:
+            list of MilenageOutput
+        """
+        cipher = MilenageCipher(key, opc)
+        outputs = []
+        for sqn in sqns:
+            sqn_bytes = sqn.to_bytes(6, 'big')
+            rand = Milenage.generate_rand()
 
-        mac_a, _ = Milenage.f1(key, sqn_bytes, rand, opc, self.amf)
-        xres, ak = Milenage.f2_f5(key, rand, opc)
-        ck = Milenage.f3(key, rand, opc)
-        ik = Milenage.f4(key, rand, opc)
+            temp = cipher.temp(rand)
+            mac_a, _ = cipher.f1(temp, sqn_bytes, self.amf)
+            xres, ak, ck, ik = cipher.f2_f3_f4_f5(temp)
 
-        autn = Milenage.generate_autn(sqn_bytes, ak, mac_a, self.amf)
-        kasme = Milenage.generate_kasme(ck, ik, plmn, sqn_bytes, ak)
-        return rand, xres, autn, kasme
+            autn = Milenage.generate_autn(sqn_bytes, ak, mac_a, self.amf)
+            outputs.append(MilenageOutput(sqn, rand, xres, autn, ak, ck, ik))
+        return outputs
+
+    @classmethod
+    def eutran_vector(cls, output, plmn):
+        """
+        Derive the E-UTRAN key vector of a Milenage output for a network.
+        Args:
+            output (MilenageOutput): output of generate_outputs
+            plmn (bytes): 24 bit network identifer
+        Returns:
+            (rand, xres, autn, kasme), as returned by generate_eutran_vector
+        """
+        sqn_bytes = output.sqn.to_bytes(6, 'big')
+        kasme = cls.generate_kasme(
+            output.ck, output.ik, plmn, sqn_bytes, output.ak,
+        )
+        return output.rand, output.xres, output.autn, kasme
+
+    @classmethod
+    def m5gran_vector(cls, output, snni):
+        """
+        Derive the NGRAN key vector of a Milenage output for a network.
+        Args:
+            output (MilenageOutput): output of generate_outputs
+            snni (bytes): serving network name
+        Returns:
+            FiveGRanAuthVector, as returned by generate_m5gran_vector
+        """
+        ck_ik = output.ck + output.ik
+        xres_star = cls.generate_m5g_xres_star(
+            ck_ik, snni, output.rand, output.xres,
+        )
+        kausf = cls.generate_m5g_kausf(ck_ik, snni, output.autn)
+        kseaf = cls.generate_m5g_kseaf(kausf, snni)
+        return FiveGRanAuthVector(output.rand, xres_star, output.autn, kseaf)
 
     def generate_m5gran_vector(
         self, key: bytes, opc: bytes, sqn: int,
@@ -72,20 +164,8 @@ class Milenage(BaseLTEAuthAlgo):
             FiveGRanAuthVector : NamedTuple
                  Consists of (rand, xres_star, autn, kseaf)
         """
-        sqn_bytes = bytearray.fromhex('{:012x}'.format(sqn))
-        rand = Milenage.generate_rand()
-
-        mac_a, _ = Milenage.f1(key, sqn_bytes, rand, opc, self.amf)
-        xres, ak = Milenage.f2_f5(key, rand, opc)
-        ck = Milenage.f3(key, rand, opc)
-        ik = Milenage.f4(key, rand, opc)
-
-        autn = Milenage.generate_autn(sqn_bytes, ak, mac_a, self.amf)
-        xres_star = Milenage.generate_m5g_xres_star(ck + ik, snni, rand, xres)
-        kausf = Milenage.generate_m5g_kausf(ck + ik, snni, autn)
-        kseaf = Milenage.generate_m5g_kseaf(kausf, snni)
-
-        return FiveGRanAuthVector(rand, xres_star, autn, kseaf)
+        output = self.generate_outputs(key, opc, [sqn])[0]
+        return self.m5gran_vector(output, snni)
 
     def generate_auts(
         self, key: bytes, opc: bytes, rand: bytes,
@@ -428,6 +508,99 @@ class Milenage(BaseLTEAuthAlgo):
         return cls.KDF(K, S)
 
 
+class MilenageCipher(object):
+    """
+    The Milenage functions of a subscriber, sharing the AES key schedule of
+    the subscriber key and the TEMP block of a RAND between them.
+    (3GPP TS 35.206 4.1)
+    """
+
+    # Constants and rotations from 3GPP 35.206 4.1, for f2 to f5
+    C2, R2 = 1, 0
+    C3, R3 = 2, 4
+    C4, R4 = 4, 8
+    C5, R5 = 8, 12
+
+    def __init__(self, key, opc):
+        """
+        Args:
+            key (bytes): 128 bit subscriber key
+            opc (bytes): 128 bit computed from OP and subscriber key
+        """
+        # A single block encrypted in CBC mode with a null IV, as done
+        # by Milenage.encrypt, is its ECB encryption
+        self._aes = AES.new(bytes(key), AES.MODE_ECB)
+        self._opc = int.from_bytes(opc, 'big')
+
+    def temp(self, rand):
+        """
+        TEMP = E_K(RAND XOR OP_C), as an integer
+        """
+        return self._encrypt(int.from_bytes(rand, 'big') ^ self._opc)
+
+    def f1(self, temp, sqn, amf):
+        """
+        f1 and f1* of the TEMP of a RAND.
+
+        Args:
+            temp (int): TEMP of the RAND
+            sqn (bytes): 48 bit sequence number
+            amf (bytes): 16 bit authentication management field
+        Returns:
+            (64 bit Network auth code, 64 bit Resynch auth code)
+        """
+        # IN1 = SQN || AMF || SQN || AMF
+        in1 = int.from_bytes((sqn[0:6] + amf[0:2]) * 2, 'big')
+        # OUT1 = E_K(TEMP XOR rotate(IN1 XOR OP_C, r1) XOR c1) XOR OP_C
+        # with r1 = 8 bytes and c1 = 0
+        out1 = self._encrypt(temp ^ _rotate_int(in1 ^ self._opc, 8)) \
+            ^ self._opc
+        out1 = out1.to_bytes(16, 'big')
+        return out1[:8], out1[8:]
+
+    def f2_f3_f4_f5(self, temp):
+        """
+        f2, f3, f4 and f5 of the TEMP of a RAND.
+
+        Args:
+            temp (int): TEMP of the RAND
+        Returns:
+            (xres, ak, ck, ik) = (64 bit response to challenge, 48 bit
+            anonymity key, 128 bit confidentiality key, 128 bit integrity key)
+        """
+        temp_x_opc = temp ^ self._opc
+        out2 = self._out(temp_x_opc, self.C2, self.R2)
+        ck = self._out(temp_x_opc, self.C3, self.R3)
+        ik = self._out(temp_x_opc, self.C4, self.R4)
+        return out2[8:16], out2[0:6], ck, ik
+
+    def f5_star(self, temp):
+        """
+        f5* of the TEMP of a RAND, the 48 bit anonymity key
+        """
+        return self._out(temp ^ self._opc, self.C5, self.R5)[:6]
+
+    def _out(self, temp_x_opc, c, r):
+        # OUTn = E_K(rotate(TEMP XOR OP_C, rn) XOR cn) XOR OP_C
+        out = self._encrypt(_rotate_int(temp_x_opc, r) ^ c) ^ self._opc
+        return out.to_bytes(16, 'big')
+
+    def _encrypt(self, block):
+        return int.from_bytes(
+            self._aes.encrypt(block.to_bytes(16, 'big')), 'big',
+        )
+
+
+def _rotate_int(block, bytes_):
+    """
+    Rotate a 128 bit integer left by a number of bytes, as rotate does
+    """
+    bits = 8 * bytes_
+    if not bits:
+        return block
+    return ((block << bits) | (block >> (128 - bits))) & ((1 << 128) - 1)
+
+
 def xor(s1, s2):
     """
     Exclusive-Or of two byte arrays
@@ -442,7 +615,9 @@ def xor(s1, s2):
     """
     if len(s1) != len(s2):
         raise ValueError('Input not equal length: %d %d' % (len(s1), len(s2)))
-    return bytes(a ^ b for a, b in zip(s1, s2))
+    return (
+        int.from_bytes(s1, 'big') ^ int.from_bytes(s2, 'big')
+    ).to_bytes(len(s1), 'big')
 
 
 def rotate(input_s, bytes_):
@@ -18,6 +18,10 @@ from lte.protos.subscriberdb_pb2_grpc import SubscriberDBCloudStub
 from magma.common.grpc_client_manager import GRPCClientManager
 from magma.common.sentry import sentry_init
 from magma.common.service import MagmaService
+from magma.subscriberdb.auth_vector_pool import (
+    DEFAULT_MAX_SUBSCRIBERS,
+    DEFAULT_NUM_WORKERS,
+)
 from magma.subscriberdb.client import SubscriberDBCloudClient
 from magma.subscriberdb.processor import Processor
 from magma.subscriberdb.protocols.diameter.application import base, s6a
@@ -48,6 +52,7 @@ def main():
     store = SqliteStore(
         service.config.get('db_path'), loop=service.loop,
         sid_digits=service.config.get('sid_last_n'),
+        cache_size=service.config.get('subscriber_cache_size', 0),
     )
 
     # Initialize the processor
@@ -57,6 +62,13 @@ def main():
         service.mconfig.sub_profiles,
         service.mconfig.lte_auth_op,
         service.mconfig.lte_auth_amf,
+        vector_pool_size=service.config.get('auth_vector_pool_size', 0),
+        vector_pool_max_subscribers=service.config.get(
+            'auth_vector_pool_max_subscribers', DEFAULT_MAX_SUBSCRIBERS,
+        ),
+        vector_pool_workers=service.config.get(
+            'auth_vector_pool_workers', DEFAULT_NUM_WORKERS,
+        ),
     )
 
     # Add all servicers to the server
@@ -99,6 +111,10 @@ def main():
             'disabled!',
         )
 
+    s6a_manager = None
+    if not service.config.get('s6a_over_grpc'):
+        s6a_manager = _get_s6a_manager(service, processor)
+
     # Wait until the datastore is populated by addition or resync before
     # listening for clients.
     async def serve():  # noqa: WPS430
@@ -137,7 +153,6 @@ def main():
                 service.config.get('mme_host_name'),
                 service.config.get('mme_host_address'),
             )
-            s6a_manager = _get_s6a_manager(service, processor)
             base_manager.register(s6a_manager)
 
             # Setup the Diameter/s6a MME
@@ -161,6 +176,10 @@ def main():
 
     # Cleanup the service
     service.close()
+    if s6a_manager is not None:
+        s6a_manager.close()
+    processor.close()
+    store.close()
 
 
 def _get_s6a_manager(service, processor):
@@ -170,6 +189,10 @@ def _get_s6a_manager(service, processor):
         service.config.get('mme_host_name'),
         service.config.get('mme_host_address'),
         service.loop,
+        num_workers=service.config.get('s6a_workers', 0),
+        max_pending_requests=service.config.get(
+            's6a_max_pending_requests', s6a.DEFAULT_MAX_PENDING_REQUESTS,
+        ),
     )
 
 
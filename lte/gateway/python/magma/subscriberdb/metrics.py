@@ -26,6 +26,16 @@ S6A_LUR_TOTAL = Counter(
     's6a_location_update',
     'Total S6a location update requests',
 )
+S6A_TOO_BUSY_TOTAL = Counter(
+    's6a_too_busy',
+    'Total S6a requests rejected as too many were pending',
+)
+S6A_REQUEST_LATENCY = Histogram(
+    's6a_request_latency_ms',
+    'Latency of S6a requests from their receipt to their answer '
+    'in milliseconds', ['command'],
+    buckets=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+)
 M5G_AUTH_SUCCESS_TOTAL = Counter(
     'm5g_auth_success',
     'Total successful M5G auth requests',
@@ -72,3 +82,14 @@ SUBSCRIBER_SYNC_FAILURE_TOTAL = Counter(
     'Total number of failed subscriber'
     'syncs with cloud',
 )
+
+AUTH_VECTOR_POOL_HIT_TOTAL = Counter(
+    'auth_vector_pool_hit',
+    'Total auth vectors served from the precomputed pool',
+)
+
+AUTH_VECTOR_POOL_MISS_TOTAL = Counter(
+    'auth_vector_pool_miss',
+    'Total auth vectors generated on the request path '
+    'with the pool enabled',
+)
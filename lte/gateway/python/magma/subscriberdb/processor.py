@@ -21,11 +21,19 @@ from lte.protos.subscriberdb_pb2 import (
 )
 from magma.subscriberdb.sid import SIDUtils
 
+from .auth_vector_pool import (
+    DEFAULT_MAX_SUBSCRIBERS,
+    DEFAULT_NUM_WORKERS,
+    AuthVectorPool,
+)
 from .crypto.gsm import UnsafePreComputedA3A8
 from .crypto.milenage import Milenage
 from .crypto.utils import CryptoError
 from .subscription.utils import ServiceNotActive
 
+# Bound on the number of E-UTRAN vectors generated for a single request
+MAX_LTE_AUTH_VECTORS = 5
+
 
 class GSMProcessor(metaclass=abc.ABCMeta):
     """
@@ -102,6 +110,26 @@ class LTEProcessor(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    def generate_lte_auth_vectors(self, imsi, plmn, num_vectors):
+        """
+        Returns num_vectors E-UTRAN key vectors for the subscriber, as
+        returned by generate_lte_auth_vector, each with the next sequence
+        number.
+        Args:
+            imsi: the subscriber identifier
+            plmn (bytes): 24 bit network identifer
+            num_vectors (int): number of vectors to generate
+        Returns:
+            list of (rand, xres, autn, kasme) vectors
+        Raises:
+            SubscriberNotFoundError if the subscriber is not present
+            CryptoError if the auth tuple couldn't be generated
+        """
+        return [
+            self.generate_lte_auth_vector(imsi, plmn)
+            for _ in range(num_vectors)
+        ]
+
 
 class Processor(GSMProcessor, LTEProcessor):
     """
@@ -117,6 +145,9 @@ class Processor(GSMProcessor, LTEProcessor):
         op=None,
         amf=None,
         sub_network=None,
+        vector_pool_size=0,
+        vector_pool_max_subscribers=DEFAULT_MAX_SUBSCRIBERS,
+        vector_pool_workers=DEFAULT_NUM_WORKERS,
     ):
         """
         Init the Processor with all the components.
@@ -124,6 +155,10 @@ class Processor(GSMProcessor, LTEProcessor):
         We use the UnsafePreComputedA3A8 crypto by default for
         GSM authentication. This requires the auth-tuple to be stored directly
         in the store as the key for the subscriber.
+
+        If vector_pool_size isn't 0, up to vector_pool_size Milenage outputs
+        are generated ahead of the LTE and 5G auth requests of the
+        recently authenticated subscribers.
         """
         self._store = store
         self._op = op
@@ -135,6 +170,21 @@ class Processor(GSMProcessor, LTEProcessor):
             raise ValueError("OP is invalid len=%d value=%s" % (len(op), op))
         if len(amf) != 2:
             raise ValueError("AMF has invalid length len=%d value=%s" % (len(amf), amf))
+        self._vector_pool = None
+        if vector_pool_size:
+            self._vector_pool = AuthVectorPool(
+                self._generate_milenage_outputs,
+                vector_pool_size,
+                vector_pool_max_subscribers,
+                vector_pool_workers,
+            )
+
+    def close(self):
+        """
+        Stop the workers of the auth vector pool, if any
+        """
+        if self._vector_pool is not None:
+            self._vector_pool.close()
 
     def get_sub_profile(self, imsi):
         """
@@ -178,6 +228,14 @@ class Processor(GSMProcessor, LTEProcessor):
         Returns the lte auth vector for the subscriber by querying the store
         for the crypto algo and secret keys.
         """
+        return self.generate_lte_auth_vectors(imsi, plmn, 1)[0]
+
+    def generate_lte_auth_vectors(self, imsi, plmn, num_vectors):
+        """
+        Returns num_vectors lte auth vectors for the subscriber. The store
+        is queried once, and the sequence numbers of all the vectors are
+        reserved at once.
+        """
         sid = SIDUtils.to_str(SubscriberID(id=imsi, type=SubscriberID.IMSI))
         subs = self._store.get_subscriber_data(sid)
 
@@ -200,9 +258,22 @@ class Processor(GSMProcessor, LTEProcessor):
         else:
             opc = subs.lte.auth_opc
 
-        sqn = self.seq_to_sqn(self.get_next_lte_auth_seq(imsi))
+        num_vectors = max(1, min(num_vectors, MAX_LTE_AUTH_VECTORS))
+        if self._vector_pool is not None:
+            outputs = self._vector_pool.get_outputs(
+                imsi, subs.lte.auth_key, opc, num_vectors,
+            )
+            return [Milenage.eutran_vector(output, plmn) for output in outputs]
+
+        first_seq = self._reserve_lte_auth_seqs(imsi, num_vectors)
+        sqns = [
+            self.seq_to_sqn(seq)
+            for seq in range(first_seq, first_seq + num_vectors)
+        ]
         milenage = Milenage(self._amf)
-        return milenage.generate_eutran_vector(subs.lte.auth_key, opc, sqn, plmn)
+        return milenage.generate_eutran_vectors(
+            subs.lte.auth_key, opc, sqns, plmn,
+        )
 
     def resync_lte_auth_seq(self, imsi, rand, auts):
         """
@@ -256,6 +327,13 @@ class Processor(GSMProcessor, LTEProcessor):
         """
         Returns the sequence number for the next auth operation.
         """
+        return self._reserve_lte_auth_seqs(imsi, 1)
+
+    def _reserve_lte_auth_seqs(self, imsi, count):
+        """
+        Returns the first of count sequence numbers reserved for the next
+        auth operations.
+        """
         sid = SIDUtils.to_str(SubscriberID(id=imsi, type=SubscriberID.IMSI))
 
         # Increment the sequence number.
@@ -264,9 +342,20 @@ class Processor(GSMProcessor, LTEProcessor):
         # between USIM and HSS when it happens.
         with self._store.edit_subscriber(sid) as subs:
             seq = subs.state.lte_auth_next_seq
-            subs.state.lte_auth_next_seq += 1
+            subs.state.lte_auth_next_seq += count
         return seq
 
+    def _generate_milenage_outputs(self, imsi, key, opc, count):
+        """
+        Generate the Milenage outputs of count newly reserved sequence
+        numbers, for the auth vector pool.
+        """
+        first_seq = self._reserve_lte_auth_seqs(imsi, count)
+        sqns = [
+            self.seq_to_sqn(seq) for seq in range(first_seq, first_seq + count)
+        ]
+        return Milenage(self._amf).generate_outputs(key, opc, sqns)
+
     def set_next_lte_auth_seq(self, imsi, seq):
         """
         Updates the LTE auth sequence number.
@@ -275,6 +364,9 @@ class Processor(GSMProcessor, LTEProcessor):
 
         with self._store.edit_subscriber(sid) as subs:
             subs.state.lte_auth_next_seq = seq
+        # The pooled vectors were generated with the previous sequence
+        if self._vector_pool is not None:
+            self._vector_pool.invalidate(imsi)
 
     def get_sub_data(self, imsi):
         """
@@ -315,6 +407,12 @@ class Processor(GSMProcessor, LTEProcessor):
         else:
             opc = subs.lte.auth_opc
 
+        if self._vector_pool is not None:
+            output = self._vector_pool.get_outputs(
+                imsi, subs.lte.auth_key, opc, 1,
+            )[0]
+            return Milenage.m5gran_vector(output, snni)
+
         sqn = self.seq_to_sqn(self.get_next_lte_auth_seq(imsi))
         milenage = Milenage(self._amf)
         return milenage.generate_m5gran_vector(subs.lte.auth_key, opc, sqn, snni)
@@ -12,6 +12,9 @@ limitations under the License.
 """
 
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum, unique
 
 from magma.subscriberdb.crypto.utils import CryptoError
@@ -19,6 +22,8 @@ from magma.subscriberdb.metrics import (
     S6A_AUTH_FAILURE_TOTAL,
     S6A_AUTH_SUCCESS_TOTAL,
     S6A_LUR_TOTAL,
+    S6A_REQUEST_LATENCY,
+    S6A_TOO_BUSY_TOTAL,
 )
 from magma.subscriberdb.protocols.diameter import avp, message
 from magma.subscriberdb.store.base import SubscriberNotFoundError
@@ -34,6 +39,23 @@ class S6AApplicationCommands(IntEnum):
     UPDATE_LOCATION = 316
 
 
+DEFAULT_MAX_PENDING_REQUESTS = 1000
+
+
+class _LoopWriter(object):
+    """
+    Writer sending the messages of the worker threads from the event loop,
+    as the transport isn't thread safe
+    """
+
+    def __init__(self, writer, loop):
+        self._writer = writer
+        self._loop = loop
+
+    def send_msg(self, msg):
+        self._loop.call_soon_threadsafe(self._writer.send_msg, msg)
+
+
 class S6AApplication(abc.Application):
     """
     As defined in TS 29.272, the 3GPP S6a/S6d application enables the
@@ -76,7 +98,10 @@ class S6AApplication(abc.Application):
             ],
     }
 
-    def __init__(self, lte_processor, realm, host, host_ip, loop=None):
+    def __init__(
+        self, lte_processor, realm, host, host_ip, loop=None,
+        num_workers=0, max_pending_requests=DEFAULT_MAX_PENDING_REQUESTS,
+    ):
         """Each application has access to a write stream and a collection of
         settings, currently limited to realm and host
 
@@ -85,13 +110,35 @@ class S6AApplication(abc.Application):
             realm: the realm the application should serve
             host: the host name the application should serve
             host_ip: the IP address of the host
+            loop: asyncio loop, required to use workers
+            num_workers: number of worker threads handling the requests
+                off the event loop, 0 handles them on the event loop
+            max_pending_requests: number of requests queued to the workers
+                above which requests are answered with DIAMETER_TOO_BUSY
         """
         super(S6AApplication, self).__init__(realm, host, host_ip, loop)
         self.lte_processor = lte_processor
+        # The requests of a subscriber are always handled by the same single
+        # threaded worker, so in the order they were received
+        self._workers = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='s6a_worker')
+            for _ in range(num_workers)
+        ]
+        self._pending_requests = threading.BoundedSemaphore(
+            max_pending_requests,
+        )
+
+    def set_writer(self, writer):
+        """ Set a writer when a connection is made """
+        if self._workers:
+            writer = _LoopWriter(writer, self._loop)
+        super(S6AApplication, self).set_writer(writer)
 
     def handle_msg(self, state_id, msg):
         """
-        Handle the command of an incoming S6a/S6d request
+        Handle the command of an incoming S6a/S6d request, on a worker if
+        there are workers. The answers are matched to the requests by their
+        Hop-by-Hop identifier, so they may be sent out of order.
 
         Args:
             state_id: the server state identifier
@@ -105,11 +152,67 @@ class S6AApplication(abc.Application):
 
         if msg.header.command_code == \
                 S6AApplicationCommands.AUTHENTICATION_INFORMATION:
-            self._send_auth(state_id, msg)
+            handler = self._send_auth
         elif msg.header.command_code == S6AApplicationCommands.UPDATE_LOCATION:
-            self._send_location_request(state_id, msg)
+            handler = self._send_location_request
         else:
-            logging.error('Unsupported command: %d', msg.command_code)
+            logging.error('Unsupported command: %d', msg.header.command_code)
+            return
+
+        received = time.monotonic()
+        if not self._workers:
+            self._handle_request(handler, state_id, msg, received)
+            return
+
+        if not self._pending_requests.acquire(blocking=False):
+            self._send_too_busy(state_id, msg)
+            return
+        user_name = msg.find_avp(*avp.resolve('User-Name'))
+        imsi = user_name.value if user_name else ''
+        worker = self._workers[hash(imsi) % len(self._workers)]
+        worker.submit(
+            self._handle_pending_request, handler, state_id, msg, received,
+        )
+
+    def close(self):
+        """
+        Stop the workers
+        """
+        for worker in self._workers:
+            worker.shutdown(wait=False)
+
+    def _handle_pending_request(self, handler, state_id, msg, received):
+        try:
+            self._handle_request(handler, state_id, msg, received)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.exception("Failed to handle S6a request: %s", e)
+        finally:
+            self._pending_requests.release()
+
+    @staticmethod
+    def _handle_request(handler, state_id, msg, received):
+        handler(state_id, msg)
+        S6A_REQUEST_LATENCY.labels(
+            command=S6AApplicationCommands(msg.header.command_code).name,
+        ).observe((time.monotonic() - received) * 1000)
+
+    def _send_too_busy(self, state_id, msg):
+        """
+        Answer a request with DIAMETER_TOO_BUSY, a protocol error the peer
+        may retry elsewhere
+        """
+        if not self.validate_message(state_id, msg):
+            return
+        S6A_TOO_BUSY_TOTAL.inc()
+        resp = self._gen_response(
+            state_id, msg, avp.ResultCode.DIAMETER_TOO_BUSY,
+        )
+        resp.header.error = True
+        self.writer.send_msg(resp)
+        logging.warning(
+            "Too many pending S6a requests, rejected command %d",
+            msg.header.command_code,
+        )
 
     def validate_message(self, state_id, msg):
         """
@@ -205,8 +308,12 @@ class S6AApplication(abc.Application):
                 auts = re_sync_info.value[16:]
                 self.lte_processor.resync_lte_auth_seq(imsi, rand, auts)
 
-            rand, xres, autn, kasme = \
-                self.lte_processor.generate_lte_auth_vector(imsi, plmn)
+            num_vectors = request_eutran_info.find_avp(
+                *avp.resolve('Number-Of-Requested-Vectors'),
+            )
+            vectors = self.lte_processor.generate_lte_auth_vectors(
+                imsi, plmn, num_vectors.value if num_vectors else 1,
+            )
 
             auth_info = avp.AVP(
                 'Authentication-Info', [
@@ -217,7 +324,8 @@ class S6AApplication(abc.Application):
                             avp.AVP('AUTN', autn),
                             avp.AVP('KASME', kasme),
                         ],
-                    ),
+                    )
+                    for rand, xres, autn, kasme in vectors
                 ],
             )
 
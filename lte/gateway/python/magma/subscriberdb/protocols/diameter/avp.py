@@ -73,6 +73,24 @@ class BaseAVP(metaclass=abc.ABCMeta):
         self.payload = None
         self.value = value
 
+    @property
+    def payload(self):
+        """
+        The encoded value, which is a view of the message buffer when the
+        AVP was decoded
+        """
+        return self._payload
+
+    @payload.setter
+    def payload(self, payload):
+        """
+        Set the encoded value, clearing the decoded value and encoded length
+        cached for the previous one
+        """
+        self._payload = payload
+        self._value = None
+        self._length = None
+
     @staticmethod
     @abc.abstractmethod
     def encode_value(value):
@@ -104,17 +122,18 @@ class BaseAVP(metaclass=abc.ABCMeta):
     def value(self):
         """
         Decode the payload and return its value. If there is no payload,
-        return None
+        return None. The payload is only decoded on the first access.
 
         Returns:
             decoded value or None if no payload is set
         Raises:
             CodecException: if decode failed
         """
-        if self.payload is None:
+        if self._payload is None:
             return None
-
-        return self.decode_payload(self.payload)
+        if self._value is None:
+            self._value = self.decode_payload(self._payload)
+        return self._value
 
     @value.setter
     def value(self, value):
@@ -173,13 +192,16 @@ class BaseAVP(metaclass=abc.ABCMeta):
     def _encoded_length(self):
         """
         Compute the length field of the AVP based which includes the length of
-        the header, vendor identifier, and payload
+        the header, vendor identifier, and payload. It is cached until the
+        payload or the flags change.
         """
-        length = HEADER_LEN
-        if self.vendor_specific:
-            length += 4
-        length += self._payload_length()
-        return length
+        if self._length is None:
+            length = HEADER_LEN
+            if self.vendor_specific:
+                length += 4
+            length += self._payload_length()
+            self._length = length
+        return self._length
 
     def validate(self):
         """
@@ -255,6 +277,8 @@ class BaseAVP(metaclass=abc.ABCMeta):
             self.flags &= ~mask  # pylint:disable=invalid-unary-operand-type
             if value:
                 self.flags |= mask
+            # The vendor flag changes the encoded length
+            self._length = None
 
         return setter
 
@@ -325,13 +349,16 @@ class Unsigned32AVP(BaseAVP):
 class GroupedAVP(BaseAVP):
     """Implements a Grouped AVP"""
 
+    # The decoded AVPs and their index by (vendor, code)
+    _index = None
+
     @staticmethod
     def decode_payload(payload):
         """Returns a list of AVPs from the decoded payload"""
         avps = []
         offset = 0
         while offset < len(payload):
-            avp = decode(payload[offset:])
+            avp = decode(payload, offset)
             offset += avp.length
             avps.append(avp)
         return avps
@@ -356,10 +383,7 @@ class GroupedAVP(BaseAVP):
         Return:
             an iterator on all AVPs that match
         """
-        return filter(
-            lambda element: element.vendor == vendor
-            and element.code == code, self.value,
-        )
+        return iter(self._get_index().get((vendor, code), ()))
 
     def find_avp(self, vendor, code):
         """
@@ -371,9 +395,20 @@ class GroupedAVP(BaseAVP):
         Return:
             the first AVP that matches or None if no match exists
         """
-        result = list(self.filter_avps(vendor, code))
-        if len(result):
-            return result[0]
+        avps = self._get_index().get((vendor, code))
+        if avps:
+            return avps[0]
+        return None
+
+    def _get_index(self):
+        """
+        Return the index of the AVPs by (vendor, code), which is built once
+        per decoded value
+        """
+        avps = self.value
+        if self._index is None or self._index[0] is not avps:
+            self._index = (avps, index_avps(avps or []))
+        return self._index[1]
 
 
 class AddressAVP(BaseAVP):
@@ -426,6 +461,7 @@ class ResultCode(IntEnum):
     """
     DIAMETER_SUCCESS = 2001
     DIAMETER_COMMAND_UNSUPPORTED = 3001
+    DIAMETER_TOO_BUSY = 3004
     DIAMETER_APPLICATION_UNSUPPORTED = 3007
     DIAMETER_ERROR_USER_UNKNOWN = 5001
     DIAMETER_MISSING_AVP = 5005
@@ -525,50 +561,81 @@ def resolve(name):
     Raises:
         ValueError if not found
     """
-    for vendor in AVPDict.keys():
-        for code in AVPDict[vendor].keys():
-            if AVPDict[vendor][code][0] == name:
-                return vendor, code
-    raise ValueError('AVP not found')
+    try:
+        return AVPNames[name]
+    except KeyError:
+        raise ValueError('AVP not found')
 
 
-def decode(payload):
+def index_avps(avps):
     """
-    Decodes one AVP from the payload
+    Index AVPs by (vendor, code)
+
+    Args:
+        avps: a list of AVP instances
+    Return:
+        a dict of (vendor, code) tuples to the list of matching AVPs, in
+        their original order
+    """
+    index = {}
+    for avp in avps:
+        index.setdefault((avp.vendor, avp.code), []).append(avp)
+    return index
+
+
+def decode_header(payload, begin=0):
+    """
+    Decodes the header of the AVP at an offset of the payload
 
     Args:
         payload: AVP bytestream
+        begin: the offset of the AVP in the payload
     Return:
-        an AVP instance
+        a (code, flags, length, vendor) tuple, where the length is the AVP
+        length field
     Raises:
         exception.CodecException if the AVP length was too short to decode
     """
-
-    if len(payload) < HEADER_LEN:
+    if len(payload) - begin < HEADER_LEN:
         raise exception.CodecException('AVP shorter than header length')
 
-    offset = 0
-
-    # Load the header
-    code, flags_and_length = struct.unpack_from('!II', payload, offset)
+    code, flags_and_length = struct.unpack_from('!II', payload, begin)
     length = flags_and_length & 0x00FFFFFF
     flags = flags_and_length >> 24
-    offset += HEADER_LEN
 
     # Resolve the vendor
     if flags & FLAG_VENDOR != 0:
-        if len(payload) - HEADER_LEN < 4:
+        if len(payload) - begin - HEADER_LEN < 4:
             raise exception.CodecException('AVP too short to decode vendor')
-        vendor = struct.unpack_from('!I', payload, offset)[0]
-        offset += 4
+        vendor = struct.unpack_from('!I', payload, begin + HEADER_LEN)[0]
     else:
         vendor = VendorId.DEFAULT
+    return code, flags, length, vendor
+
+
+def decode(payload, begin=0):
+    """
+    Decodes one AVP from the payload. The AVP payload is a slice of the
+    payload, so decoding from a memoryview doesn't copy it.
+
+    Args:
+        payload: AVP bytestream
+        begin: the offset of the AVP in the payload
+    Return:
+        an AVP instance
+    Raises:
+        exception.CodecException if the AVP length was too short to decode
+    """
+    code, flags, length, vendor = decode_header(payload, begin)
+    offset = begin + HEADER_LEN
+    if flags & FLAG_VENDOR != 0:
+        offset += 4
 
     # Lookup the type of the AVP in our dictionary or use Unknown
     avp = AVP((vendor, code), None, flags=flags)
 
     # Set the payload
-    avp.payload = payload[offset:length]
+    avp.payload = payload[offset:max(offset, begin + length)]
     return avp
 
 
@@ -726,3 +793,10 @@ AVPDict = {
         ),
     },
 }
+
+# The (vendor, code) of the AVPs by name, resolved once from the AVPDict
+AVPNames = {
+    avp_def[0]: (vendor, code)
+    for vendor, avp_defs in AVPDict.items()
+    for code, avp_def in avp_defs.items()
+}
@@ -222,11 +222,21 @@ class Message(object):
     a list of AVPs. This provides utilities for decoding a message payload into its
     constituint components, and encoding it back. There are also convenience methods
     for adding and retreiving AVPs in the instance.
+
+    The AVPs of a decoded message are indexed by (vendor, code) when decoding
+    the message, but each AVP is only decoded when it is retrieved. The
+    encoded length is cached, so AVPs must not be modified once appended.
     """
 
     def __init__(self, header=None):
         self.header = header if header else MessageHeader()
-        self._avps = []
+        # AVP instances, or the offset in the payload of the not yet decoded
+        # AVPs of a decoded message
+        self._entries = []
+        # The indices in the entries by (vendor, code)
+        self._index = {}
+        self._payload = None
+        self._length = None
 
     @classmethod
     def create_response_msg(cls, msg):
@@ -248,6 +258,13 @@ class Message(object):
             )
         )
 
+    @property
+    def _avps(self):
+        """
+        The list of all the AVPs of the message, decoding them if needed
+        """
+        return [self._get_avp(i) for i in range(len(self._entries))]
+
     @property
     def length(self):
         """
@@ -256,10 +273,12 @@ class Message(object):
         Returns:
             the length of the encoded message in bytes
         """
-        length = self.header.length
-        for avp_ in self._avps:
-            length += avp_.length
-        return length
+        if self._length is None:
+            length = self.header.length
+            for avp_ in self._avps:
+                length += avp_.length
+            self._length = length
+        return self._length
 
     def encode(self, buf, begin):
         """
@@ -283,7 +302,8 @@ class Message(object):
         Args:
             avp_: an AVP instance
         """
-        self._avps.append(avp_)
+        self._append_entry(avp_.vendor, avp_.code, avp_)
+        self._length = None
 
     def filter_avps(self, vendor, code):
         """
@@ -295,10 +315,7 @@ class Message(object):
         Return:
             an iterator on all AVPs that match
         """
-        return filter(
-            lambda element: element.vendor == vendor
-            and element.code == code, self._avps,
-        )
+        return (self._get_avp(i) for i in self._index.get((vendor, code), ()))
 
     def find_avp(self, vendor, code):
         """
@@ -310,9 +327,10 @@ class Message(object):
         Return:
             the first AVP that matches or None if no match exists
         """
-        result = list(self.filter_avps(vendor, code))
-        if len(result):
-            return result[0]
+        indices = self._index.get((vendor, code))
+        if indices:
+            return self._get_avp(indices[0])
+        return None
 
     def has_fields(self, fields):
         """
@@ -324,17 +342,35 @@ class Message(object):
             True if the required fields are found in the message
         """
         for name in fields:
-            if not self.find_avp(*avp.resolve(name)):
+            if avp.resolve(name) not in self._index:
                 return False
         return True
 
+    def _append_entry(self, vendor, code, entry):
+        self._index.setdefault((vendor, code), []).append(len(self._entries))
+        self._entries.append(entry)
+
+    def _get_avp(self, i):
+        """
+        Return the i-th AVP, decoding it from the payload on first access
+        """
+        entry = self._entries[i]
+        if isinstance(entry, int):
+            entry = avp.decode(self._payload, entry)
+            self._entries[i] = entry
+        return entry
+
 
-def decode(payload):
+def decode(payload, begin=0):
     """
     Decodes a diameter message from the wire
 
+    The message is copied out of the payload once, and its AVPs are views of
+    this copy, so the payload can be reused once the message is decoded.
+
     Args:
         payload: the byte stream from the wire
+        begin: the offset of the message in the payload
     Return:
         DiameterMessage instance if the decode was successful
     Raises:
@@ -342,23 +378,31 @@ def decode(payload):
         TooShortException if the payload was not long enough to decode. This is
             uniquely raised so that the we can get more data and try again
     """
-    if len(payload) < HEADER_LEN:
+    if len(payload) - begin < HEADER_LEN:
         raise TooShortException()
 
-    length = struct.unpack_from('!I', payload, 0)[0] & 0x00FFFFFF
+    length = struct.unpack_from('!I', payload, begin)[0] & 0x00FFFFFF
 
-    if length % 4 != 0:
+    if length % 4 != 0 or length < HEADER_LEN:
         raise CodecException("Received garbage")
 
-    if len(payload) < length:
+    if len(payload) - begin < length:
         raise TooShortException()
 
-    msg = Message(MessageHeader.decode(payload))
+    msg_bytes = memoryview(bytes(payload[begin:begin + length]))
+    msg = Message(MessageHeader.decode(msg_bytes))
+    msg._payload = msg_bytes  # pylint:disable=protected-access
+    msg._length = length  # pylint:disable=protected-access
 
+    # Only index the AVPs by their header, they are decoded when retrieved
     offset = msg.header.length
     while offset < length:
-        avp_entry = avp.decode(payload[offset:])
-        offset += avp_entry.length
-        msg.append_avp(avp_entry)
+        code, flags, avp_length, vendor = avp.decode_header(msg_bytes, offset)
+        header_length = avp.HEADER_LEN
+        if flags & avp.FLAG_VENDOR != 0:
+            header_length += 4
+        end = min(offset + max(avp_length, header_length), length)
+        msg._append_entry(vendor, code, offset)  # pylint:disable=protected-access
+        offset += (end - offset + 3) & ~3
 
     return msg
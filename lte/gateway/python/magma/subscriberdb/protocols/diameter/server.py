@@ -71,34 +71,30 @@ class S6aServer(asyncio.Protocol):
         logging.debug("Bytes read: %s", data)
         self._readbuf.extend(data)
 
-        # Use memoryview to prevent copies when slicing
-        memview = memoryview(self._readbuf)
-        remain = len(memview)
+        # Messages are decoded in place, and copy their own bytes out of the
+        # read buffer, so that it can be reused for the next reads
         begin = 0  # beginning of message
 
-        while remain >= message.HEADER_LEN:
+        while len(self._readbuf) - begin >= message.HEADER_LEN:
             try:
-                msg = message.decode(memview[begin:])
+                msg = message.decode(self._readbuf, begin)
                 logging.debug("Handling diameter message:\n%s", msg)
                 self._handle_msg(msg.header.application_id, msg)
                 # Get ready for the next message
                 begin += msg.length
-                remain -= msg.length
             except exception.TooShortException:
-                logging.error("Diameter message too short to decode")
-                return
+                logging.debug("Diameter message too short to decode")
+                break
             except Exception as exc:  # pylint: disable=broad-except
                 # Handle any exceptions with message handling, without
                 # affecting other messages/users
                 logging.exception(exc)
 
                 # Clear past garbage
-                length = len(memview[begin:])
-                begin += length
-                remain -= length
+                begin = len(self._readbuf)
 
-        # Get the unparsed bytes
-        self._readbuf = bytearray(memview[begin:])
+        # Drop the parsed bytes
+        del self._readbuf[:begin]
 
     def connection_lost(self, exc):
         """
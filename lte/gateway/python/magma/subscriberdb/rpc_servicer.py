@@ -113,7 +113,9 @@ class SubscriberDBRpcServicer(subscriberdb_pb2_grpc.SubscriberDBServicer):
         )
         sid = SIDUtils.to_str(request)
         try:
-            response = self._store.get_subscriber_data(sid)
+            # The store data can be cached, update a copy of it
+            response = subscriberdb_pb2.SubscriberData()
+            response.CopyFrom(self._store.get_subscriber_data(sid))
             # get_sub_profile converts the imsi id to a string prependend with IMSI string,
             # so strip the IMSI prefix in sid
             imsi = sid[4:]
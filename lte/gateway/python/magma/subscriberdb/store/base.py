@@ -88,6 +88,7 @@ class BaseStore(metaclass=abc.ABCMeta):
     def get_subscriber_data(self, subscriber_id):
         """
         Method that should return the subscriber data for the subscriber.
+        The returned message must not be modified, as stores may cache it.
 
         Args:
             subscriber_id - unique identifier for the subscriber
@@ -114,6 +115,27 @@ class BaseStore(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def upsert_subscribers(self, subscribers):
+        """
+        Method that should upsert all the given subscribers at once.
+
+        Args:
+            subscribers: list of the data of the subscribers to be upserted.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def delete_subscribers(self, subscriber_ids):
+        """
+        Method that should delete all the given subscribers at once, if
+        present.
+
+        Args:
+            subscriber_ids: list of unique identifiers of the subscribers
+        """
+        raise NotImplementedError()
+
     @abc.abstractmethod
     async def on_ready(self):
         """
@@ -14,7 +14,8 @@ limitations under the License.
 import logging
 import sqlite3
 import subprocess
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
 from contextlib import contextmanager
 from datetime import datetime
 from typing import List, NamedTuple
@@ -42,11 +43,16 @@ class SqliteStore(BaseStore):
     """
     A thread-safe sqlite based implementation of the subscriber database.
 
+    Each shard keeps a persistent connection in WAL mode, guarded by a lock,
+    so that the prepared statements are cached by the connection and readers
+    don't block the writer of another process. Decoded subscribers can
+    also be kept in a bounded LRU cache, which is updated on every write.
+
     Processes using this store shouldn't be forked since the sqlite connections
     can't be shared by multiple processes.
     """
 
-    def __init__(self, db_location, loop=None, sid_digits=2):
+    def __init__(self, db_location, loop=None, sid_digits=2, cache_size=0):
         self._sid_digits = sid_digits  # last digits to be included from subscriber id
         self._n_shards = 10**sid_digits
         self._db_locations = self._create_db_locations(db_location, self._n_shards)
@@ -55,6 +61,19 @@ class SqliteStore(BaseStore):
         self._root_digest_db_location = digest_db_info.root_digest_db_location
         self._leaf_digests_db_location = digest_db_info.leaf_digests_db_location
 
+        self._conns = {}
+        self._conn_locks = {
+            db_location: threading.RLock()
+            for db_location in self._db_locations + [
+                self._root_digest_db_location,
+                self._leaf_digests_db_location,
+            ]
+        }
+        # subscriber id => decoded SubscriberData, in LRU order
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
         self._create_store()
         self._on_ready = OnDataReady(loop=loop)
         self._on_digests_ready = OnDigestsReady(loop=loop)
@@ -65,7 +84,7 @@ class SqliteStore(BaseStore):
             db_location = "/var/opt/magma/"
 
         # construct db_location items as:
-        # file:<path>subscriber<shard>.db?cache=shared
+        # file:<path>subscriber<shard>.db
         db_location_list = []
 
         # file name is passed, use it as a base
@@ -75,7 +94,7 @@ class SqliteStore(BaseStore):
                 + db_location
                 + 'subscriber'
                 + str(shard)
-                + ".db?cache=shared",
+                + ".db",
             )
             logging.info("db location: %s", db_location_list[shard])
 
@@ -83,11 +102,11 @@ class SqliteStore(BaseStore):
 
     def _create_digest_db_locations(self, db_location: str) -> DigestDBInfo:
         root_digest_db_location = 'file:' + db_location + \
-            'subscriber-root-digest.db?cache=shared'
+            'subscriber-root-digest.db'
         logging.info("root digest db location: %s", root_digest_db_location)
 
         leaf_digests_db_location = 'file:' + db_location + \
-            'subscriber-leaf-digests.db?cache=shared'
+            'subscriber-leaf-digests.db'
         logging.info(
             "leaf digests db location: %s",
             leaf_digests_db_location,
@@ -99,41 +118,60 @@ class SqliteStore(BaseStore):
         )
         return digest_db_info
 
+    @contextmanager
+    def _connect(self, db_location: str):
+        """
+        Context manager holding the persistent connection of a database.
+        The connection is opened on first use, and used by one thread at a
+        time.
+        """
+        with self._conn_locks[db_location]:
+            conn = self._conns.get(db_location)
+            if conn is None:
+                conn = sqlite3.connect(
+                    db_location, uri=True, check_same_thread=False,
+                )
+                conn.execute("PRAGMA journal_mode=WAL")
+                # In WAL mode, the database can't get corrupted with NORMAL.
+                # A power loss can only roll back the last transactions,
+                # e.g. an auth sequence number, which the UE resyncs.
+                conn.execute("PRAGMA synchronous=NORMAL")
+                self._conns[db_location] = conn
+            yield conn
+
+    def close(self) -> None:
+        """
+        Close the connections of the store
+        """
+        for db_location, lock in self._conn_locks.items():
+            with lock:
+                conn = self._conns.pop(db_location, None)
+                if conn is not None:
+                    conn.close()
+
     def _create_store(self) -> None:
         """
         Create the sqlite table for subscribers and digest if they don't exist
         already.
         """
         for db_location in self._db_locations:
-            conn = sqlite3.connect(db_location, uri=True)
-            try:
-                with conn:
-                    conn.execute(
-                        "CREATE TABLE IF NOT EXISTS subscriberdb"
-                        "(subscriber_id text PRIMARY KEY, data text)",
-                    )
-            finally:
-                conn.close()
-
-        conn = sqlite3.connect(self._root_digest_db_location, uri=True)
-        try:
-            with conn:
+            with self._connect(db_location) as conn, conn:
                 conn.execute(
-                    "CREATE TABLE IF NOT EXISTS subscriber_root_digest"
-                    "(digest string PRIMARY KEY, updated_at timestamp)",
+                    "CREATE TABLE IF NOT EXISTS subscriberdb"
+                    "(subscriber_id text PRIMARY KEY, data text)",
                 )
-        finally:
-            conn.close()
 
-        conn = sqlite3.connect(self._leaf_digests_db_location, uri=True)
-        try:
-            with conn:
-                conn.execute(
-                    "CREATE TABLE IF NOT EXISTS subscriber_leaf_digests"
-                    "(sid string PRIMARY KEY, digest string)",
-                )
-        finally:
-            conn.close()
+        with self._connect(self._root_digest_db_location) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscriber_root_digest"
+                "(digest string PRIMARY KEY, updated_at timestamp)",
+            )
+
+        with self._connect(self._leaf_digests_db_location) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS subscriber_leaf_digests"
+                "(sid string PRIMARY KEY, digest string)",
+            )
 
     def add_subscriber(self, subscriber_data: SubscriberData):
         """
@@ -142,8 +180,7 @@ class SqliteStore(BaseStore):
         sid = SIDUtils.to_str(subscriber_data.sid)
         data_str = subscriber_data.SerializeToString()
         db_location = self._db_locations[self._sid2bucket(sid)]
-        conn = sqlite3.connect(db_location, uri=True)
-        try:
+        with self._connect(db_location) as conn:
             with conn:
                 res = conn.execute(
                     "SELECT data FROM subscriberdb WHERE "
@@ -156,8 +193,7 @@ class SqliteStore(BaseStore):
                     "INSERT INTO subscriberdb(subscriber_id, data) "
                     "VALUES (?, ?)", (sid, data_str),
                 )
-        finally:
-            conn.close()
+            self._cache_pop(sid)
         self._on_ready.add_subscriber(subscriber_data)
 
     @contextmanager
@@ -166,8 +202,7 @@ class SqliteStore(BaseStore):
         Context manager to modify the subscriber data.
         """
         db_location = self._db_locations[self._sid2bucket(subscriber_id)]
-        conn = sqlite3.connect(db_location, uri=True)
-        try:
+        with self._connect(db_location) as conn:
             with conn:
                 res = conn.execute(
                     "SELECT data FROM subscriberdb WHERE " "subscriber_id = ?",
@@ -185,8 +220,7 @@ class SqliteStore(BaseStore):
                     "WHERE subscriber_id = ?",
                     (data_str, subscriber_id),
                 )
-        finally:
-            conn.close()
+            self._cache_put(subscriber_id, subscriber_data)
 
     def upsert_subscriber(self, subscriber_data: SubscriberData) -> None:
         """
@@ -196,8 +230,7 @@ class SqliteStore(BaseStore):
         sid = SIDUtils.to_str(subscriber_data.sid)
         data_str = subscriber_data.SerializeToString()
         db_location = self._db_locations[self._sid2bucket(sid)]
-        conn = sqlite3.connect(db_location, uri=True)
-        try:
+        with self._connect(db_location) as conn:
             with conn:
                 res = conn.execute(
                     "SELECT subscriber_id FROM subscriberdb WHERE "
@@ -214,8 +247,7 @@ class SqliteStore(BaseStore):
                         "UPDATE subscriberdb SET data = ? "
                         "WHERE subscriber_id = ?", (data_str, sid),
                     )
-        finally:
-            conn.close()
+            self._cache_pop(sid)
         self._on_ready.upsert_subscriber(subscriber_data)
 
     def delete_subscriber(self, subscriber_id) -> None:
@@ -229,61 +261,64 @@ class SqliteStore(BaseStore):
         away all digest data.
         """
         db_location = self._db_locations[self._sid2bucket(subscriber_id)]
-        conn = sqlite3.connect(db_location, uri=True)
-        try:
-            self.clear_digests()
+        self.clear_digests()
+        with self._connect(db_location) as conn:
             with conn:
                 conn.execute(
                     "DELETE FROM subscriberdb WHERE subscriber_id = ?",
                     (subscriber_id,),
                 )
-        finally:
-            conn.close()
+            self._cache_pop(subscriber_id)
         self._on_ready.delete_subscriber(subscriber_id)
 
     def delete_all_subscribers(self):
         """
         Remove all the subscribers from the store
         """
+        self.clear_digests()
         for db_location in self._db_locations:
-            conn = sqlite3.connect(db_location, uri=True)
-            try:
-                self.clear_digests()
-                with conn:
-                    conn.execute("DELETE FROM subscriberdb")
-            finally:
-                conn.close()
+            with self._connect(db_location) as conn, conn:
+                conn.execute("DELETE FROM subscriberdb")
+        self._cache_clear()
 
     def get_subscriber_data(self, subscriber_id):
         """
         Return the auth key for the subscriber.
+
+        The returned message may be shared with the subscriber cache, so it
+        must not be modified.
         """
+        cached = self._cache_get(subscriber_id)
+        if cached is not None:
+            return cached
+
         db_location = self._db_locations[self._sid2bucket(subscriber_id)]
-        conn = sqlite3.connect(db_location, uri=True)
-        try:
-            with conn:
-                res = conn.execute(
-                    "SELECT data FROM subscriberdb WHERE "
-                    "subscriber_id = ?", (subscriber_id,),
-                )
-                row = res.fetchone()
-                if not row:
-                    raise SubscriberNotFoundError(subscriber_id)
-        except sqlite3.OperationalError:
-            # Print the process holding the lock
-            db_parts = db_location.split(":", 1)
-            if (len(db_parts) == 2) and db_parts[1]:
-                path_str = db_parts[1].split("?")
-                output = subprocess.Popen(
-                    ["/usr/bin/fuser", "-uv", path_str[0]],
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                )
-                logging.info(output.communicate())
-            raise SubscriberServerTooBusy(subscriber_id)
-        finally:
-            conn.close()
-        subscriber_data = SubscriberData()
-        subscriber_data.ParseFromString(row[0])
+        with self._connect(db_location) as conn:
+            try:
+                with conn:
+                    res = conn.execute(
+                        "SELECT data FROM subscriberdb WHERE "
+                        "subscriber_id = ?", (subscriber_id,),
+                    )
+                    row = res.fetchone()
+                    if not row:
+                        raise SubscriberNotFoundError(subscriber_id)
+            except sqlite3.OperationalError:
+                # Print the process holding the lock
+                db_parts = db_location.split(":", 1)
+                if (len(db_parts) == 2) and db_parts[1]:
+                    path_str = db_parts[1].split("?")
+                    output = subprocess.Popen(
+                        ["/usr/bin/fuser", "-uv", path_str[0]],
+                        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    )
+                    logging.info(output.communicate())
+                raise SubscriberServerTooBusy(subscriber_id)
+            subscriber_data = SubscriberData()
+            subscriber_data.ParseFromString(row[0])
+            # Cached while holding the connection, so that a concurrent
+            # write can't be overwritten by this older data
+            self._cache_put(subscriber_id, subscriber_data)
         return subscriber_data
 
     def list_subscribers(self):
@@ -292,15 +327,11 @@ class SqliteStore(BaseStore):
         """
         sub_list = []
         for db_location in self._db_locations:
-            conn = sqlite3.connect(db_location, uri=True)
-            try:
-                with conn:
-                    res = conn.execute(
-                        "SELECT subscriber_id FROM subscriberdb",
-                    )
-                    sub_list.extend([row[0] for row in res])
-            finally:
-                conn.close()
+            with self._connect(db_location) as conn, conn:
+                res = conn.execute(
+                    "SELECT subscriber_id FROM subscriberdb",
+                )
+                sub_list.extend([row[0] for row in res])
         return sub_list
 
     def update_subscriber(self, subscriber_data):
@@ -319,9 +350,7 @@ class SqliteStore(BaseStore):
         sid = SIDUtils.to_str(subscriber_data.sid)
         data_str = subscriber_data.SerializeToString()
         db_location = self._db_locations[self._sid2bucket(sid)]
-        conn = sqlite3.connect(db_location, uri=True)
-
-        try:
+        with self._connect(db_location) as conn:
             with conn:
                 res = conn.execute(
                     "UPDATE subscriberdb SET data = ? "
@@ -329,8 +358,51 @@ class SqliteStore(BaseStore):
                 )
                 if not res.rowcount:
                     raise SubscriberNotFoundError(sid)
-        finally:
-            conn.close()
+            self._cache_pop(sid)
+
+    def upsert_subscribers(self, subscribers: List[SubscriberData]) -> None:
+        """
+        Bulk version of upsert_subscriber, with one transaction per shard.
+        Rows whose data is unchanged aren't rewritten.
+        """
+        for db_location, subs in self._group_by_shard(subscribers).items():
+            rows = [
+                (SIDUtils.to_str(sub.sid), sub.SerializeToString())
+                for sub in subs
+            ]
+            with self._connect(db_location) as conn:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO subscriberdb(subscriber_id, data) "
+                        "VALUES (?, ?) ON CONFLICT(subscriber_id) DO UPDATE "
+                        "SET data = excluded.data "
+                        "WHERE data != excluded.data", rows,
+                    )
+                self._cache_pop_many(sid for sid, _ in rows)
+        if subscribers:
+            self._on_ready.upsert_subscriber(subscribers)
+
+    def delete_subscribers(self, subscriber_ids: List[str]) -> None:
+        """
+        Bulk version of delete_subscriber, with one transaction per shard.
+        Like delete_subscriber, this clears all digest information.
+        """
+        if not subscriber_ids:
+            return
+        shard_sids = defaultdict(list)
+        for sid in subscriber_ids:
+            shard_sids[self._db_locations[self._sid2bucket(sid)]].append(sid)
+
+        self.clear_digests()
+        for db_location, sids in shard_sids.items():
+            with self._connect(db_location) as conn:
+                with conn:
+                    conn.executemany(
+                        "DELETE FROM subscriberdb WHERE subscriber_id = ?",
+                        [(sid,) for sid in sids],
+                    )
+                self._cache_pop_many(sids)
+        self._on_ready.delete_subscriber(subscriber_ids)
 
     def resync(self, subscribers):
         """
@@ -338,61 +410,69 @@ class SqliteStore(BaseStore):
         subscribers. The resync leaves the current state of subscribers
         intact.
 
+        The store is diffed against the subscribers, so that only the rows
+        which were added, changed or deleted are written, in one
+        transaction per shard.
+
         Args:
             subscribers - list of subscribers to be in the store.
         """
-        bucket_subs = defaultdict(list)
-        for sub in subscribers:
-            sid = SIDUtils.to_str(sub.sid)
-            bucket_subs[self._sid2bucket(sid)].append(sub)
-
-        for i, db_location in enumerate(self._db_locations):
-            conn = sqlite3.connect(db_location, uri=True)
-            try:
+        shard_subs = self._group_by_shard(subscribers)
+        for db_location in self._db_locations:
+            with self._connect(db_location) as conn:
                 with conn:
-                    # Capture the current state of the subscribers
-                    res = conn.execute(
-                        "SELECT subscriber_id, data FROM subscriberdb",
+                    to_write, to_delete = self._diff_shard(
+                        conn, shard_subs.get(db_location, []),
                     )
-                    current_state = {}
-                    for row in res:
-                        sub = SubscriberData()
-                        sub.ParseFromString(row[1])
-                        current_state[row[0]] = sub.state
-
-                    # Clear all subscribers
-                    conn.execute("DELETE FROM subscriberdb")
-
-                    # Add the subscribers with the current state
-                    for sub in bucket_subs[i]:
-                        sid = SIDUtils.to_str(sub.sid)
-                        if sid in current_state:
-                            sub.state.CopyFrom(current_state[sid])
-                        data_str = sub.SerializeToString()
-                        conn.execute(
-                            "INSERT INTO subscriberdb(subscriber_id, data) "
-                            "VALUES (?, ?)", (sid, data_str),
-                        )
-            finally:
-                conn.close()
+                    conn.executemany(
+                        "DELETE FROM subscriberdb WHERE subscriber_id = ?",
+                        [(sid,) for sid in to_delete],
+                    )
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO subscriberdb"
+                        "(subscriber_id, data) VALUES (?, ?)", to_write,
+                    )
+                self._cache_pop_many(sid for sid, _ in to_write)
+                self._cache_pop_many(to_delete)
         self._on_ready.resync(subscribers)
 
+    @staticmethod
+    def _diff_shard(conn, subscribers):
+        """
+        Return the rows of subscribers which differ from the rows of the
+        shard, and the ids of the subscribers to delete from it.
+
+        The current state of existing subscribers is copied to the new
+        data. Unchanged rows are detected by comparing the serialized data.
+        """
+        current = dict(
+            conn.execute("SELECT subscriber_id, data FROM subscriberdb"),
+        )
+        to_write = []
+        for sub in subscribers:
+            sid = SIDUtils.to_str(sub.sid)
+            current_data = current.pop(sid, None)
+            if current_data is not None:
+                current_sub = SubscriberData()
+                current_sub.ParseFromString(current_data)
+                sub.state.CopyFrom(current_sub.state)
+            data_str = sub.SerializeToString()
+            if data_str != current_data:
+                to_write.append((sid, data_str))
+        return to_write, list(current)
+
     def get_current_root_digest(self) -> str:
         """
         Return the current subscriber digest stored in the db.
         """
-        conn = sqlite3.connect(self._root_digest_db_location, uri=True)
-        try:
-            with conn:
-                res = conn.execute(
-                    "SELECT digest, updated_at FROM subscriber_root_digest "
-                    "ORDER BY updated_at DESC",
-                )
-                row = res.fetchone()
-                if not row:
-                    row = ["", None]
-        finally:
-            conn.close()
+        with self._connect(self._root_digest_db_location) as conn, conn:
+            res = conn.execute(
+                "SELECT digest, updated_at FROM subscriber_root_digest "
+                "ORDER BY updated_at DESC",
+            )
+            row = res.fetchone()
+            if not row:
+                row = ["", None]
 
         digest = str(row[0])
         logging.info("get digest stored in gateway: %s", digest)
@@ -402,57 +482,45 @@ class SqliteStore(BaseStore):
         """
         Replace the old digest in the db with the new digest.
         """
-        conn = sqlite3.connect(self._root_digest_db_location, uri=True)
-        try:
-            with conn:
-                conn.execute("DELETE FROM subscriber_root_digest")
+        with self._connect(self._root_digest_db_location) as conn, conn:
+            conn.execute("DELETE FROM subscriber_root_digest")
 
-                conn.execute(
-                    "INSERT INTO subscriber_root_digest(digest, updated_at) "
-                    "VALUES (?, ?)", (new_digest, datetime.now()),
-                )
-        finally:
-            conn.close()
+            conn.execute(
+                "INSERT INTO subscriber_root_digest(digest, updated_at) "
+                "VALUES (?, ?)", (new_digest, datetime.now()),
+            )
 
         logging.info("update root digest stored in gateway: %s", new_digest)
         self._on_digests_ready.update_root_digest(new_digest)
 
     def get_current_leaf_digests(self) -> List[LeafDigest]:
         digests = []
-        conn = sqlite3.connect(self._leaf_digests_db_location, uri=True)
-        try:
-            with conn:
-                res = conn.execute(
-                    "SELECT sid, digest FROM subscriber_leaf_digests ",
-                )
+        with self._connect(self._leaf_digests_db_location) as conn, conn:
+            res = conn.execute(
+                "SELECT sid, digest FROM subscriber_leaf_digests ",
+            )
 
-                for row in res:
-                    digest = LeafDigest(
-                        id=row[0],
-                        digest=Digest(md5_base64_digest=row[1]),
-                    )
-                    digests.append(digest)
-        finally:
-            conn.close()
+            for row in res:
+                digest = LeafDigest(
+                    id=row[0],
+                    digest=Digest(md5_base64_digest=row[1]),
+                )
+                digests.append(digest)
 
         return digests
 
     def update_leaf_digests(self, new_digests: List[LeafDigest]) -> None:
-        conn = sqlite3.connect(self._leaf_digests_db_location, uri=True)
-        try:
-            with conn:
-                conn.execute(
-                    "DELETE FROM subscriber_leaf_digests",
-                )
-                for leaf_digest in new_digests:
-                    sid = leaf_digest.id
-                    digest = leaf_digest.digest.md5_base64_digest
-                    conn.execute(
-                        "INSERT INTO subscriber_leaf_digests(sid, digest)"
-                        "VALUES (?, ?)", (sid, digest),
-                    )
-        finally:
-            conn.close()
+        with self._connect(self._leaf_digests_db_location) as conn, conn:
+            conn.execute(
+                "DELETE FROM subscriber_leaf_digests",
+            )
+            conn.executemany(
+                "INSERT INTO subscriber_leaf_digests(sid, digest)"
+                "VALUES (?, ?)", [
+                    (leaf_digest.id, leaf_digest.digest.md5_base64_digest)
+                    for leaf_digest in new_digests
+                ],
+            )
         self._on_digests_ready.update_leaf_digests(new_digests)
 
     def clear_digests(self):
@@ -468,6 +536,37 @@ class SqliteStore(BaseStore):
     async def on_digests_ready(self):
         return await self._on_digests_ready.event.wait()
 
+    def _cache_get(self, subscriber_id):
+        if not self._cache_size:
+            return None
+        with self._cache_lock:
+            subscriber_data = self._cache.get(subscriber_id)
+            if subscriber_data is not None:
+                self._cache.move_to_end(subscriber_id)
+            return subscriber_data
+
+    def _cache_put(self, subscriber_id, subscriber_data):
+        if not self._cache_size:
+            return
+        with self._cache_lock:
+            self._cache[subscriber_id] = subscriber_data
+            self._cache.move_to_end(subscriber_id)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_pop(self, subscriber_id):
+        with self._cache_lock:
+            self._cache.pop(subscriber_id, None)
+
+    def _cache_pop_many(self, subscriber_ids):
+        with self._cache_lock:
+            for subscriber_id in subscriber_ids:
+                self._cache.pop(subscriber_id, None)
+
+    def _cache_clear(self):
+        with self._cache_lock:
+            self._cache.clear()
+
     def _update_apn(self, apn_config, apn_data):
         """
         Method that populates apn data.
@@ -486,6 +585,16 @@ class SqliteStore(BaseStore):
         apn_config.ambr.max_bandwidth_ul = apn_data.ambr.max_bandwidth_ul
         apn_config.ambr.max_bandwidth_dl = apn_data.ambr.max_bandwidth_dl
 
+    def _group_by_shard(self, subscribers):
+        """
+        Group subscribers by the location of their shard
+        """
+        shard_subs = defaultdict(list)
+        for sub in subscribers:
+            sid = SIDUtils.to_str(sub.sid)
+            shard_subs[self._db_locations[self._sid2bucket(sid)]].append(sub)
+        return shard_subs
+
     def _sid2bucket(self, subscriber_id):
         """
         Maps Subscriber ID to bucket
@@ -0,0 +1,209 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import tempfile
+import unittest
+
+from lte.protos.mconfig.mconfigs_pb2 import SubscriberDB
+from lte.protos.subscriberdb_pb2 import (
+    LTESubscription,
+    SubscriberData,
+    SubscriberState,
+)
+from magma.subscriberdb.auth_vector_pool import AuthVectorPool
+from magma.subscriberdb.crypto.milenage import Milenage, MilenageOutput
+from magma.subscriberdb.processor import Processor
+from magma.subscriberdb.sid import SIDUtils
+from magma.subscriberdb.store.sqlite import SqliteStore
+
+
+class _ManualExecutor(object):
+    """ Executor running the submitted refills when asked to """
+
+    def __init__(self):
+        self.pending = []
+        self.is_shutdown = False
+
+    def submit(self, fn, *args):
+        self.pending.append((fn, args))
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        for fn, args in pending:
+            fn(*args)
+
+    def shutdown(self, wait=True):
+        self.is_shutdown = True
+
+
+class AuthVectorPoolTests(unittest.TestCase):
+    """
+    Tests for the AuthVectorPool
+    """
+
+    def setUp(self):
+        self._next_sqn = 0
+        self._pool = AuthVectorPool(self._generate, size=3, max_subscribers=2)
+        self._executor = _ManualExecutor()
+        self._pool._executor = self._executor  # pylint: disable=protected-access
+
+    def _generate(self, imsi, key, opc, count):
+        outputs = [
+            MilenageOutput(sqn, b'', b'', b'', b'', b'', b'')
+            for sqn in range(self._next_sqn, self._next_sqn + count)
+        ]
+        self._next_sqn += count
+        return outputs
+
+    def _get_sqns(self, imsi, count=1, key=b'k'):
+        outputs = self._pool.get_outputs(imsi, key, b'opc', count)
+        return [output.sqn for output in outputs]
+
+    def test_refill(self):
+        # Generated on the request path, then refilled in the background
+        self.assertEqual(self._get_sqns('1'), [0])
+        self.assertEqual(len(self._executor.pending), 1)
+        self._executor.run_pending()
+
+        self.assertEqual(self._get_sqns('1', 2), [1, 2])
+        # A single refill at a time
+        self.assertEqual(self._get_sqns('1'), [3])
+        self.assertEqual(len(self._executor.pending), 1)
+
+        # Missing outputs are generated after the pooled ones
+        self.assertEqual(self._get_sqns('1'), [4])
+        self._executor.run_pending()
+        self.assertEqual(self._get_sqns('1', 3), [5, 6, 7])
+
+    def test_stale_refill(self):
+        self._get_sqns('1')
+        self._executor.run_pending()
+        self._get_sqns('1', 3)
+
+        # The refill reserves SQNs before the request path does
+        refill_fn, refill_args = self._executor.pending.pop()
+        refill_outputs = self._generate('1', b'k', b'opc', 3)
+        self.assertEqual(self._get_sqns('1'), [7])
+
+        self._pool._generate = lambda *args: refill_outputs  # pylint: disable=protected-access
+        refill_fn(*refill_args)
+        self._pool._generate = self._generate  # pylint: disable=protected-access
+        # SQNs lower than the served one are dropped
+        self.assertEqual(self._get_sqns('1'), [8])
+
+    def test_invalidate(self):
+        self._get_sqns('1')
+        self._executor.run_pending()
+        self._pool.invalidate('1')
+        self.assertEqual(self._get_sqns('1'), [4])
+
+        # Invalidated before refilling
+        self._pool.invalidate('1')
+        self._executor.run_pending()
+        self.assertEqual(self._get_sqns('1'), [5])
+
+        # Key change
+        self._executor.run_pending()
+        self.assertEqual(self._get_sqns('1', key=b'k2'), [9])
+
+    def test_eviction(self):
+        self._get_sqns('1')
+        self._get_sqns('2')
+        self._get_sqns('3')
+        self.assertEqual(len(self._pool), 2)
+        self._executor.run_pending()
+        # The evicted subscriber isn't refilled
+        self.assertEqual(self._next_sqn, 9)
+
+
+class ProcessorVectorPoolTests(unittest.TestCase):
+    """
+    Tests for the Processor with an auth vector pool
+    """
+
+    def setUp(self):
+        self._tmpfile = tempfile.TemporaryDirectory()
+        self._store = SqliteStore(self._tmpfile.name + "/")
+        self._processor = Processor(
+            self._store,
+            SubscriberDB.SubscriptionProfile(),
+            {},
+            16 * b"\x11",
+            b"\x80\x00",
+            vector_pool_size=2,
+        )
+        self._executor = _ManualExecutor()
+        pool = self._processor._vector_pool  # pylint: disable=protected-access
+        pool._executor = self._executor  # pylint: disable=protected-access
+
+        self._key = 16 * b"\x01"
+        self._store.add_subscriber(
+            SubscriberData(
+                sid=SIDUtils.to_pb("IMSI11111"),
+                lte=LTESubscription(
+                    state=LTESubscription.ACTIVE, auth_key=self._key,
+                ),
+                state=SubscriberState(lte_auth_next_seq=1),
+            ),
+        )
+
+    def tearDown(self):
+        self._tmpfile.cleanup()
+
+    def _next_seq(self):
+        return self._store.get_subscriber_data(
+            "IMSI11111",
+        ).state.lte_auth_next_seq
+
+    def test_pooled_vectors(self):
+        plmn = b"\x02\xf8\x59"
+        self._processor.generate_lte_auth_vector("11111", plmn)
+        self.assertEqual(self._next_seq(), 2)
+        self._executor.run_pending()
+        self.assertEqual(self._next_seq(), 4)
+
+        # Served from the pool without writing the store
+        vectors = self._processor.generate_lte_auth_vectors("11111", plmn, 2)
+        self.assertEqual(len(vectors), 2)
+        self.assertEqual(self._next_seq(), 4)
+
+        # The vectors are those of the reserved SQNs
+        opc = Milenage.generate_opc(self._key, 16 * b"\x11")
+        for seq, (rand, xres, autn, _) in zip((2, 3), vectors):
+            sqn = Processor.seq_to_sqn(seq).to_bytes(6, 'big')
+            xres_, ak = Milenage.f2_f5(self._key, rand, opc)
+            mac_a, _ = Milenage.f1(self._key, sqn, rand, opc, b"\x80\x00")
+            self.assertEqual(xres, xres_)
+            self.assertEqual(
+                autn, Milenage.generate_autn(sqn, ak, mac_a, b"\x80\x00"),
+            )
+
+        # 5G vectors are served from the same pool
+        self._executor.run_pending()
+        self._processor.generate_m5g_auth_vector(
+            "11111", b"5G:mnc456.mcc222.3gppnetwork.org",
+        )
+        self.assertEqual(self._next_seq(), 6)
+
+        # A resync invalidates the pooled vectors
+        self._processor.set_next_lte_auth_seq("11111", 100)
+        self._processor.generate_lte_auth_vector("11111", plmn)
+        self.assertEqual(self._next_seq(), 101)
+
+    def test_close(self):
+        self._processor.close()
+        self.assertTrue(self._executor.is_shutdown)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,7 @@ limitations under the License.
 
 import unittest
 
-from magma.subscriberdb.crypto.milenage import Milenage
+from magma.subscriberdb.crypto.milenage import Milenage, MilenageCipher
 
 
 class MilenageRandomTests(unittest.TestCase):
@@ -181,6 +181,40 @@ class MilenageTests(unittest.TestCase):
         self.assertEqual(autn, autn_)
         self.assertEqual(kasme, kasme_)
 
+    def test_eutran_vectors(self):
+        """Do batched vectors match the individual Milenage functions?"""
+        self.rand = b'#U<\xbe\x967\xa8\x9d!\x8a\xe6M\xaeG\xbf5'
+        key = b'\x8b\xafG?/\x8f\xd0\x94\x87\xcc\xcb\xd7\t|hb'
+        op_c = b"\x8e'\xb6\xaf\x0ei.u\x0f2fz;\x14`]"
+        amf = b'\x80\x00'
+        plmn = b'\x02\xf8\x59'
+
+        crypto = Milenage(amf)
+        sqns = [7351, 7352, 2 ** 48 - 1]
+        vectors = crypto.generate_eutran_vectors(key, op_c, sqns, plmn)
+        self.assertEqual(len(vectors), len(sqns))
+        for sqn, (rand, xres, autn, kasme) in zip(sqns, vectors):
+            sqn_bytes = sqn.to_bytes(6, 'big')
+            mac_a, _ = Milenage.f1(key, sqn_bytes, self.rand, op_c, amf)
+            xres_, ak = Milenage.f2_f5(key, self.rand, op_c)
+            ck = Milenage.f3(key, self.rand, op_c)
+            ik = Milenage.f4(key, self.rand, op_c)
+            self.assertEqual(rand, self.rand)
+            self.assertEqual(xres, xres_)
+            self.assertEqual(
+                autn, Milenage.generate_autn(sqn_bytes, ak, mac_a, amf),
+            )
+            self.assertEqual(
+                kasme,
+                Milenage.generate_kasme(ck, ik, plmn, sqn_bytes, ak),
+            )
+
+        cipher = MilenageCipher(key, op_c)
+        self.assertEqual(
+            cipher.f5_star(cipher.temp(self.rand)),
+            Milenage.f5_star(key, self.rand, op_c),
+        )
+
     def test_m5g_xres_star_vector(self):
         """Can we compute the vector that OAI generates?"""
         self.rand = (
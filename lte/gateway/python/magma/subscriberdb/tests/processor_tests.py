@@ -236,6 +236,27 @@ class ProcessorTests(unittest.TestCase):
             eutran_vector,
         )
 
+    def test_lte_auth_vectors(self):
+        """
+        Test if the seq numbers of all the auth vectors are reserved at once
+        """
+        self._processor.set_next_lte_auth_seq("11111", 10)
+        self.assertEqual(
+            self._processor.generate_lte_auth_vectors("11111", 3 * b"\x00", 3),
+            3 * [_dummy_eutran_vector()],
+        )
+        self.assertEqual(self._processor.get_next_lte_auth_seq("11111"), 13)
+
+        # The number of vectors is bounded
+        self.assertEqual(
+            len(
+                self._processor.generate_lte_auth_vectors(
+                    "11111", 3 * b"\x00", 10,
+                ),
+            ),
+            processor.MAX_LTE_AUTH_VECTORS,
+        )
+
     def test_lte_auth_success_opc(self):
         """
         Test if we get the auth vector using passed OPc
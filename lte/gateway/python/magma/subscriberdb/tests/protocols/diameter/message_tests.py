@@ -471,3 +471,24 @@ class MessageAVPTests(unittest.TestCase):
 
         # Doesn't exist so returns None
         self.assertEqual(self.msg.find_avp(0, 1337), None)
+
+    def test_decoded_avps(self):
+        """AVPs of a decoded message are only decoded when retrieved"""
+        buf = bytearray(self.msg.length)
+        self.msg.encode(buf, 0)
+        msg = message.decode(buf)
+        self.assertEqual(msg.length, len(buf))
+        self.assertTrue(msg.has_fields(['User-Name', 'Host-IP-Address']))
+        self.assertFalse(msg.has_fields(['User-Name', 'Session-Id']))
+        self.assertTrue(all(isinstance(e, int) for e in msg._entries))
+
+        self.assertEqual(msg.find_avp(0, 257).value, '127.0.0.1')
+        self.assertEqual(
+            [isinstance(e, int) for e in msg._entries], [True, True, False],
+        )
+        filtered_avps = list(msg.filter_avps(avp.VendorId.DEFAULT, 1))
+        self.assertEqual([a.value for a in filtered_avps], ['hello', 'world'])
+
+        # The message doesn't reference the buffer it was decoded from
+        buf[:] = bytes(len(buf))
+        self.assertEqual(msg._avps, self.msg._avps)
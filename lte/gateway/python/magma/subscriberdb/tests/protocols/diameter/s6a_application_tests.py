@@ -13,6 +13,8 @@ limitations under the License.
 
 # pylint:disable=protected-access
 
+import asyncio
+import threading
 import unittest
 from unittest.mock import Mock
 
@@ -470,5 +472,134 @@ class S6AApplicationTests(unittest.TestCase):
         self._check_reply(req_buf, resp_buf)
 
 
+class S6AApplicationWorkersTests(unittest.TestCase):
+    """
+    Tests for the S6a requests handled by worker threads
+    """
+    REALM = "mai.facebook.com"
+    HOST = "hss.mai.facebook.com"
+    HOST_ADDR = "127.0.0.1"
+
+    def setUp(self):
+        self._loop = asyncio.new_event_loop()
+        self._processor = MockProcessor()
+        self._s6a_manager = s6a.S6AApplication(
+            self._processor,
+            self.REALM,
+            self.HOST,
+            self.HOST_ADDR,
+            loop=self._loop,
+            num_workers=2,
+            max_pending_requests=2,
+        )
+        self._server = server.S6aServer(
+            Mock(),
+            self._s6a_manager,
+            self.REALM,
+            self.HOST,
+        )
+        self._writes = []
+        self._transport = MockTransport()
+        self._transport.write = Mock(
+            side_effect=lambda buf: self._writes.append(
+                message.decode(buf.tobytes()),
+            ),
+        )
+        self._server.connection_made(self._transport)
+
+    def tearDown(self):
+        self._s6a_manager.close()
+        self._loop.close()
+
+    def _send_air(self, imsi, hop_by_hop_id):
+        msg = message.Message()
+        msg.header.application_id = s6a.S6AApplication.APP_ID
+        msg.header.command_code = s6a.S6AApplicationCommands.AUTHENTICATION_INFORMATION
+        msg.header.request = True
+        msg.header.hop_by_hop_id = hop_by_hop_id
+        msg.append_avp(avp.AVP('Session-Id', 'mme;1475864727;1;apps6a'))
+        msg.append_avp(avp.AVP('Auth-Session-State', 1))
+        msg.append_avp(avp.AVP('User-Name', imsi))
+        msg.append_avp(avp.AVP('Visited-PLMN-Id', b'(Y'))
+        msg.append_avp(
+            avp.AVP(
+                'Requested-EUTRAN-Authentication-Info', [
+                    avp.AVP('Number-Of-Requested-Vectors', 1),
+                ],
+            ),
+        )
+        req_buf = bytearray(msg.length)
+        msg.encode(req_buf, 0)
+        self._server.data_received(req_buf)
+
+    def _wait_for_workers(self):
+        """ Wait for the pending requests, then for their answers """
+        for worker in self._s6a_manager._workers:
+            worker.submit(lambda: None).result()
+        self._loop.run_until_complete(asyncio.sleep(0))
+
+    def _get_answers(self):
+        return {
+            resp.header.hop_by_hop_id:
+            resp.find_avp(*avp.resolve('Result-Code')).value
+            for resp in self._writes
+        }
+
+    def test_workers(self):
+        """
+        Test that the requests of a subscriber are handled in order by
+        the same worker, and answered from the event loop
+        """
+        threads = []
+
+        generate = self._processor.generate_lte_auth_vector
+
+        def generate_lte_auth_vector(imsi, plmn):
+            threads.append((imsi, threading.current_thread()))
+            return generate(imsi, plmn)
+
+        self._processor.generate_lte_auth_vector = generate_lte_auth_vector
+        for hop_by_hop_id in range(4):
+            self._send_air('1', hop_by_hop_id)
+            self._wait_for_workers()
+        self._send_air('3', 4)
+        self._wait_for_workers()
+
+        self.assertEqual(len(set(threads[:4])), 1)
+        self.assertNotEqual(threads[0][1], threading.current_thread())
+        self.assertEqual(
+            self._get_answers(), {
+                0: avp.ResultCode.DIAMETER_SUCCESS,
+                1: avp.ResultCode.DIAMETER_SUCCESS,
+                2: avp.ResultCode.DIAMETER_SUCCESS,
+                3: avp.ResultCode.DIAMETER_SUCCESS,
+                4: avp.ResultCode.DIAMETER_ERROR_USER_UNKNOWN,
+            },
+        )
+
+    def test_too_busy(self):
+        """
+        Test that requests above the pending limit are rejected
+        """
+        handling = threading.Event()
+
+        def generate_lte_auth_vector(imsi, plmn):
+            handling.wait()
+            return _dummy_eutran_vector()
+
+        self._processor.generate_lte_auth_vector = generate_lte_auth_vector
+        for hop_by_hop_id in range(3):
+            self._send_air('1', hop_by_hop_id)
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(
+            self._get_answers(), {2: avp.ResultCode.DIAMETER_TOO_BUSY},
+        )
+        self.assertTrue(self._writes[0].header.error)
+
+        handling.set()
+        self._wait_for_workers()
+        self.assertEqual(len(self._get_answers()), 3)
+
+
 if __name__ == "__main__":
     unittest.main()
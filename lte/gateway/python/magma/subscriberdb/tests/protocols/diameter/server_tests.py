@@ -86,6 +86,24 @@ class ServerTests(unittest.TestCase):
         msg.encode(req_buf, 0)
         self._check_handler(req_buf, 0xfac3b00c)
 
+    def test_multiple_messages(self):
+        """Check that we handle all the messages of a read, and keep
+        the partial one in the read buffer"""
+        msg = message.Message()
+        msg.header.application_id = 0xfac3b00c
+        req_buf = bytearray(msg.length)
+        msg.encode(req_buf, 0)
+
+        readbuf = self._server._readbuf
+        self._server.data_received(req_buf * 2 + req_buf[:4])
+        self.assertEqual(self._server._handle_msg.call_count, 2)
+        self.assertEqual(self._server._readbuf, req_buf[:4])
+        self.assertIs(self._server._readbuf, readbuf)
+
+        self._server.data_received(req_buf[4:])
+        self.assertEqual(self._server._handle_msg.call_count, 3)
+        self.assertEqual(len(self._server._readbuf), 0)
+
     def test_too_short(self):
         """Check that if we didn't receive enough data
         we keep it in the buffer"""
@@ -170,6 +170,66 @@ class StoreTests(unittest.TestCase):
         self._store.delete_all_subscribers()
         self.assertEqual(self._store.list_subscribers(), [])
 
+    def test_bulk_upsert_delete(self):
+        """
+        Test if bulk subscriber upserts and deletions work as expected
+        """
+        (sid1, _) = self._add_subscriber('IMSI11111')
+        self._store.update_root_digest("apple")
+
+        sub1 = SubscriberData(sid=SIDUtils.to_pb(sid1))
+        sub1.lte.auth_key = b'\x01' * 16
+        subs = [
+            sub1,
+            SubscriberData(sid=SIDUtils.to_pb('IMSI22222')),
+            SubscriberData(sid=SIDUtils.to_pb('IMSI22233')),
+        ]
+        self._store.upsert_subscribers(subs)
+        self.assertEqual(
+            self._store.list_subscribers(),
+            ['IMSI11111', 'IMSI22222', 'IMSI22233'],
+        )
+        self.assertEqual(
+            self._store.get_subscriber_data(sid1).lte.auth_key, b'\x01' * 16,
+        )
+        self.assertEqual(self._store.get_current_root_digest(), "apple")
+
+        self._store.delete_subscribers(['IMSI22222', 'IMSI11111', 'IMSI44444'])
+        self.assertEqual(self._store.list_subscribers(), ['IMSI22233'])
+        self.assertEqual(self._store.get_current_root_digest(), "")
+
+    def test_resync(self):
+        """
+        Test if resync keeps the subscriber state and only writes changes
+        """
+        (sid1, _) = self._add_subscriber('IMSI11111')
+        self._add_subscriber('IMSI22222')
+        self._add_subscriber('IMSI33333')
+        with self._store.edit_subscriber(sid1) as subs:
+            subs.state.lte_auth_next_seq = 7
+
+        sub1 = SubscriberData(sid=SIDUtils.to_pb(sid1))
+        sub1.lte.auth_key = b'\x01' * 16
+        self._store.resync([
+            sub1,
+            SubscriberData(sid=SIDUtils.to_pb('IMSI22222')),
+            SubscriberData(sid=SIDUtils.to_pb('IMSI44444')),
+        ])
+        self.assertEqual(
+            self._store.list_subscribers(),
+            ['IMSI11111', 'IMSI22222', 'IMSI44444'],
+        )
+        data = self._store.get_subscriber_data(sid1)
+        self.assertEqual(data.lte.auth_key, b'\x01' * 16)
+        self.assertEqual(data.state.lte_auth_next_seq, 7)
+
+        # pylint: disable=protected-access
+        db_location = self._store._db_locations[self._store._sid2bucket(sid1)]
+        with self._store._connect(db_location) as conn:
+            to_write, to_delete = self._store._diff_shard(conn, [sub1])
+        self.assertEqual(to_write, [])
+        self.assertEqual(to_delete, [])
+
     def test_digest(self):
         """
         Test if digest gets & updates work as expected
@@ -215,6 +275,45 @@ class StoreTests(unittest.TestCase):
         self._store.update_leaf_digests(digests2)
         self.assertEqual(self._store.get_current_leaf_digests(), digests2)
 
+    def test_subscriber_cache(self):
+        """
+        Test that the cached subscribers are updated on writes
+        """
+        store = SqliteStore(self._tmpfile.name + '/', cache_size=2)
+        for sid in ('IMSI11111', 'IMSI22222', 'IMSI33333'):
+            store.add_subscriber(SubscriberData(sid=SIDUtils.to_pb(sid)))
+
+        sub1 = store.get_subscriber_data('IMSI11111')
+        self.assertIs(sub1, store.get_subscriber_data('IMSI11111'))
+
+        with store.edit_subscriber('IMSI11111') as subs:
+            subs.state.lte_auth_next_seq = 5
+        self.assertEqual(
+            store.get_subscriber_data('IMSI11111').state.lte_auth_next_seq,
+            5,
+        )
+
+        sub2 = SubscriberData(sid=SIDUtils.to_pb('IMSI22222'))
+        sub2.lte.auth_key = b'\x01' * 16
+        store.get_subscriber_data('IMSI22222')
+        store.upsert_subscriber(sub2)
+        self.assertEqual(
+            store.get_subscriber_data('IMSI22222').lte.auth_key,
+            b'\x01' * 16,
+        )
+
+        # Least recently used subscriber is evicted
+        store.get_subscriber_data('IMSI33333')
+        self.assertEqual(
+            list(store._cache.keys()),  # pylint: disable=protected-access
+            ['IMSI22222', 'IMSI33333'],
+        )
+
+        store.delete_subscriber('IMSI33333')
+        with self.assertRaises(SubscriberNotFoundError):
+            store.get_subscriber_data('IMSI33333')
+        store.close()
+
 
 if __name__ == "__main__":
     unittest.main()
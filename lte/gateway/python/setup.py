@@ -92,6 +92,14 @@ setup(
         'load_tests/loadtest_pipelined.py',
         'load_tests/loadtest_mobilityd.py',
         'load_tests/loadtest_subscriberdb.py',
+        'load_tests/benchmark_mobilityd_store.py',
+        'load_tests/benchmark_milenage.py',
+        'load_tests/benchmark_subscriberdb_store.py',
+        'load_tests/benchmark_diameter_codec.py',
+        'load_tests/benchmark_mobilityd_dhcp.py',
+        'load_tests/benchmark_rule_versions.py',
+        'load_tests/benchmark_flow_reconciliation.py',
+        'load_tests/benchmark_eventd.py',
     ],
     package_data={'magma.redirectd.templates': ['*.html']},
     install_requires=[
@@ -0,0 +1,168 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import grpc
+
+DEFAULT_MAX_CHANNELS = 32
+DEFAULT_MAX_FAILURE_SECS = 60
+
+
+class _PooledChannel:
+    """ A channel of the pool, with its last known connectivity state """
+
+    __slots__ = (
+        'channel', 'credentials_version', 'state', 'failing_since',
+        'callback',
+    )
+
+    def __init__(
+        self, channel: grpc.Channel,
+        credentials_version: Optional[Hashable],
+    ):
+        self.channel = channel
+        self.credentials_version = credentials_version
+        self.state = grpc.ChannelConnectivity.IDLE
+        self.failing_since = None
+        self.callback = None
+
+
+class GRPCChannelPool:
+    """
+    Bounded pool of gRPC channels, so that the clients of a process share
+    one HTTP/2 connection per destination instead of opening a new one for
+    every stub.
+
+    Channels are keyed by the caller, e.g. by service, destination and
+    channel options. A pooled channel is replaced when:
+        - the credentials it was created with changed, e.g. the gateway
+          certificate was rotated by the bootstrapper,
+        - it was shut down, or it has been in TRANSIENT_FAILURE for more
+          than max_failure_secs, so that a new connection is attempted,
+        - the pool is full and it is the least recently used channel.
+
+    Replaced channels are not closed, as stubs created from them may still
+    be in use: gRPC closes them once they are no longer referenced.
+    close_channel and close_channels close the channels immediately.
+    """
+
+    def __init__(
+        self, max_channels: int = DEFAULT_MAX_CHANNELS,
+        max_failure_secs: float = DEFAULT_MAX_FAILURE_SECS,
+    ):
+        self._max_channels = max_channels
+        self._max_failure_secs = max_failure_secs
+        self._lock = threading.Lock()
+        self._channels = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def get_channel(
+        self, key: Hashable,
+        create_channel: Callable[[], grpc.Channel],
+        credentials_version: Optional[Hashable] = None,
+    ) -> grpc.Channel:
+        """
+        Return the pooled channel of key, creating it with create_channel
+        if there is none or if it can't be reused.
+
+        Args:
+            key: key of the channel in the pool
+            create_channel: function creating a new channel
+            credentials_version: version of the credentials the channel
+                is created with, the channel is replaced when it changes
+        Returns:
+            grpc channel
+        """
+        with self._lock:
+            pooled = self._channels.get(key)
+            if pooled is not None:
+                if self._is_reusable(pooled, credentials_version):
+                    self._channels.move_to_end(key)
+                    return pooled.channel
+                logging.info("Replacing gRPC channel %s", key)
+                self._release(key)
+
+            pooled = _PooledChannel(create_channel(), credentials_version)
+            pooled.callback = self._make_state_callback(pooled)
+            pooled.channel.subscribe(pooled.callback, try_to_connect=False)
+            self._channels[key] = pooled
+            while len(self._channels) > self._max_channels:
+                oldest_key = next(iter(self._channels))
+                logging.debug("Evicting gRPC channel %s", oldest_key)
+                self._release(oldest_key)
+            return pooled.channel
+
+    def close_channel(self, key: Hashable) -> bool:
+        """
+        Close the pooled channel of key, return False if there is none
+        """
+        with self._lock:
+            pooled = self._release(key)
+        if pooled is None:
+            return False
+        pooled.channel.close()
+        return True
+
+    def close_channels(
+        self, predicate: Optional[Callable[[Hashable], bool]] = None,
+    ) -> int:
+        """
+        Close the pooled channels whose key matches predicate, or all
+        channels if predicate is None. Return the number of closed channels.
+        """
+        with self._lock:
+            keys = [
+                key for key in self._channels
+                if predicate is None or predicate(key)
+            ]
+            released = [self._release(key) for key in keys]
+        for pooled in released:
+            pooled.channel.close()
+        return len(released)
+
+    def _is_reusable(
+        self, pooled: _PooledChannel,
+        credentials_version: Optional[Hashable],
+    ) -> bool:
+        if pooled.credentials_version != credentials_version:
+            return False
+        if pooled.state == grpc.ChannelConnectivity.SHUTDOWN:
+            return False
+        failing_since = pooled.failing_since
+        return failing_since is None or \
+            time.monotonic() - failing_since < self._max_failure_secs
+
+    def _release(self, key: Hashable) -> Optional[_PooledChannel]:
+        """ Remove a channel from the pool, the lock must be held """
+        pooled = self._channels.pop(key, None)
+        if pooled is not None:
+            pooled.channel.unsubscribe(pooled.callback)
+        return pooled
+
+    @staticmethod
+    def _make_state_callback(pooled: _PooledChannel):
+        def _on_state_change(state: grpc.ChannelConnectivity):
+            pooled.state = state
+            if state == grpc.ChannelConnectivity.TRANSIENT_FAILURE:
+                if pooled.failing_since is None:
+                    pooled.failing_since = time.monotonic()
+            elif state == grpc.ChannelConnectivity.READY:
+                pooled.failing_since = None
+        return _on_state_change
@@ -34,7 +34,9 @@ class GRPCClientManager:
         """
         get_client returns a grpc client of the specified service in the cloud.
         it will return a recycled client until the client fails or the number
-        of recycling reaches the max_client_use.
+        of recycling reaches the max_client_use. New clients are created on
+        the pooled channel of the service, so recycling a client doesn't open
+        a new connection.
         """
         if self._client is None or \
                 self._num_client_use > self._max_client_reuse:
@@ -35,7 +35,9 @@ class ServiceStateWrapper:
             get_proto_serializer(),
             get_proto_deserializer(ServiceExitStatus),
         )
-        self._flat_dict = RedisFlatDict(get_default_client(), serde)
+        self._flat_dict = RedisFlatDict(
+            get_default_client(), serde, key_index=True,
+        )
 
     def update_service_status(
         self, service_name: str,
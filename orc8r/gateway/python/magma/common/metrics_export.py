@@ -11,12 +11,20 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import copy
+import threading
 import time
 from typing import List
 
 import metrics_pb2
 from prometheus_client import REGISTRY, CollectorRegistry
 
+# Number of delta exports between two full snapshots
+DEFAULT_FULL_SNAPSHOT_INTERVAL = 10
+
+# Labels identifying a sample within a summary or histogram timeseries
+_SAMPLE_LABELS = ('quantile', 'le')
+
 
 def get_metrics(registry: CollectorRegistry = REGISTRY, verbose: bool = False):
     """
@@ -32,18 +40,107 @@ def get_metrics(registry: CollectorRegistry = REGISTRY, verbose: bool = False):
     """
     timestamp_ms = int(time.time() * 1000)
     for metric_family in registry.collect():
-        if metric_family.type in ('counter', 'gauge'):
-            family_proto = encode_counter_gauge(metric_family, timestamp_ms)
-        elif metric_family.type == 'summary':
-            family_proto = encode_summary(metric_family, timestamp_ms)
-        elif metric_family.type == 'histogram':
-            family_proto = encode_histogram(metric_family, timestamp_ms)
-
-        family_proto.name = metric_family.name
-        if verbose:
-            family_proto.help = metric_family.documentation
-
-        yield family_proto
+        yield _encode_family(metric_family, timestamp_ms, verbose)
+
+
+class DeltaMetricsExporter(object):
+    """
+    Exports the timeseries of a prometheus registry like get_metrics, but
+    only the timeseries whose value changed since the previous export.
+
+    A full snapshot of the registry is exported every full_snapshot_interval
+    exports, so that series which didn't change are still refreshed in the
+    cloud, and series which were removed from the registry are forgotten.
+
+    Notes:
+        - The exported values are tracked per exporter, so a single
+          consumer should poll it, e.g. the magmad metrics collector.
+        - Unchanged series aren't encoded at all, which saves the protobuf
+          encoding of most of the registry on every export.
+    """
+
+    def __init__(
+        self, registry: CollectorRegistry = REGISTRY,
+        full_snapshot_interval: int = DEFAULT_FULL_SNAPSHOT_INTERVAL,
+    ):
+        self._registry = registry
+        self._full_snapshot_interval = full_snapshot_interval
+        self._exports_since_snapshot = full_snapshot_interval
+        # (family name, series labels) => sample values of the last export
+        self._last_values = {}
+        self._lock = threading.Lock()
+
+    def get_metrics(
+        self, verbose: bool = False,
+    ) -> List[metrics_pb2.MetricFamily]:
+        """
+        Encodes the timeseries which changed since the previous export, or
+        all timeseries if a full snapshot is due
+
+        Arguments:
+            verbose: whether to optimize for bandwidth and ignore metric name/help
+
+        Returns:
+            a list of prometheus MetricFamily protobufs
+        """
+        with self._lock:
+            full_snapshot = \
+                self._exports_since_snapshot >= self._full_snapshot_interval
+            if full_snapshot:
+                self._exports_since_snapshot = 0
+                self._last_values = {}
+            self._exports_since_snapshot += 1
+
+            timestamp_ms = int(time.time() * 1000)
+            families = []
+            for metric_family in self._registry.collect():
+                changed = self._get_changed_samples(metric_family)
+                if not changed:
+                    continue
+                if len(changed) < len(metric_family.samples):
+                    metric_family = copy.copy(metric_family)
+                    metric_family.samples = changed
+                families.append(
+                    _encode_family(metric_family, timestamp_ms, verbose),
+                )
+            return families
+
+    def _get_changed_samples(self, metric_family) -> List:
+        samples_for_series = {}
+        for sample in metric_family.samples:
+            series = frozenset(
+                (name, value) for name, value in sample[1].items()
+                if name not in _SAMPLE_LABELS
+            )
+            samples_for_series.setdefault(series, []).append(sample)
+
+        changed = []
+        for series, samples in samples_for_series.items():
+            values = tuple(
+                (
+                    sample[0], sample[1].get('quantile', sample[1].get('le')),
+                    sample[2],
+                ) for sample in samples
+            )
+            key = (metric_family.name, series)
+            if self._last_values.get(key) != values:
+                self._last_values[key] = values
+                changed.extend(samples)
+        return changed
+
+
+def _encode_family(metric_family, timestamp_ms, verbose):
+    if metric_family.type in ('counter', 'gauge'):
+        family_proto = encode_counter_gauge(metric_family, timestamp_ms)
+    elif metric_family.type == 'summary':
+        family_proto = encode_summary(metric_family, timestamp_ms)
+    elif metric_family.type == 'histogram':
+        family_proto = encode_histogram(metric_family, timestamp_ms)
+
+    family_proto.name = metric_family.name
+    if verbose:
+        family_proto.help = metric_family.documentation
+    return family_proto
 
 
 def encode_counter_gauge(family, timestamp_ms):
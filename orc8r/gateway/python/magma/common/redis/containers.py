@@ -10,8 +10,20 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import logging
 from copy import deepcopy
-from typing import Any, Iterator, List, MutableMapping, Optional, TypeVar
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    TypeVar,
+)
 
 import redis
 import redis_collections
@@ -27,6 +39,25 @@ from redis.lock import Lock
 
 T = TypeVar('T')
 
+# Maximum number of keys per MGET/DEL command issued by the bulk operations.
+# Larger batches are split into several commands sent in a single pipeline.
+BULK_CHUNK_SIZE = 1000
+
+# Number of keys Redis is hinted to return per SCAN call
+SCAN_COUNT = 1000
+
+# Suffix of the per-type key index of RedisFlatDict. The index key doesn't
+# match the "*:<redis_type>" pattern of the dictionary keys.
+KEY_INDEX_SUFFIX = ":key_index"
+
+# Suffix of the per-type change feed of RedisFlatDict, the Redis set of keys
+# written since the feed was last consumed
+CHANGE_FEED_SUFFIX = ":changed_keys"
+
+# Garbage flags stored as values of the key index
+_NOT_GARBAGE = b'0'
+_GARBAGE = b'1'
+
 
 class RedisList(redis_collections.List):
     """
@@ -195,16 +226,151 @@ class RedisHashDict(redis_collections.DefaultDict):
         proto_wrapper.ParseFromString(value)
         return proto_wrapper.version
 
+    def update(self, other=None, **kwargs):
+        """Update the dictionary with the key/value pairs from *other* and
+        *kwargs*, see bulk_set.
+        """
+        mapping = {}
+        if other is not None:
+            mapping.update(other)
+        mapping.update(kwargs)
+        self.bulk_set(mapping)
+
+    def bulk_get(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the values of *keys* fetched with a single HMGET. Keys
+        that are not in the map are left out of the result.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        pickled_values = self.redis.hmget(
+            self.key, [self._pickle_key(key) for key in keys],
+        )
+        return {
+            key: self._unpickle(pickled_value)
+            for key, pickled_value in zip(keys, pickled_values)
+            if pickled_value is not None
+        }
+
+    def bulk_set(
+        self, mapping: Mapping[str, Any], delete_keys: Iterable[str] = (),
+    ) -> None:
+        """Set all items of *mapping*, incrementing their versions, and
+        remove *delete_keys* from the dictionary.
+
+        Current versions are read with a single HMGET and the values are
+        written with a single HSET and HDEL, in a WATCH/MULTI transaction on
+        the hash so that concurrent updates don't lose a version increment.
+        """
+        delete_keys = list(delete_keys)
+        if not mapping and not delete_keys:
+            return
+        keys = list(mapping)
+        pickled_keys = [self._pickle_key(key) for key in keys]
+
+        def bulk_set_trans(pipe):
+            pickled_data = {}
+            if pickled_keys:
+                current_values = pipe.hmget(self.key, pickled_keys)
+                for key, pickled_key, current in zip(
+                    keys, pickled_keys, current_values,
+                ):
+                    version = _get_version(current)
+                    pickled_data[pickled_key] = self._pickle_value(
+                        mapping[key], version + 1,
+                    )
+            pipe.multi()
+            if pickled_data:
+                pipe.hset(self.key, mapping=pickled_data)
+            if delete_keys:
+                pipe.hdel(
+                    self.key, *(self._pickle_key(key) for key in delete_keys),
+                )
+
+        self._transaction(bulk_set_trans)
+        for key in delete_keys:
+            self.cache.pop(key, None)
+        if self.writeback:
+            self.cache.update(mapping)
+
+    def bulk_delete(self, keys: Iterable[str]) -> int:
+        """Remove *keys* from the dictionary with a single HDEL. Returns the
+        number of keys that were removed.
+        """
+        keys = list(keys)
+        if not keys:
+            return 0
+        for key in keys:
+            self.cache.pop(key, None)
+        return self.redis.hdel(
+            self.key, *(self._pickle_key(key) for key in keys),
+        )
+
+    def items_snapshot(self) -> Dict[str, Any]:
+        """Return a copy of all items, fetched with a single HGETALL"""
+        return {
+            self._unpickle_key(pickled_key): self._unpickle(pickled_value)
+            for pickled_key, pickled_value in
+            self.redis.hgetall(self.key).items()
+        }
+
+
+class ValueWithMetadata(Generic[T]):
+    """
+    Value of a RedisFlatDict key with its version and garbage flag. The
+    RedisState wrapper is parsed once, and the value is only deserialized
+    when it is accessed.
+    """
+
+    __slots__ = (
+        'version', 'is_garbage', '_serialized', '_redis_state', '_serde',
+        '_value',
+    )
+
+    def __init__(self, serialized_value: bytes, serde: RedisSerde[T]):
+        self._serialized = serialized_value
+        self._serde = serde
+        self._redis_state = RedisState()
+        self._redis_state.ParseFromString(serialized_value)
+        self.version = self._redis_state.version
+        self.is_garbage = self._redis_state.is_garbage
+        self._value = None
+
+    @property
+    def serialized_msg(self) -> bytes:
+        """Serialized value, as wrapped in the RedisState proto"""
+        return self._redis_state.serialized_msg
+
+    @property
+    def value(self) -> T:
+        if self._value is None:
+            self._value = self._serde.deserialize_state(
+                self._redis_state, self._serialized,
+            )
+        return self._value
+
 
 class RedisFlatDict(MutableMapping[str, T]):
     """
     Dict-like interface serializing elements to a Redis datastore. This
     dict stores key directly (i.e. without a hashmap).
+
+    Keys of the dictionary are enumerated with an incremental SCAN. If
+    key_index is set, they are also tracked in a per-type Redis hash
+    {key => garbage flag}, updated in the same MULTI/EXEC transaction as
+    the key itself, so that iterating the dictionary or listing its garbage
+    keys never walks the whole Redis keyspace. If change_feed is set, every
+    written key (set, marked as garbage or deleted) is added to a per-type
+    Redis set in the same transaction, so that a consumer can process only
+    the keys that changed, see pop_changed_keys. The index and the change
+    feed are only accurate if every writer of the type goes through
+    RedisFlatDict.
     """
 
     def __init__(
         self, client: redis.Redis, serde: RedisSerde[T],
-        writethrough: bool = False,
+        writethrough: bool = False, key_index: bool = False,
+        change_feed: bool = False,
     ):
         """
         Args:
@@ -212,46 +378,57 @@ class RedisFlatDict(MutableMapping[str, T]):
             serde (): RedisSerde for de/serializing the object stored
             writethrough (bool): if writethrough is set to true,
             RedisFlatDict maintains a local write-through cache of values.
+            key_index (bool): if key_index is set to true, RedisFlatDict
+            maintains a Redis index of its keys and their garbage flag.
+            change_feed (bool): if change_feed is set to true, RedisFlatDict
+            records the keys it writes in a Redis set.
         """
         super().__init__()
         self._writethrough = writethrough
+        self._key_index = key_index
+        self._change_feed = change_feed
+        # Writes are sent in a MULTI/EXEC with the index/feed updates
+        self._tracks_writes = key_index or change_feed
         self.redis = client
         self.serde = serde
         self.redis_type = serde.redis_type
+        self.index_key = self.redis_type + KEY_INDEX_SUFFIX
+        self.change_feed_key = self.redis_type + CHANGE_FEED_SUFFIX
         self.cache = {}
+        if self._key_index:
+            self._init_key_index()
         if self._writethrough:
             self._sync_cache()
 
+    @property
+    def change_feed(self) -> bool:
+        """Whether the keys written are recorded in the change feed"""
+        return self._change_feed
+
     def __len__(self) -> int:
         """Return the number of items in the dictionary."""
         if self._writethrough:
             return len(self.cache)
+        if self._key_index:
+            return sum(
+                1 for flag in self.redis.hvals(self.index_key)
+                if flag == _NOT_GARBAGE
+            )
 
         return len(self.keys())
 
     def __iter__(self) -> Iterator[str]:
         """Return an iterator over the keys of the dictionary."""
-        type_pattern = self._get_redis_type_pattern()
-
         if self._writethrough:
             for k in self.cache:
                 split_key, _ = k.split(":", 1)
                 yield split_key
+        elif self._key_index:
+            for key, flag in self.redis.hgetall(self.index_key).items():
+                if flag == _NOT_GARBAGE:
+                    yield _decode_key(key)
         else:
-            for k in self.redis.keys(pattern=type_pattern):
-                try:
-                    deserialized_key = k.decode('utf-8')
-                    split_key = deserialized_key.split(":", 1)
-                except AttributeError:
-                    split_key = k.split(":", 1)
-                # There could be a delete key in between KEYS and GET, so ignore
-                # invalid values for now
-                try:
-                    if self.is_garbage(split_key[0]):
-                        continue
-                except KeyError:
-                    continue
-                yield split_key[0]
+            yield from self.scan_with_metadata(garbage=False)
 
     def __contains__(self, key: str) -> bool:
         """Return ``True`` if *key* is present and not garbage,
@@ -261,6 +438,8 @@ class RedisFlatDict(MutableMapping[str, T]):
 
         if self._writethrough:
             return composite_key in self.cache
+        if self._key_index:
+            return self.redis.hget(self.index_key, key) == _NOT_GARBAGE
 
         return bool(self.redis.exists(composite_key)) and \
             not self.is_garbage(key)
@@ -299,7 +478,13 @@ class RedisFlatDict(MutableMapping[str, T]):
         composite_key = self._make_composite_key(key)
         if self._writethrough:
             self.cache[composite_key] = value
-        return self.redis.set(composite_key, serialized_value)
+        if not self._tracks_writes:
+            return self.redis.set(composite_key, serialized_value)
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(composite_key, serialized_value)
+        self._track_set(pipe, key)
+        return pipe.execute()[0]
 
     def __delitem__(self, key: str) -> int:
         """Remove ``d[key:type]`` from dictionary.
@@ -310,7 +495,13 @@ class RedisFlatDict(MutableMapping[str, T]):
         composite_key = self._make_composite_key(key)
         if self._writethrough:
             del self.cache[composite_key]
-        deleted_count = self.redis.delete(composite_key)
+        if self._tracks_writes:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(composite_key)
+            self._track_delete(pipe, key)
+            deleted_count = pipe.execute()[0]
+        else:
+            deleted_count = self.redis.delete(composite_key)
         if not deleted_count:
             raise KeyError(composite_key)
         return deleted_count
@@ -329,11 +520,10 @@ class RedisFlatDict(MutableMapping[str, T]):
         Clear all keys in the dictionary. Objects are immediately deleted
         (i.e. not garbage collected)
         """
+        keys = list(self)
         if self._writethrough:
             self.cache.clear()
-        for key in self.keys():
-            composite_key = self._make_composite_key(key)
-            self.redis.delete(composite_key)
+        self.bulk_delete(keys)
 
     def get_version(self, key: str) -> int:
         """Return the version of the value for key *key:type*. Returns 0 if
@@ -370,7 +560,13 @@ class RedisFlatDict(MutableMapping[str, T]):
         proto_wrapper.ParseFromString(value)
         proto_wrapper.is_garbage = True
         garbage_serialized = proto_wrapper.SerializeToString()
-        return self.redis.set(composite_key, garbage_serialized)
+        if not self._tracks_writes:
+            return self.redis.set(composite_key, garbage_serialized)
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(composite_key, garbage_serialized)
+        self._track_set(pipe, key, is_garbage=True)
+        return pipe.execute()[0]
 
     def is_garbage(self, key: str) -> bool:
         """Return if d[key:type] has been marked for garbage collection.
@@ -389,33 +585,201 @@ class RedisFlatDict(MutableMapping[str, T]):
         """Return a copy of the dictionary's list of keys that are garbage
         Note: for redis *key:type* key is returned
         """
-        garbage_keys = []
-        type_pattern = self._get_redis_type_pattern()
-        for k in self.redis.keys(pattern=type_pattern):
-            try:
-                deserialized_key = k.decode('utf-8')
-                split_key = deserialized_key.split(":", 1)
-            except AttributeError:
-                split_key = k.split(":", 1)
-            # There could be a delete key in between KEYS and GET, so ignore
-            # invalid values for now
-            try:
-                if not self.is_garbage(split_key[0]):
-                    continue
-            except KeyError:
-                continue
-            garbage_keys.append(split_key[0])
-        return garbage_keys
+        if self._key_index:
+            return [
+                _decode_key(key) for key, flag in
+                self.redis.hgetall(self.index_key).items()
+                if flag == _GARBAGE
+            ]
+        return list(self.scan_with_metadata(garbage=True))
 
     def delete_garbage(self, key) -> bool:
         """Remove ``d[key:type]`` from dictionary iff the object is garbage
         Returns False if *key:type* is not in the map
         """
-        if not self.is_garbage(key):
+        entry = self.get_with_metadata(key)
+        if entry is None or not entry.is_garbage:
             return False
         count = self.__delitem__(key)
         return count > 0
 
+    def bulk_get(self, keys: Iterable[str]) -> Dict[str, T]:
+        """Return the values of *keys*, fetched with MGET in a single round
+        trip. Keys that are not in the map or are garbage are left out of
+        the result.
+        """
+        keys = list(keys)
+        if self._writethrough:
+            return {
+                key: self.cache[self._make_composite_key(key)]
+                for key in keys
+                if self._make_composite_key(key) in self.cache
+            }
+        return {
+            key: entry.value
+            for key, entry in self.bulk_get_with_metadata(keys).items()
+            if not entry.is_garbage
+        }
+
+    def get_with_metadata(self, key: str) -> Optional[ValueWithMetadata[T]]:
+        """Return ``d[key:type]`` with its version and garbage flag, read
+        with a single GET. Returns None if *key:type* is not in the map.
+        """
+        if ':' in key:
+            raise ValueError("Key %s cannot contain ':' char" % key)
+        serialized_value = self.redis.get(self._make_composite_key(key))
+        if serialized_value is None:
+            return None
+        return ValueWithMetadata(serialized_value, self.serde)
+
+    def bulk_get_with_metadata(
+        self, keys: Iterable[str],
+    ) -> Dict[str, ValueWithMetadata[T]]:
+        """Return *keys* with their version and garbage flag, fetched with
+        MGET in a single round trip. Keys that are not in the map are left
+        out of the result.
+        """
+        keys = list(keys)
+        serialized_values = self._bulk_get_serialized(
+            [self._make_composite_key(key) for key in keys],
+        )
+        return {
+            key: ValueWithMetadata(serialized_value, self.serde)
+            for key, serialized_value in zip(keys, serialized_values)
+            if serialized_value is not None
+        }
+
+    def scan_with_metadata(
+        self, garbage: Optional[bool] = None,
+    ) -> Dict[str, ValueWithMetadata[T]]:
+        """Return all keys of the dictionary with their version and garbage
+        flag. Keys are listed from the key index, or with SCAN, and values
+        are fetched with MGET.
+
+        Args:
+            garbage (bool): if set, only return the keys whose garbage flag
+            is equal to it
+        """
+        if self._key_index:
+            keys = [
+                _decode_key(key) for key, flag in
+                self.redis.hgetall(self.index_key).items()
+                if garbage is None or (flag == _GARBAGE) == garbage
+            ]
+        else:
+            keys = self._scan_keys()
+        entries = self.bulk_get_with_metadata(keys)
+        if garbage is None:
+            return entries
+        return {
+            key: entry for key, entry in entries.items()
+            if entry.is_garbage == garbage
+        }
+
+    def bulk_set(self, mapping: Mapping[str, T]) -> None:
+        """Set all items of *mapping*, incrementing their versions.
+
+        Items are written in chunks of BULK_CHUNK_SIZE keys. For each chunk
+        the current versions are read with a single MGET and the values are
+        written in a WATCH/MULTI transaction, so that a concurrent update of
+        one of the keys doesn't lose a version increment.
+        """
+        for key in mapping:
+            if ':' in key:
+                raise ValueError("Key %s cannot contain ':' char" % key)
+        keys = list(mapping)
+        for start in range(0, len(keys), BULK_CHUNK_SIZE):
+            chunk = keys[start:start + BULK_CHUNK_SIZE]
+            composite_keys = [self._make_composite_key(key) for key in chunk]
+
+            def bulk_set_trans(pipe, chunk=chunk, composite_keys=composite_keys):
+                current_values = pipe.mget(composite_keys)
+                pipe.multi()
+                for key, composite_key, current in zip(
+                    chunk, composite_keys, current_values,
+                ):
+                    version = _get_version(current)
+                    pipe.set(
+                        composite_key,
+                        self.serde.serialize(mapping[key], version + 1),
+                    )
+                if self._key_index:
+                    pipe.hset(
+                        self.index_key,
+                        mapping={key: _NOT_GARBAGE for key in chunk},
+                    )
+                if self._change_feed:
+                    pipe.sadd(self.change_feed_key, *chunk)
+
+            self.redis.transaction(bulk_set_trans, *composite_keys)
+            if self._writethrough:
+                for key, composite_key in zip(chunk, composite_keys):
+                    self.cache[composite_key] = mapping[key]
+
+    def bulk_delete(self, keys: Iterable[str]) -> int:
+        """Remove *keys* from the dictionary, in a single round trip.
+        Objects are immediately deleted (i.e. not garbage collected).
+        Returns the number of keys that were removed.
+        """
+        keys = list(keys)
+        if not keys:
+            return 0
+        composite_keys = [self._make_composite_key(key) for key in keys]
+        if self._writethrough:
+            for composite_key in composite_keys:
+                self.cache.pop(composite_key, None)
+        chunk_starts = range(0, len(composite_keys), BULK_CHUNK_SIZE)
+        pipe = self.redis.pipeline(transaction=self._tracks_writes)
+        for start in chunk_starts:
+            pipe.delete(*composite_keys[start:start + BULK_CHUNK_SIZE])
+        for start in chunk_starts:
+            chunk = keys[start:start + BULK_CHUNK_SIZE]
+            if self._key_index:
+                pipe.hdel(self.index_key, *chunk)
+            if self._change_feed:
+                pipe.sadd(self.change_feed_key, *chunk)
+        # Only the first replies are the DELs of the keys
+        return sum(pipe.execute()[:len(chunk_starts)])
+
+    def items_snapshot(self) -> Dict[str, T]:
+        """Return a copy of all items that are not garbage. Values are
+        fetched with MGET in a single round trip.
+        """
+        return {
+            key: entry.value
+            for key, entry in self.scan_with_metadata(garbage=False).items()
+        }
+
+    def versions_snapshot(self) -> Dict[str, int]:
+        """Return the versions of all items that are not garbage. Values are
+        fetched with MGET in a single round trip.
+        """
+        return {
+            key: entry.version
+            for key, entry in self.scan_with_metadata(garbage=False).items()
+        }
+
+    def pop_changed_keys(self) -> List[str]:
+        """Return the keys written since the last call and reset the change
+        feed. Keys may have been deleted or marked as garbage since.
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.smembers(self.change_feed_key)
+        pipe.delete(self.change_feed_key)
+        changed_keys, _ = pipe.execute()
+        return [_decode_key(key) for key in changed_keys]
+
+    def _bulk_get_serialized(
+        self, composite_keys: List[str],
+    ) -> List[Optional[bytes]]:
+        """MGET composite_keys in chunks, sent in a single pipeline"""
+        if not composite_keys:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for start in range(0, len(composite_keys), BULK_CHUNK_SIZE):
+            pipe.mget(composite_keys[start:start + BULK_CHUNK_SIZE])
+        return [value for chunk in pipe.execute() for value in chunk]
+
     def lock(self, key: str) -> Lock:
         """Lock the dictionary for key *key*"""
         return redis_lock.Lock(
@@ -430,15 +794,95 @@ class RedisFlatDict(MutableMapping[str, T]):
         """
         Syncs write-through cache with redis data on store.
         """
-        type_pattern = self._get_redis_type_pattern()
-        for k in self.redis.keys(pattern=type_pattern):
-            composite_key = k.decode('utf-8')
-            serialized_value = self.redis.get(composite_key)
+        if self._key_index:
+            composite_keys = [
+                self._make_composite_key(_decode_key(key))
+                for key in self.redis.hkeys(self.index_key)
+            ]
+        else:
+            composite_keys = list(self._scan_composite_keys())
+        serialized_values = self._bulk_get_serialized(composite_keys)
+        for composite_key, serialized_value in zip(
+            composite_keys, serialized_values,
+        ):
+            if serialized_value is None:
+                continue
             value = self.serde.deserialize(serialized_value)
             self.cache[composite_key] = value
 
+    def _scan_composite_keys(self) -> Iterator[str]:
+        """Iterate over the composite keys of the type with an incremental
+        SCAN, which doesn't block Redis like KEYS does. A key may be returned
+        more than once.
+        """
+        for key in self.redis.scan_iter(
+            match=self._get_redis_type_pattern(), count=SCAN_COUNT,
+        ):
+            yield _decode_key(key)
+
+    def _scan_keys(self) -> List[str]:
+        """Return the keys of the type, listed with SCAN"""
+        return list({
+            composite_key.split(":", 1)[0]
+            for composite_key in self._scan_composite_keys()
+        })
+
+    def _init_key_index(self):
+        """Build the key index with SCAN if it doesn't exist yet, e.g. after
+        an upgrade from a version without the index
+        """
+        if self.redis.exists(self.index_key):
+            return
+        entries = self.bulk_get_with_metadata(self._scan_keys())
+        if not entries:
+            return
+        logging.info(
+            "Building key index of %s with %d keys",
+            self.redis_type, len(entries),
+        )
+        self.redis.hset(
+            self.index_key,
+            mapping={
+                key: _GARBAGE if entry.is_garbage else _NOT_GARBAGE
+                for key, entry in entries.items()
+            },
+        )
+
+    def _track_set(self, pipe, key: str, is_garbage: bool = False):
+        """Queue the index and change feed updates of a key set in pipe"""
+        if self._key_index:
+            pipe.hset(
+                self.index_key, key,
+                _GARBAGE if is_garbage else _NOT_GARBAGE,
+            )
+        if self._change_feed:
+            pipe.sadd(self.change_feed_key, key)
+
+    def _track_delete(self, pipe, key: str):
+        """Queue the index and change feed updates of a key deleted in pipe"""
+        if self._key_index:
+            pipe.hdel(self.index_key, key)
+        if self._change_feed:
+            pipe.sadd(self.change_feed_key, key)
+
     def _get_redis_type_pattern(self):
         return "*:" + self.redis_type
 
     def _make_composite_key(self, key):
         return key + ":" + self.redis_type
+
+
+def _decode_key(key) -> str:
+    try:
+        return key.decode('utf-8')
+    except AttributeError:
+        return key
+
+
+def _get_version(serialized_value: Optional[bytes]) -> int:
+    """Return the version of a serialized RedisState, 0 if missing"""
+    if serialized_value is None:
+        return 0
+    proto_wrapper = RedisState()
+    proto_wrapper.ParseFromString(serialized_value)
+    return proto_wrapper.version
@@ -31,3 +31,9 @@ class MockUnavailableRedis(object):
     def keys(self, pattern=".*"):
         """ Mock keys with regex pattern matching."""
         raise RedisError("mock redis error")
+
+    def get_with_metadata(self, key):
+        raise RedisError("mock redis error")
+
+    def scan_with_metadata(self, garbage=None):
+        raise RedisError("mock redis error")
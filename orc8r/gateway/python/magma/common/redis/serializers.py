@@ -10,7 +10,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from typing import Callable, Generic, Type, TypeVar
+from typing import Callable, Generic, Optional, Type, TypeVar
 
 import jsonpickle
 from orc8r.protos.redis_pb2 import RedisState
@@ -26,6 +26,9 @@ class RedisSerde(Generic[T]):
                 function called to serialize a value
     deserializer (function (str) -> T):
                 function called to deserialize a value
+    msg_deserializer (function (bytes) -> T):
+                optional function called to deserialize the serialized_msg
+                of an already parsed RedisState proto
     """
 
     def __init__(
@@ -33,10 +36,12 @@ class RedisSerde(Generic[T]):
         redis_type: str,
         serializer: Callable[[T, int], str],
         deserializer: Callable[[str], T],
+        msg_deserializer: Optional[Callable[[bytes], T]] = None,
     ):
         self.redis_type = redis_type
         self.serializer = serializer
         self.deserializer = deserializer
+        self.msg_deserializer = msg_deserializer
 
     def serialize(self, msg: T, version: int = 1) -> str:
         return self.serializer(msg, version)
@@ -44,6 +49,17 @@ class RedisSerde(Generic[T]):
     def deserialize(self, serialized_obj: str) -> T:
         return self.deserializer(serialized_obj)
 
+    def deserialize_state(
+        self, redis_state: RedisState, serialized_obj: str,
+    ) -> T:
+        """
+        Deserialize a value whose RedisState proto was already parsed from
+        serialized_obj, without parsing it again if possible
+        """
+        if self.msg_deserializer is not None:
+            return self.msg_deserializer(redis_state.serialized_msg)
+        return self.deserializer(serialized_obj)
+
 
 def get_proto_serializer() -> Callable[[T, int], str]:
     """
@@ -66,14 +82,25 @@ def get_proto_deserializer(proto_class: Type[T]) -> Callable[[str], T]:
     Return a proto deserializer that takes in a proto type to deserialize
     the serialized msg stored in the RedisState proto
     """
+    deserialize_msg = get_proto_msg_deserializer(proto_class)
+
     def _deserialize_proto(serialized_rule: str) -> T:
         proto_wrapper = RedisState()
         proto_wrapper.ParseFromString(serialized_rule)
-        serialized_proto = proto_wrapper.serialized_msg
+        return deserialize_msg(proto_wrapper.serialized_msg)
+    return _deserialize_proto
+
+
+def get_proto_msg_deserializer(proto_class: Type[T]) -> Callable[[bytes], T]:
+    """
+    Return a proto deserializer that takes in a proto type to deserialize
+    the serialized msg of an already parsed RedisState proto
+    """
+    def _deserialize_proto_msg(serialized_proto: bytes) -> T:
         proto = proto_class()
         proto.ParseFromString(serialized_proto)
         return proto
-    return _deserialize_proto
+    return _deserialize_proto_msg
 
 
 def get_json_serializer() -> Callable[[T, int], str]:
@@ -98,16 +125,27 @@ def get_json_deserializer() -> Callable[[str], T]:
     Returns a json deserializer that deserializes the RedisState proto and
     then deserializes the json msg
     """
+    deserialize_msg = get_json_msg_deserializer()
+
     def _deserialize_json(serialized_rule: str) -> T:
         proto_wrapper = RedisState()
         proto_wrapper.ParseFromString(serialized_rule)
-        serialized_msg = proto_wrapper.serialized_msg
-        msg = jsonpickle.decode(serialized_msg.decode('utf-8'))
-        return msg
+        return deserialize_msg(proto_wrapper.serialized_msg)
 
     return _deserialize_json
 
 
+def get_json_msg_deserializer() -> Callable[[bytes], T]:
+    """
+    Returns a json deserializer that deserializes the json msg of an already
+    parsed RedisState proto
+    """
+    def _deserialize_json_msg(serialized_msg: bytes) -> T:
+        return jsonpickle.decode(serialized_msg.decode('utf-8'))
+
+    return _deserialize_json_msg
+
+
 def get_proto_version_deserializer() -> Callable[[str], T]:
     """
     Return a proto deserializer that takes in a proto type to deserialize
@@ -42,6 +42,8 @@ class RedisDictTests(TestCase):
             get_proto_serializer(),
             get_proto_deserializer(LogVerbosity),
         )
+        self._client = client
+        self._serde = serde
         self._flat_dict = RedisFlatDict(client, serde)
 
     def test_hash_insert(self):
@@ -174,6 +176,160 @@ class RedisDictTests(TestCase):
         with self.assertRaises(KeyError):
             self._flat_dict.mark_as_garbage(bad_key)
 
+    def test_hash_bulk_methods(self):
+        self._hash_dict['key1'] = LogVerbosity(verbosity=1)
+        self._hash_dict.bulk_set({
+            'key1': LogVerbosity(verbosity=2),
+            'key2': LogVerbosity(verbosity=3),
+        })
+        self.assertEqual(2, self._hash_dict.get_version('key1'))
+        self.assertEqual(1, self._hash_dict.get_version('key2'))
+
+        self.assertEqual(
+            {
+                'key1': LogVerbosity(verbosity=2),
+                'key2': LogVerbosity(verbosity=3),
+            },
+            self._hash_dict.bulk_get(['key1', 'key2', 'missing']),
+        )
+        self.assertEqual(
+            self._hash_dict.bulk_get(['key1', 'key2']),
+            self._hash_dict.items_snapshot(),
+        )
+
+        self._hash_dict.update(key3=LogVerbosity(verbosity=4))
+        self.assertEqual(LogVerbosity(verbosity=4), self._hash_dict['key3'])
+
+        self.assertEqual(2, self._hash_dict.bulk_delete(['key1', 'key3']))
+        self.assertEqual(['key2'], list(self._hash_dict.keys()))
+
+        self._hash_dict.bulk_set(
+            {'key4': LogVerbosity(verbosity=5)}, delete_keys=['key2'],
+        )
+        self.assertEqual(['key4'], list(self._hash_dict.keys()))
+        self._hash_dict.bulk_set({}, delete_keys=['key4'])
+        self.assertEqual(0, len(self._hash_dict))
+
+    def test_flat_bulk_methods(self):
+        self._flat_dict['key1'] = LogVerbosity(verbosity=1)
+        self._flat_dict.bulk_set({
+            'key1': LogVerbosity(verbosity=2),
+            'key2': LogVerbosity(verbosity=3),
+            'key3': LogVerbosity(verbosity=4),
+        })
+        self.assertEqual(2, self._flat_dict.get_version('key1'))
+        self.assertEqual(1, self._flat_dict.get_version('key2'))
+
+        self._flat_dict.mark_as_garbage('key3')
+        self.assertEqual(
+            {
+                'key1': LogVerbosity(verbosity=2),
+                'key2': LogVerbosity(verbosity=3),
+            },
+            self._flat_dict.bulk_get(['key1', 'key2', 'key3', 'missing']),
+        )
+        self.assertEqual(
+            self._flat_dict.bulk_get(['key1', 'key2']),
+            self._flat_dict.items_snapshot(),
+        )
+        self.assertEqual(
+            {'key1': 2, 'key2': 1},
+            self._flat_dict.versions_snapshot(),
+        )
+
+        self.assertEqual(2, self._flat_dict.bulk_delete(['key1', 'key3']))
+        self.assertEqual(['key2'], self._flat_dict.keys())
+        self.assertRaises(
+            ValueError, self._flat_dict.bulk_set,
+            {'bad:key': LogVerbosity(verbosity=1)},
+        )
+
+    def test_flat_change_feed(self):
+        flat_dict = RedisFlatDict(self._client, self._serde, change_feed=True)
+        flat_dict['k1'] = LogVerbosity(verbosity=1)
+        flat_dict.bulk_set({
+            'k2': LogVerbosity(verbosity=2),
+            'k3': LogVerbosity(verbosity=3),
+        })
+        self.assertEqual(
+            ['k1', 'k2', 'k3'], sorted(flat_dict.pop_changed_keys()),
+        )
+        self.assertEqual([], flat_dict.pop_changed_keys())
+
+        flat_dict.mark_as_garbage('k1')
+        flat_dict.bulk_delete(['k2'])
+        self.assertEqual(['k1', 'k2'], sorted(flat_dict.pop_changed_keys()))
+        self.assertEqual(
+            {'k1', 'k3'},
+            set(flat_dict.bulk_get_with_metadata(['k1', 'k2', 'k3'])),
+        )
+
+    def test_flat_metadata_methods(self):
+        self._flat_dict['k1'] = LogVerbosity(verbosity=1)
+        self._flat_dict['k1'] = LogVerbosity(verbosity=2)
+        self._flat_dict['k2'] = LogVerbosity(verbosity=3)
+        self._flat_dict.mark_as_garbage('k2')
+
+        entry = self._flat_dict.get_with_metadata('k1')
+        self.assertEqual(LogVerbosity(verbosity=2), entry.value)
+        self.assertEqual(2, entry.version)
+        self.assertFalse(entry.is_garbage)
+        self.assertTrue(self._flat_dict.get_with_metadata('k2').is_garbage)
+        self.assertIsNone(self._flat_dict.get_with_metadata('missing'))
+
+        self.assertEqual(
+            {'k1', 'k2'}, set(self._flat_dict.scan_with_metadata()),
+        )
+        self.assertEqual(
+            ['k1'], list(self._flat_dict.scan_with_metadata(garbage=False)),
+        )
+        garbage = self._flat_dict.scan_with_metadata(garbage=True)
+        self.assertEqual(['k2'], list(garbage))
+        self.assertEqual(LogVerbosity(verbosity=3), garbage['k2'].value)
+
+
+class RedisIndexedDictTests(RedisDictTests):
+    """
+    Run the RedisFlatDict tests with the key index enabled
+    """
+
+    def setUp(self):
+        super().setUp()
+        self._flat_dict = RedisFlatDict(
+            self._client, self._serde, key_index=True,
+        )
+
+    def test_flat_key_index(self):
+        self._flat_dict['k1'] = LogVerbosity(verbosity=1)
+        self._flat_dict.bulk_set({
+            'k2': LogVerbosity(verbosity=2),
+            'k3': LogVerbosity(verbosity=3),
+        })
+        self._flat_dict.mark_as_garbage('k2')
+        self.assertEqual(
+            {b'k1': b'0', b'k2': b'1', b'k3': b'0'},
+            self._client.hgetall(self._flat_dict.index_key),
+        )
+        self.assertEqual(2, len(self._flat_dict))
+        self.assertNotIn('k2', self._flat_dict)
+
+        del self._flat_dict['k1']
+        self._flat_dict.bulk_delete(['k2'])
+        self.assertEqual(
+            {b'k3': b'0'}, self._client.hgetall(self._flat_dict.index_key),
+        )
+
+    def test_flat_key_index_migration(self):
+        unindexed = RedisFlatDict(self._client, self._serde)
+        unindexed['k1'] = LogVerbosity(verbosity=1)
+        unindexed['k2'] = LogVerbosity(verbosity=2)
+        unindexed.mark_as_garbage('k2')
+        self._client.delete(self._flat_dict.index_key)
+
+        indexed = RedisFlatDict(self._client, self._serde, key_index=True)
+        self.assertEqual(['k1'], indexed.keys())
+        self.assertEqual(['k2'], indexed.garbage_keys())
+
 
 if __name__ == "__main__":
     main()
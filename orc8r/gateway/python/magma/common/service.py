@@ -25,7 +25,11 @@ import grpc
 import pkg_resources
 from magma.common.log_count_handler import MsgCounterHandler
 from magma.common.log_counter import ServiceLogErrorReporter
-from magma.common.metrics_export import get_metrics
+from magma.common.metrics_export import (
+    DEFAULT_FULL_SNAPSHOT_INTERVAL,
+    DeltaMetricsExporter,
+    get_metrics,
+)
 from magma.common.service_registry import ServiceRegistry
 from magma.configuration.exceptions import LoadConfigError
 from magma.configuration.mconfig_managers import get_mconfig_manager
@@ -111,6 +115,16 @@ class MagmaService(Service303Servicer):
         # Operational States
         self._operational_states = []
 
+        # Only export the changed metrics if enabled
+        self._metrics_exporter = None
+        if self._config and self._config.get('metrics_delta_export', False):
+            self._metrics_exporter = DeltaMetricsExporter(
+                full_snapshot_interval=self._config.get(
+                    'metrics_full_snapshot_interval',
+                    DEFAULT_FULL_SNAPSHOT_INTERVAL,
+                ),
+            )
+
         self._version = '0.0.0'
         # Load the service version if available
         try:
@@ -410,10 +424,14 @@ class MagmaService(Service303Servicer):
     def GetMetrics(self, request, context):
         """
         Collects timeseries samples from prometheus python client on this
-        process
+        process. With metrics_delta_export, only the timeseries which changed
+        since the previous call are returned, with a periodic full snapshot.
         """
         metrics = MetricsContainer()
-        metrics.family.extend(get_metrics())
+        if self._metrics_exporter is not None:
+            metrics.family.extend(self._metrics_exporter.get_metrics())
+        else:
+            metrics.family.extend(get_metrics())
         return metrics
 
     def SetLogLevel(self, request, context):
@@ -15,6 +15,7 @@ import logging
 import os
 
 import grpc
+from magma.common.grpc_channel_pool import GRPCChannelPool
 from magma.configuration.exceptions import LoadConfigError
 from magma.configuration.service_configs import load_service_config
 
@@ -32,7 +33,7 @@ class ServiceRegistry:
 
     _REGISTRY = {}
     _PROXY_CONFIG = {}
-    _CHANNELS_CACHE = {}
+    _CHANNEL_POOL = GRPCChannelPool()
 
     LOCAL = 'local'
     CLOUD = 'cloud'
@@ -141,8 +142,10 @@ class ServiceRegistry:
         """
         Returns a RPC channel to the service. The connection params
         are obtained from the service registry and used.
-        TBD: pool connections to a service and reuse them. Right
-        now each call creates a new TCP/SSL/HTTP2 connection.
+        Channels are pooled by (service, destination, proxying, options), so
+        that the clients of a process share one HTTP/2 connection per
+        service. Direct cloud channels are recreated when the gateway
+        certificate changes.
 
         Args:
             service (string): Name of the service
@@ -165,28 +168,27 @@ class ServiceRegistry:
         should_use_proxy = proxy_config['proxy_cloud_connections'] and \
             proxy_cloud_connections
 
-        # If speaking to a local service or to the proxy, the grpc channel
-        # can be reused. If speaking to the cloud directly, the client cert
-        # could become stale after the next bootstrapper run.
-        should_reuse_channel = should_use_proxy or \
-            (destination == ServiceRegistry.LOCAL)
-        if should_reuse_channel:
-            channel = ServiceRegistry._CHANNELS_CACHE.get(authority, None)
-            if channel is not None:
-                return channel
-
         if grpc_options is None:
             grpc_options = [
                 ("grpc.keepalive_time_ms", GRPC_KEEPALIVE_MS),
             ]
+        is_direct_cloud = destination != ServiceRegistry.LOCAL and \
+            not should_use_proxy
+        key = (
+            service, destination, is_direct_cloud,
+            tuple(tuple(option) for option in grpc_options),
+        )
+
         # We need to figure out the ip and port to connnect, if we need to use
         # SSL and the authority to use.
         if destination == ServiceRegistry.LOCAL:
             # Connect to the local service directly
             (ip, port) = ServiceRegistry.get_service_address(service)
-            channel = create_grpc_channel(
-                ip, port, authority,
-                options=grpc_options,
+            return ServiceRegistry._CHANNEL_POOL.get_channel(
+                key, lambda: create_grpc_channel(
+                    ip, port, authority,
+                    options=grpc_options,
+                ),
             )
         elif should_use_proxy:
             # Connect to the cloud via local control proxy
@@ -198,22 +200,38 @@ class ServiceRegistry:
             except ValueError as err:
                 logging.error(err)
                 (ip, port) = ('127.0.0.1', proxy_config['local_port'])
-            channel = create_grpc_channel(
-                ip, port, authority,
-                options=grpc_options,
+            return ServiceRegistry._CHANNEL_POOL.get_channel(
+                key, lambda: create_grpc_channel(
+                    ip, port, authority,
+                    options=grpc_options,
+                ),
             )
-        else:
-            # Connect to the cloud directly
-            ip = proxy_config['cloud_address']
-            port = proxy_config['cloud_port']
-            ssl_creds = get_ssl_creds()
-            channel = create_grpc_channel(
-                ip, port, authority, ssl_creds,
+        # Connect to the cloud directly. The client cert can be renewed by
+        # the bootstrapper of another process, so the channel is versioned
+        # by the modification time of the cert and key files.
+        ip = proxy_config['cloud_address']
+        port = proxy_config['cloud_port']
+        return ServiceRegistry._CHANNEL_POOL.get_channel(
+            key, lambda: create_grpc_channel(
+                ip, port, authority, get_ssl_creds(),
                 options=grpc_options,
-            )
-        if should_reuse_channel:
-            ServiceRegistry._CHANNELS_CACHE[authority] = channel
-        return channel
+            ),
+            credentials_version=get_ssl_creds_version(),
+        )
+
+    @staticmethod
+    def close_cloud_channels():
+        """
+        Close the pooled channels connecting directly to the cloud, e.g.
+        after the gateway certificate was renewed. Channels going through
+        the control proxy are kept, as the proxy owns the certificate.
+
+        Returns:
+            number of closed channels
+        """
+        return ServiceRegistry._CHANNEL_POOL.close_channels(
+            lambda key: key[2],
+        )
 
     @staticmethod
     def get_registry():
@@ -296,6 +314,24 @@ def get_ssl_creds():
     return ssl_creds
 
 
+def get_ssl_creds_version():
+    """
+    Get the version of the SSL credentials returned by get_ssl_creds, as
+    the modification times of the gateway cert and key files.
+
+    Returns:
+        (cert mtime, key mtime) tuple, None for a missing file
+    """
+    proxy_config = ServiceRegistry.get_proxy_config()
+    version = []
+    for path in (proxy_config['gateway_cert'], proxy_config['gateway_key']):
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
 def create_grpc_channel(ip, port, authority, ssl_creds=None, options=None):
     """
     Helper function to create a grpc channel.
@@ -0,0 +1,193 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import grpc
+from magma.common.grpc_channel_pool import GRPCChannelPool
+from magma.common.service_registry import ServiceRegistry
+
+
+class GRPCChannelPoolTests(TestCase):
+    def setUp(self):
+        self._pool = GRPCChannelPool(max_channels=2, max_failure_secs=10)
+        self._created = []
+
+    def _create_channel(self):
+        channel = MagicMock()
+        self._created.append(channel)
+        return channel
+
+    def _state_callback(self, channel):
+        return channel.subscribe.call_args[0][0]
+
+    def test_reuse_channel(self):
+        chan = self._pool.get_channel('a', self._create_channel)
+        self.assertIs(chan, self._pool.get_channel('a', self._create_channel))
+        self.assertEqual(len(self._created), 1)
+        chan.subscribe.assert_called_once()
+
+    def test_lru_eviction(self):
+        chan_a = self._pool.get_channel('a', self._create_channel)
+        self._pool.get_channel('b', self._create_channel)
+        # 'a' is now the most recently used channel
+        self._pool.get_channel('a', self._create_channel)
+        self._pool.get_channel('c', self._create_channel)
+
+        self.assertEqual(len(self._pool), 2)
+        self.assertIs(chan_a, self._pool.get_channel('a', self._create_channel))
+        self._pool.get_channel('b', self._create_channel)
+        self.assertEqual(len(self._created), 4)
+        # Evicted channels may still be used by stubs, they aren't closed
+        for chan in self._created:
+            chan.close.assert_not_called()
+
+    def test_credentials_change(self):
+        chan = self._pool.get_channel('a', self._create_channel, 1)
+        self.assertIs(chan, self._pool.get_channel('a', self._create_channel, 1))
+
+        new_chan = self._pool.get_channel('a', self._create_channel, 2)
+        self.assertIsNot(chan, new_chan)
+        chan.unsubscribe.assert_called_once()
+        self.assertEqual(len(self._pool), 1)
+
+    @patch('magma.common.grpc_channel_pool.time.monotonic')
+    def test_connectivity_eviction(self, monotonic_mock):
+        monotonic_mock.return_value = 100
+        chan = self._pool.get_channel('a', self._create_channel)
+        on_state_change = self._state_callback(chan)
+
+        # A short failure doesn't replace the channel
+        on_state_change(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+        monotonic_mock.return_value = 105
+        self.assertIs(chan, self._pool.get_channel('a', self._create_channel))
+
+        # Reconnecting resets the failure time
+        on_state_change(grpc.ChannelConnectivity.READY)
+        monotonic_mock.return_value = 120
+        self.assertIs(chan, self._pool.get_channel('a', self._create_channel))
+
+        on_state_change(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+        on_state_change(grpc.ChannelConnectivity.CONNECTING)
+        monotonic_mock.return_value = 131
+        new_chan = self._pool.get_channel('a', self._create_channel)
+        self.assertIsNot(chan, new_chan)
+
+        self._state_callback(new_chan)(grpc.ChannelConnectivity.SHUTDOWN)
+        self.assertIsNot(
+            new_chan, self._pool.get_channel('a', self._create_channel),
+        )
+
+    def test_close_channels(self):
+        chan_a = self._pool.get_channel('a', self._create_channel)
+        chan_b = self._pool.get_channel('b', self._create_channel)
+
+        self.assertTrue(self._pool.close_channel('a'))
+        self.assertFalse(self._pool.close_channel('a'))
+        chan_a.close.assert_called_once()
+
+        self.assertEqual(self._pool.close_channels(lambda key: key == 'c'), 0)
+        self.assertEqual(self._pool.close_channels(), 1)
+        chan_b.close.assert_called_once()
+        self.assertEqual(len(self._pool), 0)
+
+
+class ServiceRegistryChannelTests(TestCase):
+    def setUp(self):
+        self._proxy_config = {
+            'proxy_cloud_connections': True,
+            'cloud_address': 'controller.magma.test',
+            'cloud_port': 443,
+            'local_port': 8443,
+            'rootca_cert': 'rootCA.pem',
+            'gateway_cert': 'gateway.crt',
+            'gateway_key': 'gateway.key',
+        }
+        ServiceRegistry._PROXY_CONFIG = self._proxy_config
+        ServiceRegistry._REGISTRY = {
+            'services': {
+                'control_proxy': {'ip_address': '127.0.0.1', 'port': 8443},
+                'mobilityd': {'ip_address': '127.0.0.1', 'port': 60051},
+            },
+        }
+        ServiceRegistry._CHANNEL_POOL = GRPCChannelPool()
+        patcher = patch(
+            'magma.common.service_registry.create_grpc_channel',
+            side_effect=lambda *args, **kwargs: MagicMock(),
+        )
+        self._create_channel_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        ServiceRegistry._PROXY_CONFIG = {}
+        ServiceRegistry._REGISTRY = {}
+        ServiceRegistry._CHANNEL_POOL = GRPCChannelPool()
+
+    def test_pooled_channels(self):
+        local = ServiceRegistry.get_rpc_channel(
+            'mobilityd', ServiceRegistry.LOCAL,
+        )
+        self.assertIs(
+            local,
+            ServiceRegistry.get_rpc_channel('mobilityd', ServiceRegistry.LOCAL),
+        )
+        proxied = ServiceRegistry.get_rpc_channel(
+            'state', ServiceRegistry.CLOUD,
+        )
+        self.assertIs(
+            proxied,
+            ServiceRegistry.get_rpc_channel('state', ServiceRegistry.CLOUD),
+        )
+        # Different options use a different channel
+        self.assertIsNot(
+            proxied,
+            ServiceRegistry.get_rpc_channel(
+                'state', ServiceRegistry.CLOUD,
+                grpc_options=[('grpc.max_receive_message_length', 1024)],
+            ),
+        )
+
+    @patch('magma.common.service_registry.get_ssl_creds_version')
+    @patch('magma.common.service_registry.get_ssl_creds')
+    def test_direct_cloud_channels(self, ssl_creds_mock, version_mock):
+        version_mock.return_value = (1, 1)
+        proxied = ServiceRegistry.get_rpc_channel(
+            'state', ServiceRegistry.CLOUD,
+        )
+        direct = ServiceRegistry.get_rpc_channel(
+            'state', ServiceRegistry.CLOUD, proxy_cloud_connections=False,
+        )
+        self.assertIsNot(proxied, direct)
+        self.assertIs(
+            direct,
+            ServiceRegistry.get_rpc_channel(
+                'state', ServiceRegistry.CLOUD,
+                proxy_cloud_connections=False,
+            ),
+        )
+
+        # Rotated certificate
+        version_mock.return_value = (2, 2)
+        rotated = ServiceRegistry.get_rpc_channel(
+            'state', ServiceRegistry.CLOUD, proxy_cloud_connections=False,
+        )
+        self.assertIsNot(direct, rotated)
+        self.assertEqual(ssl_creds_mock.call_count, 2)
+
+        # Only the direct channels are closed by the bootstrapper
+        self.assertEqual(ServiceRegistry.close_cloud_channels(), 1)
+        self.assertIs(
+            proxied,
+            ServiceRegistry.get_rpc_channel('state', ServiceRegistry.CLOUD),
+        )
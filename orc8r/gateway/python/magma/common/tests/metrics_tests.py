@@ -238,6 +238,51 @@ class Service303MetricTests(unittest.TestCase):
         self.assertEqual(metric_labels[0].name, 'result')
         self.assertEqual(metric_labels[0].value, 'success')
 
+    def test_delta_export(self):
+        """ Test that only the changed series are exported """
+        g = Gauge('gauge', 'A gauge', ['result'], registry=self.registry)
+        h = Histogram(
+            'histogram', 'A histogram', ['result'],
+            registry=self.registry, buckets=[1, float('inf')],
+        )
+        g.labels('success').set(1)
+        g.labels('failure').set(2)
+        h.labels('success').observe(0.5)
+        exporter = metrics_export.DeltaMetricsExporter(
+            self.registry, full_snapshot_interval=3,
+        )
+
+        def _exported():
+            return {
+                family.name: sorted(
+                    metric.label[0].value for metric in family.metric
+                ) for family in exporter.get_metrics()
+            }
+
+        # First export is a full snapshot
+        self.assertEqual(
+            _exported(),
+            {'gauge': ['failure', 'success'], 'histogram': ['success']},
+        )
+        self.assertEqual(_exported(), {})
+
+        g.labels('failure').set(3)
+        h.labels('success').observe(2)
+        h.labels('failure').observe(2)
+        self.assertEqual(
+            _exported(),
+            {'gauge': ['failure'], 'histogram': ['failure', 'success']},
+        )
+
+        # Periodic full snapshot
+        self.assertEqual(
+            _exported(),
+            {
+                'gauge': ['failure', 'success'],
+                'histogram': ['failure', 'success'],
+            },
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -13,6 +13,7 @@ limitations under the License.
 
 from magma.common.sentry import sentry_init
 from magma.common.service import MagmaService
+from magma.configuration.service_configs import get_service_config_value
 from magma.directoryd.rpc_servicer import GatewayDirectoryServiceRpcServicer
 from orc8r.protos.mconfig import mconfigs_pb2
 
@@ -29,6 +30,7 @@ def main():
     # Add servicer to the server
     gateway_directory_servicer = GatewayDirectoryServiceRpcServicer(
         service_config.get('print_grpc_payload', False),
+        get_service_config_value('state', 'json_state', []),
     )
     gateway_directory_servicer.add_to_server(service.rpc_server)
 
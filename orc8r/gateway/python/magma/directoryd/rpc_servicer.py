@@ -13,7 +13,7 @@ limitations under the License.
 
 
 import logging
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 
 import grpc
 from google.protobuf.json_format import MessageToJson
@@ -51,17 +51,46 @@ class DirectoryRecord:
         self.identifiers = identifiers
 
 
+def get_record_state_config(
+    json_state: Optional[List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """
+    Get the entry of the directory records in the json_state config of the
+    state service, empty if the state service doesn't replicate them
+    """
+    for json_cfg in json_state or []:
+        if json_cfg.get('redis_key') == DIRECTORYD_REDIS_TYPE:
+            return json_cfg
+    return {}
+
+
 class GatewayDirectoryServiceRpcServicer(GatewayDirectoryServiceServicer):
     """gRPC based server for the Directoryd Gateway service"""
 
-    def __init__(self, print_grpc_payload: bool = False):
-        """Initialize Directoryd grpc endpoints."""
+    def __init__(
+        self,
+        print_grpc_payload: bool = False,
+        json_state: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """Initialize Directoryd grpc endpoints.
+
+        Args:
+            print_grpc_payload: whether to log the gRPC messages
+            json_state: json_state config of the state service, whose
+                key_index and change_feed flags of the directory records
+                must match those of the state replicator and collector
+        """
+        record_state_cfg = get_record_state_config(json_state)
         serde = RedisSerde(
             DIRECTORYD_REDIS_TYPE,
             get_json_serializer(),
             get_json_deserializer(),
         )
-        self._redis_dict = RedisFlatDict(get_default_client(), serde)
+        self._redis_dict = RedisFlatDict(
+            get_default_client(), serde,
+            key_index=record_state_cfg.get('key_index', False),
+            change_feed=record_state_cfg.get('change_feed', False),
+        )
         self._print_grpc_payload = print_grpc_payload
 
         if self._print_grpc_payload:
@@ -171,24 +200,25 @@ class GatewayDirectoryServiceRpcServicer(GatewayDirectoryServiceServicer):
             self._print_grpc(response)
             return response
 
-        # Lock Redis for requested key until get is complete
+        # A record is read with a single GET, without locking it: writers
+        # replace the whole record, so the read sees a consistent version
         try:
-            with self._redis_dict.lock(request.id):
-                if request.id not in self._redis_dict:
-                    context.set_code(grpc.StatusCode.NOT_FOUND)
-                    context.set_details(
-                        "Record for ID %s was not found." %
-                        request.id,
-                    )
-                    return DirectoryField()
-                record = self._redis_dict[request.id]
-        except (RedisError, LockError) as e:
+            entry = self._redis_dict.get_with_metadata(request.id)
+        except RedisError as e:
             logging.error(e)
             context.set_code(grpc.StatusCode.UNAVAILABLE)
             context.set_details("Could not connect to redis: %s" % e)
             response = DirectoryField()
             self._print_grpc(response)
             return response
+        if entry is None or entry.is_garbage:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details(
+                "Record for ID %s was not found." %
+                request.id,
+            )
+            return DirectoryField()
+        record = entry.value
 
         if request.field_key not in record.identifiers:
             context.set_code(grpc.StatusCode.NOT_FOUND)
@@ -214,8 +244,10 @@ class GatewayDirectoryServiceRpcServicer(GatewayDirectoryServiceServicer):
         logging.debug("GetAllDirectoryRecords request received")
         self._print_grpc(request)
         response = AllDirectoryRecords()
+        # Records are exported from the key index with pipelined MGETs,
+        # without locking them
         try:
-            redis_keys = self._redis_dict.keys()
+            entries = self._redis_dict.scan_with_metadata(garbage=False)
         except RedisError as e:
             logging.error(e)
             context.set_code(grpc.StatusCode.UNAVAILABLE)
@@ -223,21 +255,8 @@ class GatewayDirectoryServiceRpcServicer(GatewayDirectoryServiceServicer):
             self._print_grpc(request)
             return response
 
-        for key in redis_keys:
-            try:
-                with self._redis_dict.lock(key):
-                    # Lookup may produce an exception if the key has been
-                    # deleted between the call to __iter__ and lock
-                    stored_record = self._redis_dict[key]
-            except (RedisError, LockError) as e:
-                logging.error(e)
-                context.set_code(grpc.StatusCode.UNAVAILABLE)
-                context.set_details("Could not connect to redis: %s" % e)
-                self._print_grpc(response)
-                return response
-            except KeyError:
-                continue
-
+        for key, entry in entries.items():
+            stored_record = entry.value
             directory_record = response.records.add()
             directory_record.id = key
             directory_record.location_history[:] = \
@@ -16,7 +16,11 @@ from unittest import TestCase, mock
 import fakeredis
 import grpc
 from magma.common.redis.mocks.mock_redis import MockUnavailableRedis
-from magma.directoryd.rpc_servicer import GatewayDirectoryServiceRpcServicer
+from magma.directoryd.rpc_servicer import (
+    DIRECTORYD_REDIS_TYPE,
+    GatewayDirectoryServiceRpcServicer,
+)
+from magma.state.redis_dicts import get_json_redis_dicts
 from orc8r.protos.common_pb2 import Void
 from orc8r.protos.directoryd_pb2 import (
     DeleteRecordRequest,
@@ -49,7 +53,14 @@ class DirectorydRpcServiceTests(TestCase):
                 func_mock,
         ):
             # Add the servicer
-            self._servicer = GatewayDirectoryServiceRpcServicer(False)
+            self._servicer = GatewayDirectoryServiceRpcServicer(
+                False, [{
+                    'redis_key': 'directory_record',
+                    'state_scope': 'network',
+                    'key_index': True,
+                    'change_feed': True,
+                }],
+            )
             self._servicer.add_to_server(self._rpc_server)
             self._rpc_server.start()
 
@@ -168,6 +179,41 @@ class DirectorydRpcServiceTests(TestCase):
             else:
                 raise AssertionError()
 
+    @mock.patch('snowflake.snowflake', get_mock_snowflake)
+    def test_reads_without_lock(self):
+        self._servicer._redis_dict.clear()
+
+        req = UpdateRecordRequest()
+        req.id = "IMSI557"
+        req.fields["mac_addr"] = "aa:bb:aa:bb:aa:bb"
+        self._stub.UpdateRecord(req)
+        req.id = "IMSI556"
+        self._stub.UpdateRecord(req)
+        self._stub.DeleteRecord(DeleteRecordRequest(id="IMSI556"))
+
+        get_req = GetDirectoryFieldRequest()
+        get_req.id = "IMSI557"
+        get_req.field_key = "mac_addr"
+        with mock.patch.object(
+            self._servicer._redis_dict, 'lock',
+            side_effect=AssertionError("Reads should not lock records"),
+        ):
+            ret = self._stub.GetDirectoryField(get_req)
+            self.assertEqual("aa:bb:aa:bb:aa:bb", ret.value)
+
+            # The deleted record is garbage until it is collected
+            get_req.id = "IMSI556"
+            with self.assertRaises(grpc.RpcError) as err:
+                self._stub.GetDirectoryField(get_req)
+            self.assertEqual(
+                err.exception.code(), grpc.StatusCode.NOT_FOUND,
+            )
+
+            ret = self._stub.GetAllDirectoryRecords(Void())
+            self.assertEqual(
+                ["IMSI557"], [record.id for record in ret.records],
+            )
+
     @mock.patch('snowflake.snowflake', get_mock_snowflake)
     def test_redis_unavailable(self):
         self._servicer._redis_dict = MockUnavailableRedis("localhost", 6380)
@@ -196,3 +242,54 @@ class DirectorydRpcServiceTests(TestCase):
         with self.assertRaises(grpc.RpcError) as err:
             self._stub.GetAllDirectoryRecords(void_req)
         self.assertEqual(err.exception.code(), grpc.StatusCode.UNAVAILABLE)
+
+
+class DirectorydStateConfigTests(TestCase):
+    def test_flags_match_state_replicator(self):
+        """
+        directoryd and the state service agree on the key index and change
+        feed of the directory records for each json_state config
+        """
+        json_states = [
+            # CWF and LTE
+            [
+                {
+                    'redis_key': DIRECTORYD_REDIS_TYPE,
+                    'state_scope': 'network',
+                    'key_index': True,
+                    'change_feed': True,
+                },
+                {'redis_key': 'cwf_gateway_health', 'state_scope': 'network'},
+            ],
+            [{'redis_key': DIRECTORYD_REDIS_TYPE, 'state_scope': 'network'}],
+            # Directory records not replicated
+            None,
+        ]
+        client = fakeredis.FakeStrictRedis()
+        for json_state in json_states:
+            with mock.patch(
+                'magma.directoryd.rpc_servicer.get_default_client',
+                return_value=client,
+            ), mock.patch(
+                'magma.state.redis_dicts.get_default_client',
+                return_value=client,
+            ):
+                servicer = GatewayDirectoryServiceRpcServicer(
+                    False, json_state,
+                )
+                state_dicts = [
+                    redis_dict for redis_dict in get_json_redis_dicts(
+                        {'json_state': json_state},
+                    ) if redis_dict.redis_type == DIRECTORYD_REDIS_TYPE
+                ]
+            directoryd_dict = servicer._redis_dict
+            if not state_dicts:
+                self.assertFalse(directoryd_dict._key_index)
+                self.assertFalse(directoryd_dict.change_feed)
+                continue
+            self.assertEqual(
+                directoryd_dict._key_index, state_dicts[0]._key_index,
+            )
+            self.assertEqual(
+                directoryd_dict.change_feed, state_dicts[0].change_feed,
+            )
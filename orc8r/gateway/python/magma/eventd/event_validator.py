@@ -14,12 +14,13 @@ limitations under the License.
 import json
 import logging
 from contextlib import closing
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 
 import pkg_resources
 import yaml
 from bravado_core.spec import Spec
-from bravado_core.validate import validate_object as bravado_validate
+from bravado_core.swagger20_validator import get_validator_type
+from bravado_core.validate import scrub_sensitive_value
 
 EVENT_REGISTRY = 'event_registry'
 SWAGGER_SPEC = 'swagger_spec'
@@ -37,6 +38,7 @@ class EventValidator(object):
     def __init__(self, config: Dict[str, Any]):
         self.event_registry = config[EVENT_REGISTRY]
         self.specs_by_filename = self._load_specs_from_registry()
+        self._validators_by_event_type = self._compile_validators()
 
     def validate_event(self, raw_event: str, event_type: str) -> None:
         """
@@ -61,12 +63,7 @@ class EventValidator(object):
                 'Event type {} not registered, '
                 'please add it to the EventD config'.format(event_type),
             )
-        filename = self.event_registry[event_type][FILENAME]
-        bravado_validate(
-            self.specs_by_filename[filename][BRAVADO_SPEC],
-            self.specs_by_filename[filename][SWAGGER_SPEC][event_type],
-            event,
-        )
+        self._validators_by_event_type[event_type](event)
 
     def _load_specs_from_registry(self) -> Dict[str, Any]:
         """
@@ -108,6 +105,25 @@ class EventValidator(object):
 
         return specs_by_filename
 
+    def _compile_validators(self) -> Dict[str, Callable[[Any], None]]:
+        """
+        Builds the jsonschema validator of each registered event type once,
+        instead of for every event as bravado's validate_object does.
+        """
+        validators_by_event_type = {}
+        for event_type, info in self.event_registry.items():
+            specs = self.specs_by_filename[info[FILENAME]]
+            bravado_spec = specs[BRAVADO_SPEC]
+            validator = get_validator_type(swagger_spec=bravado_spec)(
+                specs[SWAGGER_SPEC][event_type],
+                format_checker=bravado_spec.format_checker,
+                resolver=bravado_spec.resolver,
+            )
+            validators_by_event_type[event_type] = scrub_sensitive_value(
+                validator.validate,
+            )
+        return validators_by_event_type
+
     @staticmethod
     def _check_event_exists_in_spec(
             swagger_definitions: Dict[str, Any],
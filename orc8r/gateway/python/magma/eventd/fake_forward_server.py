@@ -0,0 +1,146 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import msgpack
+
+
+class FakeForwardServer(socketserver.ThreadingTCPServer):
+    """
+    Local server implementing the Forward protocol input of fluent-bit, in
+    Message, Forward and PackedForward modes, to test and benchmark eventd
+    without fluent-bit. Chunks are acknowledged when their option asks for
+    it, and the records are kept if keep_records is set.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self, host: str = '127.0.0.1', port: int = 0,
+        keep_records: bool = True,
+    ):
+        super().__init__((host, port), _ForwardHandler)
+        self.keep_records = keep_records
+        self.records = []  # type: List[Dict[str, Any]]
+        self.tags = set()
+        self.num_acks = 0
+        self._num_records = 0
+        self._cond = threading.Condition()
+        self._connections = set()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    @property
+    def num_records(self) -> int:
+        return self._num_records
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.serve_forever, name='fake_forward_server',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Stop the server and reset the open connections """
+        self.shutdown()
+        self.server_close()
+        with self._cond:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def wait_for_records(self, num_records: int, timeout: float) -> bool:
+        """ Wait until num_records records were received in total """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._num_records < num_records:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def add_records(self, tag: str, records: List[Dict[str, Any]]) -> None:
+        with self._cond:
+            self.tags.add(tag)
+            self._num_records += len(records)
+            if self.keep_records:
+                self.records.extend(records)
+            self._cond.notify_all()
+
+    def add_connection(self, conn: socket.socket) -> None:
+        with self._cond:
+            self._connections.add(conn)
+
+    def remove_connection(self, conn: socket.socket) -> None:
+        with self._cond:
+            self._connections.discard(conn)
+
+
+class _ForwardHandler(socketserver.BaseRequestHandler):
+    server = None  # type: FakeForwardServer
+
+    def handle(self):
+        self.server.add_connection(self.request)
+        unpacker = msgpack.Unpacker()
+        try:
+            while True:
+                data = self.request.recv(65536)
+                if not data:
+                    return
+                unpacker.feed(data)
+                for message in unpacker:
+                    self._handle_message(message)
+        except OSError:
+            return
+        finally:
+            self.server.remove_connection(self.request)
+
+    def _handle_message(self, message):
+        tag, entries = message[0], message[1]
+        option = None
+        if isinstance(entries, bytes):
+            # PackedForward mode, a stream of entries
+            records = [entry[1] for entry in _unpack_stream(entries)]
+            option = message[2] if len(message) > 2 else None
+        elif isinstance(entries, list):
+            # Forward mode
+            records = [entry[1] for entry in entries]
+            option = message[2] if len(message) > 2 else None
+        else:
+            # Message mode, [tag, time, record, option]
+            records = [message[2]]
+            option = message[3] if len(message) > 3 else None
+        self.server.add_records(tag, records)
+        if isinstance(option, dict) and 'chunk' in option:
+            self.request.sendall(msgpack.packb({'ack': option['chunk']}))
+            self.server.num_acks += 1
+
+
+def _unpack_stream(data: bytes) -> msgpack.Unpacker:
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(data)
+    return unpacker
@@ -0,0 +1,418 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import base64
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional
+
+import msgpack
+from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
+from magma.eventd.metrics import (
+    EVENTS_DROPPED,
+    EVENTS_QUEUE_DEPTH,
+    EVENTS_SENT,
+    EVENTS_SPILLED,
+)
+
+EVENTD_TAG = 'eventd'
+
+# msgpack extension type of the Fluentd EventTime
+EVENT_TIME_EXT_TYPE = 0
+
+SPILL_SUFFIX = '.chunk'
+_SPILL_TMP_SUFFIX = '.tmp'
+
+
+class ForwardError(Exception):
+    """ A chunk could not be forwarded to fluent-bit """
+    pass
+
+
+def event_time(timestamp: float) -> msgpack.ExtType:
+    """ Encode a timestamp as a Fluentd EventTime, with nanoseconds """
+    seconds = int(timestamp)
+    nanoseconds = int((timestamp - seconds) * 1e9)
+    return msgpack.ExtType(
+        EVENT_TIME_EXT_TYPE, struct.pack('>II', seconds, nanoseconds),
+    )
+
+
+class ForwardConnection(object):
+    """
+    Persistent connection to the Forward input of fluent-bit, sending
+    chunks of events in PackedForward mode.
+
+    If require_ack is set, each chunk asks fluent-bit for an ack, which is
+    waited for before the chunk is considered sent. This needs a fluent-bit
+    whose Forward input acknowledges chunks. Otherwise, a chunk is sent once
+    written to the socket, and may be lost if the connection drops.
+
+    When the connection is lost, a new one is only attempted once
+    reconnect_interval has elapsed, so that the events are spilled right
+    away instead of waiting for a connect timeout each.
+    """
+
+    def __init__(
+        self, host: str, port: int, tag: str = EVENTD_TAG,
+        timeout: float = 5, reconnect_interval: float = 1,
+        require_ack: bool = False,
+    ):
+        self._address = (host, port)
+        self._tag = tag
+        self._timeout = timeout
+        self._reconnect_interval = reconnect_interval
+        self._require_ack = require_ack
+        self._sock = None  # type: Optional[socket.socket]
+        self._unpacker = None  # type: Optional[msgpack.Unpacker]
+        self._next_attempt = 0.0
+        self._reachable = True
+
+    @property
+    def is_reachable(self) -> bool:
+        """ False since the last connection or send failure, if any """
+        return self._reachable
+
+    def connect(self) -> bool:
+        """
+        Connect if not connected and a connection attempt is due. Returns
+        whether the connection is up.
+        """
+        if self._sock is not None:
+            return True
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return False
+        self._next_attempt = now + self._reconnect_interval
+        try:
+            self._sock = socket.create_connection(
+                self._address, timeout=self._timeout,
+            )
+        except OSError as e:
+            logging.warning(
+                'Connection to FluentBit failed: %s', e,
+                extra=EXCLUDE_FROM_ERROR_MONITORING,
+            )
+            self._reachable = False
+            return False
+        self._reachable = True
+        self._unpacker = msgpack.Unpacker()
+        logging.info('Connected to FluentBit at %s:%d', *self._address)
+        return True
+
+    def send(self, entries: bytes) -> None:
+        """
+        Send a chunk of msgpack encoded [time, record] entries, and wait
+        for fluent-bit to acknowledge it if require_ack is set. Raises
+        OSError or ForwardError if the chunk may not have been received,
+        closing the connection.
+        """
+        if self._sock is None:
+            raise ForwardError('Not connected to FluentBit')
+        try:
+            if self._require_ack:
+                chunk_id = base64.b64encode(os.urandom(16)).decode('ascii')
+                self._sock.sendall(
+                    msgpack.packb([self._tag, entries, {'chunk': chunk_id}]),
+                )
+                self._wait_for_ack(chunk_id)
+            else:
+                self._sock.sendall(msgpack.packb([self._tag, entries]))
+        except (OSError, ForwardError):
+            self._reachable = False
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._unpacker = None
+
+    def _wait_for_ack(self, chunk_id: str) -> None:
+        while True:
+            for response in self._unpacker:
+                if isinstance(response, dict) and \
+                        response.get('ack') == chunk_id:
+                    return
+            data = self._sock.recv(4096)
+            if not data:
+                raise ForwardError('FluentBit closed the connection')
+            self._unpacker.feed(data)
+
+
+class SpillDirectory(object):
+    """
+    Bounded directory of the chunks of events which could not be sent,
+    replayed oldest first once fluent-bit is reachable again. A chunk is
+    only removed once it was sent, so that the spilled events survive a
+    restart of eventd.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Only one connection replays the chunks at a time
+        self._replay_lock = threading.Lock()
+        self._seq = count()
+        os.makedirs(path, exist_ok=True)
+        self._num_bytes = 0
+        for name in os.listdir(path):
+            file_path = os.path.join(path, name)
+            if name.endswith(_SPILL_TMP_SUFFIX):
+                # Partially written before a restart
+                os.remove(file_path)
+            elif name.endswith(SPILL_SUFFIX):
+                self._num_bytes += os.path.getsize(file_path)
+
+    @property
+    def num_bytes(self) -> int:
+        """ Size of the spilled chunks """
+        return self._num_bytes
+
+    @property
+    def is_full(self) -> bool:
+        return self._num_bytes >= self._max_bytes
+
+    def write(self, entries: bytes) -> bool:
+        """ Spill a chunk, returns False if the directory is full """
+        with self._lock:
+            if self._num_bytes + len(entries) > self._max_bytes:
+                return False
+            self._num_bytes += len(entries)
+        name = '%020d-%06d' % (time.time_ns(), next(self._seq) % 1000000)
+        tmp_path = os.path.join(self._path, name + _SPILL_TMP_SUFFIX)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(entries)
+            os.replace(tmp_path, os.path.join(self._path, name + SPILL_SUFFIX))
+        except OSError:
+            with self._lock:
+                self._num_bytes -= len(entries)
+            raise
+        return True
+
+    def replay(self, send: Callable[[bytes], None]) -> None:
+        """
+        Send the spilled chunks oldest first, removing each once sent. An
+        exception raised by send stops the replay, and is raised again.
+        Returns right away if another thread is replaying.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                names = sorted(
+                    name for name in os.listdir(self._path)
+                    if name.endswith(SPILL_SUFFIX)
+                )
+                if not names:
+                    return
+                for name in names:
+                    file_path = os.path.join(self._path, name)
+                    with open(file_path, 'rb') as f:
+                        entries = f.read()
+                    send(entries)
+                    os.remove(file_path)
+                    with self._lock:
+                        self._num_bytes -= len(entries)
+                logging.info(
+                    'Replayed %d spilled chunks of events', len(names),
+                )
+        finally:
+            self._replay_lock.release()
+
+
+class ForwardSink(object):
+    """
+    Sends the events to fluent-bit in Forward mode chunks, over a pool of
+    persistent connections.
+
+    The events are encoded when they are logged and queued in a bounded
+    queue, which each connection drains in chunks of at most flush_count
+    events, sent at the latest flush_interval seconds after their first
+    event. While fluent-bit is unreachable, the chunks are spilled to
+    spill_dir if set, and dropped otherwise. Chunks are only acknowledged by
+    fluent-bit if require_ack is set, see ForwardConnection.
+    """
+
+    def __init__(
+        self,
+        port: int,
+        host: str = 'localhost',
+        tag: str = EVENTD_TAG,
+        num_connections: int = 2,
+        max_queue_size: int = 10000,
+        flush_count: int = 500,
+        flush_interval: float = 0.1,
+        tcp_timeout: float = 5,
+        reconnect_interval: float = 1,
+        spill_dir: Optional[str] = None,
+        max_spill_bytes: int = 50 * 1024 * 1024,
+        require_ack: bool = False,
+    ):
+        self._queue = queue.Queue(max_queue_size)  # type: queue.Queue
+        self._flush_count = flush_count
+        self._flush_interval = flush_interval
+        self._connections = [
+            ForwardConnection(
+                host, port, tag, tcp_timeout, reconnect_interval,
+                require_ack,
+            )
+            for _ in range(num_connections)
+        ]
+        self._spill = None  # type: Optional[SpillDirectory]
+        if spill_dir:
+            self._spill = SpillDirectory(spill_dir, max_spill_bytes)
+        self._stopped = threading.Event()
+        self._threads = []  # type: List[threading.Thread]
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'ForwardSink':
+        """ Create a sink from the eventd service config """
+        sink_config = config.get('fluent_bit_sink', {})
+        return cls(
+            port=config['fluent_bit_port'],
+            tcp_timeout=config['tcp_timeout'],
+            **sink_config,
+        )
+
+    @property
+    def is_available(self) -> bool:
+        """
+        Whether queued events are expected to be sent or spilled, i.e.
+        fluent-bit is reachable or the spill directory has room
+        """
+        if self._spill is not None and not self._spill.is_full:
+            return True
+        return any(
+            connection.is_reachable for connection in self._connections
+        )
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(
+                target=self._run,
+                args=(connection,),
+                name='eventd_sink_%d' % i,
+                daemon=True,
+            )
+            for i, connection in enumerate(self._connections)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, record: Dict[str, Any]) -> bool:
+        """
+        Queue an event record, returns False if the queue is full
+        """
+        entry = msgpack.packb([event_time(time.time()), record])
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            EVENTS_DROPPED.labels('queue_full').inc()
+            return False
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Send or spill the queued events, and close the connections
+        """
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self, connection: ForwardConnection) -> None:
+        while True:
+            entries = self._next_chunk()
+            if entries is None:
+                break
+            if entries:
+                self._send(connection, entries)
+            elif self._spill is not None and self._spill.num_bytes and \
+                    connection.connect():
+                # Idle, catch up with the spilled chunks
+                self._send(connection, [])
+            elif not connection.is_reachable:
+                # Find out when fluent-bit is back, while events are refused
+                connection.connect()
+        connection.close()
+
+    def _next_chunk(self) -> Optional[List[bytes]]:
+        """
+        Get the next chunk of entries, empty if there was none for
+        flush_interval, None once the sink is stopped and drained
+        """
+        try:
+            entries = [self._queue.get(timeout=self._flush_interval)]
+        except queue.Empty:
+            return None if self._stopped.is_set() else []
+        deadline = time.monotonic() + self._flush_interval
+        while len(entries) < self._flush_count:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or self._stopped.is_set():
+                    break
+                try:
+                    entries.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+        EVENTS_QUEUE_DEPTH.set(self._queue.qsize())
+        return entries
+
+    def _send(self, connection: ForwardConnection, entries: List[bytes]):
+        chunk = b''.join(entries)
+        if connection.connect():
+            try:
+                if self._spill is not None and self._spill.num_bytes:
+                    self._spill.replay(connection.send)
+                if entries:
+                    connection.send(chunk)
+                    EVENTS_SENT.inc(len(entries))
+                return
+            except (OSError, ForwardError) as e:
+                logging.warning(
+                    'Lost the connection to FluentBit: %s', e,
+                    extra=EXCLUDE_FROM_ERROR_MONITORING,
+                )
+        if entries:
+            self._spill_chunk(chunk, len(entries))
+
+    def _spill_chunk(self, chunk: bytes, num_events: int) -> None:
+        if self._spill is None:
+            EVENTS_DROPPED.labels('unreachable').inc(num_events)
+            return
+        try:
+            if self._spill.write(chunk):
+                EVENTS_SPILLED.inc(num_events)
+                return
+            reason = 'spill_full'
+        except OSError as e:
+            logging.error('Failed to spill events: %s', e)
+            reason = 'spill_error'
+        logging.warning(
+            'Dropping %d events, FluentBit is unreachable', num_events,
+            extra=EXCLUDE_FROM_ERROR_MONITORING,
+        )
+        EVENTS_DROPPED.labels(reason).inc(num_events)
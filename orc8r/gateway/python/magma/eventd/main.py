@@ -14,6 +14,7 @@ limitations under the License.
 from magma.common.sentry import sentry_init
 from magma.common.service import MagmaService
 from magma.eventd.event_validator import EventValidator
+from magma.eventd.forward_sink import ForwardSink
 from magma.eventd.rpc_servicer import EventDRpcServicer
 from orc8r.protos.mconfig.mconfigs_pb2 import EventD
 
@@ -26,13 +27,18 @@ def main():
     sentry_init(service_name=service.name, sentry_mconfig=service.shared_mconfig.sentry_config)
 
     event_validator = EventValidator(service.config)
-    eventd_servicer = EventDRpcServicer(service.config, event_validator)
+    sink = ForwardSink.from_config(service.config)
+    sink.start()
+    eventd_servicer = EventDRpcServicer(
+        service.config, event_validator, sink,
+    )
     eventd_servicer.add_to_server(service.rpc_server)
 
     # Run the service loop
     service.run()
 
     # Cleanup the service
+    sink.close()
     service.close()
 
 
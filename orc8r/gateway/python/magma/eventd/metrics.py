@@ -0,0 +1,32 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from prometheus_client import Counter, Gauge
+
+# Counters for the fluent-bit sink
+EVENTS_SENT = Counter(
+    'eventd_events_sent',
+    'Total events sent to fluent-bit',
+)
+EVENTS_SPILLED = Counter(
+    'eventd_events_spilled',
+    'Total events spilled to disk while fluent-bit was unreachable',
+)
+EVENTS_DROPPED = Counter(
+    'eventd_events_dropped',
+    'Total events dropped before reaching fluent-bit', ['reason'],
+)
+EVENTS_QUEUE_DEPTH = Gauge(
+    'eventd_events_queue_depth',
+    'Number of events waiting to be sent to fluent-bit',
+)
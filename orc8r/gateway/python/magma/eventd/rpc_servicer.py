@@ -11,10 +11,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-import json
 import logging
-import socket
-from contextlib import closing
 from typing import Any, Dict
 
 import grpc
@@ -22,6 +19,7 @@ import jsonschema
 from magma.common.rpc_utils import return_void
 from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
 from magma.eventd.event_validator import EventValidator
+from magma.eventd.forward_sink import ForwardSink
 from orc8r.protos import eventd_pb2, eventd_pb2_grpc
 
 RETRY_ON_FAILURE = 'retry_on_failure'
@@ -32,11 +30,13 @@ class EventDRpcServicer(eventd_pb2_grpc.EventServiceServicer):
     gRPC based server for EventD.
     """
 
-    def __init__(self, config: Dict[str, Any], validator: EventValidator):
-        self._fluent_bit_port = config['fluent_bit_port']
-        self._tcp_timeout = config['tcp_timeout']
+    def __init__(
+        self, config: Dict[str, Any], validator: EventValidator,
+        sink: ForwardSink,
+    ):
         self._event_registry = config['event_registry']
         self._validator = validator
+        self._sink = sink
 
     def add_to_server(self, server):
         """
@@ -47,7 +47,11 @@ class EventDRpcServicer(eventd_pb2_grpc.EventServiceServicer):
     @return_void
     def LogEvent(self, request: eventd_pb2.Event, context):
         """
-        Logs an event.
+        Logs an event. The event is queued to be sent to fluent-bit, and
+        the RPC returns once it is queued, without waiting for it to be
+        sent. It fails with RESOURCE_EXHAUSTED if the queue is full, and
+        with UNAVAILABLE if fluent-bit is unreachable and the event could
+        not be spilled either.
         """
         logging.debug("Logging event: %s", request)
 
@@ -68,19 +72,9 @@ class EventDRpcServicer(eventd_pb2_grpc.EventServiceServicer):
             'value': request.value,
             'retry_on_failure': self._needs_retries(request.event_type),
         }
-        try:
-            with closing(
-                socket.create_connection(
-                    ('localhost', self._fluent_bit_port),
-                    timeout=self._tcp_timeout,
-                ),
-            ) as sock:
-                logging.debug('Sending log to FluentBit')
-                sock.sendall(json.dumps(value).encode('utf-8'))
-        except socket.error as e:
+        if not self._sink.is_available:
             logging.error(
-                'Connection to FluentBit failed: %s',
-                e,
+                'Connection to FluentBit failed, dropping event: %s', request,
                 extra=EXCLUDE_FROM_ERROR_MONITORING,
             )
             logging.info(
@@ -88,13 +82,20 @@ class EventDRpcServicer(eventd_pb2_grpc.EventServiceServicer):
                 'or configured correctly',
             )
             context.set_code(grpc.StatusCode.UNAVAILABLE)
+            context.set_details('Could not connect to FluentBit locally')
+            return
+        if not self._sink.put(value):
+            logging.warning(
+                'Event queue is full, dropping event: %s', request,
+                extra=EXCLUDE_FROM_ERROR_MONITORING,
+            )
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
             context.set_details(
-                'Could not connect to FluentBit locally, Details: {}'
-                .format(e),
+                'Too many events waiting to be sent to FluentBit',
             )
             return
 
-        logging.debug("Successfully logged event: %s", request)
+        logging.debug("Queued event: %s", request)
 
     def _needs_retries(self, event_type: str) -> str:
         if event_type not in self._event_registry:
@@ -0,0 +1,157 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from magma.eventd.fake_forward_server import FakeForwardServer
+from magma.eventd.forward_sink import SPILL_SUFFIX, ForwardSink
+
+# pylint: disable=protected-access
+
+
+def _record(index):
+    return {
+        'stream_name': 'magmad',
+        'event_type': 'processed_updates',
+        'event_tag': 'tag%d' % index,
+        'value': '{}',
+        'retry_on_failure': 'False',
+    }
+
+
+class ForwardSinkTests(TestCase):
+
+    def setUp(self):
+        self.server = FakeForwardServer()
+        self.server.start()
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.sink = ForwardSink(
+            self.server.port,
+            host='127.0.0.1',
+            num_connections=2,
+            flush_count=10,
+            flush_interval=0.05,
+            tcp_timeout=1,
+            reconnect_interval=0.05,
+            spill_dir=self.spill_dir.name,
+        )
+
+    def tearDown(self):
+        self.sink.close(timeout=5)
+        self.server.stop()
+        self.spill_dir.cleanup()
+
+    def test_send_in_chunks(self):
+        self.sink.start()
+        for i in range(25):
+            self.assertTrue(self.sink.put(_record(i)))
+
+        self.assertTrue(self.server.wait_for_records(25, timeout=5))
+        self.assertEqual(self.server.tags, {'eventd'})
+        self.assertEqual(
+            sorted(record['event_tag'] for record in self.server.records),
+            sorted('tag%d' % i for i in range(25)),
+        )
+        self.assertEqual(self.server.records[0]['retry_on_failure'], 'False')
+
+    def test_require_ack(self):
+        self.sink.start()
+        self.sink.put(_record(0))
+        self.assertTrue(self.server.wait_for_records(1, timeout=5))
+        self.assertEqual(self.server.num_acks, 0)
+
+        sink = ForwardSink(
+            self.server.port, host='127.0.0.1', flush_interval=0.05,
+            require_ack=True,
+        )
+        sink.start()
+        sink.put(_record(1))
+        self.assertTrue(self.server.wait_for_records(2, timeout=5))
+        sink.close(timeout=5)
+        self.assertEqual(self.server.num_acks, 1)
+
+    def test_is_available(self):
+        sink = ForwardSink(
+            self.server.port,
+            host='127.0.0.1',
+            num_connections=1,
+            flush_interval=0.05,
+            tcp_timeout=1,
+            reconnect_interval=0.05,
+        )
+        self.addCleanup(sink.close, 5)
+        port = self.server.port
+        self.server.stop()
+        sink.start()
+        self.assertTrue(sink.is_available)
+
+        # Without a spill directory, unavailable once a connection failed
+        sink.put(_record(0))
+        self._wait_for(lambda: not sink.is_available)
+        # With one, available until it is full
+        self.assertTrue(self.sink.is_available)
+
+        self.server = FakeForwardServer(port=port)
+        self.server.start()
+        self._wait_for(lambda: sink.is_available)
+
+    def test_queue_full(self):
+        sink = ForwardSink(self.server.port, max_queue_size=2)
+        self.assertTrue(sink.put(_record(0)))
+        self.assertTrue(sink.put(_record(1)))
+        self.assertFalse(sink.put(_record(2)))
+
+    def test_spill_and_replay(self):
+        port = self.server.port
+        self.server.stop()
+        self.sink.start()
+        for i in range(15):
+            self.sink.put(_record(i))
+        self._wait_for(lambda: self._num_spilled() >= 2)
+
+        # Replayed once fluent-bit is back, then the new events are sent
+        self.server = FakeForwardServer(port=port)
+        self.server.start()
+        self.assertTrue(self.server.wait_for_records(15, timeout=5))
+        self._wait_for(lambda: self._num_spilled() == 0)
+        self.sink.put(_record(15))
+        self.assertTrue(self.server.wait_for_records(16, timeout=5))
+        self.assertEqual(
+            [record['event_tag'] for record in self.server.records][-1],
+            'tag15',
+        )
+
+    def test_close_spills_queue(self):
+        """ The events still queued when eventd stops are spilled """
+        self.server.stop()
+        for i in range(5):
+            self.sink.put(_record(i))
+        self.sink.start()
+        self.sink.close(timeout=5)
+        self.assertGreaterEqual(self._num_spilled(), 1)
+        self.assertTrue(self.sink._queue.empty())
+
+    def _num_spilled(self):
+        return len([
+            name for name in os.listdir(self.spill_dir.name)
+            if name.endswith(SPILL_SUFFIX)
+        ])
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
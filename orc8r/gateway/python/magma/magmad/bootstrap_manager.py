@@ -289,6 +289,8 @@ class BootstrapManager(SDWatchdogTask):
         try:
             cert_utils.write_key(self._gateway_key, self._gateway_key_file)
             cert_utils.write_cert(cert.cert_der, self._gateway_cert_file)
+            # Direct cloud channels still use the previous cert
+            ServiceRegistry.close_cloud_channels()
         except Exception as exp:
             BOOTSTRAP_EXCEPTION.labels(
                 cause='RequestSignDoneWriteCert:%s' % type(exp).__name__,
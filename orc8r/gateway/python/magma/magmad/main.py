@@ -37,7 +37,14 @@ from magma.magmad.metrics import (
     metrics_collection_loop,
     monitor_unattended_upgrade_status,
 )
-from magma.magmad.metrics_collector import MetricsCollector, ScrapeTarget
+from magma.magmad.metrics_buffer import DROP_OLDEST
+from magma.magmad.metrics_collector import (
+    DEFAULT_MAX_BUFFER_SIZE_MB,
+    DEFAULT_MAX_CONCURRENT_UPLOADS,
+    DEFAULT_MAX_UPLOAD_QUEUE_SIZE_MB,
+    MetricsCollector,
+    ScrapeTarget,
+)
 from magma.magmad.rpc_servicer import MagmadRpcServicer
 from magma.magmad.service_health_watchdog import ServiceHealthWatchdog
 from magma.magmad.service_manager import ServiceManager
@@ -110,6 +117,18 @@ def main():
             metrics_post_processor_fn,
         ),
         scrape_targets=metric_scrape_targets,
+        max_buffer_size_mb=metrics_config.get(
+            'max_buffer_size_mb', DEFAULT_MAX_BUFFER_SIZE_MB,
+        ),
+        buffer_drop_policy=metrics_config.get(
+            'buffer_drop_policy', DROP_OLDEST,
+        ),
+        max_concurrent_uploads=metrics_config.get(
+            'max_concurrent_uploads', DEFAULT_MAX_CONCURRENT_UPLOADS,
+        ),
+        max_upload_queue_size_mb=metrics_config.get(
+            'max_upload_queue_size_mb', DEFAULT_MAX_UPLOAD_QUEUE_SIZE_MB,
+        ),
     )
 
     # Poll and sync the metrics collector loops
@@ -135,6 +154,7 @@ def main():
         sync_rpc_client = SyncRPCClient(
             service.loop, 30,
             service.config.get('print_grpc_payload', False),
+            service.config.get('sync_rpc_proxy'),
         )
 
     first_time_bootstrap = True
@@ -22,7 +22,7 @@ from magma.common.health.service_state_wrapper import ServiceStateWrapper
 from magma.common.service import MagmaService
 from magma.magmad.check.network_check import ping
 from orc8r.protos.mconfig import mconfigs_pb2
-from prometheus_client import Counter, Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
 POLL_INTERVAL_SECONDS = 100
 
@@ -111,6 +111,33 @@ SERVICE_MEMORY_PERCENTAGE = Gauge(
 )
 
 
+METRICS_BUFFERED_SAMPLES = Gauge(
+    'metrics_buffered_samples',
+    'Number of metric families buffered before the next cloud sync',
+    ['service_name'],
+)
+
+
+METRICS_UPLOAD_QUEUE_DEPTH = Gauge(
+    'metrics_upload_queue_depth',
+    'Number of metrics chunks waiting to be uploaded to the cloud',
+)
+
+
+METRICS_SAMPLES_DROPPED = Counter(
+    'metrics_samples_dropped',
+    'Count of metric families dropped before reaching the cloud',
+    ['service_name', 'cause'],
+)
+
+
+METRICS_UPLOAD_LATENCY = Histogram(
+    'metrics_upload_latency_seconds',
+    'Latency of the metrics chunk uploads to the cloud',
+    ['result'],
+)
+
+
 def _get_ping_params(config):
     ping_params = []
     if 'ping_config' in config and 'hosts' in config['ping_config']:
@@ -0,0 +1,302 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+import grpc
+import snowflake
+from magma.common.rpc_utils import indicates_connection_error
+from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
+from magma.magmad.metrics import (
+    METRICS_BUFFERED_SAMPLES,
+    METRICS_SAMPLES_DROPPED,
+    METRICS_UPLOAD_LATENCY,
+    METRICS_UPLOAD_QUEUE_DEPTH,
+)
+from metrics_pb2 import MetricFamily
+from orc8r.protos.metricsd_pb2 import MetricsContainer
+from orc8r.protos.metricsd_pb2_grpc import MetricsControllerStub
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+# Bytes reserved for the gRPC and request overhead in each chunk
+GRPC_OVERHEAD_BYTES = 1000
+
+# Errors after which an upload is retried instead of being dropped
+_RETRYABLE_CODES = {grpc.StatusCode.RESOURCE_EXHAUSTED}
+
+
+class SampleBuffer(object):
+    """
+    Bounded FIFO buffer of the metric families collected from a service
+    between two cloud syncs.
+
+    The serialized size of each family is computed once when it is added.
+    When the buffer is full, the drop policy decides whether the oldest
+    families are evicted (DROP_OLDEST) or the new ones rejected
+    (DROP_NEWEST).
+    """
+
+    def __init__(
+        self, service_name: str, max_bytes: int,
+        drop_policy: str = DROP_OLDEST,
+    ):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError("Invalid drop policy: %s" % drop_policy)
+        self._service_name = service_name
+        self._max_bytes = max_bytes
+        self._drop_policy = drop_policy
+        self._samples = deque()
+        self._num_bytes = 0
+
+    @property
+    def num_bytes(self) -> int:
+        """ Serialized size of the buffered families """
+        return self._num_bytes
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def __iter__(self) -> Iterator[MetricFamily]:
+        return (family for family, _ in self._samples)
+
+    def append(self, family: MetricFamily):
+        size = _encoded_size(family)
+        if self._num_bytes + size > self._max_bytes:
+            if self._drop_policy == DROP_NEWEST or size > self._max_bytes:
+                self._drop(1)
+                return
+            num_dropped = 0
+            while self._samples and \
+                    self._num_bytes + size > self._max_bytes:
+                _, dropped_size = self._samples.popleft()
+                self._num_bytes -= dropped_size
+                num_dropped += 1
+            self._drop(num_dropped)
+        self._samples.append((family, size))
+        self._num_bytes += size
+        METRICS_BUFFERED_SAMPLES.labels(self._service_name).set(
+            len(self._samples),
+        )
+
+    def extend(self, families: Iterable[MetricFamily]):
+        for family in families:
+            self.append(family)
+
+    def drain(self) -> List[MetricFamily]:
+        """ Remove and return all buffered families """
+        samples = [family for family, _ in self._samples]
+        self.clear()
+        return samples
+
+    def clear(self):
+        self._samples.clear()
+        self._num_bytes = 0
+        METRICS_BUFFERED_SAMPLES.labels(self._service_name).set(0)
+
+    def _drop(self, num_dropped: int):
+        logging.warning(
+            "Metrics buffer of %s is full, dropping %d samples",
+            self._service_name, num_dropped,
+        )
+        METRICS_SAMPLES_DROPPED.labels(
+            self._service_name, 'buffer_full',
+        ).inc(num_dropped)
+
+
+def chunk_samples(
+    samples: Iterable[MetricFamily], max_msg_bytes: int,
+) -> Iterator[Tuple[List[MetricFamily], int]]:
+    """
+    Split samples in chunks whose serialized size fits in a gRPC message of
+    max_msg_bytes, computing the size of each sample once. Yields each chunk
+    with its size. A sample larger than the limit is sent on its own.
+    """
+    max_chunk_bytes = max_msg_bytes - GRPC_OVERHEAD_BYTES
+
+    chunk = []
+    chunk_size = 0
+    for sample in samples:
+        size = _encoded_size(sample)
+        if chunk and chunk_size + size > max_chunk_bytes:
+            yield chunk, chunk_size
+            chunk = []
+            chunk_size = 0
+        chunk.append(sample)
+        chunk_size += size
+    # Send leftover samples
+    if chunk:
+        yield chunk, chunk_size
+
+
+class _Chunk(object):
+    __slots__ = ('source', 'families', 'num_bytes', 'attempts')
+
+    def __init__(
+        self, source: str, families: List[MetricFamily], num_bytes: int,
+    ):
+        self.source = source
+        self.families = families
+        self.num_bytes = num_bytes
+        self.attempts = 0
+
+
+class UploadQueue(object):
+    """
+    Queue of the metrics chunks to upload to the cloud.
+
+    At most max_concurrent_uploads chunks are uploaded at a time. Chunks
+    which failed because the cloud is unreachable are put back at the head
+    of the queue and retried with an exponential backoff, so that samples
+    survive a disconnect. The queued chunks are bounded to max_bytes, the
+    oldest ones are dropped past it.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop,
+        get_client: Callable[[], MetricsControllerStub],
+        grpc_timeout: int,
+        max_concurrent_uploads: int,
+        max_bytes: int,
+        initial_backoff: float = 1,
+        max_backoff: float = 60,
+    ):
+        self._loop = loop
+        self._get_client = get_client
+        self._grpc_timeout = grpc_timeout
+        self._max_concurrent_uploads = max_concurrent_uploads
+        self._max_bytes = max_bytes
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._backoff = initial_backoff
+        self._retry_handle = None
+        self._pending = deque()
+        self._pending_bytes = 0
+        self._in_flight = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def in_flight(self) -> int:
+        """ Number of uploads waiting for a response """
+        return self._in_flight
+
+    def put(self, source: str, families: List[MetricFamily], num_bytes: int):
+        """
+        Queue a chunk of families of source, a service or a scrape target.
+        dispatch must be called to start the uploads.
+        """
+        self._pending.append(_Chunk(source, families, num_bytes))
+        self._pending_bytes += num_bytes
+        self._trim()
+
+    def dispatch(self):
+        """
+        Start uploading queued chunks, up to the concurrency limit. Nothing
+        is sent while backing off after a failure.
+        """
+        if self._retry_handle is not None:
+            return
+        client = None
+        while self._pending and \
+                self._in_flight < self._max_concurrent_uploads:
+            chunk = self._pending.popleft()
+            self._pending_bytes -= chunk.num_bytes
+            if client is None:
+                client = self._get_client()
+            future = client.Collect.future(
+                MetricsContainer(
+                    gatewayId=snowflake.snowflake(),
+                    family=chunk.families,
+                ),
+                self._grpc_timeout,
+            )
+            self._in_flight += 1
+            future.add_done_callback(
+                self._make_upload_done_func(chunk, time.monotonic()),
+            )
+        METRICS_UPLOAD_QUEUE_DEPTH.set(len(self._pending))
+
+    def _make_upload_done_func(self, chunk: _Chunk, start_time: float):
+        return lambda future: self._loop.call_soon_threadsafe(
+            self._upload_done, chunk, start_time, future,
+        )
+
+    def _upload_done(self, chunk: _Chunk, start_time: float, future):
+        self._in_flight -= 1
+        err = future.exception()
+        latency = time.monotonic() - start_time
+        if err is None:
+            METRICS_UPLOAD_LATENCY.labels('success').observe(latency)
+            logging.debug(
+                "Metrics upload success for %s (%d samples)",
+                chunk.source, len(chunk.families),
+            )
+            self._backoff = self._initial_backoff
+        else:
+            METRICS_UPLOAD_LATENCY.labels('failure').observe(latency)
+            is_connection_error = indicates_connection_error(err)
+            logging.error(
+                "Metrics upload error for %s (attempt %d)! [%s] %s",
+                chunk.source, chunk.attempts + 1, err.code(), err.details(),
+                extra=EXCLUDE_FROM_ERROR_MONITORING if is_connection_error else None,
+            )
+            if is_connection_error or err.code() in _RETRYABLE_CODES:
+                chunk.attempts += 1
+                self._pending.appendleft(chunk)
+                self._pending_bytes += chunk.num_bytes
+                self._trim()
+                self._schedule_retry()
+            else:
+                METRICS_SAMPLES_DROPPED.labels(
+                    chunk.source, 'upload_failed',
+                ).inc(len(chunk.families))
+        self.dispatch()
+
+    def _schedule_retry(self):
+        if self._retry_handle is not None:
+            return
+        logging.info("Retrying metrics upload in %.1fs", self._backoff)
+        self._retry_handle = self._loop.call_later(
+            self._backoff, self._retry,
+        )
+        self._backoff = min(self._backoff * 2, self._max_backoff)
+
+    def _retry(self):
+        self._retry_handle = None
+        self.dispatch()
+
+    def _trim(self):
+        while len(self._pending) > 1 and self._pending_bytes > self._max_bytes:
+            chunk = self._pending.popleft()
+            self._pending_bytes -= chunk.num_bytes
+            logging.warning(
+                "Metrics upload queue is full, dropping %d samples of %s",
+                len(chunk.families), chunk.source,
+            )
+            METRICS_SAMPLES_DROPPED.labels(
+                chunk.source, 'queue_full',
+            ).inc(len(chunk.families))
+        METRICS_UPLOAD_QUEUE_DEPTH.set(len(self._pending))
+
+
+def _encoded_size(family: MetricFamily) -> int:
+    """ Size of a family as an element of a repeated field """
+    size = family.ByteSize()
+    # Field tag and length prefix
+    return 1 + max(1, (size.bit_length() + 6) // 7) + size
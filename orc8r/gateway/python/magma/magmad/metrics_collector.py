@@ -19,13 +19,15 @@ from typing import Callable, Dict, List, NamedTuple, Optional, Union
 import metrics_pb2
 import prometheus_client.core
 import requests
-import snowflake
-from magma.common.rpc_utils import indicates_connection_error
-from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
 from magma.common.service_registry import ServiceRegistry
+from magma.magmad.metrics_buffer import (
+    DROP_OLDEST,
+    SampleBuffer,
+    UploadQueue,
+    chunk_samples,
+)
 from orc8r.protos import metricsd_pb2
 from orc8r.protos.common_pb2 import Void
-from orc8r.protos.metricsd_pb2 import MetricsContainer
 from orc8r.protos.metricsd_pb2_grpc import MetricsControllerStub
 from orc8r.protos.service303_pb2_grpc import Service303Stub
 from prometheus_client.parser import text_string_to_metric_families
@@ -39,10 +41,19 @@ ScrapeTarget = NamedTuple(
     ],
 )
 
+DEFAULT_MAX_BUFFER_SIZE_MB = 8
+DEFAULT_MAX_UPLOAD_QUEUE_SIZE_MB = 32
+DEFAULT_MAX_CONCURRENT_UPLOADS = 4
+
 
 class MetricsCollector(object):
     """
     Polls magma services periodicaly for metrics and posts them to cloud
+
+    Samples are buffered per service in a bounded SampleBuffer until the
+    next sync, then chunked and uploaded through an UploadQueue which
+    limits the concurrent uploads and retries them when the cloud is
+    unreachable.
     """
     _services = []
 
@@ -55,6 +66,12 @@ class MetricsCollector(object):
         loop: Optional[asyncio.AbstractEventLoop] = None,
         post_processing_fn: Optional[Callable] = None,
         scrape_targets: [ScrapeTarget] = None,
+        max_buffer_size_mb: Union[int, float] = DEFAULT_MAX_BUFFER_SIZE_MB,
+        buffer_drop_policy: str = DROP_OLDEST,
+        max_concurrent_uploads: int = DEFAULT_MAX_CONCURRENT_UPLOADS,
+        max_upload_queue_size_mb: Union[int, float] = (
+            DEFAULT_MAX_UPLOAD_QUEUE_SIZE_MB
+        ),
     ):
         self.sync_interval = sync_interval
         self.collect_interval = collect_interval
@@ -63,11 +80,26 @@ class MetricsCollector(object):
         self._services = services
         self._loop = loop if loop else asyncio.get_event_loop()
         self._samples_for_service = {}
+        # Label added to the samples of each service
+        self._service_labels = {}
+        # Last process start time of each service, kept as services
+        # exporting deltas only report it in their full snapshots
+        self._start_time_for_service = {}
         for s in self._services:
-            self._samples_for_service[s] = []
+            self._service_labels[s] = metrics_pb2.LabelPair(
+                name="service", value=s,
+            )
+            self._samples_for_service[s] = SampleBuffer(
+                s, int(max_buffer_size_mb * 1024 * 1024), buffer_drop_policy,
+            )
         self._grpc_options = _get_metrics_chan_grpc_options(
             grpc_max_msg_size_mb,
         )
+        self._upload_queue = UploadQueue(
+            self._loop, self._get_metricsd_client, grpc_timeout,
+            max_concurrent_uploads,
+            int(max_upload_queue_size_mb * 1024 * 1024),
+        )
         self.scrape_targets = scrape_targets if scrape_targets else []
         # @see example_metrics_postprocessor_fn
         self.post_processing_fn = post_processing_fn
@@ -94,62 +126,20 @@ class MetricsCollector(object):
         Synchronizes sample queue for specific service to cloud and reschedules
         sync loop
         """
-        if service_name in self._samples_for_service and \
-           self._samples_for_service[service_name]:
-            chan = ServiceRegistry.get_rpc_channel(
-                'metricsd',
-                ServiceRegistry.CLOUD,
-                grpc_options=self._grpc_options,
-            )
-            client = MetricsControllerStub(chan)
+        if self._samples_for_service.get(service_name):
+            samples = self._samples_for_service[service_name].drain()
             if self.post_processing_fn:
                 # If services wants to, let it run a postprocessing function
                 # If we throw an exception here, we'll have no idea whether
                 # something was postprocessed or not, so I guess try and make it
                 # idempotent?  #m sevchicken
-                self.post_processing_fn(
-                    self._samples_for_service[service_name],
-                )
+                self.post_processing_fn(samples)
 
-            samples = self._samples_for_service[service_name]
-            sample_chunks = self._chunk_samples(samples)
-            for idx, chunk in enumerate(sample_chunks):
-                metrics_container = MetricsContainer(
-                    gatewayId=snowflake.snowflake(),
-                    family=chunk,
-                )
-                future = client.Collect.future(
-                    metrics_container,
-                    self.grpc_timeout,
-                )
-                future.add_done_callback(
-                    self._make_sync_done_func(
-                        service_name, idx,
-                    ),
-                )
-            self._samples_for_service[service_name].clear()
+            for chunk, num_bytes in self._iter_chunks(samples):
+                self._upload_queue.put(service_name, chunk, num_bytes)
+            self._upload_queue.dispatch()
         self._loop.call_later(self.sync_interval, self.sync, service_name)
 
-    def sync_done(self, service_name, chunk, collect_future):
-        """
-        Sync callback to handle exceptions
-        """
-        err = collect_future.exception()
-        if err:
-            logging.error(
-                "Metrics upload error for service %s (chunk %d)! [%s] %s",
-                service_name,
-                chunk,
-                err.code(),
-                err.details(),
-                extra=EXCLUDE_FROM_ERROR_MONITORING if indicates_connection_error(err) else None,
-            )
-        else:
-            logging.debug(
-                "Metrics upload success for service %s (chunk %d)",
-                service_name, chunk,
-            )
-
     def collect(self, service_name):
         """
         Calls into Service303 to get service metrics samples and
@@ -191,17 +181,23 @@ class MetricsCollector(object):
                 "Collected %d from %s...",
                 len(container.family), service_name,
             )
+            service_label = self._service_labels[service_name]
             for family in container.family:
                 for sample in family.metric:
-                    sample.label.add(name="service", value=service_name)
+                    sample.label.append(service_label)
                 self._samples_for_service[service_name].append(family)
                 if _is_start_time_metric(family):
-                    self._add_uptime_metric(service_name, family)
+                    self._update_start_time(service_name, family)
+            start_time = self._start_time_for_service.get(service_name)
+            if start_time is not None:
+                self._samples_for_service[service_name].append(
+                    _get_uptime_metric(service_name, start_time),
+                )
             self._samples_for_service[service_name].append(
                 _get_collect_success_metric(service_name, True),
             )
 
-    def _add_uptime_metric(self, service_name, family):
+    def _update_start_time(self, service_name, family):
         if (
             not family.metric
             or len(family.metric) == 0
@@ -209,34 +205,23 @@ class MetricsCollector(object):
         ):
             logging.error("Could not parse start time metric: %s", family)
             return
-        start_time = family.metric[0].gauge.value
-        uptime = _get_uptime_metric(service_name, start_time)
-        if uptime is not None:
-            self._samples_for_service[service_name].append(uptime)
-
-    def _make_sync_done_func(self, service_name, chunk):
-        return lambda future: self._loop.call_soon_threadsafe(
-            self.sync_done, service_name, chunk,
-            future,
+        self._start_time_for_service[service_name] = \
+            family.metric[0].gauge.value
+
+    def _get_metricsd_client(self):
+        chan = ServiceRegistry.get_rpc_channel(
+            'metricsd',
+            ServiceRegistry.CLOUD,
+            grpc_options=self._grpc_options,
         )
+        return MetricsControllerStub(chan)
+
+    def _iter_chunks(self, samples):
+        return chunk_samples(samples, self.grpc_max_msg_size_bytes)
 
     def _chunk_samples(self, samples):
-        # Add 1kiB for gRPC overhead
-        max_msg_bytes = self.grpc_max_msg_size_bytes - 1000
-
-        chunked_samples = []
-        chunked_samples_size = 0
-        for s in samples:
-            if chunked_samples_size + s.ByteSize() <= max_msg_bytes:
-                chunked_samples.append(s)
-                chunked_samples_size += s.ByteSize()
-            else:
-                yield chunked_samples
-                chunked_samples = [s]
-                chunked_samples_size = s.ByteSize()
-        # Send leftover samples
-        if chunked_samples_size > 0:
-            yield chunked_samples
+        for chunk, _ in self._iter_chunks(samples):
+            yield chunk
 
     def scrape_prometheus_target(self, target: ScrapeTarget) -> None:
         """
@@ -265,52 +250,15 @@ class MetricsCollector(object):
         """
         Send parsed and protobuf-converted metrics to cloud.
         """
-        chan = ServiceRegistry.get_rpc_channel(
-            'metricsd',
-            ServiceRegistry.CLOUD,
-            grpc_options=self._grpc_options,
-        )
-
-        client = MetricsControllerStub(chan)
-        for chunk in self._chunk_samples(metrics):
-            metrics_container = MetricsContainer(
-                gatewayId=snowflake.snowflake(),
-                family=chunk,
-            )
-            future = client.Collect.future(
-                metrics_container,
-                self.grpc_timeout,
-            )
-            future.add_done_callback(
-                lambda future:
-                self._loop.call_soon_threadsafe(
-                    self.scrape_done, future, target,
-                ),
-            )
+        for chunk, num_bytes in self._iter_chunks(metrics):
+            self._upload_queue.put(target.name, chunk, num_bytes)
+        self._upload_queue.dispatch()
 
         self._loop.call_later(
             target.interval,
             self.scrape_prometheus_target, target,
         )
 
-    def scrape_done(self, collect_future, target):
-        """
-        Log error if send fails, otherwise reschedule collection
-        """
-        err = collect_future.exception()
-        if err:
-            logging.error(
-                "Prometheus Target Metrics upload error! [%s] %s",
-                err.code(),
-                err.details(),
-                extra=EXCLUDE_FROM_ERROR_MONITORING if indicates_connection_error(err) else None,
-            )
-        else:
-            logging.debug(
-                "Prometheus Target Metrics upload success: %s",
-                target.name,
-            )
-
 
 def _parse_metrics_response(response_text: str) -> [metrics_pb2.MetricFamily]:
     parsed_families = list(text_string_to_metric_families(response_text))
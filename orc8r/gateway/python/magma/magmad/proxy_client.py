@@ -12,11 +12,10 @@ limitations under the License.
 """
 import asyncio
 import logging
+from typing import Optional
 
-import aioh2
-import h2.events
 from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
-from magma.common.service_registry import ServiceRegistry
+from magma.magmad.proxy_connection_pool import ProxyConnectionPool
 from orc8r.protos.sync_rpc_service_pb2 import GatewayResponse, SyncRPCResponse
 
 
@@ -25,10 +24,16 @@ class ControlProxyHttpClient(object):
     ControlProxyHttpClient is a httpclient sending request
     to the control proxy local port. It's used in SyncRPCClient
     for forwarding GatewayRequests from the cloud, and gets a GatewayResponse.
+
+    The requests to a service are multiplexed as streams over the pooled
+    HTTP/2 connections to the service.
     """
 
-    def __init__(self):
-        self._connection_table = {}  # map req id -> client
+    def __init__(self, pool: Optional[ProxyConnectionPool] = None):
+        if pool is None:
+            pool = ProxyConnectionPool()
+        self._pool = pool
+        self._connection_table = {}  # map req id -> pooled connection
 
     async def send(
         self, gateway_request, req_id, sync_rpc_response_queue,
@@ -52,18 +57,6 @@ class ControlProxyHttpClient(object):
         Returns: None.
 
         """
-        client = await self._get_client(gateway_request.authority)
-
-        # Small hack to set PingReceived to no-op because the log gets spammed
-        # with KeyError messages since aioh2 doesn't have a handler for
-        # PingReceived. Remove if future versions support it.
-        # pylint: disable=protected-access
-        if hasattr(h2.events, "PingReceived"):
-            # Need the hasattr here because some older versions of h2 may not
-            # have the PingReceived event
-            client._event_handlers[h2.events.PingReceived] = lambda _: None
-        # pylint: enable=protected-access
-
         if req_id in self._connection_table:
             logging.warning(
                 "[SyncRPC] proxy_client is already handling request ID %s",
@@ -81,24 +74,31 @@ class ControlProxyHttpClient(object):
                     ),
                 ),
             )
-            client.close_connection()
             return
-        self._connection_table[req_id] = client
+        # Reserve the request ID while the connection is acquired
+        self._connection_table[req_id] = None
 
+        conn = None
+        stream_id = None
+        completed = False
         try:
-            await client.wait_functional()
+            body = gateway_request.payload
+            conn = await self._pool.acquire(
+                gateway_request.authority, len(body),
+            )
+            self._connection_table[req_id] = conn
             req_headers = self._get_req_headers(
                 gateway_request.headers,
                 gateway_request.path,
                 gateway_request.authority,
             )
-            body = gateway_request.payload
-            stream_id = await client.start_request(req_headers)
+            stream_id = await conn.client.start_request(req_headers)
             await self._await_gateway_response(
-                client, stream_id, body,
+                conn, stream_id, body,
                 req_id, sync_rpc_response_queue,
                 conn_closed_table,
             )
+            completed = True
         except ConnectionAbortedError:
             logging.error(
                 "[SyncRPC] proxy_client connection terminated by cloud",
@@ -117,40 +117,25 @@ class ControlProxyHttpClient(object):
                 ),
             )
         finally:
-            del self._connection_table[req_id]
-            try:
-                client.close_connection()
-            except AttributeError as e:
-                logging.error(
-                    '[SyncRPC] Error while trying to close conn: %s',
-                    str(e),
-                    extra=EXCLUDE_FROM_ERROR_MONITORING,
-                )
+            self._connection_table.pop(req_id, None)
+            if conn is not None:
+                if stream_id is not None and not completed:
+                    # Cancel the stream only, the connection is shared
+                    self._pool.reset_stream(conn, stream_id)
+                self._pool.release(conn, stream_id)
 
     def close_all_connections(self):
-        connections = list(self._connection_table.values())
-        for client in connections:
-            try:
-                client.close_connection()
-            except (ConnectionAbortedError, AttributeError) as e:
-                logging.error(
-                    '[SyncRPC] Error while trying to close conn: %s',
-                    str(e),
-                    extra=EXCLUDE_FROM_ERROR_MONITORING,
-                )
+        self._pool.close_all()
         self._connection_table.clear()
 
-    @staticmethod
-    async def _get_client(service):
-        (ip, port) = ServiceRegistry.get_service_address(service)
-        return await aioh2.open_connection(ip, port)
-
     async def _await_gateway_response(
-        self, client, stream_id, body,
+        self, conn, stream_id, body,
         req_id, response_queue,
         conn_closed_table,
     ):
-        await client.send_data(stream_id, body, end_stream=True)
+        await conn.send_data(stream_id, body)
+
+        client = conn.client
 
         resp_headers = await client.recv_response(stream_id)
         status = self._get_resp_status(resp_headers)
@@ -0,0 +1,295 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional
+
+import aioh2
+import h2.events
+import h2.exceptions
+from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
+from magma.common.service_registry import ServiceRegistry
+
+# pylint: disable=protected-access
+
+
+class PooledConnection(object):
+    """
+    HTTP/2 connection to a local service, shared by the concurrent proxied
+    requests to the service, each on its own stream
+    """
+    __slots__ = (
+        'service', 'client', 'active_streams', 'last_used', 'retired',
+        'idle_handle', 'send_lock',
+    )
+
+    def __init__(self, service: str, client: aioh2.H2Protocol):
+        self.service = service
+        self.client = client
+        self.active_streams = 0
+        self.last_used = 0.0
+        # Retired connections get no new streams, and are closed once idle
+        self.retired = False
+        self.idle_handle = None  # type: Optional[asyncio.TimerHandle]
+        # aioh2 schedules the concurrent sends of a connection racily, and
+        # may then spin forever on its priority tree
+        self.send_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        # aioh2 drops its h2 state machine once the connection is lost
+        return self.client._conn is not None
+
+    def max_streams(self, max_streams_per_connection: int) -> int:
+        return min(
+            max_streams_per_connection,
+            self.client._conn.remote_settings.max_concurrent_streams,
+        )
+
+    async def send_data(self, stream_id: int, data: bytes) -> None:
+        """ Send the body of a request, ending its stream """
+        async with self.send_lock:
+            await self.client.send_data(stream_id, data, end_stream=True)
+
+    def send_window(self) -> int:
+        """ Bytes that can be sent before the service opens the window """
+        return self.client._conn.outbound_flow_control_window
+
+
+class ProxyConnectionPool(object):
+    """
+    Pool of long-lived HTTP/2 connections to the local services, which
+    multiplexes the proxied requests to a service as streams over up to
+    max_connections_per_service connections.
+
+    A request goes to the open connection with the fewest active streams
+    among those whose connection flow control window fits its body, and a
+    new connection is only opened once all the connections of the service
+    carry max_streams_per_connection streams, or as many as the service
+    allows. Past max_connections_per_service, the requests wait for a stream
+    to end. A connection without streams for idle_timeout seconds is closed.
+    """
+
+    def __init__(
+        self,
+        max_connections_per_service: int = 2,
+        max_streams_per_connection: int = 100,
+        idle_timeout: float = 300,
+        functional_timeout: float = 5,
+    ):
+        self._max_connections_per_service = max_connections_per_service
+        self._max_streams_per_connection = max_streams_per_connection
+        self._idle_timeout = idle_timeout
+        self._functional_timeout = functional_timeout
+        self._connections_by_service = defaultdict(
+            list,
+        )  # type: Dict[str, List[PooledConnection]]
+        # Serializes the connection openings of each service, so that a
+        # burst of requests opens a single connection
+        self._open_locks = {}  # type: Dict[str, asyncio.Lock]
+        # Requests waiting for a stream, once all the connections are full
+        self._waiters = defaultdict(
+            deque,
+        )  # type: Dict[str, Deque[asyncio.Future]]
+
+    def __len__(self) -> int:
+        return sum(
+            len(connections)
+            for connections in self._connections_by_service.values()
+        )
+
+    async def acquire(
+        self, service: str, body_size: int = 0,
+    ) -> PooledConnection:
+        """
+        Get a functional connection to service to start a stream on, and
+        count the stream as active until it is released
+        """
+        while True:
+            conn = self._pick(service, body_size)
+            if conn is not None:
+                break
+            lock = self._open_locks.setdefault(service, asyncio.Lock())
+            async with lock:
+                conn = self._pick(service, body_size)
+                if conn is None and len(
+                    self._connections_by_service[service],
+                ) < self._max_connections_per_service:
+                    conn = await self._open(service)
+            if conn is not None:
+                break
+            # All the connections carry their max streams, rather than
+            # queueing the stream in aioh2, wait for another one to end
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters[service].append(waiter)
+            await waiter
+        conn.active_streams += 1
+        try:
+            await asyncio.wait_for(
+                conn.client.wait_functional(), self._functional_timeout,
+            )
+        except asyncio.TimeoutError:
+            self.release(conn, None)
+            self.retire(conn)
+            raise ConnectionError(
+                'Connection to {} is not responding'.format(service),
+            )
+        return conn
+
+    def release(self, conn: PooledConnection, stream_id: Optional[int]):
+        """ End the stream of a request on conn """
+        conn.active_streams -= 1
+        if stream_id is not None:
+            # aioh2 never forgets the streams of a connection
+            conn.client._streams.pop(stream_id, None)
+        self._wake_waiter(conn.service)
+        if conn.active_streams > 0:
+            return
+        loop = asyncio.get_event_loop()
+        conn.last_used = loop.time()
+        if conn.retired or not conn.is_open:
+            self._close(conn)
+            return
+        if conn.idle_handle is None:
+            conn.idle_handle = loop.call_later(
+                self._idle_timeout, self._evict_if_idle, conn,
+            )
+
+    @staticmethod
+    def reset_stream(conn: PooledConnection, stream_id: int) -> None:
+        """
+        Cancel the stream of an aborted request, leaving the other streams
+        of the connection running
+        """
+        if not conn.is_open:
+            return
+        try:
+            conn.client._conn.reset_stream(stream_id)
+            conn.client._flush()
+        except h2.exceptions.ProtocolError as e:
+            logging.debug(
+                '[SyncRPC] Stream %d already closed: %s', stream_id, e,
+            )
+
+    def retire(self, conn: PooledConnection) -> None:
+        """
+        Stop starting streams on conn, e.g. after an error, and close it
+        once its streams are done
+        """
+        conn.retired = True
+        self._remove(conn)
+        if conn.active_streams == 0:
+            self._close(conn)
+        # Its requests may be waited for on a new connection
+        self._wake_waiter(conn.service)
+
+    def close_all(self) -> None:
+        for connections in self._connections_by_service.values():
+            for conn in connections:
+                conn.retired = True
+                self._close(conn)
+        self._connections_by_service.clear()
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            waiters.clear()
+
+    def _pick(
+        self, service: str, body_size: int,
+    ) -> Optional[PooledConnection]:
+        """
+        Pick the connection to start a stream on, among the open ones with
+        less than their max streams
+        """
+        connections = self._connections_by_service[service]
+        connections[:] = [conn for conn in connections if conn.is_open]
+        connections = [
+            conn for conn in connections
+            if conn.active_streams < conn.max_streams(
+                self._max_streams_per_connection,
+            )
+        ]
+        if not connections:
+            return None
+        return min(
+            connections,
+            key=lambda conn: (
+                conn.send_window() < body_size,
+                conn.active_streams,
+                -conn.send_window(),
+            ),
+        )
+
+    async def _open(self, service: str) -> PooledConnection:
+        (ip, port) = ServiceRegistry.get_service_address(service)
+        client = await aioh2.open_connection(ip, port)
+
+        # Small hack to set PingReceived to no-op because the log gets spammed
+        # with KeyError messages since aioh2 doesn't have a handler for
+        # PingReceived. Remove if future versions support it.
+        if hasattr(h2.events, "PingReceived"):
+            # Need the hasattr here because some older versions of h2 may not
+            # have the PingReceived event
+            client._event_handlers[h2.events.PingReceived] = lambda _: None
+
+        conn = PooledConnection(service, client)
+        self._connections_by_service[service].append(conn)
+        logging.debug(
+            "[SyncRPC] Opened connection %d to %s",
+            len(self._connections_by_service[service]), service,
+        )
+        return conn
+
+    def _evict_if_idle(self, conn: PooledConnection) -> None:
+        conn.idle_handle = None
+        if conn.active_streams > 0 or conn.retired:
+            # Checked again once its streams are released
+            return
+        loop = asyncio.get_event_loop()
+        remaining = conn.last_used + self._idle_timeout - loop.time()
+        if remaining > 0:
+            # Used again since, check once its new idle period is over
+            conn.idle_handle = loop.call_later(
+                remaining, self._evict_if_idle, conn,
+            )
+            return
+        logging.debug("[SyncRPC] Closing idle connection to %s", conn.service)
+        conn.retired = True
+        self._remove(conn)
+        self._close(conn)
+
+    def _wake_waiter(self, service: str) -> None:
+        waiters = self._waiters.get(service)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _remove(self, conn: PooledConnection) -> None:
+        connections = self._connections_by_service.get(conn.service, [])
+        if conn in connections:
+            connections.remove(conn)
+
+    @staticmethod
+    def _close(conn: PooledConnection) -> None:
+        try:
+            conn.client.close_connection()
+        except (ConnectionAbortedError, AttributeError) as e:
+            logging.error(
+                '[SyncRPC] Error while trying to close conn: %s',
+                str(e),
+                extra=EXCLUDE_FROM_ERROR_MONITORING,
+            )
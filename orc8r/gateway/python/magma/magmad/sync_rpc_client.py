@@ -16,7 +16,7 @@ import queue
 import random
 import threading
 import time
-from typing import List
+from typing import Any, Dict, List, Optional
 
 import grpc
 import magma.magmad.events as magmad_events
@@ -25,6 +25,7 @@ from magma.common.rpc_utils import is_grpc_error_retryable
 from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
 from magma.common.service_registry import ServiceRegistry
 from magma.magmad.proxy_client import ControlProxyHttpClient
+from magma.magmad.proxy_connection_pool import ProxyConnectionPool
 from orc8r.protos.sync_rpc_service_pb2 import SyncRPCRequest, SyncRPCResponse
 from orc8r.protos.sync_rpc_service_pb2_grpc import SyncRPCServiceStub
 
@@ -40,6 +41,7 @@ class SyncRPCClient(threading.Thread):
     def __init__(
         self, loop, response_timeout: int,
         print_grpc_payload: bool = False,
+        proxy_config: Optional[Dict[str, Any]] = None,
     ):
         threading.Thread.__init__(self)
         # a synchronized queue
@@ -49,7 +51,9 @@ class SyncRPCClient(threading.Thread):
         # seconds to wait for an actual SyncRPCResponse to become available
         # before sending out a heartBeat
         self._response_timeout = response_timeout
-        self._proxy_client = ControlProxyHttpClient()
+        self._proxy_client = ControlProxyHttpClient(
+            ProxyConnectionPool(**(proxy_config or {})),
+        )
         self.daemon = True
         self._current_delay = 0
         self._last_conn_time = 0
@@ -217,7 +221,10 @@ class SyncRPCClient(threading.Thread):
         current proxy client connections
         """
         self._conn_closed_table.clear()
-        self._proxy_client.close_all_connections()
+        # The proxy client connections are used from the event loop
+        self._loop.call_soon_threadsafe(
+            self._proxy_client.close_all_connections,
+        )
         self._retry_connect_sleep()
         magmad_events.disconnected_sync_rpc_stream()
 
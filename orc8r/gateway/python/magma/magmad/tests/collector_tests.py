@@ -17,9 +17,16 @@ import unittest
 import unittest.mock
 from random import randrange
 
+import grpc
 import metrics_pb2
 import prometheus_client
 from magma.common.service_registry import ServiceRegistry
+from magma.magmad.metrics_buffer import (
+    DROP_NEWEST,
+    DROP_OLDEST,
+    SampleBuffer,
+    UploadQueue,
+)
 # Allow access to protected variables for unit testing
 # pylint: disable=protected-access
 from magma.magmad.metrics_collector import (
@@ -54,6 +61,17 @@ class MockFuture(object):
             return 0
 
 
+class MockRpcError(object):
+    def __init__(self, code):
+        self._code = code
+
+    def details(self):
+        return ''
+
+    def code(self):
+        return self._code
+
+
 class MetricsCollectorTests(unittest.TestCase):
     """
     Tests for the MetricCollector collect and sync
@@ -212,6 +230,37 @@ class MetricsCollectorTests(unittest.TestCase):
         except Exception:  # pylint: disable=broad-except
             self.fail("Collection with empty metric should not have failed")
 
+    def test_collect_delta_uptime(self):
+        """
+        Test that the uptime is still reported when the start time isn't
+        exported again by the service.
+        """
+        mock = unittest.mock.MagicMock()
+        start_metric = Metric()
+        start_metric.gauge.value = calendar.timegm(time.gmtime()) - 1
+        start_time = MetricFamily(
+            name=str(metricsd_pb2.process_start_time_seconds),
+            metric=[start_metric],
+        )
+        service_name = "test"
+        self._collector._samples_for_service[service_name].clear()
+        mock.result.side_effect = [
+            MetricsContainer(family=[start_time]),
+            MetricsContainer(family=[MetricFamily(name="1234")]),
+        ]
+        mock.exception.return_value = False
+
+        self._collector.collect_done('test', mock)
+        self._collector._samples_for_service[service_name].clear()
+        self._collector.collect_done('test', mock)
+
+        names = [
+            fam.name
+            for fam in self._collector._samples_for_service[service_name]
+        ]
+        self.assertIn(str(metricsd_pb2.process_uptime_seconds), names)
+        self.assertEqual(len(names), 3)
+
     def test_counter_to_proto(self):
         test_counter = prometheus_client.core.CounterMetricFamily(
             "test",
@@ -417,6 +466,83 @@ class MetricsCollectorTests(unittest.TestCase):
         chunked_samples = test_collector._chunk_samples(samples)
         self.assertEqual(len(list(chunked_samples)), 2)
 
+    def test_sample_buffer_drop_policy(self):
+        samples = [MetricFamily(name=str(i)) for i in range(10)]
+        sample_size = samples[0].ByteSize() + 2
+
+        drop_oldest = SampleBuffer('test', 4 * sample_size, DROP_OLDEST)
+        drop_oldest.extend(samples)
+        self.assertEqual(list(drop_oldest), samples[-4:])
+        self.assertEqual(drop_oldest.num_bytes, 4 * sample_size)
+
+        drop_newest = SampleBuffer('test', 4 * sample_size, DROP_NEWEST)
+        drop_newest.extend(samples)
+        self.assertEqual(drop_newest.drain(), samples[:4])
+        self.assertEqual(len(drop_newest), 0)
+        self.assertEqual(drop_newest.num_bytes, 0)
+
+    @unittest.mock.patch('snowflake.snowflake')
+    def test_upload_queue(self, mock_snowflake):
+        mock_snowflake.side_effect = lambda: self.gateway_id
+        loop = asyncio.new_event_loop()
+        client = unittest.mock.Mock()
+        futures = []
+
+        def _collect(*_):
+            future = unittest.mock.Mock()
+            futures.append(future)
+            return future
+        client.Collect.future.side_effect = _collect
+
+        def _complete(future, err):
+            future.exception.return_value = err
+            future.add_done_callback.call_args[0][0](future)
+            loop.run_until_complete(asyncio.sleep(0))
+
+        queue = UploadQueue(
+            loop, lambda: client, self.timeout,
+            max_concurrent_uploads=2, max_bytes=1000,
+        )
+
+        chunks = [[MetricFamily(name=str(i))] for i in range(4)]
+        for chunk in chunks:
+            queue.put('test', chunk, 100)
+        queue.dispatch()
+        # Only two uploads at a time
+        self.assertEqual(client.Collect.future.call_count, 2)
+        self.assertEqual(queue.in_flight, 2)
+        self.assertEqual(len(queue), 2)
+
+        # Failed upload is retried after the backoff, and nothing is sent
+        # in the meantime
+        _complete(futures[0], MockRpcError(grpc.StatusCode.UNAVAILABLE))
+        self.assertEqual(client.Collect.future.call_count, 2)
+        self.assertEqual(len(queue), 3)
+        self.assertIsNotNone(queue._retry_handle)
+
+        queue._retry()
+        self.assertEqual(client.Collect.future.call_count, 3)
+        retried = client.Collect.future.call_args[0][0]
+        self.assertEqual(list(retried.family), chunks[0])
+
+        # Successful upload frees a slot
+        _complete(futures[1], None)
+        self.assertEqual(client.Collect.future.call_count, 4)
+        self.assertEqual(
+            list(client.Collect.future.call_args[0][0].family), chunks[2],
+        )
+
+        # Non retryable errors drop the chunk
+        _complete(futures[2], MockRpcError(grpc.StatusCode.INVALID_ARGUMENT))
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(client.Collect.future.call_count, 5)
+
+        # Oldest chunks are dropped past the queue size
+        for chunk in chunks * 3:
+            queue.put('test', chunk, 100)
+        self.assertEqual(len(queue), 10)
+        loop.close()
+
     def _generate_samples(self, number):
         samples = []
         for _ in range(number):
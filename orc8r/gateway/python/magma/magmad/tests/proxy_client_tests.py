@@ -15,12 +15,23 @@ limitations under the License.
 import asyncio
 import queue
 import unittest.mock
+from types import SimpleNamespace
 
 from magma.common.service_registry import ServiceRegistry
 from magma.magmad.proxy_client import ControlProxyHttpClient
 from orc8r.protos.sync_rpc_service_pb2 import GatewayRequest
 
 
+class MockH2Connection(object):
+    def __init__(self):
+        self.remote_settings = SimpleNamespace(max_concurrent_streams=100)
+        self.outbound_flow_control_window = 65535
+        self.reset_streams = []
+
+    def reset_stream(self, stream_id):
+        self.reset_streams.append(stream_id)
+
+
 class MockUnaryClient(object):
     def __init__(self, payload, headers, trailers, expected_req):
         self._expected_payload = payload
@@ -29,6 +40,8 @@ class MockUnaryClient(object):
         self._expected_req = expected_req
         self._event_handlers = {}
         self._num_calls_read_stream = 0
+        self._conn = MockH2Connection()
+        self._streams = {}
 
     async def start_request(self, headers):
         return 3
@@ -55,6 +68,9 @@ class MockUnaryClient(object):
         return self._expected_trailers
 
     def close_connection(self):
+        self._conn = None
+
+    def _flush(self):
         return
 
 
@@ -66,6 +82,8 @@ class MockStreamingClient(object):
         self._expected_req = expected_req
         self._event_handlers = {}
         self._num_calls_read_stream = 0
+        self._conn = MockH2Connection()
+        self._streams = {}
 
     async def start_request(self, headers):
         return 3
@@ -92,6 +110,9 @@ class MockStreamingClient(object):
         return self._expected_trailers
 
     def close_connection(self):
+        self._conn = None
+
+    def _flush(self):
         return
 
 
@@ -251,6 +272,40 @@ class ProxyClientTests(unittest.TestCase):
         self.assertEqual(res_2.respBody.headers['grpc-status'], '0')
         self._loop.close()
 
+    @unittest.mock.patch('aioh2.open_connection')
+    def test_http_client_reuses_connection(self, mock_conn):
+        """ Sequential requests to a service share a connection """
+        expected_header = [
+            (':status', '200'),
+            ('content-type', 'application/grpc'),
+        ]
+        expected_trailers = [('grpc-status', '0'), ('grpc-message', '')]
+        client = MockUnaryClient(
+            b'\x00', expected_header, expected_trailers, self._req_body,
+        )
+        mock_conn.side_effect = asyncio.coroutine(
+            unittest.mock.MagicMock(return_value=client),
+        )
+
+        request_queue = queue.Queue()
+        for req_id in (1234, 1235):
+            self._loop.run_until_complete(
+                self._proxy_client.send(
+                    self._req_body, req_id, request_queue, {},
+                ),
+            )
+
+        self.assertEqual(mock_conn.call_count, 1)
+        self.assertEqual(request_queue.qsize(), 2)
+        self.assertEqual(request_queue.get().reqId, 1234)
+        self.assertEqual(request_queue.get().reqId, 1235)
+        self.assertIsNotNone(client._conn)
+        self.assertEqual(client._conn.reset_streams, [])
+
+        self._proxy_client.close_all_connections()
+        self.assertIsNone(client._conn)
+        self._loop.close()
+
 
 if __name__ == "__main__":
     unittest.main()
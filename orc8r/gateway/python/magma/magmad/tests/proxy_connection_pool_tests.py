@@ -0,0 +1,200 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+# pylint: disable=protected-access
+
+import asyncio
+import unittest.mock
+from types import SimpleNamespace
+
+from magma.common.service_registry import ServiceRegistry
+from magma.magmad.proxy_connection_pool import ProxyConnectionPool
+
+
+class MockH2Connection(object):
+    def __init__(self):
+        self.remote_settings = SimpleNamespace(max_concurrent_streams=100)
+        self.outbound_flow_control_window = 65535
+        self.reset_streams = []
+
+    def reset_stream(self, stream_id):
+        self.reset_streams.append(stream_id)
+
+
+class MockClient(object):
+    def __init__(self):
+        self._conn = MockH2Connection()
+        self._event_handlers = {}
+        self._streams = {}
+
+    async def wait_functional(self):
+        return
+
+    def close_connection(self):
+        self._conn = None
+
+    def _flush(self):
+        return
+
+
+class ProxyConnectionPoolTests(unittest.TestCase):
+    """
+    Tests for the ProxyConnectionPool.
+    """
+
+    def setUp(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        ServiceRegistry._REGISTRY = {
+            "services": {
+                "mobilityd": {
+                    "ip_address": "0.0.0.0",
+                    "port": 3456,
+                },
+            },
+        }
+        self._clients = []
+        patcher = unittest.mock.patch('aioh2.open_connection')
+        self._open_connection = patcher.start()
+        self._open_connection.side_effect = self._open
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._loop.close()
+
+    async def _open(self, ip, port):
+        client = MockClient()
+        self._clients.append(client)
+        return client
+
+    def _acquire(self, pool, body_size=0):
+        return self._loop.run_until_complete(
+            pool.acquire('mobilityd', body_size),
+        )
+
+    def test_multiplexes_streams(self):
+        pool = ProxyConnectionPool(max_connections_per_service=2)
+
+        async def acquire_all():
+            return await asyncio.gather(
+                *[pool.acquire('mobilityd') for _ in range(10)]
+            )
+        conns = self._loop.run_until_complete(acquire_all())
+
+        self.assertEqual(self._open_connection.call_count, 1)
+        self.assertEqual(len({id(conn) for conn in conns}), 1)
+        self.assertEqual(conns[0].active_streams, 10)
+
+    def test_opens_connection_when_full(self):
+        pool = ProxyConnectionPool(
+            max_connections_per_service=2, max_streams_per_connection=2,
+        )
+        conns = [self._acquire(pool) for _ in range(4)]
+
+        self.assertEqual(self._open_connection.call_count, 2)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual([conn.active_streams for conn in conns], [2] * 4)
+
+        # Past the limit, a request waits for a stream to end
+        waiting = self._loop.create_task(pool.acquire('mobilityd'))
+        self._loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(waiting.done())
+        pool.release(conns[3], 1)
+        self.assertIs(self._loop.run_until_complete(waiting), conns[3])
+        self.assertEqual(self._open_connection.call_count, 2)
+
+        # The streams allowed by the service are also honored
+        self._clients[0]._conn.remote_settings.max_concurrent_streams = 1
+        pool.release(conns[0], 3)
+        self.assertIsNone(pool._pick('mobilityd', 0))
+
+    def test_send_data_serialized(self):
+        pool = ProxyConnectionPool()
+        conn = self._acquire(pool)
+        sends = []
+
+        async def send_data(stream_id, data, end_stream=False):
+            sends.append(('start', stream_id))
+            await asyncio.sleep(0.01)
+            sends.append(('end', stream_id))
+        conn.client.send_data = send_data
+
+        self._loop.run_until_complete(
+            asyncio.gather(conn.send_data(1, b'a'), conn.send_data(3, b'b')),
+        )
+        self.assertEqual(
+            sends, [('start', 1), ('end', 1), ('start', 3), ('end', 3)],
+        )
+
+    def test_flow_control_aware(self):
+        pool = ProxyConnectionPool(
+            max_connections_per_service=2, max_streams_per_connection=1,
+        )
+        first = self._acquire(pool)
+        second = self._acquire(pool)
+        pool.release(first, 1)
+        pool.release(second, 3)
+        self.assertEqual(first.active_streams, 0)
+
+        # The fullest window gets the request body
+        self._clients[0]._conn.outbound_flow_control_window = 10
+        self.assertIs(self._acquire(pool, body_size=1000), second)
+        # Otherwise the least loaded connection does
+        self.assertIs(self._acquire(pool, body_size=1000), first)
+
+    def test_idle_eviction(self):
+        pool = ProxyConnectionPool(idle_timeout=0.05)
+        conn = self._acquire(pool)
+        conn.client._streams[1] = object()
+        pool.release(conn, 1)
+        self.assertEqual(conn.client._streams, {})
+
+        self._loop.run_until_complete(asyncio.sleep(0.02))
+        self.assertIs(self._acquire(pool), conn)
+        pool.release(conn, 3)
+        self._loop.run_until_complete(asyncio.sleep(0.04))
+        # Used again within its idle timeout
+        self.assertEqual(len(pool), 1)
+
+        self._loop.run_until_complete(asyncio.sleep(0.1))
+        self.assertEqual(len(pool), 0)
+        self.assertIsNone(self._clients[0]._conn)
+
+    def test_lost_connection(self):
+        pool = ProxyConnectionPool()
+        conn = self._acquire(pool)
+        conn.client.close_connection()
+
+        self.assertIsNot(self._acquire(pool), conn)
+        self.assertEqual(self._open_connection.call_count, 2)
+        self.assertEqual(len(pool), 1)
+
+    def test_reset_stream_and_retire(self):
+        pool = ProxyConnectionPool()
+        conn = self._acquire(pool)
+        other = self._acquire(pool)
+        self.assertIs(conn, other)
+
+        pool.reset_stream(conn, 1)
+        self.assertEqual(self._clients[0]._conn.reset_streams, [1])
+
+        # A retired connection is closed once its streams are done
+        pool.retire(conn)
+        self.assertEqual(len(pool), 0)
+        pool.release(conn, 1)
+        self.assertIsNotNone(self._clients[0]._conn)
+        pool.release(other, 3)
+        self.assertIsNone(self._clients[0]._conn)
+
+
+if __name__ == "__main__":
+    unittest.main()
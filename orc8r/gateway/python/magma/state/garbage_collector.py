@@ -51,6 +51,9 @@ class GarbageCollector:
 
         # _grpc_client_manager to manage grpc client recyclings
         self._grpc_client_manager = grpc_client_manager
+        # Garbage keys of each redis dict collected for the last request,
+        # deleted from Redis once the request succeeds
+        self._garbage_keys = []
 
     async def run_garbage_collection(self):
         request = await self._collect_states_to_delete()
@@ -59,8 +62,11 @@ class GarbageCollector:
 
     async def _collect_states_to_delete(self):
         states_to_delete = []
+        self._garbage_keys = []
         for redis_dict in self._redis_dicts:
-            for key in redis_dict.garbage_keys():
+            garbage_keys = list(redis_dict.scan_with_metadata(garbage=True))
+            self._garbage_keys.append((redis_dict, garbage_keys))
+            for key in garbage_keys:
                 state_scope = redis_dict.state_scope
                 device_id = make_scoped_device_id(key, state_scope)
                 sid = StateID(deviceID=device_id, type=redis_dict.redis_type)
@@ -93,9 +99,12 @@ class GarbageCollector:
                 extra=EXCLUDE_FROM_ERROR_MONITORING if indicates_connection_error(err) else None,
             )
         else:
-            for redis_dict in self._redis_dicts:
-                for key in redis_dict.garbage_keys():
+            # Keys updated since they were collected are no longer garbage,
+            # and are kept by _delete_state_from_redis
+            for redis_dict, garbage_keys in self._garbage_keys:
+                for key in garbage_keys:
                     await self._delete_state_from_redis(redis_dict, key)
+            self._garbage_keys = []
 
     async def _delete_state_from_redis(
         self,
@@ -20,6 +20,13 @@ def make_mem_key(device_id: str, state_type: str) -> str:
     return device_id + ":" + state_type
 
 
+def get_mem_key_type(mem_key: str) -> str:
+    """
+    Return the type of a key of the format <id>:<type>
+    """
+    return mem_key.rsplit(":", 1)[-1]
+
+
 def make_scoped_device_id(idval: str, scope: str) -> str:
     """
     Create a deviceID of the format <id> for scope 'network'
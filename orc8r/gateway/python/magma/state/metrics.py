@@ -0,0 +1,28 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from prometheus_client import Counter
+
+# Counters for state replication
+STATE_KEYS_SCANNED = Counter(
+    'state_keys_scanned',
+    'Total state keys read from Redis for replication', ['state_type'],
+)
+STATE_KEYS_REPORTED = Counter(
+    'state_keys_reported',
+    'Total state keys reported to the Orchestrator', ['state_type'],
+)
+STATE_FULL_SYNCS = Counter(
+    'state_full_syncs',
+    'Total full syncs of the replicated state',
+)
@@ -19,8 +19,10 @@ from magma.common.redis.containers import RedisFlatDict
 from magma.common.redis.serializers import (
     RedisSerde,
     get_json_deserializer,
+    get_json_msg_deserializer,
     get_json_serializer,
     get_proto_deserializer,
+    get_proto_msg_deserializer,
     get_proto_serializer,
 )
 
@@ -34,8 +36,14 @@ class StateDict(RedisFlatDict):
     state to Redis.
     """
 
-    def __init__(self, serde: RedisSerde, state_scope: str, state_format: int):
-        super().__init__(get_default_client(), serde)
+    def __init__(
+        self, serde: RedisSerde, state_scope: str, state_format: int,
+        key_index: bool = False, change_feed: bool = False,
+    ):
+        super().__init__(
+            get_default_client(), serde,
+            key_index=key_index, change_feed=change_feed,
+        )
         # Scope determines the deviceID to report the state with
         self.state_scope = state_scope
         self.state_format = state_format
@@ -67,11 +75,14 @@ def get_proto_redis_dicts(config):
                 redis_key,
                 get_proto_serializer(),
                 get_proto_deserializer(msg),
+                get_proto_msg_deserializer(msg),
             )
             redis_dict = StateDict(
                 serde,
                 proto_cfg['state_scope'],
                 PROTO_FORMAT,
+                proto_cfg.get('key_index', False),
+                proto_cfg.get('change_feed', False),
             )
             redis_dicts.append(redis_dict)
 
@@ -103,11 +114,14 @@ def get_json_redis_dicts(config):
             redis_key,
             get_json_serializer(),
             get_json_deserializer(),
+            get_json_msg_deserializer(),
         )
         redis_dict = StateDict(
             serde,
             json_cfg['state_scope'],
             JSON_FORMAT,
+            json_cfg.get('key_index', False),
+            json_cfg.get('change_feed', False),
         )
         redis_dicts.append(redis_dict)
 
@@ -0,0 +1,102 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import hashlib
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import grpc
+import jsonpickle
+from google.protobuf.json_format import MessageToDict
+from google.protobuf.message import Message
+from magma.common.redis.containers import ValueWithMetadata
+from magma.state.redis_dicts import PROTO_FORMAT
+
+# Bytes reserved for the gRPC and request overhead in each chunk
+GRPC_OVERHEAD_BYTES = 1000
+
+GRPC_COMPRESSION = {
+    'none': grpc.Compression.NoCompression,
+    'gzip': grpc.Compression.Gzip,
+}
+
+M = TypeVar('M', bound=Message)
+
+
+class StateEncoder:
+    """
+    StateEncoder encodes the replicated states to the JSON values reported
+    to the Orchestrator.
+
+    The last encoded value of each state is cached along with a digest of
+    its serialized form, so that a state whose version was bumped without a
+    change of content isn't deserialized and encoded again.
+    """
+
+    def __init__(self):
+        # in-memory key of the state => (digest, encoded value)
+        self._cache: Dict[str, Tuple[bytes, bytes]] = {}
+
+    def encode(
+        self, in_mem_key: str, entry: ValueWithMetadata,
+        state_format: int,
+    ) -> Optional[bytes]:
+        """
+        Return the JSON value of a state, None if the state is empty.
+        Raises if the state can't be encoded.
+        """
+        digest = hashlib.blake2b(
+            entry.serialized_msg, digest_size=16,
+        ).digest()
+        cached = self._cache.get(in_mem_key)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+
+        value = entry.value
+        if value is None:
+            return None
+        if state_format == PROTO_FORMAT:
+            serialized_json_state = json.dumps(MessageToDict(value))
+        else:
+            serialized_json_state = jsonpickle.encode(value)
+        encoded = serialized_json_state.encode("utf-8")
+        self._cache[in_mem_key] = (digest, encoded)
+        return encoded
+
+    def forget(self, in_mem_key: str):
+        """Drop the cached value of a state that was deleted"""
+        self._cache.pop(in_mem_key, None)
+
+
+def chunk_messages(
+    messages: Iterable[M], max_msg_bytes: int,
+) -> Iterator[List[M]]:
+    """
+    Split messages in chunks whose serialized size fits in a gRPC message
+    of max_msg_bytes. A message larger than the limit is sent on its own.
+    """
+    max_chunk_bytes = max_msg_bytes - GRPC_OVERHEAD_BYTES
+
+    chunk = []
+    chunk_size = 0
+    for msg in messages:
+        # Repeated field tag and length prefix
+        msg_size = msg.ByteSize() + 8
+        if chunk and chunk_size + msg_size > max_chunk_bytes:
+            yield chunk
+            chunk = []
+            chunk_size = 0
+        chunk.append(msg)
+        chunk_size += msg_size
+    # Send leftover messages
+    if chunk:
+        yield chunk
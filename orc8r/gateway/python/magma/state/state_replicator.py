@@ -12,12 +12,9 @@ limitations under the License.
 """
 # pylint: disable=broad-except
 
-import json
 import logging
 
 import grpc
-import jsonpickle
-from google.protobuf.json_format import MessageToDict
 from magma.common.grpc_client_manager import GRPCClientManager
 from magma.common.rpc_utils import (
     grpc_async_wrapper,
@@ -28,11 +25,21 @@ from magma.common.sdwatchdog import SDWatchdogTask
 from magma.common.sentry import EXCLUDE_FROM_ERROR_MONITORING
 from magma.common.service import MagmaService
 from magma.state.garbage_collector import GarbageCollector
-from magma.state.keys import make_mem_key, make_scoped_device_id
-from magma.state.redis_dicts import (
-    PROTO_FORMAT,
-    get_json_redis_dicts,
-    get_proto_redis_dicts,
+from magma.state.keys import (
+    get_mem_key_type,
+    make_mem_key,
+    make_scoped_device_id,
+)
+from magma.state.metrics import (
+    STATE_FULL_SYNCS,
+    STATE_KEYS_REPORTED,
+    STATE_KEYS_SCANNED,
+)
+from magma.state.redis_dicts import get_json_redis_dicts, get_proto_redis_dicts
+from magma.state.state_encoder import (
+    GRPC_COMPRESSION,
+    StateEncoder,
+    chunk_messages,
 )
 from orc8r.protos.service303_pb2 import State
 from orc8r.protos.state_pb2 import (
@@ -45,6 +52,8 @@ from orc8r.protos.state_pb2 import (
 DEFAULT_SYNC_INTERVAL = 60
 DEFAULT_GRPC_TIMEOUT = 10
 GARBAGE_COLLECTION_ITERATION_INTERVAL = 2
+DEFAULT_FULL_SYNC_ITERATIONS = 10
+DEFAULT_MAX_GRPC_MSG_SIZE_MB = 4
 
 
 def _resolve_sync_interval(service: MagmaService) -> int:
@@ -78,6 +87,14 @@ class StateReplicator(SDWatchdogTask):
     """
     StateReplicator periodically fetches all configured state from Redis,
     reporting any updates to the Orchestrator State service.
+
+    State types whose writer maintains a change feed are only read for the
+    keys that changed since the previous iteration. All state is read on a
+    full sync, every full_sync_iterations iterations and after a failure to
+    report, as a safety net.
+
+    Reported states are split in requests of at most max_grpc_msg_size_mb,
+    optionally compressed with grpc_compression.
     """
 
     def __init__(
@@ -99,6 +116,9 @@ class StateReplicator(SDWatchdogTask):
         # Set of keys from current replication iteration - used to track
         # keys to delete from _state_versions dict
         self._state_keys_from_current_iteration = set()
+        # State types whose keys were all read on current iteration, only
+        # their keys can be deleted from _state_versions dict
+        self._state_types_from_current_iteration = set()
         # Redis clients for each type of state to replicate
         self._redis_dicts = []
         self._redis_dicts.extend(get_proto_redis_dicts(service.config))
@@ -115,6 +135,35 @@ class StateReplicator(SDWatchdogTask):
         self._replication_iteration = 0
         self._print_grpc_payload = print_grpc_payload
 
+        # Number of replication iterations between full syncs of the
+        # change feed state types
+        self._full_sync_iterations = service.config.get(
+            'full_sync_iterations',
+            DEFAULT_FULL_SYNC_ITERATIONS,
+        )
+        self._iterations_since_full_sync = 0
+        # Flag to force a full sync on next iteration, e.g. after a failure
+        # to report changed states
+        self._full_sync_pending = True
+
+        # Encoder caching the last reported value of each state
+        self._encoder = StateEncoder()
+        # Reported states are split in requests of at most _max_msg_bytes
+        self._max_msg_bytes = int(
+            service.config.get(
+                'max_grpc_msg_size_mb',
+                DEFAULT_MAX_GRPC_MSG_SIZE_MB,
+            ) * 1024 * 1024,
+        )
+        compression = service.config.get('grpc_compression', 'none')
+        self._compression = GRPC_COMPRESSION.get(compression)
+        if self._compression is None:
+            logging.warning(
+                "Unsupported grpc_compression %s, sending uncompressed",
+                compression,
+            )
+            self._compression = grpc.Compression.NoCompression
+
         if self._print_grpc_payload:
             logging.info("Printing GRPC messages")
 
@@ -145,8 +194,7 @@ class StateReplicator(SDWatchdogTask):
     async def _resync(self):
         states_to_sync = []
         for redis_dict in self._redis_dicts:
-            for key in redis_dict:
-                version = redis_dict.get_version(key)
+            for key, version in redis_dict.versions_snapshot().items():
                 device_id = make_scoped_device_id(key, redis_dict.state_scope)
                 state_id = StateID(
                     type=redis_dict.redis_type,
@@ -159,52 +207,99 @@ class StateReplicator(SDWatchdogTask):
             logging.debug("Not re-syncing state. No local state found.")
             return
         state_client = self._grpc_client_manager.get_client()
-        request = SyncStatesRequest(states=states_to_sync)
-        print_grpc(
-            request, self._print_grpc_payload,
-            "Sending resync state request",
-        )
-        response = await grpc_async_wrapper(
-            state_client.SyncStates.future(
-                request,
-                DEFAULT_GRPC_TIMEOUT,
-            ),
-            self._loop,
-        )
-        print_grpc(
-            response, self._print_grpc_payload,
-            "Received resync state request",
-        )
-        unsynced_states = set()
-        for id_and_version in response.unsyncedStates:
-            unsynced_states.add((
-                id_and_version.id.type,
-                id_and_version.id.deviceID,
-            ))
-        # Update in-memory map to add already synced states
-        for state in request.states:
-            in_mem_key = make_mem_key(state.id.deviceID, state.id.type)
-            if (state.id.type, state.id.deviceID) not in unsynced_states:
-                self._state_versions[in_mem_key] = state.version
+        for chunk in chunk_messages(states_to_sync, self._max_msg_bytes):
+            request = SyncStatesRequest(states=chunk)
+            print_grpc(
+                request, self._print_grpc_payload,
+                "Sending resync state request",
+            )
+            response = await grpc_async_wrapper(
+                state_client.SyncStates.future(
+                    request,
+                    DEFAULT_GRPC_TIMEOUT,
+                    compression=self._compression,
+                ),
+                self._loop,
+            )
+            print_grpc(
+                response, self._print_grpc_payload,
+                "Received resync state request",
+            )
+            unsynced_states = set()
+            for id_and_version in response.unsyncedStates:
+                unsynced_states.add((
+                    id_and_version.id.type,
+                    id_and_version.id.deviceID,
+                ))
+            # Update in-memory map to add already synced states
+            for state in request.states:
+                in_mem_key = make_mem_key(state.id.deviceID, state.id.type)
+                if (state.id.type, state.id.deviceID) not in unsynced_states:
+                    self._state_versions[in_mem_key] = state.version
 
         self._has_resync_completed = True
         logging.info("Successfully resynced state with Orchestrator!")
 
+    def _start_iteration(self) -> bool:
+        """Return whether all state has to be read on this iteration"""
+        full_sync = self._full_sync_pending or \
+            self._iterations_since_full_sync >= self._full_sync_iterations
+        if full_sync:
+            STATE_FULL_SYNCS.inc()
+            self._full_sync_pending = False
+            self._iterations_since_full_sync = 0
+        else:
+            self._iterations_since_full_sync += 1
+        return full_sync
+
+    def _read_states(self, redis_dict, full_sync: bool):
+        """
+        Return {key => ValueWithMetadata} of the keys of redis_dict to check,
+        garbage is left out
+        """
+        if not redis_dict.change_feed:
+            states = redis_dict.scan_with_metadata(garbage=False)
+        elif full_sync:
+            # Reset the change feed first, keys changed while the snapshot
+            # is read are read again on next iteration
+            redis_dict.pop_changed_keys()
+            states = redis_dict.scan_with_metadata(garbage=False)
+        else:
+            changed_keys = redis_dict.pop_changed_keys()
+            states = {
+                key: entry for key, entry in
+                redis_dict.bulk_get_with_metadata(changed_keys).items()
+                if not entry.is_garbage
+            }
+            # Keys deleted or marked as garbage since the last iteration
+            for key in changed_keys:
+                if key not in states:
+                    device_id = make_scoped_device_id(
+                        key, redis_dict.state_scope,
+                    )
+                    self._forget_state(
+                        make_mem_key(device_id, redis_dict.redis_type),
+                    )
+            STATE_KEYS_SCANNED.labels(redis_dict.redis_type).inc(
+                len(changed_keys),
+            )
+            return states
+
+        self._state_types_from_current_iteration.add(redis_dict.redis_type)
+        STATE_KEYS_SCANNED.labels(redis_dict.redis_type).inc(len(states))
+        return states
+
     async def _collect_states_to_replicate(self):
         states_to_report = []
+        full_sync = self._start_iteration()
         for redis_dict in self._redis_dicts:
-            for key in redis_dict:
-                redis_state = redis_dict.get(key)
+            # Each state is read and parsed once, its value is only
+            # deserialized if its version changed since it was last reported
+            redis_states = self._read_states(redis_dict, full_sync)
+            for key, entry in redis_states.items():
+                redis_version = entry.version
                 device_id = make_scoped_device_id(key, redis_dict.state_scope)
-
                 in_mem_key = make_mem_key(device_id, redis_dict.redis_type)
-                if redis_state is None:
-                    logging.debug(
-                        "Content of key %s is empty, skipping", in_mem_key,
-                    )
-                    continue
-
-                redis_version = redis_dict.get_version(key)
                 self._state_keys_from_current_iteration.add(in_mem_key)
                 if in_mem_key in self._state_versions and \
                         self._state_versions[in_mem_key] == redis_version:
@@ -215,11 +310,9 @@ class StateReplicator(SDWatchdogTask):
                     continue
 
                 try:
-                    if redis_dict.state_format == PROTO_FORMAT:
-                        state_to_serialize = MessageToDict(redis_state)
-                        serialized_json_state = json.dumps(state_to_serialize)
-                    else:
-                        serialized_json_state = jsonpickle.encode(redis_state)
+                    serialized_json_state = self._encoder.encode(
+                        in_mem_key, entry, redis_dict.state_format,
+                    )
                 except Exception as e:  # pylint: disable=broad-except
                     logging.error(
                         "Found bad state for %s for %s, not "
@@ -227,13 +320,16 @@ class StateReplicator(SDWatchdogTask):
                         key, device_id, e,
                     )
                     continue
+                if serialized_json_state is None:
+                    logging.debug(
+                        "Content of key %s is empty, skipping", in_mem_key,
+                    )
+                    continue
 
                 state_proto = State(
                     type=redis_dict.redis_type,
                     deviceID=device_id,
-                    value=serialized_json_state.encode(
-                        "utf-8",
-                    ),
+                    value=serialized_json_state,
                     version=redis_version,
                 )
 
@@ -242,6 +338,7 @@ class StateReplicator(SDWatchdogTask):
                     serialized_json_state,
                 )
                 states_to_report.append(state_proto)
+                STATE_KEYS_REPORTED.labels(redis_dict.redis_type).inc()
 
         if len(states_to_report) == 0:
             logging.debug("Not replicating state. No state has changed!")
@@ -249,6 +346,22 @@ class StateReplicator(SDWatchdogTask):
         return ReportStatesRequest(states=states_to_report)
 
     async def _send_to_state_service(self, request: ReportStatesRequest):
+        try:
+            for chunk in chunk_messages(request.states, self._max_msg_bytes):
+                reported = await self._report_states(
+                    ReportStatesRequest(states=chunk),
+                )
+                if not reported:
+                    # The changed keys were consumed from the change feeds,
+                    # they are reported again on next full sync
+                    self._full_sync_pending = True
+                    break
+        finally:
+            # reset timeout to config-specified + some buffer
+            self.set_timeout(self._interval * 2)
+
+    async def _report_states(self, request: ReportStatesRequest) -> bool:
+        """Report a chunk of states, return False if the RPC failed"""
         state_client = self._grpc_client_manager.get_client()
         try:
             print_grpc(
@@ -259,6 +372,7 @@ class StateReplicator(SDWatchdogTask):
                 state_client.ReportStates.future(
                     request,
                     DEFAULT_GRPC_TIMEOUT,
+                    compression=self._compression,
                 ),
                 self._loop,
             )
@@ -270,35 +384,42 @@ class StateReplicator(SDWatchdogTask):
                 err,
                 extra=EXCLUDE_FROM_ERROR_MONITORING if indicates_connection_error(err) else None,
             )
-        else:
-            unreplicated_states = set()
-            for idAndError in response.unreportedStates:
-                logging.warning(
-                    "Failed to replicate state for (%s,%s): %s",
-                    idAndError.type, idAndError.deviceID, idAndError.error,
-                )
-                unreplicated_states.add((idAndError.type, idAndError.deviceID))
-            # Update in-memory map for successfully reported states
-            for state in request.states:
-                if (state.type, state.deviceID) in unreplicated_states:
-                    continue
-                in_mem_key = make_mem_key(state.deviceID, state.type)
-                self._state_versions[in_mem_key] = state.version
+            return False
 
-                logging.debug(
-                    "Successfully replicated state for: "
-                    "deviceID: %s,"
-                    "type: %s, "
-                    "version: %d",
-                    state.deviceID, state.type, state.version,
-                )
-        finally:
-            # reset timeout to config-specified + some buffer
-            self.set_timeout(self._interval * 2)
+        unreplicated_states = set()
+        for idAndError in response.unreportedStates:
+            logging.warning(
+                "Failed to replicate state for (%s,%s): %s",
+                idAndError.type, idAndError.deviceID, idAndError.error,
+            )
+            unreplicated_states.add((idAndError.type, idAndError.deviceID))
+            self._full_sync_pending = True
+        # Update in-memory map for successfully reported states
+        for state in request.states:
+            if (state.type, state.deviceID) in unreplicated_states:
+                continue
+            in_mem_key = make_mem_key(state.deviceID, state.type)
+            self._state_versions[in_mem_key] = state.version
+
+            logging.debug(
+                "Successfully replicated state for: "
+                "deviceID: %s,"
+                "type: %s, "
+                "version: %d",
+                state.deviceID, state.type, state.version,
+            )
+        return True
+
+    def _forget_state(self, in_mem_key: str):
+        self._state_versions.pop(in_mem_key, None)
+        self._encoder.forget(in_mem_key)
 
     async def _cleanup_deleted_keys(self):
         deleted_keys = set(self._state_versions) - \
             self._state_keys_from_current_iteration
         for key in deleted_keys:
-            del self._state_versions[key]
+            if get_mem_key_type(key) in \
+                    self._state_types_from_current_iteration:
+                self._forget_state(key)
         self._state_keys_from_current_iteration = set()
+        self._state_types_from_current_iteration = set()
@@ -0,0 +1,96 @@
+"""
+Copyright 2020 The Magma Authors.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from unittest import TestCase
+from unittest.mock import patch
+
+from magma.common.redis.containers import ValueWithMetadata
+from magma.common.redis.serializers import (
+    RedisSerde,
+    get_proto_deserializer,
+    get_proto_serializer,
+)
+from magma.state.redis_dicts import PROTO_FORMAT
+from magma.state.state_encoder import (
+    GRPC_OVERHEAD_BYTES,
+    StateEncoder,
+    chunk_messages,
+)
+from orc8r.protos.common_pb2 import NetworkID
+from orc8r.protos.service303_pb2 import State
+
+NID_TYPE = 'network_id'
+
+
+class StateEncoderTests(TestCase):
+    def setUp(self):
+        self._serde = RedisSerde(
+            NID_TYPE,
+            get_proto_serializer(),
+            get_proto_deserializer(NetworkID),
+        )
+        self._encoder = StateEncoder()
+
+    def _entry(self, value: NetworkID, version: int) -> ValueWithMetadata:
+        return ValueWithMetadata(
+            self._serde.serialize(value, version), self._serde,
+        )
+
+    def test_encode(self):
+        encoded = self._encoder.encode(
+            'id1:' + NID_TYPE, self._entry(NetworkID(id='foo'), 1),
+            PROTO_FORMAT,
+        )
+        self.assertEqual(b'{"id": "foo"}', encoded)
+
+    def test_encode_cache(self):
+        key = 'id1:' + NID_TYPE
+        self._encoder.encode(
+            key, self._entry(NetworkID(id='foo'), 1), PROTO_FORMAT,
+        )
+
+        # Only the version changed, the cached value is reused
+        entry = self._entry(NetworkID(id='foo'), 2)
+        with patch('magma.state.state_encoder.MessageToDict') as to_dict:
+            encoded = self._encoder.encode(key, entry, PROTO_FORMAT)
+            to_dict.assert_not_called()
+        self.assertEqual(b'{"id": "foo"}', encoded)
+
+        encoded = self._encoder.encode(
+            key, self._entry(NetworkID(id='bar'), 3), PROTO_FORMAT,
+        )
+        self.assertEqual(b'{"id": "bar"}', encoded)
+
+        self._encoder.forget(key)
+        with patch('magma.state.state_encoder.MessageToDict') as to_dict:
+            to_dict.return_value = {'id': 'bar'}
+            self._encoder.encode(
+                key, self._entry(NetworkID(id='bar'), 4), PROTO_FORMAT,
+            )
+            to_dict.assert_called_once()
+
+    def test_chunk_messages(self):
+        states = [
+            State(type=NID_TYPE, deviceID=str(i), value=b'x' * 100)
+            for i in range(10)
+        ]
+        state_size = states[0].ByteSize() + 8
+        chunks = list(
+            chunk_messages(states, GRPC_OVERHEAD_BYTES + 3 * state_size),
+        )
+        self.assertEqual([3, 3, 3, 1], [len(chunk) for chunk in chunks])
+        self.assertEqual(states, [s for chunk in chunks for s in chunk])
+
+        # A state larger than the limit is sent on its own
+        chunks = list(chunk_messages(states[:2], GRPC_OVERHEAD_BYTES + 1))
+        self.assertEqual([1, 1], [len(chunk) for chunk in chunks])
+        self.assertEqual([], list(chunk_messages([], 1024)))
@@ -47,6 +47,7 @@ NID_TYPE = 'network_id'
 IDList_TYPE = 'id_list'
 LOG_TYPE = 'log_verbosity'
 FOO_TYPE = 'foo'
+FEED_TYPE = 'network_id_feed'
 
 # Allow access to protected variables for unit testing
 # pylint: disable=protected-access
@@ -135,6 +136,13 @@ class StateReplicatorTests(TestCase):
                     'redis_key': LOG_TYPE,
                     'state_scope': 'gateway',
                 },
+                {
+                    'proto_file': 'orc8r.protos.common_pb2',
+                    'proto_msg': 'NetworkID',
+                    'redis_key': FEED_TYPE,
+                    'state_scope': 'network',
+                    'change_feed': True,
+                },
             ],
             'json_state': [{'redis_key': FOO_TYPE, 'state_scope': 'network'}],
         }
@@ -172,11 +180,19 @@ class StateReplicatorTests(TestCase):
             get_json_serializer(),
             get_json_deserializer(),
         )
+        serde5 = RedisSerde(
+            FEED_TYPE,
+            get_proto_serializer(),
+            get_proto_deserializer(NetworkID),
+        )
 
         self.nid_client = RedisFlatDict(self.mock_redis, serde1)
         self.idlist_client = RedisFlatDict(self.mock_redis, serde2)
         self.log_client = RedisFlatDict(self.mock_redis, serde3)
         self.foo_client = RedisFlatDict(self.mock_redis, serde4)
+        self.feed_client = RedisFlatDict(
+            self.mock_redis, serde5, change_feed=True,
+        )
 
         # Set up and start state replicating loop
         grpc_client_manager = GRPCClientManager(
@@ -479,6 +495,84 @@ class StateReplicatorTests(TestCase):
         self.state_replicator._periodic_task.cancel()
         self.loop.run_until_complete(test())
 
+    @mock.patch('snowflake.snowflake', get_mock_snowflake)
+    @mock.patch('magma.magmad.state_reporter.ServiceRegistry.get_rpc_channel')
+    def test_change_feed_replication(self, get_grpc_mock):
+        async def test():
+            get_grpc_mock.return_value = self.channel
+            self.feed_client.clear()
+
+            # First iteration is a full sync
+            self.feed_client['id1'] = NetworkID(id='foo')
+            self.feed_client['id2'] = NetworkID(id='bar')
+            req = await self.state_replicator._collect_states_to_replicate()
+            self.assertEqual(2, len(req.states))
+            await self.state_replicator._send_to_state_service(req)
+            await self.state_replicator._cleanup_deleted_keys()
+
+            # Only the changed keys are read afterwards
+            self.feed_client['id2'] = NetworkID(id='baz')
+            del self.feed_client['id1']
+            req = await self.state_replicator._collect_states_to_replicate()
+            self.assertEqual(1, len(req.states))
+            self.assertEqual('id2', req.states[0].deviceID)
+            self.assertEqual(2, req.states[0].version)
+            self.assertEqual(
+                {make_mem_key('id2', FEED_TYPE)},
+                self.state_replicator._state_keys_from_current_iteration,
+            )
+            self.assertNotIn(
+                make_mem_key('id1', FEED_TYPE),
+                self.state_replicator._state_versions,
+            )
+            await self.state_replicator._send_to_state_service(req)
+            await self.state_replicator._cleanup_deleted_keys()
+
+            req = await self.state_replicator._collect_states_to_replicate()
+            self.assertIsNone(req)
+            self.assertEqual(
+                set(), self.state_replicator._state_keys_from_current_iteration,
+            )
+
+            # Keys written without the change feed are found on full sync
+            self.mock_redis.delete(self.feed_client.change_feed_key)
+            self.feed_client['id3'] = NetworkID(id='foo')
+            self.mock_redis.delete(self.feed_client.change_feed_key)
+            req = await self.state_replicator._collect_states_to_replicate()
+            self.assertIsNone(req)
+            self.state_replicator._full_sync_pending = True
+            req = await self.state_replicator._collect_states_to_replicate()
+            self.assertEqual(1, len(req.states))
+            self.assertEqual('id3', req.states[0].deviceID)
+
+        # Cancel the replicator's loop so there are no other activities
+        self.state_replicator._periodic_task.cancel()
+        self.loop.run_until_complete(test())
+
+    @mock.patch('snowflake.snowflake', get_mock_snowflake)
+    @mock.patch('magma.magmad.state_reporter.ServiceRegistry.get_rpc_channel')
+    def test_send_states_in_chunks(self, get_grpc_mock):
+        async def test():
+            get_grpc_mock.return_value = self.channel
+            self.nid_client.clear()
+            for i in range(5):
+                self.nid_client['id%d' % i] = NetworkID(id='foo%d' % i)
+
+            # Leave room for a couple of states in each request
+            self.state_replicator._max_msg_bytes = 1100
+            with mock.patch.object(
+                self.state_replicator, '_report_states',
+                wraps=self.state_replicator._report_states,
+            ) as report_mock:
+                req = await self.state_replicator._collect_states_to_replicate()
+                await self.state_replicator._send_to_state_service(req)
+                self.assertEqual(3, report_mock.call_count)
+            self.assertEqual(5, len(self.state_replicator._state_versions))
+
+        # Cancel the replicator's loop so there are no other activities
+        self.state_replicator._periodic_task.cancel()
+        self.loop.run_until_complete(test())
+
     def test_resolve_sync_interval(self):
         testcases = [
             {
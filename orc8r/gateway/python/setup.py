@@ -90,6 +90,7 @@ setup(
         'jsonpickle',
         'bravado-core==5.16.1',
         'jsonschema==3.1.0',
+        'msgpack>=1.0.0',
         "strict-rfc3339>=0.7",
         "rfc3987>=1.3.0",
         "webcolors>=1.11.1",